@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""Controle de admissão: limites de taxa por SID e por sala, e filas de saída limitadas.
+
+Nada limitava a taxa de eventos: um cliente podia repetir submit_answer,
+join_room_pin ou create_room à vontade, e cada chamada pega locks e pode gerar
+um broadcast para a sala inteira. RateLimiter guarda um token bucket por chave
+(SID ou PIN) e por evento. guard_events() consulta os buckets assim que o
+python-socketio decodifica o evento, antes de ele virar uma tarefa e ganhar o
+contexto do Flask: um evento recusado não pega lock nenhum e custa pouco mais
+que a decodificação do pacote, mesmo numa enxurrada.
+
+Na saída, um cliente lento (celular com sinal fraco) acumulava na fila do
+Engine.IO todos os broadcasts da sala. bound_queues() limita essa fila: com ela
+cheia, os pacotes dos eventos descartáveis ('rate_limited') não entram, e os
+dos eventos que só carregam o estado mais recente ('scores_update') são
+coalescidos: o último fica guardado e entra quando a fila tiver espaço, no
+lugar dos anteriores. Os demais (new_question, time_up, quiz_ended,
+resultados) entram sempre.
+
+Como em metrics.py, os buckets são atualizados sem lock: com eventlet e asyncio
+não há troca de contexto no meio de uma atualização; no modo threading uma
+ficha pode, raramente, ser contada a mais ou a menos.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """Token buckets por chave e evento. `limits`: evento -> (fichas por segundo, capacidade)."""
+
+    def __init__(self, limits, clock=time.monotonic):
+        self.limits = limits
+        self._clock = clock
+        self._buckets = {}   # Chave -> {evento: [fichas, instante da última conta]}
+
+    def acquire(self, key, event):
+        """Gasta uma ficha do bucket (key, event). 0 se o evento foi admitido, senão os segundos até a próxima ficha."""
+        limit = self.limits.get(event)
+        if limit is None:
+            return 0
+        rate, burst = limit
+        now = self._clock()
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            buckets = self._buckets[key] = {}
+        bucket = buckets.get(event)
+        if bucket is None:
+            buckets[event] = [burst - 1, now]
+            return 0
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    def forget(self, key):
+        """Descarta os buckets de uma chave (SID desconectado, sala removida)."""
+        self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def _event_prefixes(events):
+    # Começo do pacote Socket.IO de um evento no namespace /, como o python-socketio o codifica
+    return {f'2["{event}",': event for event in events}
+
+
+def guard_events(server, admit):
+    """Consulta `admit(sid, evento, args)` a cada evento recebido por um socketio.Server (ou AsyncServer).
+
+    `admit` devolve None para deixar o evento seguir para o handler; senão, o
+    evento não é despachado e o que ela devolver, (evento, dados), é enviado de
+    volta só para esse cliente. Depois de cada recusa o loop é cedido: os
+    pacotes de uma enxurrada já chegam no buffer do socket, e recusá-los todos
+    de uma vez atrasaria os eventos dos outros clientes.
+    """
+    handle_event = server._handle_event
+
+    def check(eio_sid, namespace, data):
+        if not data or not isinstance(data[0], str):
+            return None   # Nome de evento malformado: o python-socketio decide o que fazer com ele
+        namespace = namespace or '/'
+        sid = server.manager.sid_from_eio_sid(eio_sid, namespace)
+        if sid is None:
+            return None   # Namespace não conectado: o python-socketio ignora o evento
+        reply = admit(sid, data[0], data[1:])
+        return reply and (reply, sid, namespace)
+
+    if server.eio.is_asyncio_based():
+        async def on_event(eio_sid, namespace, id, data):
+            refused = check(eio_sid, namespace, data)
+            if refused is None:
+                return await handle_event(eio_sid, namespace, id, data)
+            (event, payload), sid, namespace = refused
+            await server.emit(event, payload, to=sid, namespace=namespace)
+            await server.sleep(0)
+    else:
+        def on_event(eio_sid, namespace, id, data):
+            refused = check(eio_sid, namespace, data)
+            if refused is None:
+                return handle_event(eio_sid, namespace, id, data)
+            (event, payload), sid, namespace = refused
+            server.emit(event, payload, to=sid, namespace=namespace)
+            server.sleep(0)
+
+    server._handle_event = on_event
+
+
+def bound_queues(server, max_queued, droppable, on_drop=None, coalesce=(), retry_interval=0.25):
+    """Limita a fila de saída de cada cliente de um socketio.Server (ou AsyncServer).
+
+    Um pacote de um evento em `droppable` não entra na fila de um cliente que já
+    tem `max_queued` pacotes esperando. Os de um evento em `coalesce` também
+    não, mas o mais recente de cada cliente fica guardado: um mais novo toma o
+    lugar dele, e uma tarefa em background tenta de novo a cada
+    `retry_interval` s até a fila ter espaço. Assim o último estado sempre
+    chega, mesmo que a sala não mande mais nada depois. `on_drop(evento)` é
+    chamado a cada pacote descartado (ou guardado e depois substituído). Deve
+    ser instalado depois do wire_msgpack.install, para ver os pacotes ainda em
+    JSON. max_queued 0 (ou None) não instala nada.
+    """
+    if not max_queued:
+        return
+    eio = server.eio
+    sockets, send_packet = eio.sockets, eio.send_packet
+    coalesce = frozenset(coalesce)
+    prefixes = _event_prefixes(set(droppable) | coalesce)
+    starts = tuple(prefixes)
+    held = {}               # (eio_sid, evento) -> pacote mais recente que não coube na fila
+    retrying = [False]      # Se a tarefa que reenvia os guardados está rodando
+    retry_lock = threading.Lock()
+
+    def shed(eio_sid, pkt):
+        # True se o pacote não entra na fila agora (descartado ou guardado)
+        socket = sockets.get(eio_sid)
+        if socket is None:
+            return False
+        has_room = socket.queue.qsize() < max_queued
+        if has_room and not held:
+            return False
+        data = pkt.data
+        if not isinstance(data, str) or not data.startswith(starts):
+            return False
+        event = next(event for prefix, event in prefixes.items() if data.startswith(prefix))
+        if event not in coalesce:
+            if has_room:
+                return False
+        else:
+            key = (eio_sid, event)
+            stale = held.pop(key, None)
+            if stale is not None and on_drop is not None:
+                on_drop(event)   # O guardado ficou velho: este o substitui
+            if has_room:
+                return False
+            held[key] = pkt
+            with retry_lock:
+                if retrying[0]:
+                    return True
+                retrying[0] = True
+            server.start_background_task(retry)
+            return True
+        if on_drop is not None:
+            on_drop(event)
+        return True
+
+    def ready():
+        # Guardados que já cabem na fila; esquece os de clientes que desconectaram
+        for key, pkt in list(held.items()):
+            socket = sockets.get(key[0])
+            if socket is None:
+                held.pop(key, None)
+            elif socket.queue.qsize() < max_queued and held.get(key) is pkt:
+                del held[key]
+                yield key[0], pkt
+
+    def done():
+        with retry_lock:
+            if held:
+                return False
+            retrying[0] = False
+            return True
+
+    if eio.is_asyncio_based():
+        async def send(eio_sid, pkt):
+            if not shed(eio_sid, pkt):
+                return await send_packet(eio_sid, pkt)
+
+        async def retry():
+            while True:
+                await server.sleep(retry_interval)
+                for eio_sid, pkt in ready():
+                    await send_packet(eio_sid, pkt)
+                if done():
+                    return
+    else:
+        def send(eio_sid, pkt):
+            if not shed(eio_sid, pkt):
+                return send_packet(eio_sid, pkt)
+
+        def retry():
+            while True:
+                server.sleep(retry_interval)
+                for eio_sid, pkt in ready():
+                    send_packet(eio_sid, pkt)
+                if done():
+                    return
+
+    eio.send_packet = send
+
+
+def queue_depths(server):
+    """Pacotes esperando na fila de saída de cada cliente conectado (para as métricas)."""
+    return [socket.queue.qsize() for socket in list(server.eio.sockets.values())]
@@ -1,131 +1,682 @@
 # -*- coding: utf-8 -*-
 import os
-from flask import Flask, render_template, session, request, jsonify
+from flask import Flask, Response, render_template, session, request, jsonify, abort
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS 
+from itsdangerous import BadSignature, URLSafeSerializer
 import time
 import threading
-from collections import defaultdict
+from contextlib import contextmanager
 import logging
 import random
-import string
-
-logging.basicConfig(level=logging.DEBUG) 
+import socket
+import uuid
+import hmac
+import atexit
+import pickle
+import signal
+import sys
+from scheduler import DeadlineScheduler
+from room_store import create_room_store
+from pin_allocator import PinAllocator, PinsExhausted, parse_shard
+from sqlite_queue import SQLiteManager
+from leaderboard import Leaderboard
+from question_bank import QuestionBankStore, QuestionFilter
+from recommendation import recommend_skills
+from room_state import RoomState, GameState, PlayerState, answer_summary
+from event_log import EventLog, NullEventLog
+from room_lifecycle import RoomLifecycle, RoomInfo, estimate_bytes, CAP
+from checkpoint import RoomCheckpoint
+from quiz_logging import configure_logging, socketio_logs_enabled, LogSampler
+import metrics
+import profiling
+import wire_json
+import wire_msgpack
+import asgi_server
+import admission
+from wire_json import PreEncoded
+
+# Configurado antes do monkey_patch do eventlet: a escrita dos logs roda numa thread
+# real do sistema, fora do loop de eventos (ver quiz_logging.py para as variáveis de ambiente)
+log_listener = configure_logging()
 logger = logging.getLogger(__name__)
-werkzeug_logger = logging.getLogger('werkzeug') 
-werkzeug_logger.setLevel(logging.INFO) 
+# Logs de eventos frequentes (respostas, entradas, saídas) saem por amostragem
+event_log = LogSampler()
 
+# QUIZ_ASYNC_MODE=threading força o modo threading mesmo com eventlet instalado (útil nos benchmarks);
+# QUIZ_ASYNC_MODE=asyncio roda o Socket.IO num loop asyncio servido pelo uvicorn, sem monkey_patch
+# (ver asgi_server.py)
+ASYNC_MODE = os.environ.get('QUIZ_ASYNC_MODE', 'eventlet')
 try:
+    if ASYNC_MODE != 'eventlet':
+        raise ImportError("eventlet desabilitado por QUIZ_ASYNC_MODE")
     import eventlet
     eventlet.monkey_patch() 
-    ASYNC_MODE = 'eventlet'
     logger.info("Eventlet encontrado e monkey_patch() aplicado.")
 except ImportError:
-    logger.warning("Eventlet não encontrado. Usando async_mode='threading'.")
-    ASYNC_MODE = 'threading'
+    if ASYNC_MODE != 'asyncio':
+        logger.warning("Eventlet não encontrado. Usando async_mode='threading'.")
+        ASYNC_MODE = 'threading'
+
+# Vários workers: QUIZ_ROOM_STORE=sqlite:///salas.db compartilha o estado das salas e
+# QUIZ_MESSAGE_QUEUE (redis://... ou sqlite:///fila.db) entrega os emits entre os processos.
+ROOM_STORE_URL = os.environ.get('QUIZ_ROOM_STORE', 'memory')
+MESSAGE_QUEUE_URL = os.environ.get('QUIZ_MESSAGE_QUEUE')
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+queue_options = {}
+if MESSAGE_QUEUE_URL and MESSAGE_QUEUE_URL.startswith('sqlite:'):
+    queue_options['client_manager'] = SQLiteManager(MESSAGE_QUEUE_URL)
+elif MESSAGE_QUEUE_URL:
+    queue_options['message_queue'] = MESSAGE_QUEUE_URL
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 app.config['SECRET_KEY'] = 'bict_quiz_ufma_salas_super_secretas_eventlet_v13!' # Nova chave
-socketio = SocketIO(app,
-                    async_mode=ASYNC_MODE,
-                    cors_allowed_origins="*",
-                    logger=True,              
-                    engineio_logger=True)     
-
-logger.info(f"SocketIO inicializado com async_mode: {socketio.async_mode}")
-
-# --- Definição das Questões ---
-class QuizOption:
-    def __init__(self, id: str, text: str): self.id = id; self.text = text
-    def to_dict(self): return {"id": self.id, "text": self.text}
-
-class QuizQuestion:
-    def __init__(self, id: str, text: str, options: list[QuizOption], correct_option_id: str, skill_area: str, difficulty: str):
-        self.id, self.text, self.options, self.correct_option_id, self.skill_area, self.difficulty = id, text, options, correct_option_id, skill_area, difficulty
-    def to_dict(self):
-        return {"id": self.id, "text": self.text, "options": [opt.to_dict() for opt in self.options],
-                "correctOptionId": self.correct_option_id, "skillArea": self.skill_area, "difficulty": self.difficulty}
-
-# Questões do Desafio 1 (já existentes + acrescentei 6 novas)
-challenge_1_questions_data = [
-  {"id": "nq1","text": "Se um algoritmo é uma sequência finita de instruções para resolver um problema, qual das seguintes opções MELHOR descreve uma característica essencial de um bom algoritmo?","options": [{"id": "nq1_opt1", "text": "Ser escrito na linguagem de programação mais recente."}, {"id": "nq1_opt2", "text": "Ser o mais curto possível, mesmo que difícil de entender."}, {"id": "nq1_opt3", "text": "Ser eficiente em termos de tempo e recursos, e ser claro."}, {"id": "nq1_opt4", "text": "Funcionar apenas para um conjunto específico de dados de entrada."}],"correctOptionId": "nq1_opt3","skillArea": "BICT - Lógica de Programação","difficulty": "Fácil"},
-  {"id": "nq2","text": "No contexto de redes de computadores, o que significa a sigla 'IP' em 'Endereço IP'?","options": [{"id": "nq2_opt1", "text": "Internal Protocol"}, {"id": "nq2_opt2", "text": "Internet Protocol"}, {"id": "nq2_opt3", "text": "Instruction Pointer"}, {"id": "nq2_opt4", "text": "Immediate Power"}],"correctOptionId": "nq2_opt2","skillArea": "BICT - Redes de Computadores","difficulty": "Fácil"},
-  {"id": "nq3","text": "Qual o resultado da expressão lógica: (VERDADEIRO OU FALSO) E (NÃO FALSO)?","options": [{"id": "nq3_opt1", "text": "VERDADEIRO"}, {"id": "nq3_opt2", "text": "FALSO"}, {"id": "nq3_opt3", "text": "Depende"}, {"id": "nq3_opt4", "text": "Inválido"}],"correctOptionId": "nq3_opt1","skillArea": "BICT - Matemática Discreta","difficulty": "Fácil"},
-  {"id": "nq4","text": "Em Engenharia de Computação, qual componente de um computador é responsável por executar a maioria das instruções e cálculos?","options": [{"id": "nq4_opt1", "text": "Memória RAM"}, {"id": "nq4_opt2", "text": "Disco Rígido (HD/SSD)"}, {"id": "nq4_opt3", "text": "Unidade Central de Processamento (CPU)"}, {"id": "nq4_opt4", "text": "Placa de Vídeo (GPU)"}],"correctOptionId": "nq4_opt3","skillArea": "Eng. Computação - Arquitetura de Computadores","difficulty": "Fácil"},
-  {"id": "nq5","text": "Um engenheiro civil está projetando uma viga para uma ponte. Qual dos seguintes materiais é comumente escolhido por sua alta resistência à compressão?","options": [{"id": "nq5_opt1", "text": "Madeira Leve"}, {"id": "nq5_opt2", "text": "Borracha Vulcanizada"}, {"id": "nq5_opt3", "text": "Concreto Armado"}, {"id": "nq5_opt4", "text": "Plástico PVC"}],"correctOptionId": "nq5_opt3","skillArea": "Eng. Civil - Materiais de Construção","difficulty": "Médio"},
-  {"id": "nq6","text": "Qual lei da termodinâmica afirma que a energia não pode ser criada nem destruída, apenas transformada de uma forma para outra?","options": [{"id": "nq6_opt1", "text": "Lei Zero"}, {"id": "nq6_opt2", "text": "Primeira Lei"}, {"id": "nq6_opt3", "text": "Segunda Lei"}, {"id": "nq6_opt4", "text": "Terceira Lei"}],"correctOptionId": "nq6_opt2","skillArea": "Eng. Mecânica - Termodinâmica","difficulty": "Médio"},
-  {"id": "nq7","text": "Um carro de Fórmula 1 utiliza um aerofólio traseiro para gerar 'downforce'. Este efeito está mais relacionado a qual princípio da física?","options": [{"id": "nq7_opt1", "text": "Efeito Doppler"}, {"id": "nq7_opt2", "text": "Princípio de Arquimedes"}, {"id": "nq7_opt3", "text": "Princípio de Bernoulli (relacionado à diferença de pressão)"}, {"id": "nq7_opt4", "text": "Lei da Gravitação Universal"}],"correctOptionId": "nq7_opt3","skillArea": "Eng. Aeroespacial - Aerodinâmica","difficulty": "Médio"},
-  {"id": "nq8","text": "Qual das seguintes ações é uma medida fundamental na Engenharia Ambiental para mitigar o impacto de resíduos sólidos urbanos?","options": [{"id": "nq8_opt1", "text": "Aumentar a capacidade dos aterros sanitários existentes."},{"id": "nq8_opt2", "text": "Incentivar o consumo descartável para facilitar a coleta."},{"id": "nq8_opt3", "text": "Implementar programas de coleta seletiva e reciclagem."},{"id": "nq8_opt4", "text": "Queimar todos os resíduos a céu aberto para reduzir volume."}],"correctOptionId": "nq8_opt3","skillArea": "Eng. Ambiental - Gestão de Resíduos","difficulty": "Fácil"},
-  {"id": "nq9","text": "Em Engenharia de Transportes, o planejamento de um sistema de semáforos em um cruzamento visa principalmente:","options": [{"id": "nq9_opt1", "text": "Aumentar a velocidade média dos veículos na via."},{"id": "nq9_opt2", "text": "Priorizar exclusivamente o fluxo de transporte público."},{"id": "nq9_opt3", "text": "Otimizar o fluxo de veículos e a segurança de pedestres."},{"id": "nq9_opt4", "text": "Reduzir o número de faixas de rolamento."}],"correctOptionId": "nq9_opt3","skillArea": "Eng. Transportes - Engenharia de Tráfego","difficulty": "Médio"},
-  {"id": "nq10","text": "Se um terreno retangular tem 20 metros de frente e 30 metros de profundidade, qual é a sua área total?","options": [{"id": "nq10_opt1", "text": "50 m²"},{"id": "nq10_opt2", "text": "100 m²"},{"id": "nq10_opt3", "text": "600 m²"},{"id": "nq10_opt4", "text": "500 m²"}],"correctOptionId": "nq10_opt3","skillArea": "Cálculo Básico - Geometria","difficulty": "Fácil"},
-  {"id": "nq11","text": "Um projeto requer que uma peça metálica se expanda no máximo 0.05mm com o calor. O engenheiro precisa calcular a variação de temperatura permitida. Qual conceito físico é fundamental aqui?","options": [{"id": "nq11_opt1", "text": "Resistência Elétrica"},{"id": "nq11_opt2", "text": "Dilatação Térmica"},{"id": "nq11_opt3", "text": "Capacitância"},{"id": "nq11_opt4", "text": "Momento de Inércia"}],"correctOptionId": "nq11_opt2","skillArea": "Física Aplicada - Termologia","difficulty": "Médio"},
-  {"id": "nq12","text": "Se você tem um conjunto de dados de medições e precisa encontrar o valor que ocorre com maior frequência, qual medida estatística você usaria?","options": [{"id": "nq12_opt1", "text": "Média Aritmética"},{"id": "nq12_opt2", "text": "Mediana"},{"id": "nq12_opt3", "text": "Moda"},{"id": "nq12_opt4", "text": "Desvio Padrão"}],"correctOptionId": "nq12_opt3","skillArea": "BICT - Estatística Básica","difficulty": "Fácil"},
-  # Novas perguntas para o Desafio 1
-  {"id": "nq13_comp", "text": "Em ciência da computação, qual das seguintes estruturas de dados é mais eficiente para acessar elementos por índice, mas menos eficiente para inserções ou remoções no meio da sequência?", "options": [{"id": "nq13_comp_opt1", "text": "Lista Encadeada"}, {"id": "nq13_comp_opt2", "text": "Árvore Binária"}, {"id": "nq13_comp_opt3", "text": "Array (Vetor)"}, {"id": "nq13_comp_opt4", "text": "Fila"}], "correctOptionId": "nq13_comp_opt3", "skillArea": "Eng. Computação - Estruturas de Dados", "difficulty": "Médio"},
-  {"id": "nq14_civil", "text": "No dimensionamento de estruturas de concreto armado, qual a principal função das barras de aço (armadura) inseridas no concreto?", "options": [{"id": "nq14_civil_opt1", "text": "Aumentar o peso da estrutura"}, {"id": "nq14_civil_opt2", "text": "Resistir aos esforços de tração"}, {"id": "nq14_civil_opt3", "text": "Melhorar o isolamento térmico"}, {"id": "nq14_civil_opt4", "text": "Acelerar a secagem do concreto"}], "correctOptionId": "nq14_civil_opt2", "skillArea": "Eng. Civil - Concreto Armado", "difficulty": "Médio"},
-  {"id": "nq15_mec", "text": "Qual das seguintes leis da Termodinâmica estabelece que a entropia de um sistema isolado nunca diminui com o tempo, tendendo a um máximo?", "options": [{"id": "nq15_mec_opt1", "text": "Lei Zero da Termodinâmica"}, {"id": "nq15_mec_opt2", "text": "Primeira Lei da Termodinâmica"}, {"id": "nq15_mec_opt3", "text": "Segunda Lei da Termodinâmica"}, {"id": "nq15_mec_opt4", "text": "Terceira Lei da Termodinâmica"}], "correctOptionId": "nq15_mec_opt3", "skillArea": "Eng. Mecânica - Termodinâmica", "difficulty": "Médio"},
-  {"id": "nq16_aero", "text": "Para que um objeto permaneça em órbita estável ao redor da Terra, qual força deve estar em equilíbrio com a força centrífuga gerada pelo movimento do objeto?", "options": [{"id": "nq16_aero_opt1", "text": "Força de arrasto atmosférico"}, {"id": "nq16_aero_opt2", "text": "Força de atrito"}, {"id": "nq16_aero_opt3", "text": "Força gravitacional"}, {"id": "nq16_aero_opt4", "text": "Força de sustentação"}], "correctOptionId": "nq16_aero_opt3", "skillArea": "Eng. Aeroespacial - Mecânica Orbital", "difficulty": "Médio"},
-  {"id": "nq17_amb", "text": "Qual o principal objetivo do tratamento de esgoto sanitário em uma Estação de Tratamento de Esgoto (ETE) antes do descarte no ambiente?", "options": [{"id": "nq17_amb_opt1", "text": "Aumentar a quantidade de água disponível"}, {"id": "nq17_amb_opt2", "text": "Remover poluentes e patógenos para proteger a saúde pública e os ecossistemas"}, {"id": "nq17_amb_opt3", "text": "Produzir energia elétrica"}, {"id": "nq17_amb_opt4", "text": "Gerar fertilizantes para a agricultura"}], "correctOptionId": "nq17_amb_opt2", "skillArea": "Eng. Ambiental - Saneamento Básico", "difficulty": "Médio"},
-  {"id": "nq18_trans", "text": "No planejamento de transportes, o que representa o conceito de 'capacidade de uma via'?", "options": [{"id": "nq18_trans_opt1", "text": "A velocidade máxima permitida na via"}, {"id": "nq18_trans_opt2", "text": "O número máximo de veículos que podem passar por um ponto da via em um determinado período"}, {"id": "nq18_trans_opt3", "text": "O comprimento total da via"}, {"id": "nq18_trans_opt4", "text": "A largura da via em metros"}], "correctOptionId": "nq18_trans_opt2", "skillArea": "Eng. Transportes - Engenharia de Tráfego", "difficulty": "Médio"}
-]
-
-# Novas questões para o Desafio 2 (nível mais básico - calouros)
-challenge_2_questions_data = [
-    # Engenharia de Computação (3 perguntas)
-    {"id": "c2_comp1", "text": "Qual é a principal função de um 'algoritmo' na programação de computadores?", "options": [{"id": "c2_comp1_opt1", "text": "Escrever textos"}, {"id": "c2_comp1_opt2", "text": "Resolver problemas passo a passo"}, {"id": "c2_comp1_opt3", "text": "Desenhar imagens"}, {"id": "c2_comp1_opt4", "text": "Tocar música"}], "correctOptionId": "c2_comp1_opt2", "skillArea": "Eng. Computação - Fundamentos de Programação", "difficulty": "Muito Fácil"},
-    {"id": "c2_comp2", "text": "O que significa a sigla 'CPU' em um computador?", "options": [{"id": "c2_comp2_opt1", "text": "Central Power Unit"}, {"id": "c2_comp2_opt2", "text": "Computer Processing Utility"}, {"id": "c2_comp2_opt3", "text": "Central Processing Unit"}, {"id": "c2_comp2_opt4", "text": "Core Program Unit"}], "correctOptionId": "c2_comp2_opt3", "skillArea": "Eng. Computação - Hardware Básico", "difficulty": "Muito Fácil"},
-    {"id": "c2_comp3", "text": "Qual das seguintes opções é um exemplo de linguagem de programação usada para criar páginas web interativas?", "options": [{"id": "c2_comp3_opt1", "text": "Microsoft Word"}, {"id": "c2_comp3_opt2", "text": "JavaScript"}, {"id": "c2_comp3_opt3", "text": "Adobe Photoshop"}, {"id": "c2_comp3_opt4", "text": "Excel"}], "correctOptionId": "c2_comp3_opt2", "skillArea": "Eng. Computação - Desenvolvimento Web", "difficulty": "Fácil"},
-
-    # Engenharia Civil (3 perguntas)
-    {"id": "c2_civil1", "text": "Qual o principal objetivo de uma 'fundação' em um edifício?", "options": [{"id": "c2_civil1_opt1", "text": "Decorar o exterior"}, {"id": "c2_civil1_opt2", "text": "Suportar o peso da estrutura e distribuí-lo no solo"}, {"id": "c2_civil1_opt3", "text": "Proteger contra raios"}, {"id": "c2_civil1_opt4", "text": "Armazenar água"}], "correctOptionId": "c2_civil1_opt2", "skillArea": "Eng. Civil - Estruturas Básicas", "difficulty": "Muito Fácil"},
-    {"id": "c2_civil2", "text": "O que é o 'concreto' na construção civil?", "options": [{"id": "c2_civil2_opt1", "text": "Um tipo de madeira"}, {"id": "c2_civil2_opt2", "text": "Uma mistura de cimento, água, areia e brita"}, {"id": "c2_civil2_opt3", "text": "Uma chapa de metal"}, {"id": "c2_civil2_opt4", "text": "Um tipo de vidro"}], "correctOptionId": "c2_civil2_opt2", "skillArea": "Eng. Civil - Materiais de Construção", "difficulty": "Fácil"},
-    {"id": "c2_civil3", "text": "Qual a importância de um engenheiro civil no planejamento de cidades?", "options": [{"id": "c2_civil3_opt1", "text": "Apenas projetar casas"}, {"id": "c2_civil3_opt2", "text": "Desenvolver infraestruturas como estradas, pontes e sistemas de saneamento"}, {"id": "c2_civil3_opt3", "text": "Cuidar do paisagismo"}, {"id": "c2_civil3_opt4", "text": "Gerenciar o tráfego de veículos"}], "correctOptionId": "c2_civil3_opt2", "skillArea": "Eng. Civil - Urbanismo e Infraestrutura", "difficulty": "Fácil"},
-
-    # Engenharia Mecânica (3 perguntas)
-    {"id": "c2_mec1", "text": "Qual o principal objetivo de um motor, como o de um carro?", "options": [{"id": "c2_mec1_opt1", "text": "Gerar eletricidade"}, {"id": "c2_mec1_opt2", "text": "Converter energia (química ou outra) em movimento"}, {"id": "c2_mec1_opt3", "text": "Purificar o ar"}, {"id": "c2_mec1_opt4", "text": "Aquecer o veículo"}], "correctOptionId": "c2_mec1_opt2", "skillArea": "Eng. Mecânica - Fundamentos de Máquinas", "difficulty": "Muito Fácil"},
-    {"id": "c2_mec2", "text": "O que é uma 'engrenagem' e para que serve em um sistema mecânico?", "options": [{"id": "c2_mec2_opt1", "text": "Um tipo de parafuso"}, {"id": "c2_mec2_opt2", "text": "Uma roda dentada usada para transmitir movimento e força"}, {"id": "c2_mec2_opt3", "text": "Um sensor de temperatura"}, {"id": "c2_mec2_opt4", "text": "Um isolante elétrico"}], "correctOptionId": "c2_mec2_opt2", "skillArea": "Eng. Mecânica - Elementos de Máquinas", "difficulty": "Fácil"},
-    {"id": "c2_mec3", "text": "Qual o conceito que estuda como o calor se transforma em outras formas de energia e vice-versa?", "options": [{"id": "c2_mec3_opt1", "text": "Eletricidade"}, {"id": "c2_mec3_opt2", "text": "Óptica"}, {"id": "c2_mec3_opt3", "text": "Termodinâmica"}, {"id": "c2_mec3_opt4", "text": "Acústica"}], "correctOptionId": "c2_mec3_opt3", "skillArea": "Eng. Mecânica - Termodinâmica", "difficulty": "Fácil"},
-
-    # Engenharia Aeroespacial (3 perguntas)
-    {"id": "c2_aero1", "text": "Qual princípio físico fundamental explica como as asas de um avião geram sustentação para voar?", "options": [{"id": "c2_aero1_opt1", "text": "Lei da Gravidade"}, {"id": "c2_aero1_opt2", "text": "Princípio de Bernoulli (diferença de pressão)"}, {"id": "c2_aero1_opt3", "text": "Lei de Ohm"}, {"id": "c2_aero1_opt4", "text": "Princípio da Conservação de Massa"}], "correctOptionId": "c2_aero1_opt2", "skillArea": "Eng. Aeroespacial - Aerodinâmica Básica", "difficulty": "Fácil"},
-    {"id": "c2_aero2", "text": "Qual a principal diferença entre a propulsão de um avião a jato e a de um foguete?", "options": [{"id": "c2_aero2_opt1", "text": "Aviões usam rodas e foguetes não"}, {"id": "c2_aero2_opt2", "text": "Aviões precisam de ar para queimar combustível, foguetes carregam seu próprio oxidante"}, {"id": "c2_aero2_opt3", "text": "Aviões voam mais rápido"}, {"id": "c2_aero2_opt4", "text": "Foguetes são maiores"}], "correctOptionId": "c2_aero2_opt2", "skillArea": "Eng. Aeroespacial - Propulsão", "difficulty": "Médio"},
-    {"id": "c2_aero3", "text": "Para que serve um satélite artificial em órbita da Terra?", "options": [{"id": "c2_aero3_opt1", "text": "Apenas para observar estrelas"}, {"id": "c2_aero3_opt2", "text": "Comunicações, previsão do tempo, navegação (GPS)"}, {"id": "c2_aero3_opt3", "text": "Coletar lixo espacial"}, {"id": "c2_aero3_opt4", "text": "Ajudar na agricultura"}], "correctOptionId": "c2_aero3_opt2", "skillArea": "Eng. Aeroespacial - Aplicações Espaciais", "difficulty": "Fácil"},
-
-    # Engenharia Ambiental (3 perguntas)
-    {"id": "c2_amb1", "text": "O que é 'reciclagem' e por que ela é importante para o meio ambiente?", "options": [{"id": "c2_amb1_opt1", "text": "Queimar lixo para produzir energia"}, {"id": "c2_amb1_opt2", "text": "Transformar materiais usados em novos produtos para reduzir o descarte"}, {"id": "c2_amb1_opt3", "text": "Jogar lixo em aterros"}, {"id": "c2_amb1_opt4", "text": "Usar mais produtos descartáveis"}], "correctOptionId": "c2_amb1_opt2", "skillArea": "Eng. Ambiental - Gestão de Resíduos", "difficulty": "Muito Fácil"},
-    {"id": "c2_amb2", "text": "Qual o nome do fenômeno natural que mantém a Terra aquecida, mas que pode ser intensificado pela poluição, causando mudanças climáticas?", "options": [{"id": "c2_amb2_opt1", "text": "Chuva ácida"}, {"id": "c2_amb2_opt2", "text": "Efeito estufa"}, {"id": "c2_amb2_opt3", "text": "Camada de ozônio"}, {"id": "c2_amb2_opt4", "text": "Maré alta"}], "correctOptionId": "c2_amb2_opt2", "skillArea": "Eng. Ambiental - Clima e Poluição", "difficulty": "Fácil"},
-    {"id": "c2_amb3", "text": "Qual das seguintes é uma fonte de energia considerada 'limpa' ou renovável?", "options": [{"id": "c2_amb3_opt1", "text": "Carvão mineral"}, {"id": "c2_amb3_opt2", "text": "Petróleo"}, {"id": "c2_amb3_opt3", "text": "Energia solar"}, {"id": "c2_amb3_opt4", "text": "Gás natural"}], "correctOptionId": "c2_amb3_opt3", "skillArea": "Eng. Ambiental - Energias Renováveis", "difficulty": "Muito Fácil"},
-
-    # Engenharia de Transportes (3 perguntas)
-    {"id": "c2_trans1", "text": "Qual o principal objetivo de um sistema de transporte público bem planejado em uma cidade?", "options": [{"id": "c2_trans1_opt1", "text": "Apenas transportar carros"}, {"id": "c2_trans1_opt2", "text": "Reduzir engarrafamentos e poluição, e oferecer mobilidade acessível"}, {"id": "c2_trans1_opt3", "text": "Construir mais estacionamentos"}, {"id": "c2_trans1_opt4", "text": "Aumentar o número de semáforos"}], "correctOptionId": "c2_trans1_opt2", "skillArea": "Eng. Transportes - Mobilidade Urbana", "difficulty": "Muito Fácil"},
-    {"id": "c2_trans2", "text": "Por que é importante para um país ter uma boa rede de estradas e ferrovias?", "options": [{"id": "c2_trans2_opt1", "text": "Para que as pessoas possam passear de carro"}, {"id": "c2_trans2_opt2", "text": "Para facilitar o transporte de mercadorias e pessoas, impulsionando a economia"}, {"id": "c2_trans2_opt3", "text": "Para criar mais empregos para motoristas"}, {"id": "c2_trans2_opt4", "text": "Para que os veículos sejam mais rápidos"}], "correctOptionId": "c2_trans2_opt2", "skillArea": "Eng. Transportes - Infraestrutura", "difficulty": "Fácil"},
-    {"id": "c2_trans3", "text": "O que é um 'plano de mobilidade urbana'?", "options": [{"id": "c2_trans3_opt1", "text": "Um mapa de ruas"}, {"id": "c2_trans3_opt2", "text": "Um documento que organiza como as pessoas e mercadorias se movem na cidade, buscando eficiência e sustentabilidade"}, {"id": "c2_trans3_opt3", "text": "Uma lista de empresas de ônibus"}, {"id": "c2_trans3_opt4", "text": "Um guia turístico"}], "correctOptionId": "c2_trans3_opt2", "skillArea": "Eng. Transportes - Planejamento Urbano", "difficulty": "Fácil"}
-]
-
-# Converte os dados das questões em objetos QuizQuestion
-challenge_1_questions = [QuizQuestion(q["id"], q["text"], [QuizOption(opt["id"], opt["text"]) for opt in q["options"]], q["correctOptionId"], q["skillArea"], q["difficulty"]) for q in challenge_1_questions_data]
-challenge_2_questions = [QuizQuestion(q["id"], q["text"], [QuizOption(opt["id"], opt["text"]) for opt in q["options"]], q["correctOptionId"], q["skillArea"], q["difficulty"]) for q in challenge_2_questions_data]
-
-# Dicionário para armazenar todos os conjuntos de questões
-ALL_CHALLENGES = {
-    "desafio1": challenge_1_questions,
-    "desafio2": challenge_2_questions
+socketio_options = dict(cors_allowed_origins="*",
+                        json=wire_json,           # Aceita payloads pré-serializados (PreEncoded)
+                        serializer=wire_msgpack.WirePacket,      # JSON ou MessagePack, conforme o cliente
+                        logger=socketio_logs_enabled(),          # Log por pacote: só com QUIZ_SOCKETIO_LOGS=1
+                        engineio_logger=socketio_logs_enabled(),
+                        **queue_options)
+if ASYNC_MODE == 'asyncio':
+    socketio = asgi_server.AsyncSocketIO(app, **socketio_options)
+else:
+    socketio = SocketIO(app, async_mode=ASYNC_MODE, **socketio_options)
+# Locks que podem ser esperados por quem está no meio de um sleep (salas, checkpoints).
+# No modo asyncio, quem espera um deles cede o loop em vez de travar a thread do loop.
+ContendedLock = asgi_server.Lock if ASYNC_MODE == 'asyncio' else threading.Lock
+
+logger.info("SocketIO inicializado com async_mode: %s", socketio.async_mode)
+
+# Formato dos pacotes: o servidor aceita JSON e MessagePack ao mesmo tempo (ver wire_msgpack.py);
+# QUIZ_WIRE_FORMAT=msgpack faz as páginas carregarem o cliente Socket.IO com o parser MessagePack.
+# Clientes com páginas antigas em cache continuam em JSON.
+msgpack_clients = wire_msgpack.install(socketio.server)
+WIRE_FORMAT = os.environ.get('QUIZ_WIRE_FORMAT', 'json')
+if WIRE_FORMAT == 'msgpack' and not wire_msgpack.available:
+    logger.warning("QUIZ_WIRE_FORMAT=msgpack, mas o pacote msgpack não está instalado. Usando JSON.")
+    WIRE_FORMAT = 'json'
+SOCKETIO_CLIENT_URL = ("https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.7.5/socket.io.msgpack.min.js"
+                       if WIRE_FORMAT == 'msgpack' else
+                       "https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.7.5/socket.io.min.js")
+
+@app.context_processor
+def _socketio_client():
+    return {"socketio_client_url": SOCKETIO_CLIENT_URL}
+
+# --- Controle de admissão (ver admission.py) ---
+# Token buckets por SID e por sala: evento -> (fichas por segundo, capacidade). Um evento acima
+# do limite é descartado antes de chegar ao handler (ver _admit), e o cliente recebe um 'rate_limited'.
+# QUIZ_RATE_LIMITS=0 desliga os limites.
+RATE_LIMITS = os.environ.get('QUIZ_RATE_LIMITS', '1') != '0'
+SID_RATE_LIMITS = {
+    'create_room': (0.2, 3),            # Uma sala a cada 5 s, até 3 seguidas
+    'join_room_pin': (1.0, 5),
+    'rejoin_room_check': (1.0, 5),
+    'start_quiz_for_room': (1.0, 3),
+    'get_results': (5.0, 20),           # Páginas de resultados do host
+    'submit_answer': (3.0, 10),
+}
+# Por sala: cada entrada nova faz um broadcast da lista de jogadores para a sala inteira. As
+# capacidades comportam uma sala grande inteira entrando de uma vez. Quem volta com o
+# rejoin_room_check (uma queda do Wi-Fi da sala inteira, um reinício) só tem o limite do SID.
+ROOM_RATE_LIMITS = {
+    'join_room_pin': (50.0, 500),
+    'submit_answer': (200.0, 1000),
 }
+sid_limiter = admission.RateLimiter(SID_RATE_LIMITS if RATE_LIMITS else {})
+room_limiter = admission.RateLimiter(ROOM_RATE_LIMITS if RATE_LIMITS else {})
+# Salas abertas criadas por uma mesma conexão (0 = sem limite)
+MAX_ROOMS_PER_CONNECTION = int(os.environ.get('QUIZ_MAX_ROOMS_PER_CONNECTION', 3))
+# Fila de saída de cada cliente: com QUIZ_CLIENT_QUEUE_MAX pacotes esperando (cliente lento),
+# os 'rate_limited' são descartados e só o 'scores_update' mais recente fica guardado, para
+# entrar quando a fila tiver espaço; new_question, time_up, o fim do quiz e os resultados
+# entram sempre. 0 deixa a fila sem limite.
+CLIENT_QUEUE_MAX = int(os.environ.get('QUIZ_CLIENT_QUEUE_MAX', 64))
+DROPPABLE_EVENTS = ('rate_limited',)
+COALESCED_EVENTS = ('scores_update',)   # Só o último placar interessa
+admission.bound_queues(socketio.server, CLIENT_QUEUE_MAX, DROPPABLE_EVENTS, coalesce=COALESCED_EVENTS,
+                       on_drop=lambda event: metrics.OUTBOUND_DROPPED.labels(event).inc())
+
+room_store = create_room_store(ROOM_STORE_URL, sleep=socketio.sleep)
+if room_store.shared != bool(MESSAGE_QUEUE_URL):
+    logger.warning("QUIZ_ROOM_STORE e QUIZ_MESSAGE_QUEUE devem ser configurados juntos para rodar vários workers.")
+
+# PINs das salas (ver pin_allocator.py). Com vários workers, QUIZ_PIN_SHARD=k/K (k de 0 a K-1)
+# dá a cada um a sua fatia do espaço de PINs; um PIN liberado fica QUIZ_PIN_QUARANTINE s sem voltar.
+PIN_SHARD, PIN_SHARDS = parse_shard(os.environ.get('QUIZ_PIN_SHARD'))
+pin_allocator = PinAllocator(shard=PIN_SHARD, shards=PIN_SHARDS,
+                             quarantine=float(os.environ.get('QUIZ_PIN_QUARANTINE', 3600)))
+if room_store.shared and PIN_SHARDS == 1:
+    logger.info("QUIZ_PIN_SHARD não configurado: workers podem sortear o mesmo PIN (o store recusa e outro é alocado).")
+
+# Um único loop de prazos atende os timers de pergunta e os envios de placar de todas as salas
+deadline_scheduler = DeadlineScheduler(socketio.start_background_task,
+                                       asgi_server.Event() if ASYNC_MODE == 'asyncio' else threading.Event(),
+                                       on_lateness=metrics.TIMER_LATENESS.observe)
+# Janela em que respostas são agrupadas num único 'scores_update' por sala
+SCORES_UPDATE_WINDOW = 0.25
+# Janela em que as voltas de sessões retomadas geram um único 'player_joined_room' com a lista
+# de jogadores (numa queda do Wi-Fi da sala inteira, um broadcast em vez de um por aluno)
+PLAYERS_UPDATE_WINDOW = 0.5
+# Fim do quiz: a sala recebe só o top RESULTS_SUMMARY_SIZE; cada jogador recebe o próprio
+# resultado em particular, calculado em lotes de RESULTS_CHUNK fora do lock da sala.
+RESULTS_SUMMARY_SIZE = 10
+RESULTS_CHUNK = 100
+RESULTS_PAGE_SIZE = 50
+RESULTS_PAGE_MAX = 200
+TIME_PER_QUESTION = int(os.environ.get('QUIZ_TIME_PER_QUESTION', 20))
+MAX_ROOM_QUESTIONS = 200   # Limite de questionCount no create_room
+# Com estado compartilhado, o timer da pergunta pertence ao worker que o agendou. Se o
+# prazo vencer há mais de ORPHAN_TIMER_GRACE s (o dono caiu), outro worker o assume.
+ORPHAN_TIMER_GRACE = 2.0
+ORPHAN_TIMER_SWEEP = 1.0
+# Ciclo de vida das salas (ver room_lifecycle.py): prazos em segundos e limites de salas
+# e jogadores deste worker (0 = sem limite). A varredura roda a cada ROOM_SWEEP_INTERVAL s.
+room_lifecycle = RoomLifecycle(idle_ttl=float(os.environ.get('QUIZ_ROOM_IDLE_TTL', 1800)),
+                               finished_ttl=float(os.environ.get('QUIZ_ROOM_FINISHED_TTL', 900)),
+                               orphan_ttl=float(os.environ.get('QUIZ_ROOM_ORPHAN_TTL', 600)),
+                               max_rooms=int(os.environ.get('QUIZ_MAX_ROOMS', 2000)),
+                               max_players=int(os.environ.get('QUIZ_MAX_PLAYERS', 50000)))
+ROOM_SWEEP_INTERVAL = 30.0
+# No limite, um create_room/join_room_pin despeja salas no máximo uma vez a cada
+# CAPACITY_EVICTION_INTERVAL s, abrindo uma folga de CAPACITY_HEADROOM de cada limite para
+# os pedidos seguintes; acima do limite no meio do intervalo, o pedido é recusado na hora
+CAPACITY_EVICTION_INTERVAL = 1.0
+CAPACITY_HEADROOM = 0.05
+# Sessões retomáveis: cada jogador recebe um resumeToken (PIN da sala + id da sessão, assinado
+# com a SECRET_KEY) ao criar, entrar ou reconectar numa sala. Um rejoin_room_check com o token
+# devolve o registro do jogador (pontuação e respostas) ao SID novo em O(1); o registro de
+# quem desconectou fica guardado na sala por QUIZ_SESSION_RESUME_TTL s (padrão: 10 min).
+SESSION_RESUME_TTL = float(os.environ.get('QUIZ_SESSION_RESUME_TTL', 600))
+resume_tokens = URLSafeSerializer(app.config['SECRET_KEY'], salt='quiz-resume')
+# Checkpoints das salas (ver checkpoint.py): com o store em memória, o servidor grava as salas
+# alteradas a cada QUIZ_CHECKPOINT_INTERVAL s (padrão: 5) em QUIZ_CHECKPOINT (padrão:
+# checkpoints/salas.db; "off" desliga) e uma última vez ao encerrar. Ao subir, restaura as
+# salas e reagenda os prazos das perguntas em andamento (ver start_checkpoints).
+CHECKPOINT_PATH = os.environ.get('QUIZ_CHECKPOINT',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints', 'salas.db'))
+CHECKPOINT_INTERVAL = float(os.environ.get('QUIZ_CHECKPOINT_INTERVAL', 5))
+# Sala ocupada por mais que isso fica para o checkpoint seguinte (no final, com a foto anterior)
+CHECKPOINT_LOCK_TIMEOUT = 1.0
+CHECKPOINT_YIELD_EVERY = 50   # Salas fotografadas entre duas cedidas de vez às outras tarefas
+# Pergunta restaurada com o prazo vencido (ou quase) durante o reinício ganha esse tempo: o
+# cliente Socket.IO tenta reconectar com espera crescente, de até 5 s entre as tentativas
+RESTORED_DEADLINE_MIN = 5.0
+
+# --- Bancos de Questões ---
+# Um arquivo <desafio>.jsonl por desafio em QUIZ_QUESTION_BANKS (padrão: questions/),
+# lido no primeiro uso e recarregado quando muda (ver question_bank.py). Cada sala
+# fixa a versão do banco ao iniciar o quiz e a usa até o fim.
+QUESTION_BANKS_DIR = os.environ.get('QUIZ_QUESTION_BANKS',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questions'))
+DEFAULT_CHALLENGE = "desafio1"
+# A leitura e o parse de um banco rodam numa thread do sistema: no eventlet (tpool) e no
+# asyncio (executor do loop) quem pediu cede a vez até terminar, sem parar as outras salas
+if ASYNC_MODE == 'eventlet':
+    from eventlet import tpool
+    # Só os bancos usam o tpool, e o parse disputa o GIL de qualquer jeito: duas threads bastam
+    if 'EVENTLET_THREADPOOL_SIZE' not in os.environ: tpool.set_num_threads(2)
+    run_blocking = tpool.execute
+elif ASYNC_MODE == 'asyncio':
+    run_blocking = asgi_server.run_in_thread
+else:
+    run_blocking = None   # threading: cada handler e cada tarefa já roda na sua thread
+question_banks = QuestionBankStore(QUESTION_BANKS_DIR, start_task=socketio.start_background_task,
+                                   run_blocking=run_blocking)
+
+def _bank_name(challenge_type):
+    # Desafio desconhecido cai no padrão, como antes
+    return challenge_type if question_banks.exists(challenge_type) else DEFAULT_CHALLENGE
+
+def _room_bank(room):
+    """Banco da sala: a versão fixada no início do quiz ou, antes dele, a versão atual."""
+    challenge = _bank_name(room.challenge_type)
+    version = room.game_state.bank_version
+    try:
+        return question_banks.get(challenge, version)
+    except KeyError:
+        logger.error("Versão %s do banco '%s' indisponível; usando a atual.", version, challenge)
+        return question_banks.current(challenge)
+
+# --- Log de Eventos ---
+# Respostas, time_up, entradas e saídas vão para um log só de acréscimo em QUIZ_EVENTS_DIR
+# (padrão: eventos/; "off" desliga), gravado em lotes por uma thread própria (ver event_log.py).
+# QUIZ_EVENTS_FSYNC=0 dispensa o fsync de cada lote.
+EVENT_LOG_DIR = os.environ.get('QUIZ_EVENTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eventos'))
+if EVENT_LOG_DIR.lower() == 'off':
+    answer_log = NullEventLog()
+else:
+    answer_log = EventLog(EVENT_LOG_DIR, fsync=os.environ.get('QUIZ_EVENTS_FSYNC', '1') != '0').start()
+    atexit.register(answer_log.close)
+
+# Questões de 'new_question' já serializadas, guardadas na própria versão do banco
+# (chave: posição no banco). A versão é imutável, então cada questão é compilada uma vez
+# e reaproveitada em todos os envios (broadcast, jogadores atrasados e reconexões); o
+# número da pergunta e o total, que mudam com o sorteio de cada sala, são emendados no envio.
+def _question_payload(bank, position, number, total, time_limit):
+    question = bank.payload_cache.get(position)
+    if question is None:
+        question = bank.payload_cache[position] = PreEncoded(bank[position].to_client_dict())
+    return PreEncoded({"question": question.data, "questionNumber": number, "totalQuestions": total,
+                       "timeLimit": time_limit},
+                      f'{{"question":{question.encoded},"questionNumber":{number},"totalQuestions":{total},'
+                      f'"timeLimit":{wire_json.dumps(time_limit)}}}')
+
+def _question_position(room, idx):
+    """Posição no banco da pergunta `idx` da partida (ou None fora do intervalo)."""
+    gs = room.game_state
+    if not 0 <= idx < gs.total_questions_in_challenge: return None
+    return gs.question_order[idx] if gs.question_order is not None else idx
+
+def _question_payload_for_room(room):
+    gs = room.game_state
+    idx = gs.current_question_index
+    return _question_payload(_room_bank(room), _question_position(room, idx), idx + 1,
+                             gs.total_questions_in_challenge, gs.time_per_question)
+
+def _room_skills(room):
+    # Área de cada pergunta da partida, na ordem em que foram feitas
+    skills = _room_bank(room).skills
+    order = room.game_state.question_order
+    return skills if order is None else tuple(skills[pos] for pos in order)
 
 # TOTAL_QUESTIONS será dinâmico, dependendo do desafio escolhido para a sala
 # Não defini TOTAL_QUESTIONS aqui globalmente, ele será obtido da sala
 
+# rooms_lock protege apenas a estrutura global (registro e lookup de salas; os PINs vêm do pin_allocator).
+# O estado de cada sala é protegido pelo seu próprio lock em room_locks, então
+# respostas numa sala não esperam por joins/broadcasts de outras salas.
+# Ordem de aquisição: lock da sala -> rooms_lock (nunca o contrário).
+# Com um room_store compartilhado, rooms_data é a cópia local da última carga de
+# cada sala e só vale enquanto o lock da sala (e o lease no store) estão em mãos.
 rooms_data = {} 
-rooms_lock = threading.Lock()
-
-def generate_room_pin(length=5):
-    logger.debug("generate_room_pin: Iniciando geração de PIN.")
+room_locks = {}
+rooms_lock = threading.Lock()   # Trechos curtos e sem sleep: lock comum também no modo asyncio
+# Índice reverso SID -> (PIN da sala, registro do jogador), espelho exato de
+# room.players de todas as salas. Também protegido por rooms_lock.
+sid_index = {}
+# Com os checkpoints ligados (start_checkpoints), PINs das salas alteradas ou removidas
+# desde o último checkpoint. Também protegido por rooms_lock.
+room_checkpoint = None
+checkpoint_dirty = set()
+# SID -> PINs das salas que ele criou, para o limite MAX_ROOMS_PER_CONNECTION. PINs de salas
+# já removidas saem na próxima contagem. Também protegido por rooms_lock.
+rooms_by_creator = {}
+
+def _register_room(room_data):
+    """Aloca um PIN e registra a sala (com seu lock). PinsExhausted se não houver PIN livre."""
+    for sid, player_data in room_data.players.items():
+        room_data.leaderboard.add(sid, player_data.score)
+        room_data.batch_clients += player_data.batch_frames
+        if player_data.session: room_data.sessions[player_data.session] = sid
+    room_data.last_activity = time.time()
+    # PIN e inserção no store fora do rooms_lock: ninguém mais conhece o PIN até o retorno
     while True:
-        pin = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-        with rooms_lock: 
-            if pin not in rooms_data:
-                logger.debug(f"generate_room_pin: PIN gerado e único: {pin}")
-                return pin
+        room_pin = pin_allocator.allocate()
+        # Recusado se ainda estiver em uso: sala de outro worker sem fatia própria,
+        # ou de antes de este worker reiniciar
+        if room_store.insert(room_pin, room_data): break
+    with rooms_lock:
+        rooms_data[room_pin] = room_data
+        room_locks[room_pin] = ContendedLock()
+        for sid, player_data in room_data.players.items():
+            sid_index[sid] = (room_pin, player_data)
+        if room_checkpoint: checkpoint_dirty.add(room_pin)
+    return room_pin
+
+def _remove_room(room_pin):
+    # Esta função assume que o lock da sala já foi adquirido
+    room_store.delete(room_pin)
+    _forget_room(room_pin)
+    pin_allocator.release(room_pin)   # Volta a ser alocado só depois da quarentena
+
+def _forget_room(room_pin):
+    # Descarta o que este processo sabe da sala (removida aqui ou por outro worker)
+    with rooms_lock:
+        room = rooms_data.pop(room_pin, None)
+        room_locks.pop(room_pin, None)
+        deadline_scheduler.cancel(("question", room_pin))
+        deadline_scheduler.cancel(("scores", room_pin))
+        deadline_scheduler.cancel(("players", room_pin))
+        room_limiter.forget(room_pin)
+        if room:
+            for sid in room.players:
+                _unindex_sid_locked(sid, room_pin)
+            if room_checkpoint: checkpoint_dirty.add(room_pin)
+
+def _adopt_loaded_room(room_pin, room):
+    # Cópia recém-carregada do store compartilhado passa a ser a cópia local da sala.
+    # O índice só tem os SIDs conectados a este worker; eles passam a apontar para os novos registros.
+    with rooms_lock:
+        rooms_data[room_pin] = room
+        for sid, player_data in room.players.items():
+            entry = sid_index.get(sid)
+            if entry is not None and entry[0] == room_pin:
+                sid_index[sid] = (room_pin, player_data)
+
+def _index_player(sid, room_pin, player_data):
+    # Esta função assume que o lock da sala já foi adquirido
+    with rooms_lock:
+        sid_index[sid] = (room_pin, player_data)
+
+def _unindex_sid_locked(sid, room_pin):
+    # Esta função assume que rooms_lock já foi adquirido
+    entry = sid_index.get(sid)
+    if entry and entry[0] == room_pin:
+        del sid_index[sid]
+
+def _unindex_player(sid, room_pin):
+    # Esta função assume que o lock da sala já foi adquirido
+    with rooms_lock:
+        _unindex_sid_locked(sid, room_pin)
+
+def _add_player(room_pin, room, sid, player_data, resumed=False):
+    # Esta função assume que o lock da sala já foi adquirido.
+    # resumed=True: registro de uma sessão retomada, que mantém pontuação e respostas.
+    if sid in room.players:
+        # O mesmo SID entrou de novo (ou retomou uma sessão depois de entrar): o registro
+        # anterior sai antes, com os contadores, o placar e a sessão dele
+        _drop_player(room_pin, room, sid)
+    room.players[sid] = player_data
+    room.leaderboard.add(sid, player_data.score)
+    room.batch_clients += player_data.batch_frames
+    if player_data.session: room.sessions[player_data.session] = sid
+    gs = room.game_state
+    if resumed:
+        if gs.quiz_active and player_data.has_answered(gs.question_gen): gs.answered += 1
+    elif gs.quiz_active:
+        # Entrou com o quiz em andamento: responde a partir da pergunta atual
+        player_data.start_quiz(gs.total_questions_in_challenge)
+    _index_player(sid, room_pin, player_data)
+    answer_log.record("join", room=room_pin, player=player_data.nickname, session=player_data.session, sid=sid)
+
+def _drop_player(room_pin, room, sid):
+    # Esta função assume que o lock da sala já foi adquirido
+    player_data = room.players.pop(sid, None)
+    gs = room.game_state
+    if player_data:
+        room.batch_clients -= player_data.batch_frames
+        if gs.quiz_active and player_data.has_answered(gs.question_gen):
+            gs.answered -= 1
+        if room.sessions.get(player_data.session) == sid:
+            del room.sessions[player_data.session]
+    room.leaderboard.remove(sid)
+    _unindex_player(sid, room_pin)
+
+# --- Sessões retomáveis ---
+def _new_session(): return uuid.uuid4().hex[:16]
+
+def _resume_token(room_pin, player_data):
+    return resume_tokens.dumps([room_pin, player_data.session])
+
+def _session_from_token(token, room_pin):
+    """Id da sessão de um resumeToken desta sala, ou None (ausente, inválido ou de outra sala)."""
+    if not isinstance(token, str): return None
+    try:
+        pin, session_id = resume_tokens.loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    return session_id if pin == room_pin and isinstance(session_id, str) else None
+
+def _detach_session(room, player_data):
+    # Esta função assume que o lock da sala já foi adquirido.
+    # Guarda o registro de quem desconectou até o rejoin_room_check com o resumeToken. O dict
+    # está em ordem de desconexão: os vencidos saem do começo, sem percorrer a sala.
+    now = time.time()
+    detached = room.detached
+    while detached:
+        oldest = next(iter(detached))
+        if now - detached[oldest][0] < SESSION_RESUME_TTL: break
+        del detached[oldest]
+    detached.pop(player_data.session, None)
+    detached[player_data.session] = (now, player_data)
+
+def _reattach_session(room_pin, room, sid, session_id):
+    """Devolve ao SID novo o registro da sessão. Assume o lock da sala.
+
+    Retorna (registro, voltou): `voltou` é True se o jogador tinha saído da sala
+    (desconexão já processada, ou host que estava desconectado) e os demais
+    precisam saber. (None, False) se a sessão não está na sala nem guardada.
+    """
+    old_sid = room.sessions.get(session_id)
+    player_data = room.players.get(old_sid)
+    if player_data is None or player_data.session != session_id:
+        room.sessions.pop(session_id, None)   # SID que entrou de novo na sala com outro registro
+        entry = room.detached.pop(session_id, None)
+        if entry is None or time.time() - entry[0] >= SESSION_RESUME_TTL:
+            metrics.SESSION_RESUMES.labels('missing').inc()
+            return None, False
+        _add_player(room_pin, room, sid, entry[1], resumed=True)
+        metrics.SESSION_RESUMES.labels('restored').inc()
+        return entry[1], True
+    returned = old_sid == room.host_sid_disconnected_temp
+    if old_sid != sid:
+        # A desconexão do SID antigo ainda não foi processada: o registro passa para o SID
+        # novo e, quando ela chegar, o SID antigo não está mais no índice (nada a fazer)
+        if sid in room.players: _drop_player(room_pin, room, sid)   # O SID novo já tinha entrado com outro registro
+        del room.players[old_sid]
+        room.players[sid] = player_data
+        room.leaderboard.rename(old_sid, sid)
+        room.sessions[session_id] = sid
+        with rooms_lock:
+            _unindex_sid_locked(old_sid, room_pin)
+            sid_index[sid] = (room_pin, player_data)
+        if old_sid in (room.host_sid, room.host_sid_disconnected_temp):
+            room.host_sid, room.host_sid_disconnected_temp = sid, None
+    metrics.SESSION_RESUMES.labels('swapped').inc()
+    return player_data, returned
+
+def _set_batch_frames(room, player_data, batch_frames):
+    # Esta função assume que o lock da sala já foi adquirido
+    if player_data.batch_frames != batch_frames:
+        room.batch_clients += batch_frames - player_data.batch_frames
+        player_data.batch_frames = batch_frames
+
+def _room_snapshot(room_pin, room, sid, player_data, resume_token):
+    """'room_snapshot' de quem retomou a sessão: no lugar de room_joined + new_question.
+
+    Com o quiz em andamento, leva a pergunta atual (o payload de 'new_question', emendado já
+    serializado), o tempo que resta e se o jogador já a respondeu. O resumeToken volta
+    como veio: sem timestamp, a assinatura de uma mesma sessão é sempre a mesma.
+    """
+    gs = room.game_state
+    snapshot = {"roomPin": room_pin, "nickname": player_data.nickname, "sid": sid, "isHost": room.host_sid == sid,
+                "players": [p.nickname for p in room.players.values()], "quizActive": gs.quiz_active,
+                "challengeType": room.challenge_type, "score": player_data.score,
+                "answered": gs.quiz_active and player_data.has_answered(gs.question_gen),
+                "resumeToken": resume_token}
+    if not _get_current_question_for_room(room_pin):
+        return snapshot
+    question = _question_payload_for_room(room)
+    snapshot["remaining"] = round(max(0.0, gs.time_per_question - (time.time() - gs.question_start_time)), 1)
+    encoded = wire_json.dumps(snapshot, separators=(',', ':'))
+    return PreEncoded(dict(snapshot, currentQuestion=question.data),
+                      f'{encoded[:-1]},"currentQuestion":{question.encoded}}}')
+
+def _schedule_players_update(room_pin):
+    # A lista de jogadores sai depois de PLAYERS_UPDATE_WINDOW s, uma vez para todas as voltas da janela
+    deadline_scheduler.schedule_once(("players", room_pin), PLAYERS_UPDATE_WINDOW, _on_players_update_deadline, room_pin)
+
+def _on_players_update_deadline(room_pin):
+    with _locked_room(room_pin, touch=False) as room:
+        if room:
+            _broadcast(room_pin, room, 'player_joined_room',
+                       {"roomPin": room_pin, "players": [p.nickname for p in room.players.values()]})
+
+def _public_result(result):
+    # A sessão do jogador fica só no servidor: é ela que autoriza o reenvio do resultado
+    return {key: value for key, value in result.items() if key != "session"}
+
+def _resend_result(room_pin, room, sid, session_id):
+    # Esta função assume que o lock da sala já foi adquirido.
+    # Quiz já encerrado (ex.: a página de resultados reconectou): reenvia o resultado do jogador.
+    # Busca pela sessão verificada no token, nunca pelo nickname que o cliente informou.
+    if not session_id or room.game_state.quiz_active or not room.results: return
+    result = next((r for r in room.results if r.get("session") == session_id), None)
+    if result:
+        emit('quiz_result', dict(_public_result(result), totalPlayers=len(room.results), roomPin=room_pin), room=sid)
+
+def _lookup_sid_room(sid):
+    with rooms_lock:
+        entry = sid_index.get(sid)
+    return entry[0] if entry else None
+
+def check_sid_index_consistency():
+    """Compara sid_index com o room.players de todas as salas.
+
+    Retorna a lista de inconsistências encontradas (vazia se estiver tudo certo).
+    Adquire o lock de cada sala, então não deve ser chamada com um lock de sala em mãos.
+    """
+    problems = []
+    with rooms_lock:
+        pins = list(rooms_data.keys())
+        index_snapshot = dict(sid_index)
+    seen_sids = set()
+    for pin in pins:
+        with _locked_room(pin, touch=False) as room:
+            if not room: continue
+            with rooms_lock:
+                for sid, player_data in room.players.items():
+                    seen_sids.add(sid)
+                    entry = sid_index.get(sid)
+                    if entry is None:
+                        # Com vários workers, jogadores conectados a outro processo não estão neste índice
+                        if not room_store.shared:
+                            problems.append(f"SID {sid} está na sala {pin} mas não no índice")
+                    elif entry[0] != pin:
+                        problems.append(f"SID {sid} está na sala {pin} mas o índice aponta para {entry[0]}")
+                    elif entry[1] is not player_data:
+                        problems.append(f"SID {sid} na sala {pin}: registro do índice difere do registro da sala")
+    for sid, (pin, _) in index_snapshot.items():
+        if sid not in seen_sids and pin in pins:
+            problems.append(f"SID {sid} indexado para a sala {pin}, mas não está nos jogadores dela")
+        elif pin not in pins:
+            problems.append(f"SID {sid} indexado para a sala inexistente {pin}")
+    return problems
+
+def _open_rooms_created_by(sid):
+    with rooms_lock:
+        pins = [pin for pin in rooms_by_creator.get(sid, ()) if pin in rooms_data]
+        if pins: rooms_by_creator[sid] = pins
+        else: rooms_by_creator.pop(sid, None)
+    return len(pins)
+
+def _room_exists(room_pin):
+    with rooms_lock:
+        if room_pin in rooms_data: return True
+    return room_store.shared and room_store.exists(room_pin)
+
+def _room_lock(room_pin):
+    with rooms_lock:
+        lock = room_locks.get(room_pin)
+    if lock is None and room_store.shared and room_store.exists(room_pin):
+        # Sala criada por outro worker: este processo passa a ter um lock local para ela
+        with rooms_lock:
+            lock = room_locks.setdefault(room_pin, ContendedLock())
+    return lock
+
+def _question_deadline_at(room):
+    timer = room.game_state.timer
+    return timer["deadline_at"] if timer and room.game_state.quiz_active else None
+
+@contextmanager
+def _locked_room(room_pin, touch=True):
+    """Adquire o lock da sala e entrega o RoomState da sala (ou None se ela não existir).
+
+    Com o store compartilhado, a sala é carregada ao entrar (sob o lease entre
+    processos) e gravada de volta ao sair, se ainda existir. touch=False não conta
+    o acesso como atividade da sala (varreduras e verificações internas).
+    """
+    lock = _room_lock(room_pin)
+    if lock is None:
+        yield None
+        return
+    wait_start = time.perf_counter()
+    with lock, room_store.lease(room_pin):
+        acquired = time.perf_counter()
+        metrics.ROOM_LOCK_WAIT.observe(acquired - wait_start)
+        try:
+            with rooms_lock:
+                # A sala pode ter sido removida (e o PIN reaproveitado) enquanto esperávamos o lock
+                current = room_locks.get(room_pin) is lock
+            room = room_store.load(room_pin) if current else None
+            if room is None:
+                if current: _forget_room(room_pin)
+                yield None
+                return
+            if room_store.shared: _adopt_loaded_room(room_pin, room)
+            if touch: room.last_activity = time.time()
+            yield room
+            with rooms_lock:
+                still_registered = room_locks.get(room_pin) is lock
+                if still_registered and room_checkpoint: checkpoint_dirty.add(room_pin)
+            if still_registered: room_store.save(room_pin, room, _question_deadline_at(room))
+        finally:
+            metrics.ROOM_LOCK_HOLD.observe(time.perf_counter() - acquired)
+
+def _broadcast(room_pin, room, event, payload, include_self=True):
+    # Emite para a sala inteira, registrando quantos jogadores o broadcast alcança.
+    # Dentro de _transition, o evento espera o fim da transição para sair junto com os outros.
+    metrics.EMIT_FANOUT.labels(event).observe(len(room.players) - (0 if include_self else 1))
+    outbox = room_outbox.get(room_pin)
+    if outbox is not None and include_self:
+        outbox.append((event, payload))
+        return
+    socketio.emit(event, payload, room=room_pin, include_self=include_self)
+
+# --- Lotes de broadcast ---
+# Os broadcasts de uma mesma transição (time_up + new_question, placar final + new_question,
+# quiz_started + primeira pergunta, time_up + quiz_ended) saem num pacote só, 'room_batch',
+# para os clientes que anunciam batchFrames no create_room/join_room_pin/rejoin_room_check.
+# Esses clientes também entram na sala Socket.IO <PIN>:lote; os demais entram em <PIN>:avulso
+# e recebem os mesmos eventos separados, como antes. QUIZ_BATCH_FRAMES=0 desliga os lotes.
+BATCH_FRAMES = os.environ.get('QUIZ_BATCH_FRAMES', '1') != '0'
+# Custo aproximado de cada pacote além do payload: cabeçalho do frame WebSocket (2 bytes)
+# e cabeçalhos TCP/IP com timestamps (52 bytes), usado nas métricas de economia
+PACKET_OVERHEAD_BYTES = 54
+# PIN -> eventos da transição em andamento na sala; só quem tem o lock da sala mexe na sua entrada
+room_outbox = {}
+
+def _batch_room(room_pin): return f"{room_pin}:lote"
+def _single_room(room_pin): return f"{room_pin}:avulso"
+
+def _join_room_channels(room_pin, batch_frames):
+    join_room(room_pin)
+    join_room(_batch_room(room_pin) if batch_frames else _single_room(room_pin))
+
+@contextmanager
+def _transition(room_pin, room):
+    """Junta os broadcasts da sala feitos no bloco num único 'room_batch'. Assume o lock da sala."""
+    if not BATCH_FRAMES or room_pin in room_outbox:
+        yield   # Lotes desligados, ou transição aninhada: quem envia é a de fora
+        return
+    outbox = room_outbox[room_pin] = []
+    try:
+        yield
+    finally:
+        del room_outbox[room_pin]
+        _flush_outbox(room_pin, room, outbox)
+
+def _flush_outbox(room_pin, room, outbox):
+    if len(outbox) <= 1 or not room.batch_clients:
+        for event, payload in outbox:
+            socketio.emit(event, payload, room=room_pin)
+        return
+    args = wire_json.encode_batch(outbox, room_pin)
+    socketio.emit('room_batch', args, room=_batch_room(room_pin))  # Tupla: um argumento por evento
+    for event, payload in outbox:
+        socketio.emit(event, payload, room=_single_room(room_pin))
+    # Economia por cliente com lotes: n-1 pacotes e seus cabeçalhos, mais ou menos a
+    # diferença de tamanho entre o lote e a soma dos eventos separados
+    separate = sum(len(wire_json.dumps([event, payload], separators=(',', ':')).encode('utf-8'))
+                   for event, payload in outbox)
+    batch = len(wire_json.dumps(['room_batch', *args], separators=(',', ':')).encode('utf-8'))
+    saved_bytes = separate - batch + (len(outbox) - 1) * PACKET_OVERHEAD_BYTES
+    metrics.BATCH_FRAMES.inc()
+    metrics.BATCH_EVENTS.inc(len(outbox))
+    metrics.BATCH_PACKETS_SAVED.inc((len(outbox) - 1) * room.batch_clients)
+    metrics.BATCH_BYTES_SAVED.inc(max(0, saved_bytes) * room.batch_clients)
 
 @app.route('/')
 def index_page(): return render_template('index.html')
@@ -135,527 +686,1013 @@ def lobby_page(): return render_template('lobby.html')
 def quiz_page(): return render_template('quiz.html')
 @app.route('/results')
 def results_page(): return render_template('results.html')
+@app.route('/api/timers')
+def timers_stats(): return jsonify(deadline_scheduler.stats())
+@app.route('/metrics')
+def metrics_page(): return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+# --- Perfis sob demanda (ver profiling.py) ---
+# Controle só para administradores: as requisições precisam do cabeçalho
+# "Authorization: Bearer <QUIZ_ADMIN_TOKEN>"; sem a variável, as rotas /admin não existem.
+# Os arquivos vão para QUIZ_PROFILE_DIR (padrão: perfis/). Cada worker perfila só o próprio processo.
+ADMIN_TOKEN = os.environ.get('QUIZ_ADMIN_TOKEN', '')
+profiler = profiling.Profiler(os.environ.get('QUIZ_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perfis')),
+                              socketio.start_background_task, socketio.sleep, green=ASYNC_MODE != 'threading')
+
+def _require_admin():
+    if not ADMIN_TOKEN: abort(404)
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        abort(401)
+
+@app.route('/admin/profile', methods=['GET'])
+def profile_status():
+    _require_admin()
+    return jsonify(profiler.status())
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_start():
+    # {"mode": "sample" | "cprofile" | "spans", "seconds": 30, "interval": 0.005}
+    _require_admin()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict): data = {}
+    try:
+        session_info = profiler.start(data.get('mode', 'sample'), float(data.get('seconds', 30)),
+                                      float(data.get('interval', profiling.DEFAULT_INTERVAL)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    logger.info("Perfil '%s' ligado até %s: %s", session_info["mode"], time.strftime('%H:%M:%S', time.localtime(session_info["until"])), session_info["file"])
+    return jsonify(session_info), 202
+
+@app.route('/admin/profile/<mode>', methods=['DELETE'])
+def profile_stop(mode):
+    _require_admin()
+    path = profiler.stop(mode)
+    if path is None:
+        return jsonify({"error": f"Nenhum perfil '{mode}' em andamento."}), 404
+    logger.info("Perfil '%s' encerrado antes do prazo: %s", mode, path)
+    return jsonify({"mode": mode, "file": path})
+
+def _rooms_snapshot():
+    # Leitura sem os locks das salas: valores aproximados bastam para as métricas.
+    # Com store compartilhado, são as salas que este worker já carregou.
+    with rooms_lock:
+        return [(pin, len(room.players), room.game_state.quiz_active) for pin, room in rooms_data.items()]
+
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_rooms_active', 'Salas abertas.', lambda: [((), len(_rooms_snapshot()))]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_rooms_quiz_active', 'Salas com quiz em andamento.',
+    lambda: [((), sum(1 for _, _, active in _rooms_snapshot() if active))]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_players', 'Jogadores nas salas abertas.',
+    lambda: [((), sum(players for _, players, _ in _rooms_snapshot()))]))
+metrics.REGISTRY.register(metrics.CollectedHistogram(
+    'quiz_room_players', 'Distribuição de jogadores por sala aberta.',
+    lambda: [players for _, players, _ in _rooms_snapshot()], buckets=metrics.FANOUT_BUCKETS))
+def _held_rooms():
+    # Mesma leitura aproximada de _rooms_snapshot, com a contagem de respostas e resultados guardados
+    with rooms_lock:
+        return [_room_info(pin, room) for pin, room in rooms_data.items()]
+
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_rooms_held_answers', 'Respostas guardadas nas salas abertas.',
+    lambda: [((), sum(info.answers for info in _held_rooms()))]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_rooms_memory_bytes', 'Memória estimada das salas abertas (ver room_lifecycle.estimate_bytes).',
+    lambda: [((), sum(estimate_bytes(info) for info in _held_rooms()))]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_timers_pending', 'Prazos pendentes no DeadlineScheduler.',
+    lambda: [((), deadline_scheduler.pending_count())]))
+for _name, _attr, _help in (('quiz_event_log_recorded', 'recorded', 'Eventos enfileirados no log de eventos.'),
+                            ('quiz_event_log_written', 'written', 'Eventos gravados no log de eventos.'),
+                            ('quiz_event_log_dropped', 'dropped', 'Eventos descartados com a fila do log cheia.'),
+                            ('quiz_event_log_batches', 'batches', 'Lotes gravados (um write e um fsync cada).'),
+                            ('quiz_event_log_errors', 'errors', 'Lotes perdidos por erro de escrita.')):
+    metrics.REGISTRY.register(metrics.Collected(
+        _name, _help, lambda _attr=_attr: [((), getattr(answer_log, _attr))], kind='counter'))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_event_log_pending', 'Eventos aguardando gravação no log de eventos.',
+    lambda: [((), answer_log.pending())]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_room_pins', 'PINs da fatia deste worker: novos, em quarentena e livres (já liberados).',
+    lambda: list(zip((('fresh',), ('quarantine',), ('free',)), pin_allocator.counts())), labelnames=['state']))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_msgpack_clients', 'Conexões deste worker que falam MessagePack (as demais usam JSON).',
+    lambda: [((), len(msgpack_clients))]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_outbound_queue_max', 'Maior fila de saída entre os clientes conectados (pacotes esperando envio).',
+    lambda: [((), max(admission.queue_depths(socketio.server), default=0))]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_outbound_queues_full', 'Clientes com a fila de saída no limite (QUIZ_CLIENT_QUEUE_MAX).',
+    lambda: [((), sum(depth >= CLIENT_QUEUE_MAX for depth in admission.queue_depths(socketio.server))
+                  if CLIENT_QUEUE_MAX else 0)]))
+metrics.REGISTRY.register(metrics.Collected(
+    'quiz_rate_limit_keys', 'SIDs e salas com token buckets guardados.',
+    lambda: [(('sid',), len(sid_limiter)), (('room',), len(room_limiter))], labelnames=['scope']))
+for _name, _attr, _help in (('quiz_checkpoints', 'checkpoints', 'Checkpoints gravados (uma transação cada).'),
+                            ('quiz_checkpoint_rooms_written', 'rooms_written', 'Fotos de salas gravadas nos checkpoints.'),
+                            ('quiz_checkpoint_bytes', 'bytes_written', 'Bytes de fotos de salas gravados (comprimidos).'),
+                            ('quiz_checkpoint_errors', 'errors', 'Checkpoints que falharam ao gravar (as fotos ficam para o seguinte).')):
+    metrics.REGISTRY.register(metrics.Collected(
+        _name, _help, lambda _attr=_attr: [((), getattr(room_checkpoint, _attr, 0))], kind='counter'))
 
 # --- Funções Auxiliares do Quiz ---
 def _start_quiz_logic(room_pin): 
-    # Esta função assume que rooms_lock já foi adquirido
+    # Esta função assume que o lock da sala já foi adquirido
     room = rooms_data.get(room_pin)
     if not room:
-        logger.error(f"_start_quiz_logic chamada para sala inexistente: {room_pin}")
+        logger.error("_start_quiz_logic chamada para sala inexistente: %s", room_pin)
         return
 
-    # Obter o conjunto de questões para o desafio da sala
-    current_challenge_questions = ALL_CHALLENGES.get(room["challenge_type"], challenge_1_questions)
-    total_questions_for_room = len(current_challenge_questions)
-
-    logger.info(f"Sala {room_pin}: Dentro de _start_quiz_logic: Iniciando lógica do quiz para desafio '{room['challenge_type']}'.")
-    room["game_state"]["current_question_index"] = -1
-    room["game_state"]["quiz_active"] = True
-    room["game_state"]["question_start_time"] = None
-    room["game_state"]["total_questions_in_challenge"] = total_questions_for_room # Armazena o total de questões para a sala
+    # Fixa a versão atual do banco do desafio: edições no arquivo durante o quiz não afetam esta sala
+    bank = question_banks.current(_bank_name(room.challenge_type))
+    room_store.renew(room_pin)   # A primeira carga de um banco grande pode levar segundos
+    gs = room.game_state
+    gs.question_order = gs.seed = None
+    question_filter = room.question_filter
+    if question_filter:
+        # Sorteio da partida: a semente fica no estado da sala e no log de eventos para auditoria
+        gs.seed = question_filter.seed if question_filter.seed is not None else random.getrandbits(32)
+        gs.question_order = bank.draw(question_filter.count, question_filter.skill_areas,
+                                      question_filter.difficulties, gs.seed)
+        if not gs.question_order:
+            logger.warning("Sala %s: nenhuma questão do banco %s atende ao filtro %s; usando o banco inteiro.",
+                           room_pin, bank.version, question_filter)
+            gs.question_order = gs.seed = None
+    total_questions_for_room = len(gs.question_order) if gs.question_order is not None else len(bank)
+
+    logger.info("Sala %s: Dentro de _start_quiz_logic: Iniciando lógica do quiz para desafio '%s' (banco %s, %d questões, semente %s).",
+                room_pin, room.challenge_type, bank.version, total_questions_for_room, gs.seed)
+    gs.bank_version = bank.version
+    answer_log.record("quiz_start", room=room_pin, challenge=bank.challenge, bank_version=bank.version,
+                      players=len(room.players), seed=gs.seed,
+                      questions=list(gs.question_order) if gs.question_order is not None else None)
+    gs.results_id = None  # Resultados do quiz anterior, se ainda em cálculo, são descartados
+    room.results = None
+    gs.current_question_index = -1
+    gs.quiz_active = True
+    gs.question_start_time = None
+    gs.total_questions_in_challenge = total_questions_for_room # Armazena o total de questões para a sala
+    gs.answered = 0
     
-    if room["game_state"].get("question_timer_thread") and room["game_state"]["question_timer_thread"].is_alive():
-        logger.debug(f"Sala {room_pin}: _start_quiz_logic: Timer anterior ainda ativo (será ignorado).")
-    room["game_state"]["question_timer_thread"] = None
-    for p_data in room["players"].values(): 
-        p_data["score"] = 0
-        p_data["answers"] = {}
-        if "answered_current_question" in p_data:
-            del p_data["answered_current_question"]
+    if deadline_scheduler.cancel(("question", room_pin)):
+        logger.debug("Sala %s: _start_quiz_logic: Prazo anterior ainda pendente foi cancelado.", room_pin)
+    for p_data in room.players.values(): 
+        p_data.start_quiz(total_questions_for_room)
+    room.detached.clear()   # Registros guardados são da partida anterior: quem voltar entra como novo
+    room.leaderboard.reset()
+    room.last_scores_sent = None
+    deadline_scheduler.cancel(("scores", room_pin))
     
-    logger.info(f"Sala {room_pin}: _start_quiz_logic: Emitindo 'quiz_started'.")
-    socketio.emit('quiz_started', {"message": "O quiz vai começar!", "roomPin": room_pin}, room=room_pin)
-    _advance_question_for_room(room_pin) # Esta também assume lock
+    logger.info("Sala %s: _start_quiz_logic: Emitindo 'quiz_started'.", room_pin)
+    with _transition(room_pin, room):
+        _broadcast(room_pin, room, 'quiz_started', {"message": "O quiz vai começar!", "roomPin": room_pin})
+        _advance_question_for_room(room_pin) # Esta também assume lock
 
 
 def _reset_room_quiz_state(room_pin):
-    # Esta função assume que rooms_lock já foi adquirido
+    # Esta função assume que o lock da sala já foi adquirido
     room = rooms_data.get(room_pin)
     if not room: 
-        logger.error(f"_reset_room_quiz_state chamada para sala inexistente: {room_pin}")
+        logger.error("_reset_room_quiz_state chamada para sala inexistente: %s", room_pin)
         return
 
-    room["game_state"] = {
-        "current_question_index": -1, "quiz_active": False, "question_start_time": None,
-        "time_per_question": 20, "question_timer_thread": None,
-        "total_questions_in_challenge": 0 # Será atualizado em _start_quiz_logic
-    }
-    for player_sid_key in list(room["players"].keys()): 
-        player_data = room["players"].get(player_sid_key)
-        if player_data:
-            player_data["score"] = 0
-            player_data["answers"] = {}
-            if "answered_current_question" in player_data:
-                del player_data["answered_current_question"]
-    logger.info(f"Estado do quiz resetado para a sala {room_pin}.")
+    room.game_state = GameState(TIME_PER_QUESTION) # total_questions_in_challenge é atualizado em _start_quiz_logic
+    for player_data in room.players.values(): 
+        player_data.start_quiz(0)
+    room.leaderboard.reset()
+    room.last_scores_sent = None
+    room.results = None
+    logger.info("Estado do quiz resetado para a sala %s.", room_pin)
 
 
 def _get_current_question_for_room(room_pin):
-    # Esta função assume que rooms_lock já foi adquirido
+    # Esta função assume que o lock da sala já foi adquirido
     room = rooms_data.get(room_pin)
-    if not room or not room["game_state"]["quiz_active"]: return None
+    if not room or not room.game_state.quiz_active: return None
     
-    idx = room["game_state"]["current_question_index"]
-    challenge_type = room.get("challenge_type", "desafio1") # Pega o tipo de desafio da sala
-    current_challenge_questions = ALL_CHALLENGES.get(challenge_type, challenge_1_questions) # Pega as questões corretas
-    
-    if 0 <= idx < len(current_challenge_questions):
-        return current_challenge_questions[idx]
-    return None
+    position = _question_position(room, room.game_state.current_question_index)
+    if position is None: return None
+    return _room_bank(room)[position] # Versão do banco fixada na sala
 
+@metrics.timed('advance_question')
 def _advance_question_for_room(room_pin):
-    # Esta função assume que rooms_lock já foi adquirido
+    # Esta função assume que o lock da sala já foi adquirido
     room = rooms_data.get(room_pin)
-    if not room or not room["game_state"]["quiz_active"]:
-        logger.debug(f"Advance Q para sala {room_pin}: Quiz não ativo.")
+    if not room or not room.game_state.quiz_active:
+        logger.debug("Advance Q para sala %s: Quiz não ativo.", room_pin)
         return
 
-    room["game_state"]["current_question_index"] += 1
-    idx = room["game_state"]["current_question_index"]
+    # Nova geração: ninguém respondeu a próxima pergunta, sem percorrer os jogadores
+    room.game_state.next_question()
+    idx = room.game_state.current_question_index
     
-    total_questions_for_room = room["game_state"]["total_questions_in_challenge"] # Usa o total armazenado na sala
-    current_challenge_questions = ALL_CHALLENGES.get(room["challenge_type"], challenge_1_questions) # Pega as questões corretas
+    total_questions_for_room = room.game_state.total_questions_in_challenge # Usa o total armazenado na sala
 
     if idx < total_questions_for_room:
-        current_q = current_challenge_questions[idx]
-        logger.info(f"Sala {room_pin}: Avançando para P{idx + 1} - {current_q.text[:30]}...")
-        room["game_state"]["question_start_time"] = time.time()
-        for player_sid_key in list(room["players"].keys()): 
-            player_data = room["players"].get(player_sid_key)
-            if player_data and "answered_current_question" in player_data:
-                del player_data["answered_current_question"]
+        current_q = _room_bank(room)[_question_position(room, idx)]
+        logger.info("Sala %s: Avançando para P%s - %s...", room_pin, idx + 1, current_q.text[:30])
+        room.game_state.question_start_time = time.time()
         
-        payload = {"question": current_q.to_dict(), "questionNumber": idx + 1,
-                   "totalQuestions": total_questions_for_room, "timeLimit": room["game_state"]["time_per_question"]}
-        socketio.emit('new_question', payload, room=room_pin)
+        _broadcast(room_pin, room, 'new_question', _question_payload_for_room(room))
         _start_question_timer_for_room(room_pin) # Esta também assume lock
     else:
-        logger.info(f"Sala {room_pin}: Fim das perguntas. Finalizando quiz.")
+        logger.info("Sala %s: Fim das perguntas. Finalizando quiz.", room_pin)
         _end_quiz_for_room(room_pin) # Esta também assume lock
 
 
-def _question_timer_logic_for_room(room_pin_arg): 
-    logger.debug(f"[Timer Sala {room_pin_arg}] Thread iniciada.")
-    initial_question_index = -1 
-    time_to_wait = 20 
-
-    with rooms_lock: 
-        room = rooms_data.get(room_pin_arg) 
-        if not room: 
-            logger.warning(f"[Timer Sala {room_pin_arg}] Sala não existe mais no início da thread. Timer encerrando.")
-            return
-        initial_question_index = room["game_state"]["current_question_index"]
-        time_to_wait = room["game_state"]["time_per_question"]
-    
-    logger.info(f"[Timer Sala {room_pin_arg} - Q{initial_question_index + 1}] Esperando {time_to_wait}s.")
-    socketio.sleep(time_to_wait + 0.5) 
-
-    with rooms_lock: 
-        room = rooms_data.get(room_pin_arg) 
+def _on_question_deadline(room_pin, question_index, token):
+    # Chamada pelo deadline_scheduler quando o tempo da pergunta esgota
+    with _locked_room(room_pin) as room: 
         if not room:
-            logger.warning(f"[Timer Sala {room_pin_arg} - Q{initial_question_index + 1}] Sala desapareceu após sleep. Timer encerrando.")
+            logger.debug("[Timer Sala %s - Q%s] Sala não existe mais. Prazo ignorado.", room_pin, question_index + 1)
             return
-
-        gs = room["game_state"]
-        logger.debug(f"[Timer Sala {room_pin_arg} - Q{initial_question_index + 1}] Acordou. Estado: quiz_active={gs['quiz_active']}, current_q_idx={gs['current_question_index']}, q_idx_start={initial_question_index}")
-        if gs["quiz_active"] and gs["current_question_index"] == initial_question_index:
-            logger.info(f"[Timer Sala {room_pin_arg} - Q{initial_question_index + 1}] Tempo esgotado. Avançando.")
-            current_q_obj = _get_current_question_for_room(room_pin_arg) 
+        _question_deadline_reached(room_pin, room, question_index, token)
+
+def _question_deadline_reached(room_pin, room, question_index, token):
+    # Esta função assume que o lock da sala já foi adquirido
+    gs = room.game_state
+    timer = gs.timer
+    # O token identifica o prazo vigente: prazos de perguntas já encerradas (aqui ou em
+    # outro worker) e de partidas anteriores da mesma sala são ignorados
+    if gs.quiz_active and gs.current_question_index == question_index and timer and timer["token"] == token:
+        logger.info("[Timer Sala %s - Q%s] Tempo esgotado. Avançando.", room_pin, question_index + 1)
+        current_q_obj = _get_current_question_for_room(room_pin) 
+        with _transition(room_pin, room):
             if current_q_obj:
-                 socketio.emit('time_up', {'questionId': current_q_obj.id, 'roomPin': room_pin_arg}, room=room_pin_arg)
-            _advance_question_for_room(room_pin_arg)
-        else:
-            logger.info(f"[Timer Sala {room_pin_arg} - Q{initial_question_index + 1}] Condição não atendida para avançar. Timer encerrando sem ação.")
+                 answer_log.record("time_up", room=room_pin, question=current_q_obj.id)
+                 _broadcast(room_pin, room, 'time_up', {'questionId': current_q_obj.short_id, 'correctOptionId': current_q_obj.correct_short_id,
+                                                        'roomPin': room_pin})
+            _advance_question_for_room(room_pin)
+    else:
+        logger.info("[Timer Sala %s - Q%s] Condição não atendida para avançar. Prazo ignorado.", room_pin, question_index + 1)
 
 
 def _start_question_timer_for_room(room_pin):
-    # Esta função assume que rooms_lock já foi adquirido
+    # Esta função assume que o lock da sala já foi adquirido
     room = rooms_data.get(room_pin)
     if not room: return
 
-    if room["game_state"].get("question_timer_thread") and room["game_state"]["question_timer_thread"].is_alive():
-        logger.warning(f"Sala {room_pin}: Timer já existe para Q{room['game_state']['current_question_index']+1}.")
+    idx = room.game_state.current_question_index
+    delay = room.game_state.time_per_question + 0.5
+    token = uuid.uuid4().hex[:12]
+    # Este worker passa a ser o dono do timer da sala até a próxima pergunta
+    room.game_state.timer = {"owner": WORKER_ID, "token": token, "question_index": idx,
+                                   "deadline_at": time.time() + delay}
+    logger.info("Sala %s: Agendando prazo para Q%s.", room_pin, idx + 1)
+    # Reagendar a mesma chave substitui o prazo da pergunta anterior, se ainda pendente
+    deadline_scheduler.schedule(("question", room_pin), delay, _on_question_deadline, room_pin, idx, token)
+
+def _sweep_orphan_timers():
+    # Só com store compartilhado: assume prazos vencidos cujo worker dono não os tratou
+    try:
+        for room_pin in room_store.overdue(time.time() - ORPHAN_TIMER_GRACE):
+            with _locked_room(room_pin) as room:
+                timer = room and room.game_state.timer
+                if not timer or timer["deadline_at"] > time.time() - ORPHAN_TIMER_GRACE: continue
+                logger.warning("Sala %s: prazo da Q%s do worker %s vencido há %.1fs. Assumindo o timer.",
+                               room_pin, timer['question_index'] + 1, timer['owner'], time.time() - timer['deadline_at'])
+                _question_deadline_reached(room_pin, room, timer["question_index"], timer["token"])
+    finally:
+        deadline_scheduler.schedule(("orphan_timers", WORKER_ID), ORPHAN_TIMER_SWEEP, _sweep_orphan_timers)
+
+def _ensure_orphan_timer_sweep():
+    # Iniciada na primeira conexão, não na importação: só workers que atendem clientes
+    # fazem a varredura (scripts que só importam o app não sobem o loop de prazos)
+    if room_store.shared:
+        deadline_scheduler.schedule_once(("orphan_timers", WORKER_ID), ORPHAN_TIMER_SWEEP, _sweep_orphan_timers)
+
+def _room_info(room_pin, room):
+    # Foto da sala para o RoomLifecycle (leitura sem lock basta para planejar; o despejo confere de novo sob o lock)
+    gs = room.game_state
+    players = room.players
+    return RoomInfo(room_pin, room.last_activity, gs.quiz_active,
+                    not gs.quiz_active and bool(gs.results_id), room.host_sid is None,
+                    len(players), sum(p.answer_count() for p in list(players.values())), len(room.results or ()))
+
+def _evict_rooms(extra_rooms=0, extra_players=0, protect=()):
+    """Remove as salas expiradas e, acima dos limites, as menos usadas. Retorna quantas removeu.
+
+    Não deve ser chamada com um lock de sala em mãos.
+    """
+    with rooms_lock:
+        rooms = list(rooms_data.items())
+    # As fotos fora do rooms_lock: somar as respostas de todas as salas não segura os lookups
+    infos = [_room_info(pin, room) for pin, room in rooms]
+    evicted = 0
+    for planned, reason in room_lifecycle.plan(infos, time.time(), extra_rooms, extra_players, protect):
+        with _locked_room(planned.pin, touch=False) as room:
+            if not room: continue
+            info = _room_info(planned.pin, room)
+            # A sala pode ter voltado a ser usada depois da foto
+            if reason == CAP:
+                if info.quiz_active or info.last_activity != planned.last_activity: continue
+            elif room_lifecycle.expired(info, time.time()) != reason:
+                continue
+            _close_room(planned.pin, room, reason, info)
+            evicted += 1
+    return evicted
+
+def _close_room(room_pin, room, reason, info):
+    # Esta função assume que o lock da sala já foi adquirido
+    logger.info("Sala %s removida pelo ciclo de vida (%s): %d jogadores, sem atividade há %.0f s.",
+                room_pin, reason, info.players, time.time() - info.last_activity)
+    metrics.ROOMS_EVICTED.labels(reason).inc()
+    answer_log.record("room_closed", room=room_pin, reason=reason, players=info.players)
+    message = (f"A sala {room_pin} foi encerrada para liberar espaço no servidor." if reason == CAP
+               else f"A sala {room_pin} foi encerrada por inatividade.")
+    _broadcast(room_pin, room, 'room_closed', {"roomPin": room_pin, "reason": reason, "message": message})
+    for channel in (room_pin, _batch_room(room_pin), _single_room(room_pin)):
+        socketio.close_room(channel)
+    _remove_room(room_pin)
+
+def _sweep_rooms():
+    try:
+        _evict_rooms()
+    except Exception:
+        logger.exception("Falha na varredura do ciclo de vida das salas.")
+    finally:
+        deadline_scheduler.schedule(("room_sweep", WORKER_ID), ROOM_SWEEP_INTERVAL, _sweep_rooms)
+
+def _ensure_room_sweep():
+    # Como a varredura de timers órfãos, só começa na primeira conexão
+    deadline_scheduler.schedule_once(("room_sweep", WORKER_ID), ROOM_SWEEP_INTERVAL, _sweep_rooms)
+
+capacity_evicted_at = 0.0   # Último despejo feito por _has_capacity (time.monotonic)
+
+def _has_capacity(extra_rooms=0, extra_players=0, protect=()):
+    """Confere os limites antes de criar uma sala ou aceitar um jogador, despejando salas se preciso.
+
+    Salas e jogadores são contados em O(1) (rooms_data e sid_index). O despejo
+    percorre todas as salas, então roda no máximo uma vez por
+    CAPACITY_EVICTION_INTERVAL; no meio do intervalo, quem passa do limite é recusado.
+    """
+    global capacity_evicted_at
+    with rooms_lock:
+        rooms, players = len(rooms_data), len(sid_index)
+    if not room_lifecycle.over_limit(rooms + extra_rooms, players + extra_players):
+        return True
+    now = time.monotonic()
+    if now - capacity_evicted_at < CAPACITY_EVICTION_INTERVAL:
+        return False
+    capacity_evicted_at = now
+    spare_rooms, spare_players = room_lifecycle.headroom(CAPACITY_HEADROOM)
+    _evict_rooms(extra_rooms + spare_rooms, extra_players + spare_players, protect)
+    with rooms_lock:
+        rooms, players = len(rooms_data), len(sid_index)
+    return not room_lifecycle.over_limit(rooms + extra_rooms, players + extra_players)
+
+# --- Checkpoints das salas ---
+checkpoint_pass_lock = ContendedLock()   # Um checkpoint por vez: as fotos entram na fila em ordem
+
+def _checkpoint_rooms():
+    """Fotografa as salas alteradas desde o último checkpoint e as entrega ao escritor.
+
+    Cada foto é o pickle da sala, tirado com o lock dela; entre as salas o loop cede a
+    vez às outras tarefas. Retorna quantas salas entraram no checkpoint.
+    Não deve ser chamada com um lock de sala em mãos.
+    """
+    start = time.perf_counter()
+    with checkpoint_pass_lock:
+        with rooms_lock:
+            dirty = list(checkpoint_dirty)
+            checkpoint_dirty.clear()
+        changes = {}
+        for n, room_pin in enumerate(dirty, 1):
+            with rooms_lock:
+                lock = room_locks.get(room_pin)
+            if lock is None:
+                changes[room_pin] = None   # Sala removida
+                continue
+            if not lock.acquire(timeout=CHECKPOINT_LOCK_TIMEOUT):
+                with rooms_lock:
+                    checkpoint_dirty.add(room_pin)   # Fica para o próximo checkpoint
+                continue
+            try:
+                with rooms_lock:
+                    room = rooms_data.get(room_pin) if room_locks.get(room_pin) is lock else None
+                changes[room_pin] = pickle.dumps(room, pickle.HIGHEST_PROTOCOL) if room else None
+            finally:
+                lock.release()
+            if n % CHECKPOINT_YIELD_EVERY == 0: socketio.sleep(0)
+        if changes: room_checkpoint.submit(changes, time.time())
+    metrics.CHECKPOINT_DURATION.observe(time.perf_counter() - start)
+    return len(changes)
+
+def _checkpoint_loop():
+    while True:
+        socketio.sleep(CHECKPOINT_INTERVAL)
+        try:
+            _checkpoint_rooms()
+        except Exception:
+            logger.exception("Falha no checkpoint das salas.")
+
+def _final_checkpoint():
+    # atexit (SIGTERM, Ctrl+C ou fim normal): última foto das salas, gravada antes de o processo sair
+    try:
+        logger.info("Checkpoint final: %d salas alteradas desde o anterior.", _checkpoint_rooms())
+    finally:
+        room_checkpoint.close()
+
+def _reopen_room(room_pin, room):
+    # Esta função assume que o lock da sala já foi adquirido.
+    # Sala vinda de um checkpoint: as conexões de antes do reinício não existem mais. O host
+    # fica aguardando reconexão, como numa desconexão, e os demais viram sessões guardadas, que
+    # voltam com o resumeToken (_reattach_session). O prazo da pergunta em andamento continua
+    # no mesmo horário (o tempo fora do ar conta), com no mínimo RESTORED_DEADLINE_MIN s.
+    gs = room.game_state
+    if not gs.quiz_active and gs.results_id and room.results is None:
+        # Caiu no meio da entrega dos resultados: calcula de novo para o get_results e as reconexões
+        socketio.start_background_task(_deliver_results, room_pin, gs.results_id, *_ranking_snapshot(room))
+    for sid, player_data in list(room.players.items()):
+        if sid in (room.host_sid, room.host_sid_disconnected_temp):
+            room.host_sid, room.host_sid_disconnected_temp = None, sid
+            _index_player(sid, room_pin, player_data)
+        else:
+            _drop_player(room_pin, room, sid)
+            if player_data.session: _detach_session(room, player_data)
+    timer = gs.timer
+    if gs.quiz_active and timer:
+        now = time.time()
+        deadline_at = max(timer["deadline_at"], now + RESTORED_DEADLINE_MIN)
+        if gs.question_start_time:
+            # Mantém o tempo restante mostrado no room_snapshot coerente com o prazo adiado
+            gs.question_start_time += deadline_at - timer["deadline_at"]
+        timer.update(owner=WORKER_ID, deadline_at=deadline_at)
+        deadline_scheduler.schedule(("question", room_pin), deadline_at - now, _on_question_deadline,
+                                    room_pin, timer["question_index"], timer["token"])
+
+def _restore_rooms():
+    """Recria as salas do último checkpoint. Retorna quantas salas voltaram."""
+    start = time.perf_counter()
+    saved_at, entries = room_checkpoint.load()
+    restored = 0
+    for room_pin, data in entries:
+        try:
+            room = pickle.loads(data)
+        except Exception:
+            logger.exception("Checkpoint: sala %s ilegível; descartada.", room_pin)
+            room = None
+        if room is None or not room_store.insert(room_pin, room):
+            with rooms_lock:
+                checkpoint_dirty.add(room_pin)   # Sai do arquivo no próximo checkpoint
+            continue
+        with rooms_lock:
+            rooms_data[room_pin] = room
+            room_locks[room_pin] = ContendedLock()
+        with _locked_room(room_pin, touch=False) as room:
+            _reopen_room(room_pin, room)
+        restored += 1
+    if entries:
+        logger.info("Checkpoint de %s: %d salas restauradas em %.0f ms.",
+                    time.strftime('%H:%M:%S', time.localtime(saved_at)) if saved_at else '?',
+                    restored, (time.perf_counter() - start) * 1000)
+    return restored
+
+def start_checkpoints():
+    """Restaura as salas do último checkpoint e liga os checkpoints periódicos e o final.
+
+    Chamada pelo processo do servidor antes de aceitar conexões: scripts que só importam
+    o app (benchmarks, cliente de teste) não leem nem gravam checkpoints.
+    """
+    global room_checkpoint
+    if room_checkpoint or CHECKPOINT_PATH.lower() == 'off': return
+    if room_store.shared:
+        logger.info("Checkpoints desligados: com QUIZ_ROOM_STORE as salas já ficam no store compartilhado.")
         return
-    
-    logger.info(f"Sala {room_pin}: Iniciando timer para Q{room['game_state']['current_question_index'] + 1}.")
-    room["game_state"]["question_timer_thread"] = socketio.start_background_task(
-        target=_question_timer_logic_for_room, room_pin_arg=room_pin 
-    )
-
-    #parte inteligente do sistema, mas não é tão robusta
-def _calculate_recommendation_for_room(player_answers):
-    if not player_answers: return "Nenhuma resposta registrada."
-    correct_skill_counts = defaultdict(int)
-    for q_id, answer_data in player_answers.items():
-        if answer_data.get('is_correct'):
-            skill = answer_data.get('skill')
-            if skill: correct_skill_counts[skill] += 1
-    if not correct_skill_counts: return "Nenhum acerto para sugerir área."
-    best_skill_area = max(correct_skill_counts, key=correct_skill_counts.get)
-    
-    # Mapeamento de áreas de habilidade para sugestões de curso, essa é a parte inteligente do sistema, mas não é tão robusta
-    # quanto um modelo de IA real.
-    course_suggestions = {
-        "BICT - Lógica de Programação": "Engenharia de Computação, Ciência da Computação",
-        "BICT - Redes de Computadores": "Engenharia de Computação", 
-        "BICT - Matemática Discreta": "Engenharia de Computação",
-        "Eng. Computação - Arquitetura de Computadores": "Engenharia de Computação",
-        "Eng. Civil - Materiais de Construção": "Engenharia Civil",
-        "Eng. Mecânica - Termodinâmica": "Engenharia Mecânica, Eng. Aeroespacial",
-        "Eng. Aeroespacial - Aerodinâmica": "Engenharia Aeroespacial",
-        "Eng. Ambiental - Gestão de Resíduos": "Engenharia Ambiental",
-        "Eng. Transportes - Engenharia de Tráfego": "Engenharia de Transportes",
-        "Cálculo Básico - Geometria": "Todas as Engenharias",
-        "Física Aplicada - Termologia": "Eng. Mecânica, Eng. Materiais",
-        "BICT - Estatística Básica": "Todas as Engenharias", 
-        "Conhecimentos Gerais": "Qualquer área!",
-        # Novas áreas de habilidade para o Desafio 2
-        "Eng. Computação - Fundamentos de Programação": "Engenharia de Computação, Ciência da Computação",
-        "Eng. Computação - Hardware Básico": "Engenharia de Computação",
-        "Eng. Computação - Desenvolvimento Web": "Engenharia de Computação, Sistemas de Informação",
-        "Eng. Civil - Estruturas Básicas": "Engenharia Civil",
-        "Eng. Civil - Urbanismo e Infraestrutura": "Engenharia Civil",
-        "Eng. Mecânica - Fundamentos de Máquinas": "Engenharia Mecânica, Eng. de Produção",
-        "Eng. Mecânica - Elementos de Máquinas": "Engenharia Mecânica",
-        "Eng. Aeroespacial - Aerodinâmica Básica": "Engenharia Aeroespacial",
-        "Eng. Aeroespacial - Propulsão": "Engenharia Aeroespacial",
-        "Eng. Aeroespacial - Aplicações Espaciais": "Engenharia Aeroespacial",
-        "Eng. Ambiental - Clima e Poluição": "Engenharia Ambiental",
-        "Eng. Ambiental - Energias Renováveis": "Engenharia Ambiental, Eng. de Energia",
-        "Eng. Transportes - Mobilidade Urbana": "Engenharia de Transportes, Eng. Civil",
-        "Eng. Transportes - Infraestrutura": "Engenharia de Transportes, Eng. Civil",
-        "Eng. Transportes - Planejamento Urbano": "Engenharia de Transportes, Eng. Civil",
-        # Novas áreas de habilidade para o Desafio 1 (perguntas avançadas)
-        "Eng. Computação - Estruturas de Dados": "Engenharia de Computação, Ciência da Computação",
-        "Eng. Civil - Concreto Armado": "Engenharia Civil",
-        "Eng. Aeroespacial - Mecânica Orbital": "Engenharia Aeroespacial",
-        "Eng. Ambiental - Saneamento Básico": "Engenharia Ambiental",
-    }
-    
-    suggestion_text = f"Você se destacou em '{best_skill_area}'. "
-    suggestion_text += f"Cursos como {course_suggestions.get(best_skill_area, 'áreas relacionadas')} podem ser interessantes."
-    sorted_correct_skills = sorted(correct_skill_counts.items(), key=lambda item: item[1], reverse=True)
-    top_skills_info = "; ".join([f"{s[0]}: {s[1]} acerto(s)" for s in sorted_correct_skills[:3]])
-    return f"{suggestion_text} Suas áreas de destaque: {top_skills_info}."
-
-
+    room_checkpoint = RoomCheckpoint(CHECKPOINT_PATH)
+    try:
+        _restore_rooms()
+    except Exception:
+        logger.exception("Checkpoint %s ilegível: o servidor sobe sem as salas de antes.", CHECKPOINT_PATH)
+    room_checkpoint.start()
+    socketio.start_background_task(_checkpoint_loop)
+    atexit.register(_final_checkpoint)
+
+def _exit_on_sigterm(signum, frame):
+    # O processo sai pelo atexit (checkpoint final). Com eventlet, o SystemExit levantado aqui
+    # mataria só o greenlet que estivesse rodando: ele sobe pelo hub até o greenlet principal
+    if ASYNC_MODE == 'eventlet':
+        eventlet.hubs.get_hub().schedule_call_global(0, sys.exit, 0)
+    else:
+        sys.exit(0)
+
+def _scores_overview(room, n=10):
+    players = room.players
+    return [{"nickname": players[sid].nickname, "score": score} for sid, score in room.leaderboard.top(n)]
+
+def _schedule_scores_update(room_pin):
+    # Várias respostas dentro da janela geram no máximo um 'scores_update' por sala
+    deadline_scheduler.schedule_once(("scores", room_pin), SCORES_UPDATE_WINDOW, _on_scores_update_deadline, room_pin)
+
+def _on_scores_update_deadline(room_pin):
+    with _locked_room(room_pin) as room:
+        if room: _emit_scores_update_if_changed(room_pin, room)
+
+def _emit_scores_update_if_changed(room_pin, room):
+    # Esta função assume que o lock da sala já foi adquirido.
+    # Só faz broadcast quando o top 10 mudou desde o último envio.
+    deadline_scheduler.cancel(("scores", room_pin))
+    top = _scores_overview(room)
+    if top == room.last_scores_sent: return False
+    room.last_scores_sent = top
+    _broadcast(room_pin, room, 'scores_update', {"scores": top, "roomPin": room_pin})
+    return True
+
+@metrics.timed('end_quiz')
 def _end_quiz_for_room(room_pin):
-    # Esta função assume que rooms_lock já foi adquirido
+    # Esta função assume que o lock da sala já foi adquirido
     room = rooms_data.get(room_pin)
     if not room: return
 
     # Obter o total de questões para a sala específica
-    total_questions_for_room = room["game_state"]["total_questions_in_challenge"]
-
-    gs = room["game_state"]
-    if not gs["quiz_active"] and gs["current_question_index"] < (total_questions_for_room - 1) : 
-         logger.info(f"Sala {room_pin}: _end_quiz_for_room chamada, mas quiz já inativo ou não completou todas as perguntas. Estado: {gs}")
-
-    gs["quiz_active"] = False 
-    logger.info(f"Sala {room_pin}: Quiz finalizado. Calculando resultados...")
+    total_questions_for_room = room.game_state.total_questions_in_challenge
+
+    gs = room.game_state
+    if not gs.quiz_active and gs.current_question_index < (total_questions_for_room - 1) : 
+         logger.info("Sala %s: _end_quiz_for_room chamada, mas quiz já inativo ou não completou todas as perguntas. Estado: %s", room_pin, gs)
+
+    gs.quiz_active = False 
+    gs.timer = None
+    deadline_scheduler.cancel(("question", room_pin))
+    logger.info("Sala %s: Quiz finalizado. Calculando resultados...", room_pin)
+    # Sob o lock só é tirada uma foto do ranking (já ordenado pelo Leaderboard). As respostas
+    # não mudam mais depois do fim do quiz (um novo quiz cria arrays novos), então
+    # as recomendações podem ser calculadas depois, fora do lock.
+    ranking, answers, skills = _ranking_snapshot(room)
+    results_id = uuid.uuid4().hex[:8]
+    gs.results_id = results_id
+    room.results = None
+    summary = [{"rank": rank, "nickname": nickname, "score": score}
+               for rank, (_, nickname, _, score) in enumerate(ranking[:RESULTS_SUMMARY_SIZE], 1)]
+    answer_log.record("quiz_end", room=room_pin, players=len(ranking))
+    _broadcast(room_pin, room, 'quiz_ended', {"ranking": summary, "totalPlayers": len(ranking), "roomPin": room_pin})
+    socketio.start_background_task(_deliver_results, room_pin, results_id, ranking, answers, skills)
+
+def _ranking_snapshot(room):
+    # Esta função assume que o lock da sala já foi adquirido
+    players = room.players
+    ranking = [(sid, players[sid].nickname, players[sid].session, score) for sid, score in room.leaderboard.ranked()]
+    return ranking, [players[sid].choices for sid, _, _, _ in ranking], _room_skills(room)
+
+def _deliver_results(room_pin, results_id, ranking, answers, skills):
+    # Roda numa tarefa em segundo plano, sem o lock da sala: calcula as recomendações em
+    # lotes (cedendo a vez às outras salas entre eles) e envia a cada jogador o seu resultado.
+    total = len(ranking)
     results = []
-    for sid, player_data in room["players"].items():
-        recommendation = _calculate_recommendation_for_room(player_data.get("answers", {}))
-        results.append({"nickname": player_data["nickname"], "score": player_data["score"],
-                        "recommendation": recommendation, "sid": sid})
-    results.sort(key=lambda p: p["score"], reverse=True)
-    socketio.emit('quiz_ended', {"results": results, "roomPin": room_pin}, room=room_pin)
-    logger.info(f"Sala {room_pin}: Resultados enviados.")
+    for start in range(0, total, RESULTS_CHUNK):
+        recommendations = [recommend_skills(*answer_summary(choices, skills)) for choices in answers[start:start + RESULTS_CHUNK]]
+        for rank, (sid, nickname, session_id, score), recommendation in zip(range(start + 1, total + 1), ranking[start:start + RESULTS_CHUNK], recommendations):
+            result = {"rank": rank, "nickname": nickname, "score": score, "recommendation": recommendation}
+            results.append(dict(result, session=session_id))
+            socketio.emit('quiz_result', dict(result, totalPlayers=total, roomPin=room_pin), room=sid)
+        socketio.sleep(0)
+    # Guarda a lista completa para a consulta paginada do host (get_results), a menos
+    # que a sala já tenha começado outro quiz nesse meio tempo.
+    with _locked_room(room_pin) as room:
+        if room and room.game_state.results_id == results_id:
+            room.results = results
+    logger.info("Sala %s: Resultados enviados (%d jogadores).", room_pin, total)
+
+def _remove_player_from_room(room_pin, sid, keep_host_record=True):
+    # Esta função assume que o lock da sala já foi adquirido.
+    # keep_host_record=True (desconexão) mantém o registro do host na sala aguardando reconexão
+    # e guarda o dos demais para retomarem a sessão (_detach_session).
+    room_data = rooms_data.get(room_pin)
+    if not room_data or sid not in room_data.players: return False
+    player_data = room_data.players[sid]
+    player_nickname_left = player_data.nickname
+    is_host_leaving = (sid == room_data.host_sid)
+    
+    logger.debug("_remove_player_from_room: Jogador '%s' (SID: %s) encontrado na sala %s.", player_nickname_left, sid, room_pin)
+    answer_log.record("leave", room=room_pin, player=player_nickname_left, session=player_data.session, sid=sid,
+                      host=is_host_leaving)
+    
+    if is_host_leaving:
+        logger.info("Host (SID: %s) da sala %s desconectou. Marcando host_sid como None.", sid, room_pin)
+        room_data.host_sid = None 
+        if keep_host_record:
+            room_data.host_sid_disconnected_temp = sid 
+        else:
+            _drop_player(room_pin, room_data, sid)
+        _broadcast(room_pin, room_data, 'host_left', {"roomPin": room_pin, "message": "O líder da sala parece ter desconectado. Aguardando reconexão..."})
+    else:
+        _drop_player(room_pin, room_data, sid)
+        if keep_host_record and player_data.session: _detach_session(room_data, player_data)
+        logger.info("Jogador '%s' (SID: %s) removido da sala %s.", player_nickname_left, sid, room_pin)
+        remaining_players_nicknames = [p.nickname for p in room_data.players.values()]
+        _broadcast(room_pin, room_data, 'player_left', {
+            "nickname": player_nickname_left, "sid": sid,
+            "remainingPlayers": remaining_players_nicknames,
+            "roomPin": room_pin
+        })
+
+    if not room_data.players and room_data.host_sid is None :
+        logger.info("Sala %s está vazia e sem host. Removendo sala.", room_pin)
+        _remove_room(room_pin)
+    return True
+
+
+def _detach_sid_from_other_room(sid, room_pin):
+    # Um mesmo SID só participa de uma sala: ao entrar em outra, sai da anterior.
+    # Não deve ser chamada com um lock de sala em mãos.
+    previous_pin = _lookup_sid_room(sid)
+    if not previous_pin or previous_pin == room_pin: return
+    with _locked_room(previous_pin) as previous_room:
+        if previous_room:
+            logger.info("SID %s saindo da sala %s para entrar na sala %s.", sid, previous_pin, room_pin)
+            _remove_player_from_room(previous_pin, sid, keep_host_record=False)
 
 # --- Eventos SocketIO ---
+def _admit(sid, event, args):
+    """Limites de taxa do SID e da sala do roomPin para um evento recebido (ver admission.guard_events).
+
+    Roda antes do handler, sem contexto do Flask: um evento recusado não entra
+    nas métricas do handler, só em quiz_admission_rejected. Devolve None para
+    admitir, ou a resposta 'rate_limited' para o cliente.
+    """
+    wait, reason = sid_limiter.acquire(sid, event), 'sid'
+    if not wait and event in ROOM_RATE_LIMITS and args and isinstance(args[0], dict):
+        room_pin = args[0].get('roomPin')
+        # Só salas abertas neste worker têm bucket: PINs inventados não ocupam memória
+        if isinstance(room_pin, str) and room_pin.upper() in rooms_data:
+            wait, reason = room_limiter.acquire(room_pin.upper(), event), 'room'
+    if not wait:
+        return None
+    metrics.ADMISSION_REJECTED.labels(event, reason).inc()
+    return 'rate_limited', {"event": event, "retryAfter": round(wait, 1),
+                            "message": "Muitas tentativas seguidas. Aguarde alguns segundos."}
+
+if RATE_LIMITS:
+    admission.guard_events(socketio.server, _admit)
+
 @socketio.on('connect')
+@metrics.instrument_handler('connect')
 def handle_connect():
-    logger.info(f"Cliente CONECTADO: SID {request.sid}, Headers: {dict(request.headers)}")
+    logger.debug("Cliente CONECTADO: SID %s", request.sid)
+    _ensure_orphan_timer_sweep()
+    _ensure_room_sweep()
 
 @socketio.on('disconnect')
+@metrics.instrument_handler('disconnect')
 def handle_disconnect():
     sid = request.sid
-    logger.info(f"Cliente DESCONECTADO: SID {sid}")
+    logger.debug("Cliente DESCONECTADO: SID %s", sid)
+    sid_limiter.forget(sid)
     with rooms_lock:
-        room_pin_to_leave = None
-        player_nickname_left = None
-        is_host_leaving = False
-
-        for pin, room_data in list(rooms_data.items()): 
-            if sid in room_data.get("players", {}): 
-                room_pin_to_leave = pin
-                player_nickname_left = room_data["players"][sid]["nickname"]
-                is_host_leaving = (sid == room_data.get("host_sid"))
-                
-                logger.debug(f"handle_disconnect: Jogador '{player_nickname_left}' (SID: {sid}) encontrado na sala {pin}.")
-                
-                if is_host_leaving:
-                    logger.info(f"Host (SID: {sid}) da sala {room_pin_to_leave} desconectou. Marcando host_sid como None.")
-                    room_data["host_sid_disconnected_temp"] = sid 
-                    room_data["host_sid"] = None 
-                    socketio.emit('host_left', {"roomPin": room_pin_to_leave, "message": "O líder da sala parece ter desconectado. Aguardando reconexão..."}, room=room_pin_to_leave)
-                else:
-                    del room_data["players"][sid]
-                    logger.info(f"Jogador '{player_nickname_left}' (SID: {sid}) removido da sala {pin}.")
-                    remaining_players_nicknames = [p["nickname"] for p in room_data["players"].values()]
-                    socketio.emit('player_left', {
-                        "nickname": player_nickname_left, "sid": sid,
-                        "remainingPlayers": remaining_players_nicknames,
-                        "roomPin": room_pin_to_leave
-                    }, room=room_pin_to_leave)
-
-                if not room_data.get("players") and room_data.get("host_sid") is None :
-                    logger.info(f"Sala {room_pin_to_leave} está vazia e sem host. Removendo sala.")
-                    if room_pin_to_leave in rooms_data: del rooms_data[room_pin_to_leave]
-                
-                logger.info(f"handle_disconnect: Estado de rooms_data após processar SID {sid}: {list(rooms_data.keys())}")
-                break 
-        if not room_pin_to_leave:
-            logger.debug(f"handle_disconnect: SID {sid} não encontrado em nenhuma sala ativa.")
+        rooms_by_creator.pop(sid, None)
+    room_pin_to_leave = _lookup_sid_room(sid)
+    if not room_pin_to_leave:
+        logger.debug("handle_disconnect: SID %s não encontrado em nenhuma sala ativa.", sid)
+        return
 
+    with _locked_room(room_pin_to_leave) as room_data:
+        if not room_data or not _remove_player_from_room(room_pin_to_leave, sid):
+            logger.warning("handle_disconnect: Índice apontava SID %s para a sala %s, mas ele não está lá.", sid, room_pin_to_leave)
+            with rooms_lock:
+                _unindex_sid_locked(sid, room_pin_to_leave)
+            return
+        if event_log("disconnect"): logger.info("handle_disconnect: SID %s processado na sala %s.", sid, room_pin_to_leave)
+
+
+def _parse_question_filter(data):
+    """QuestionFilter a partir de questionCount, skillAreas, difficulties e seed do create_room.
+
+    None se nenhum deles vier (a sala joga o banco inteiro, em ordem). ValueError/TypeError se inválidos.
+    """
+    count, skill_areas, difficulties, seed = (data.get(k) for k in ('questionCount', 'skillAreas', 'difficulties', 'seed'))
+    if count is None and not skill_areas and not difficulties:
+        return None
+    if count is not None:
+        count = int(count)
+        if not 1 <= count <= MAX_ROOM_QUESTIONS: raise ValueError(count)
+    def names(values, limit):
+        if not values: return None
+        if not isinstance(values, list) or len(values) > limit or not all(isinstance(v, str) for v in values):
+            raise ValueError(values)
+        return tuple(sorted(set(values)))
+    return QuestionFilter(count, names(skill_areas, 100), names(difficulties, 20),
+                          None if seed is None else int(seed) & 0xFFFFFFFF)
 
 @socketio.on('create_room')
+@metrics.instrument_handler('create_room')
 def handle_create_room(data):
     sid = request.sid
     nickname = data.get('nickname', f'Host_{sid[:4]}').strip()[:25]
     challenge_type = data.get('challengeType', 'desafio1') # Novo: tipo de desafio
-    logger.info(f"handle_create_room: Recebido de SID {sid} para nickname {nickname}, desafio {challenge_type}")
+    logger.info("handle_create_room: Recebido de SID %s para nickname %s, desafio %s", sid, nickname, challenge_type)
+    try:
+        question_filter = _parse_question_filter(data)
+    except (TypeError, ValueError):
+        emit('room_error', {"message": "Configuração de perguntas inválida."}, room=sid); return
+    bank = question_banks.current(_bank_name(challenge_type)) # Carrega o banco no primeiro uso
+    total_questions = len(bank)
+    if question_filter:
+        total_questions = bank.pool_size(question_filter.skill_areas, question_filter.difficulties)
+        if not total_questions:
+            emit('room_error', {"message": "Nenhuma questão do desafio com as áreas e dificuldades escolhidas."}, room=sid); return
+        total_questions = min(total_questions, question_filter.count or total_questions)
+    if MAX_ROOMS_PER_CONNECTION and _open_rooms_created_by(sid) >= MAX_ROOMS_PER_CONNECTION:
+        metrics.ADMISSION_REJECTED.labels('create_room', 'rooms_per_connection').inc()
+        emit('room_error', {"message": "Limite de salas abertas por conexão atingido."}, room=sid); return
+    if not _has_capacity(extra_rooms=1, extra_players=1):
+        logger.warning("handle_create_room: Limite de salas/jogadores atingido; sala de '%s' recusada.", nickname)
+        emit('room_error', {"message": "Servidor cheio. Tente novamente em alguns minutos."}, room=sid); return
     
-    room_pin = generate_room_pin()
-    logger.info(f"handle_create_room: PIN gerado {room_pin}")
-
+    host_data = PlayerState(nickname, batch_frames=bool(data.get('batchFrames')), session=_new_session())
+    try:
+        room_pin = _register_room(RoomState(
+            sid, nickname, challenge_type, # Armazena o tipo de desafio
+            {sid: host_data},
+            Leaderboard(), # Ranking incremental (preenchido em _register_room)
+            GameState(TIME_PER_QUESTION, total_questions),
+            question_filter))
+    except PinsExhausted as e:
+        logger.error("handle_create_room: Sem PINs livres (%s); sala de '%s' recusada.", e, nickname)
+        emit('room_error', {"message": "Servidor cheio. Tente novamente em alguns minutos."}, room=sid); return
+    logger.info("handle_create_room: PIN gerado %s", room_pin)
     with rooms_lock:
-        logger.debug(f"handle_create_room: Lock adquirido para sala {room_pin}")
-        rooms_data[room_pin] = {
-            "host_sid": sid,
-            "host_nickname_on_creation": nickname, 
-            "players": {sid: {"nickname": nickname, "score": 0, "answers": {}}},
-            "game_state": {
-                "current_question_index": -1, "quiz_active": False, "question_start_time": None,
-                "time_per_question": 20, "question_timer_thread": None,
-                "total_questions_in_challenge": len(ALL_CHALLENGES.get(challenge_type, challenge_1_questions)) # Define o total de questões
-            },
-            "challenge_type": challenge_type # Armazena o tipo de desafio
-        }
-        join_room(room_pin) 
-        session['current_room_pin'] = room_pin 
-        session['is_host'] = True
-        logger.info(f"Sala {room_pin} criada com host '{nickname}' (SID: {sid}), desafio '{challenge_type}'. Chaves de rooms_data: {list(rooms_data.keys())}")
+        rooms_by_creator.setdefault(sid, []).append(room_pin)
+    answer_log.record("join", room=room_pin, player=nickname, session=host_data.session, sid=sid, host=True)
+
+    _join_room_channels(room_pin, bool(data.get('batchFrames')))
+    session['current_room_pin'] = room_pin 
+    session['is_host'] = True
+    logger.info("Sala %s criada com host '%s' (SID: %s), desafio '%s'.", room_pin, nickname, sid, challenge_type)
     
     emit('room_created', {"roomPin": room_pin, "nickname": nickname, "sid": sid, "isHost": True,
-                           "players": [nickname], "challengeType": challenge_type}, room=sid) # Envia o tipo de desafio de volta
-    logger.info(f"handle_create_room: Evento 'room_created' emitido para sala {room_pin}.")
+                           "players": [nickname], "challengeType": challenge_type, # Envia o tipo de desafio de volta
+                           "resumeToken": _resume_token(room_pin, host_data)}, room=sid)
+    logger.info("handle_create_room: Evento 'room_created' emitido para sala %s.", room_pin)
 
 
 @socketio.on('join_room_pin')
+@metrics.instrument_handler('join_room_pin')
 def handle_join_room_pin(data):
     sid = request.sid
     nickname = data.get('nickname', f'Jogador_{sid[:4]}').strip()[:25]
     room_pin = data.get('roomPin', '').upper()
-    logger.info(f"handle_join_room_pin: Recebido de SID {sid} para nickname {nickname}, sala {room_pin}")
-    logger.debug(f"handle_join_room_pin: Salas existentes: {list(rooms_data.keys())}")
-
-    with rooms_lock:
-        logger.debug(f"handle_join_room_pin: Lock adquirido para sala {room_pin}")
-        room = rooms_data.get(room_pin)
+    logger.debug("handle_join_room_pin: Recebido de SID %s para nickname %s, sala %s", sid, nickname, room_pin)
+
+    if _room_exists(room_pin):
+        _detach_sid_from_other_room(sid, room_pin)
+        if not _has_capacity(extra_players=1, protect=(room_pin,)):
+            logger.warning("handle_join_room_pin: Limite de jogadores atingido; '%s' recusado na sala %s.", nickname, room_pin)
+            emit('room_join_error', {"message": "Servidor cheio. Tente novamente em alguns minutos."}, room=sid); return
+    with _locked_room(room_pin) as room:
+        logger.debug("handle_join_room_pin: Lock adquirido para sala %s", room_pin)
         if not room:
-            logger.warning(f"Tentativa de join na sala {room_pin} por '{nickname}', mas sala não existe.")
+            logger.warning("Tentativa de join na sala %s por '%s', mas sala não existe.", room_pin, nickname)
             emit('room_join_error', {"message": f"Sala com PIN '{room_pin}' não encontrada."}, room=sid)
             return
         
-        room["players"][sid] = {"nickname": nickname, "score": 0, "answers": {}} 
+        batch_frames = bool(data.get('batchFrames'))
+        player_data = PlayerState(nickname, batch_frames=batch_frames, session=_new_session())
+        _add_player(room_pin, room, sid, player_data)
         
-        logger.info(f"Jogador '{nickname}' (SID {sid}) entrou/atualizou na sala {room_pin}.")
-        join_room(room_pin) 
+        if event_log("join"): logger.info("Jogador '%s' (SID %s) entrou/atualizou na sala %s.", nickname, sid, room_pin)
+        _join_room_channels(room_pin, batch_frames)
         session['current_room_pin'] = room_pin
-        session['is_host'] = (sid == room.get("host_sid")) 
+        session['is_host'] = (sid == room.host_sid) 
 
-        current_players_nicknames = [p_data["nickname"] for p_data in room["players"].values()]
+        current_players_nicknames = [p_data.nickname for p_data in room.players.values()]
         
         emit('room_joined', {
             "roomPin": room_pin, "nickname": nickname, "sid": sid, 
             "isHost": session['is_host'], "players": current_players_nicknames,
-            "quizActive": room["game_state"]["quiz_active"],
-            "challengeType": room.get("challenge_type", "desafio1") # Envia o tipo de desafio da sala
+            "quizActive": room.game_state.quiz_active,
+            "challengeType": room.challenge_type, # Envia o tipo de desafio da sala
+            "resumeToken": _resume_token(room_pin, player_data)
         }, room=sid)
         
-        socketio.emit('player_joined_room', {
+        _broadcast(room_pin, room, 'player_joined_room', {
             "nickname": nickname, "sid": sid, "roomPin": room_pin,
             "players": current_players_nicknames
-        }, room=room_pin, include_self=False) 
-
-        if room["game_state"]["quiz_active"]:
-            logger.info(f"handle_join_room_pin: Quiz já ativo na sala {room_pin}. Enviando pergunta atual para {nickname}.")
-            current_q = _get_current_question_for_room(room_pin) 
-            if current_q:
-                q_idx = room["game_state"]["current_question_index"]
-                total_questions_for_room = room["game_state"]["total_questions_in_challenge"]
-                payload = {"question": current_q.to_dict(), "questionNumber": q_idx + 1,
-                           "totalQuestions": total_questions_for_room, "timeLimit": room["game_state"]["time_per_question"]}
-                emit('new_question', payload, room=sid)
-        logger.debug(f"handle_join_room_pin: Lock liberado para sala {room_pin}")
-
-@socketio.on('rejoin_room_check') 
+        }, include_self=False)
+
+        if room.game_state.quiz_active:
+            logger.info("handle_join_room_pin: Quiz já ativo na sala %s. Enviando pergunta atual para %s.", room_pin, nickname)
+            if _get_current_question_for_room(room_pin):
+                emit('new_question', _question_payload_for_room(room), room=sid) # Cópia em cache, sem re-serializar
+        logger.debug("handle_join_room_pin: Lock liberado para sala %s", room_pin)
+
+@socketio.on('rejoin_room_check')
+@metrics.instrument_handler('rejoin_room_check')
 def handle_rejoin_room_check(data):
     sid = request.sid 
     room_pin = data.get('roomPin', '').upper()
     nickname_from_client = data.get('nickname') 
-    logger.info(f"handle_rejoin_room_check: SID {sid} tentando re-entrar na sala '{room_pin}' como '{nickname_from_client}'.")
-    logger.debug(f"handle_rejoin_room_check: Salas existentes ANTES do lock: {list(rooms_data.keys())}")
+    session_id = _session_from_token(data.get('resumeToken'), room_pin)
+    logger.info("handle_rejoin_room_check: SID %s tentando re-entrar na sala '%s' como '%s'.", sid, room_pin, nickname_from_client)
 
-    with rooms_lock:
-        logger.debug(f"handle_rejoin_room_check: Salas existentes DENTRO do lock: {list(rooms_data.keys())}")
-        room = rooms_data.get(room_pin)
+    if _room_exists(room_pin): _detach_sid_from_other_room(sid, room_pin)
+    with _locked_room(room_pin) as room:
         if not room:
-            logger.warning(f"handle_rejoin_room_check: Sala '{room_pin}' NÃO encontrada para SID {sid}. Informando cliente.")
+            logger.warning("handle_rejoin_room_check: Sala '%s' NÃO encontrada para SID %s. Informando cliente.", room_pin, sid)
             emit('room_not_found_on_rejoin', {"roomPin": room_pin, "message": f"A sala {room_pin} não existe mais."}, room=sid)
             return
 
+        batch_frames = bool(data.get('batchFrames'))
+        player_data, returned = _reattach_session(room_pin, room, sid, session_id) if session_id else (None, False)
+        if player_data:
+            # Sessão retomada: mesmo registro (pontuação e respostas), um único 'room_snapshot'
+            _set_batch_frames(room, player_data, batch_frames)
+            _join_room_channels(room_pin, batch_frames)
+            session['current_room_pin'] = room_pin
+            session['is_host'] = room.host_sid == sid
+            if event_log("join"): logger.info("handle_rejoin_room_check: Sessão de '%s' retomada na sala '%s' (SID %s).", player_data.nickname, room_pin, sid)
+            emit('room_snapshot', _room_snapshot(room_pin, room, sid, player_data, data['resumeToken']), room=sid)
+            if returned: _schedule_players_update(room_pin)
+            _resend_result(room_pin, room, sid, player_data.session)
+            return
+
         is_confirmed_host = False
-        player_data_to_use = {"nickname": nickname_from_client, "score": 0, "answers": {}} 
+        # Sem sessão para retomar (cliente antigo, token inválido ou registro vencido): registro novo
+        player_data_to_use = PlayerState(nickname_from_client, batch_frames=batch_frames,
+                                         session=session_id or _new_session())
 
-        if room.get("host_sid") is None and room.get("host_nickname_on_creation") == nickname_from_client:
-            logger.info(f"handle_rejoin_room_check: Host '{nickname_from_client}' (novo SID: {sid}) reconectando à sala órfã '{room_pin}'.")
-            room["host_sid"] = sid 
+        if room.host_sid is None and room.host_nickname_on_creation == nickname_from_client:
+            logger.info("handle_rejoin_room_check: Host '%s' (novo SID: %s) reconectando à sala órfã '%s'.", nickname_from_client, sid, room_pin)
+            room.host_sid = sid 
             is_confirmed_host = True
-            old_host_sid_temp = room.pop("host_sid_disconnected_temp", None)
-            if old_host_sid_temp and old_host_sid_temp in room["players"] and old_host_sid_temp != sid:
-                logger.info(f"handle_rejoin_room_check: Removendo entrada antiga do host (SID: {old_host_sid_temp}) da lista de players.")
-                del room["players"][old_host_sid_temp]
-        elif room.get("host_sid") == sid: 
+            old_host_sid_temp, room.host_sid_disconnected_temp = room.host_sid_disconnected_temp, None
+            if old_host_sid_temp and old_host_sid_temp in room.players and old_host_sid_temp != sid:
+                logger.info("handle_rejoin_room_check: Removendo entrada antiga do host (SID: %s) da lista de players.", old_host_sid_temp)
+                _drop_player(room_pin, room, old_host_sid_temp)
+        elif room.host_sid == sid: 
             is_confirmed_host = True
-            logger.info(f"handle_rejoin_room_check: SID {sid} já é o host da sala '{room_pin}'.")
+            logger.info("handle_rejoin_room_check: SID %s já é o host da sala '%s'.", sid, room_pin)
         
-        if sid not in room["players"]:
-            room["players"][sid] = player_data_to_use
-            logger.info(f"handle_rejoin_room_check: Jogador '{nickname_from_client}' (SID {sid}) adicionado à sala '{room_pin}'.")
+        if sid not in room.players:
+            _add_player(room_pin, room, sid, player_data_to_use)
+            logger.info("handle_rejoin_room_check: Jogador '%s' (SID %s) adicionado à sala '%s'.", nickname_from_client, sid, room_pin)
         else: 
-            room["players"][sid]["nickname"] = nickname_from_client 
-            logger.info(f"handle_rejoin_room_check: Jogador '{nickname_from_client}' (SID {sid}) já estava na sala, nickname atualizado.")
+            room.players[sid].nickname = nickname_from_client 
+            logger.info("handle_rejoin_room_check: Jogador '%s' (SID %s) já estava na sala, nickname atualizado.", nickname_from_client, sid)
         
-        if "host_sid_disconnected_temp" in room and room.get("host_sid") == sid : # Limpa se o host atual é o que reconectou
-            del room["host_sid_disconnected_temp"]
+        if room.host_sid_disconnected_temp is not None and room.host_sid == sid : # Limpa se o host atual é o que reconectou
+            room.host_sid_disconnected_temp = None
         
-        join_room(room_pin) 
+        _join_room_channels(room_pin, room.players[sid].batch_frames)
         session['current_room_pin'] = room_pin
         session['is_host'] = is_confirmed_host
         
-        current_players_nicknames = [p_data["nickname"] for p_data in room["players"].values()]
-        logger.info(f"handle_rejoin_room_check: SID {sid} ('{nickname_from_client}') re-processado para sala '{room_pin}'. É host: {session['is_host']}")
+        current_players_nicknames = [p_data.nickname for p_data in room.players.values()]
+        logger.info("handle_rejoin_room_check: SID %s ('%s') re-processado para sala '%s'. É host: %s", sid, nickname_from_client, room_pin, session['is_host'])
 
         emit('room_joined', { 
             "roomPin": room_pin, "nickname": nickname_from_client, "sid": sid, 
             "isHost": session['is_host'], "players": current_players_nicknames,
-            "quizActive": room["game_state"]["quiz_active"],
-            "challengeType": room.get("challenge_type", "desafio1") # Envia o tipo de desafio da sala
+            "quizActive": room.game_state.quiz_active,
+            "challengeType": room.challenge_type, # Envia o tipo de desafio da sala
+            "resumeToken": _resume_token(room_pin, room.players[sid])
         }, room=sid)
         
-        socketio.emit('player_joined_room', { 
+        _broadcast(room_pin, room, 'player_joined_room', {
             "nickname": nickname_from_client, "sid": sid, "roomPin": room_pin,
             "players": current_players_nicknames
-        }, room=room_pin, include_self=False)
+        }, include_self=False)
 
-        if room["game_state"]["quiz_active"]:
-            logger.info(f"handle_rejoin_room_check: Quiz ativo na sala {room_pin}. Enviando pergunta atual para {nickname_from_client}.")
-            current_q = _get_current_question_for_room(room_pin) 
-            if current_q:
-                q_idx = room["game_state"]["current_question_index"]
-                total_questions_for_room = room["game_state"]["total_questions_in_challenge"]
-                payload = {"question": current_q.to_dict(), "questionNumber": q_idx + 1,
-                           "totalQuestions": total_questions_for_room, "timeLimit": room["game_state"]["time_per_question"]}
-                emit('new_question', payload, room=sid)
+        if room.game_state.quiz_active:
+            logger.info("handle_rejoin_room_check: Quiz ativo na sala %s. Enviando pergunta atual para %s.", room_pin, nickname_from_client)
+            if _get_current_question_for_room(room_pin):
+                emit('new_question', _question_payload_for_room(room), room=sid) # Cópia em cache, sem re-serializar
 
 
 @socketio.on('start_quiz_for_room')
+@metrics.instrument_handler('start_quiz_for_room')
 def handle_start_quiz_for_room(data):
     sid = request.sid
     room_pin = data.get('roomPin', '').upper()
-    logger.info(f"handle_start_quiz_for_room: Recebido de SID {sid} para sala '{room_pin}'")
-    logger.debug(f"handle_start_quiz_for_room: Salas existentes no momento da chamada: {list(rooms_data.keys())}")
+    logger.info("handle_start_quiz_for_room: Recebido de SID %s para sala '%s'", sid, room_pin)
     
-    with rooms_lock:
-        logger.debug(f"handle_start_quiz_for_room: Lock adquirido para sala '{room_pin}'")
-        room = rooms_data.get(room_pin)
+    with _locked_room(room_pin) as room:
+        logger.debug("handle_start_quiz_for_room: Lock adquirido para sala '%s'", room_pin)
         if not room:
-            logger.error(f"handle_start_quiz_for_room: Sala '{room_pin}' NÃO ENCONTRADA para SID {sid}.")
+            logger.error("handle_start_quiz_for_room: Sala '%s' NÃO ENCONTRADA para SID %s.", room_pin, sid)
             emit('room_error', {"message": f"Sala '{room_pin}' não encontrada."}, room=sid); return
         
-        logger.info(f"handle_start_quiz_for_room: Sala '{room_pin}' encontrada. Host SID da sala: {room.get('host_sid')}, Requisitante SID: {sid}")
-        if room.get("host_sid") != sid: 
-            logger.warning(f"handle_start_quiz_for_room: SID {sid} tentou iniciar quiz para sala '{room_pin}', mas não é o host ({room.get('host_sid')}).")
+        logger.info("handle_start_quiz_for_room: Sala '%s' encontrada. Host SID da sala: %s, Requisitante SID: %s", room_pin, room.host_sid, sid)
+        if room.host_sid != sid: 
+            logger.warning("handle_start_quiz_for_room: SID %s tentou iniciar quiz para sala '%s', mas não é o host (%s).", sid, room_pin, room.host_sid)
             emit('room_error', {"message": "Apenas o líder pode iniciar."}, room=sid); return
-        if room["game_state"]["quiz_active"]:
-            logger.info(f"handle_start_quiz_for_room: Quiz na sala '{room_pin}' já está ativo.")
+        if room.game_state.quiz_active:
+            logger.info("handle_start_quiz_for_room: Quiz na sala '%s' já está ativo.", room_pin)
             emit('room_error', {"message": "Quiz já em andamento."}, room=sid); return
-        if not room.get("players"): 
-            logger.warning(f"handle_start_quiz_for_room: Host {sid} tentou iniciar quiz para sala '{room_pin}' sem jogadores.")
+        if not room.players: 
+            logger.warning("handle_start_quiz_for_room: Host %s tentou iniciar quiz para sala '%s' sem jogadores.", sid, room_pin)
             emit('room_error', {"message": "Não há jogadores na sala para iniciar."}, room=sid); return
 
-        logger.info(f"Host {sid} iniciando quiz para sala {room_pin}.")
+        logger.info("Host %s iniciando quiz para sala %s.", sid, room_pin)
         _reset_room_quiz_state(room_pin) 
         _start_quiz_logic(room_pin) 
-        logger.debug(f"handle_start_quiz_for_room: Lock liberado para sala {room_pin}")
+        logger.debug("handle_start_quiz_for_room: Lock liberado para sala %s", room_pin)
+
+
+@socketio.on('get_results')
+@metrics.instrument_handler('get_results')
+def handle_get_results(data):
+    # Resultados completos, paginados, para a tela do host
+    sid = request.sid
+    room_pin = data.get('roomPin', '').upper()
+    try:
+        page = max(1, int(data.get('page', 1)))
+        per_page = min(RESULTS_PAGE_MAX, max(1, int(data.get('perPage', RESULTS_PAGE_SIZE))))
+    except (TypeError, ValueError):
+        emit('room_error', {"message": "Página inválida."}, room=sid); return
+
+    with _locked_room(room_pin) as room:
+        if not room:
+            emit('room_error', {"message": f"Sala '{room_pin}' não encontrada."}, room=sid); return
+        if room.host_sid != sid:
+            emit('room_error', {"message": "Apenas o líder pode ver todos os resultados."}, room=sid); return
+        results = room.results
+        if results is None:
+            # Quiz em andamento ou resultados ainda sendo calculados
+            payload = {"roomPin": room_pin, "ready": False, "page": page, "perPage": per_page}
+        else:
+            start = (page - 1) * per_page
+            payload = {"roomPin": room_pin, "ready": True, "page": page, "perPage": per_page,
+                       "totalPlayers": len(results), "totalPages": max(1, -(-len(results) // per_page)),
+                       "results": [_public_result(r) for r in results[start:start + per_page]]}
+    emit('results_page', payload, room=sid)
 
 
 @socketio.on('submit_answer')
+@metrics.instrument_handler('submit_answer')
 def handle_submit_answer(data):
     sid = request.sid
     room_pin = data.get('roomPin', '').upper()
     question_id = data.get('questionId')
     selected_option_id = data.get('selectedOptionId')
-    logger.info(f"handle_submit_answer: Recebido de SID {sid} para sala {room_pin}, QID {question_id}")
+    logger.debug("handle_submit_answer: Recebido de SID %s para sala %s, QID %s", sid, room_pin, question_id)
 
-    with rooms_lock:
-        logger.debug(f"handle_submit_answer: Lock adquirido para sala {room_pin}")
-        room = rooms_data.get(room_pin)
-        if not room or sid not in room["players"]:
+    with _locked_room(room_pin) as room:
+        logger.debug("handle_submit_answer: Lock adquirido para sala %s", room_pin)
+        if not room or sid not in room.players:
             emit('answer_ack', {"success": False, "error": "Sala/jogador não reconhecido."}, room=sid); return
         
-        gs = room["game_state"]
-        player = room["players"][sid]
+        gs = room.game_state
+        player = room.players[sid]
 
-        if not gs["quiz_active"]:
+        if not gs.quiz_active:
             emit('answer_ack', {"success": False, "error": "Quiz não está ativo."}, room=sid); return
         
         current_q = _get_current_question_for_room(room_pin)
 
-        if not current_q or current_q.id != question_id:
+        if not current_q or not current_q.matches_id(question_id):
             emit('answer_ack', {"success": False, "error": "Resposta para pergunta errada."}, room=sid); return
-        if player.get("answered_current_question"):
+        if player.has_answered(gs.question_gen):
             emit('answer_ack', {"success": False, "error": "Você já respondeu."}, room=sid); return
 
-        is_correct = (selected_option_id == current_q.correct_option_id)
+        option_position = current_q.option_position(selected_option_id)
+        selected_full_id = current_q.options[option_position].id if option_position is not None else None
+        is_correct = (selected_full_id is not None and selected_full_id == current_q.correct_option_id)
         points_earned = 0
         if is_correct:
-            base_points = 100; time_taken = time.time() - gs.get("question_start_time", time.time()) 
-            time_limit = gs["time_per_question"]
+            base_points = 100; time_taken = time.time() - (gs.question_start_time or time.time()) 
+            time_limit = gs.time_per_question
             bonus_percentage = max(0, (time_limit - time_taken) / time_limit if time_limit > 0 else 0)
             max_bonus_points = 50; bonus_points = int(max_bonus_points * bonus_percentage)
             points_earned = base_points + bonus_points
-            player["score"] += points_earned
         
-        player["answers"][current_q.id] = {
-            "answer_id": selected_option_id, "is_correct": is_correct,
-            "skill": current_q.skill_area, "points_earned": points_earned
-        }
-        player["answered_current_question"] = True
-        logger.info(f"Sala {room_pin}: '{player['nickname']}' Q'{current_q.id}': {'Ok' if is_correct else 'X'}. Pts:{points_earned}. Total:{player['score']}")
+        player.answer(gs.current_question_index, option_position, is_correct, points_earned, gs.question_gen) # Soma os pontos ao score
+        gs.answered += 1
+        if is_correct: room.leaderboard.update(sid, player.score)
+        answer_log.record("answer", room=room_pin, player=player.nickname, session=player.session, sid=sid,
+                          question=current_q.id, option=selected_full_id, correct=is_correct, points=points_earned,
+                          score=player.score, skill=current_q.skill_area, difficulty=current_q.difficulty)
+        if event_log("answer"):
+            logger.info("Sala %s: '%s' Q'%s': %s. Pts:%s. Total:%s", room_pin, player.nickname, current_q.id, 'Ok' if is_correct else 'X', points_earned, player.score)
         
         emit('answer_feedback', {
-            "questionId": current_q.id, "selectedOptionId": selected_option_id,
-            "correctOptionId": current_q.correct_option_id, "isCorrect": is_correct,
-            "pointsEarned": points_earned, "currentScore": player["score"], "roomPin": room_pin
+            "questionId": current_q.short_id, "selectedOptionId": current_q.short_option_id(selected_full_id),
+            "correctOptionId": current_q.correct_short_id, "isCorrect": is_correct,
+            "pointsEarned": points_earned, "currentScore": player.score, "roomPin": room_pin
         }, room=sid)
         
-        scores_overview = sorted(
-            [{"nickname": p_data["nickname"], "score": p_data["score"]} for p_data in room["players"].values()],
-            key=lambda x: x["score"], reverse=True
-        )
-        socketio.emit('scores_update', {"scores": scores_overview[:10], "roomPin": room_pin}, room=room_pin)
-
-        all_answered = all(p_data.get("answered_current_question") for p_data in room["players"].values() if p_data)
-        if all_answered and len(room["players"]) > 0 :
-            logger.info(f"Sala {room_pin}: Todos os {len(room['players'])} jogadores responderam. Avançando...")
-            _advance_question_for_room(room_pin)
-        logger.debug(f"handle_submit_answer: Lock liberado para sala {room_pin}")
+        _schedule_scores_update(room_pin)
+
+        all_answered = gs.answered >= len(room.players)
+        if all_answered and len(room.players) > 0 :
+            logger.info("Sala %s: Todos os %s jogadores responderam. Avançando...", room_pin, len(room.players))
+            deadline_scheduler.cancel(("question", room_pin))
+            with _transition(room_pin, room):
+                _emit_scores_update_if_changed(room_pin, room) # Placar final da pergunta antes da próxima
+                _advance_question_for_room(room_pin)
+        logger.debug("handle_submit_answer: Lock liberado para sala %s", room_pin)
 
 # --- Inicialização ---
 if __name__ == '__main__':
-    logger.info(f"--- Iniciando servidor Flask-SocketIO (PID: {os.getpid()}) ---")
-    logger.info(f"--- Usando async_mode: {socketio.async_mode} ---")
-    socketio.run(app, debug=True, host='0.0.0.0', port=os.environ.get('PORT', 5001))
+    logger.info("--- Iniciando servidor Flask-SocketIO (PID: %s) ---", os.getpid())
+    logger.info("--- Usando async_mode: %s ---", socketio.async_mode)
+    # QUIZ_DEBUG=0 desliga o modo debug e o reloader. Com o reloader, este bloco roda também no
+    # processo que só vigia os arquivos, e os checkpoints ficam com o que atende (WERKZEUG_RUN_MAIN);
+    # num SIGTERM ou Ctrl+C o vigia mata o servidor com SIGKILL, sem o checkpoint final.
+    # O modo asyncio (uvicorn) não tem reloader.
+    DEBUG = os.environ.get('QUIZ_DEBUG', '1') != '0'
+    if not DEBUG or ASYNC_MODE == 'asyncio' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_checkpoints()
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    socketio.run(app, debug=DEBUG, host='0.0.0.0', port=os.environ.get('PORT', 5001))
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""Modo asyncio (QUIZ_ASYNC_MODE=asyncio): o Socket.IO num loop asyncio, servido por ASGI.
+
+Sem monkey_patch: o servidor é o socketio.AsyncServer do python-socketio,
+atendido pelo uvicorn, e as rotas HTTP do Flask entram pelo mesmo loop. Os
+handlers do app.py continuam síncronos, como nos modos eventlet e threading:
+cada evento, cada tarefa em background (o loop de prazos, as varreduras, a
+entrega de resultados) e cada requisição HTTP roda num greenlet filho da sua
+tarefa asyncio. O `sleep` desse código devolve o controle ao loop e volta
+quando a espera termina (a mesma ponte do suporte a asyncio do SQLAlchemy);
+todo o resto roda sem trocar de contexto, na thread do loop.
+
+AsyncSocketIO imita a parte do flask_socketio.SocketIO que o app.py usa (`on`,
+`emit`, `close_room`, `sleep`, `start_background_task`, `run`) e se registra
+em app.extensions, então os `emit` e `join_room` do flask_socketio funcionam
+dentro dos handlers. Um `emit` não espera a entrega: vira uma tarefa do loop,
+na ordem em que foi chamado, e pode ser feito com o lock de uma sala em mãos.
+
+Os locks das salas precisam ser os deste módulo (Lock): quem espera um lock
+ocupado cede o loop, em vez de travar a única thread enquanto o dono dorme. O
+mesmo vale para o Event que acorda o loop de prazos.
+"""
+import asyncio
+import io
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+import flask
+import greenlet
+import socketio
+from flask.sessions import SessionMixin
+
+logger = logging.getLogger(__name__)
+
+
+class _Bridge(greenlet.greenlet):
+    """Greenlet com código síncrono, filho da tarefa asyncio que o executa."""
+
+
+def await_(awaitable):
+    """Espera `awaitable` de dentro de código síncrono rodando por run_sync(), cedendo o loop."""
+    current = greenlet.getcurrent()
+    if not isinstance(current, _Bridge):
+        raise RuntimeError("await_() fora de um greenlet do loop asyncio")
+    return current.parent.switch(awaitable)
+
+
+def in_loop():
+    return isinstance(greenlet.getcurrent(), _Bridge)
+
+
+def run_in_thread(fn, *args):
+    """Executa fn(*args) numa thread do sistema; no loop, cede a vez até ela terminar."""
+    if not in_loop():
+        return fn(*args)
+    return await_(asyncio.get_running_loop().run_in_executor(None, fn, *args))
+
+
+async def run_sync(fn, *args):
+    """Executa fn(*args) num greenlet novo; cada await_() dele é aguardado aqui, no loop."""
+    bridge = _Bridge(fn, greenlet.getcurrent())
+    result = bridge.switch(*args)
+    while not bridge.dead:
+        try:
+            value = await result
+        except BaseException:
+            result = bridge.throw(*sys.exc_info())
+        else:
+            result = bridge.switch(value)
+    return result
+
+
+class Lock:
+    """threading.Lock para o modo asyncio: quem espera cede o loop em vez de travar a thread.
+
+    O lock é entregue ao primeiro da fila ao ser solto. Fora do loop (antes de o
+    servidor subir, ou no atexit), só um lock livre pode ser adquirido.
+    """
+
+    def __init__(self):
+        self._locked = False
+        self._waiters = deque()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._locked:
+            self._locked = True
+            return True
+        if not blocking:
+            return False
+        if not in_loop():
+            if timeout >= 0:
+                return False
+            raise RuntimeError("Lock ocupado fora do loop asyncio")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            if timeout < 0:
+                await_(waiter)
+            else:
+                await_(asyncio.wait((waiter,), timeout=timeout))
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()   # Recebeu o lock, mas foi cancelado antes de usá-lo
+            else:
+                waiter.cancel()
+            raise
+        if waiter.done():
+            return True
+        waiter.cancel()   # Prazo vencido: o release() pula os cancelados
+        return False
+
+    def release(self):
+        if not self._locked:
+            raise RuntimeError("release() de um Lock livre")
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)   # O lock passa direto para quem esperava
+                return
+        self._locked = False
+
+    def locked(self):
+        return self._locked
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class Event:
+    """threading.Event para o modo asyncio: wait() cede o loop em vez de travar a thread."""
+
+    def __init__(self):
+        self._flag = False
+        self._waiters = set()
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        self._flag = True
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(True)
+        self._waiters.clear()
+
+    def clear(self):
+        self._flag = False
+
+    def wait(self, timeout=None):
+        if self._flag:
+            return True
+        if not in_loop():
+            raise RuntimeError("Event.wait() fora do loop asyncio")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await_(asyncio.wait((waiter,), timeout=timeout))
+        finally:
+            self._waiters.discard(waiter)
+            waiter.cancel()
+        return self._flag
+
+
+class _ManagedSession(dict, SessionMixin):
+    """Sessão do Flask de cada cliente Socket.IO, copiada da sessão HTTP na conexão (como no Flask-SocketIO)."""
+
+
+class _Server(socketio.AsyncServer):
+    """AsyncServer com enter_room/leave_room síncronos, como o flask_socketio.join_room espera.
+
+    Entrar e sair de uma sala só mexe no índice local do manager (também com a
+    fila de mensagens), então não há o que esperar.
+    """
+
+    def enter_room(self, sid, room, namespace=None):
+        self.manager.basic_enter_room(sid, namespace or '/', room)
+
+    def leave_room(self, sid, room, namespace=None):
+        self.manager.basic_leave_room(sid, namespace or '/', room)
+
+
+class WsgiApp:
+    """Aplicação ASGI que atende as rotas HTTP de um app WSGI (o Flask) num greenlet do loop."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            if scope['type'] == 'websocket':
+                await send({'type': 'websocket.close'})
+            return
+        body = []
+        while True:
+            message = await receive()
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        status, headers, chunks = await run_sync(self._call, self._environ(scope, b''.join(body)))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    @staticmethod
+    def _environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('127.0.0.1', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0], 'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0], 'REMOTE_PORT': str(client[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', ()):
+            name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _call(self, environ):
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(' ', 1)[0]),
+                          [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks = list(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return started[0], started[1], chunks
+
+
+class AsyncSocketIO:
+    """O flask_socketio.SocketIO do modo asyncio (a parte dele que o app.py usa)."""
+
+    async_mode = 'asyncio'
+
+    def __init__(self, app, message_queue=None, client_manager=None, **kwargs):
+        if message_queue:
+            if not message_queue.startswith(('redis://', 'rediss://')):
+                raise ValueError("No modo asyncio, QUIZ_MESSAGE_QUEUE precisa ser redis://...")
+            client_manager = socketio.AsyncRedisManager(message_queue)
+        elif client_manager is not None and not isinstance(client_manager, socketio.AsyncManager):
+            raise ValueError(f"A fila de mensagens '{client_manager.name}' não funciona no modo asyncio; use redis://...")
+        self.app = app
+        self.server = _Server(async_mode='asgi', client_manager=client_manager, **kwargs)
+        self.asgi_app = socketio.ASGIApp(self.server, other_asgi_app=WsgiApp(app.wsgi_app), on_startup=self._started)
+        self._loop = None
+        self._loop_thread = None
+        self._pending = []   # Tarefas pedidas antes de o loop existir (restauração dos checkpoints)
+        self._tasks = set()  # O asyncio só guarda referências fracas às tarefas
+        app.extensions['socketio'] = self
+
+    def _started(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        pending, self._pending = self._pending, []
+        for target, args in pending:
+            self._spawn(run_sync(self._background, target, *args))
+
+    def _spawn(self, coro):
+        if self._loop is None or self._loop.is_closed():
+            coro.close()   # Sem loop (antes de o servidor subir ou depois de parar) não há clientes
+            return
+        if threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._spawn, coro)
+            return
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Erro numa tarefa do loop asyncio.", exc_info=task.exception())
+
+    @staticmethod
+    def _background(target, *args):
+        try:
+            target(*args)
+        except Exception:
+            logger.exception("Erro na tarefa em background %s.", getattr(target, '__name__', target))
+
+    def on(self, message, namespace=None):
+        namespace = namespace or '/'
+
+        def decorator(handler):
+            async def _handler(sid, *args):
+                return await run_sync(self._handle_event, handler, message, namespace, sid, *args)
+            self.server.on(message, _handler, namespace=namespace)
+            return handler
+        return decorator
+
+    def _handle_event(self, handler, message, namespace, sid, *args):
+        # O mesmo contexto que o Flask-SocketIO monta para cada evento: request.sid,
+        # request.namespace e uma sessão por cliente, copiada da sessão HTTP na conexão
+        environ = self.server.get_environ(sid, namespace=namespace)
+        if not environ:
+            return '', 400
+        environ.setdefault('wsgi.url_scheme', 'http')
+        ctx = self.app.request_context(environ)
+        if 'saved_session' not in environ:
+            with self.app.request_context(environ):
+                environ['saved_session'] = _ManagedSession(flask.session)
+        ctx.session = environ['saved_session']
+        with ctx:
+            flask.request.sid = sid
+            flask.request.namespace = namespace
+            flask.request.event = {'message': message, 'args': args}
+            if message == 'connect':
+                auth = args[1] if len(args) > 1 else None
+                try:
+                    return handler(auth)
+                except TypeError:
+                    return handler()
+            return handler(*args)
+
+    def emit(self, event, *args, namespace='/', to=None, room=None, include_self=True, skip_sid=None,
+             callback=None, ignore_queue=False):
+        if not include_self and not skip_sid:
+            skip_sid = flask.request.sid
+        self._spawn(self.server.emit(event, args[0] if args else None, namespace=namespace, to=to or room,
+                                     skip_sid=skip_sid, callback=callback, ignore_queue=ignore_queue))
+
+    def close_room(self, room, namespace='/'):
+        self._spawn(self.server.close_room(room, namespace=namespace))
+
+    def sleep(self, seconds=0):
+        if in_loop():
+            await_(asyncio.sleep(seconds))
+        else:
+            time.sleep(seconds)
+
+    def start_background_task(self, target, *args):
+        if self._loop is None:
+            self._pending.append((target, args))
+        else:
+            self._spawn(run_sync(self._background, target, *args))
+
+    def run(self, app, host=None, port=None, debug=False, use_reloader=None, log_output=None, **kwargs):
+        """Sobe o uvicorn com o app ASGI. Sem reloader: reinicie o servidor ao mudar o código."""
+        import uvicorn
+        if use_reloader or (use_reloader is None and debug):
+            logger.info("Modo asyncio: sem o reloader do Werkzeug.")
+        log_output = debug if log_output is None else log_output
+        # Sem os pings do WebSocket: o Engine.IO já tem o ping/pong dele
+        uvicorn.run(self.asgi_app, host=host or '127.0.0.1', port=int(port or 5000),
+                    log_level='info' if log_output else 'warning', ws_ping_interval=None, **kwargs)
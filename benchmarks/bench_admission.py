@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""Controle de admissão (admission.py) contra o servidor real: enxurradas e clientes lentos.
+
+1. Enxurrada: uma sala joga o quiz com clientes do loadgen.py e, na 1ª
+   pergunta, um cliente mal-comportado da sala manda de uma vez --flood-answers
+   submit_answer, --flood-joins join_room_pin e --flood-rooms create_room.
+   Com os limites (padrão) e sem eles (QUIZ_RATE_LIMITS=0), mede: eventos da
+   enxurrada recusados e os que chegaram aos handlers, broadcasts 'player_joined_room' que
+   os jogadores legítimos receberam, CPU do servidor no quiz e p99/máximo do
+   answer_feedback dos jogadores legítimos.
+2. Clientes lentos: --stalled clientes por long-polling entram na sala e param
+   de buscar pacotes enquanto a sala joga um quiz curto (uma pergunta por
+   segundo). No fim, cada um busca a fila de uma vez e confere o que chegou:
+   new_question, time_up, quiz_ended e quiz_result têm de estar todos lá; dos
+   'scores_update' basta o último: o placar final de cada um tem de ser o que
+   os jogadores ativos viram por último (a fila cheia guarda só o mais
+   recente, que entra numa segunda busca). Com a fila limitada a --queue-max
+   pacotes (baixo, para encher num quiz curto) e sem limite (QUIZ_CLIENT_QUEUE_MAX=0).
+
+Uso:
+    python benchmarks/bench_admission.py [--players 30] [--stalled 10] [--queue-max 16]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import (APP_DIR, SERVER_CODE, Client, LoadRun, ProcessStats, Room, free_port,  # noqa: E402
+                     parse_distribution, percentiles)
+
+ESSENTIAL = ('new_question', 'time_up', 'quiz_ended', 'quiz_result')
+
+
+def start_server(env_overrides):
+    port = free_port()
+    log = tempfile.NamedTemporaryFile(prefix='quiz-admissao-', suffix='.log', delete=False, mode='w')
+    env = dict(os.environ, QUIZ_EVENTS_DIR='off', QUIZ_CHECKPOINT='off', QUIZ_LOG_LEVEL='WARNING',
+               PYTHONUNBUFFERED='1', **env_overrides)
+    env.pop('QUIZ_ASYNC_MODE', None)
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, str(port), '{}'], cwd=APP_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 30
+    while True:
+        try:
+            if http_get(port, '/')[0] == 200:
+                return proc, port
+        except OSError:
+            pass
+        if time.time() > deadline or proc.poll() is not None:
+            raise RuntimeError(f"servidor não subiu (veja {log.name})")
+        time.sleep(0.05)
+
+
+def http_get(port, path, timeout=5):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read().decode('utf-8')
+    finally:
+        conn.close()
+
+
+def scrape(port):
+    """Valores do /metrics: {'nome{labels}': valor}."""
+    values = {}
+    for line in http_get(port, '/metrics')[1].splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            values[name] = float(value)
+    return values
+
+
+def metric_sum(values, prefix):
+    return sum(v for name, v in values.items() if name.startswith(prefix))
+
+
+def load_params(players, answer_time):
+    return argparse.Namespace(rooms=1, players=players, challenge='desafio1', answer_time=answer_time,
+                              skip_rate=0.0, disconnect_rate=0.0, rejoin_delay=1.0, stagger=0.0,
+                              connect_concurrency=50, timeout=30.0, quiz_timeout=120.0)
+
+
+async def setup_room(load, question_count):
+    room = Room(load, 0)
+    host = Client(load, room, 'host', load.address(), is_host=True)
+    await host.connect()
+    host.emit('create_room', {'nickname': 'host', 'challengeType': 'desafio1', 'questionCount': question_count})
+    room.pin = (await host.wait_for('room_created', 30))['roomPin']
+    room.clients.append(host)
+    for i in range(load.params.players):
+        client = Client(load, room, f"p{i:03d}", load.address())
+        await client.connect()
+        await client.join('join_room_pin', {'nickname': client.name, 'roomPin': room.pin})
+        room.clients.append(client)
+    return room
+
+
+async def play_until_done(room, timeout):
+    room.start_sent_at = time.perf_counter()
+    room.clients[0].emit('start_quiz_for_room', {'roomPin': room.pin})
+    await asyncio.wait([asyncio.ensure_future(c.done.wait()) for c in room.clients], timeout=timeout)
+
+
+# --- 1. Enxurrada ---
+
+async def flood_run(port, args, stats):
+    load = LoadRun(load_params(args.players, parse_distribution('uniform:0.3:1.5')), [('127.0.0.1', port)])
+    room = await setup_room(load, args.questions)
+    # O mal-comportado tem o próprio LoadRun: não responde sozinho nem entra nas latências
+    attack = LoadRun(load_params(0, parse_distribution('fixed:0')), [('127.0.0.1', port)])
+    attack.params.skip_rate = 1.0
+    attacker = Client(attack, Room(attack, 1), 'flood', ('127.0.0.1', port))
+    attacker.room.pin = room.pin
+    await attacker.connect()
+    await attacker.join('join_room_pin', {'nickname': 'flood', 'roomPin': room.pin})
+    joined_before = load.received['player_joined_room']
+    first_question = asyncio.ensure_future(attacker.wait_for('new_question', 30))
+
+    cpu_before, start = stats.cpu_seconds(), time.perf_counter()
+    quiz = asyncio.ensure_future(play_until_done(room, 120))
+    question = await first_question
+    answer = {'roomPin': room.pin, 'questionId': question['question']['id'], 'selectedOptionId': 'a'}
+    for i in range(max(args.flood_answers, args.flood_joins, args.flood_rooms)):
+        if i < args.flood_answers:
+            attacker.emit('submit_answer', answer)
+        if i < args.flood_joins:
+            attacker.emit('join_room_pin', {'nickname': 'flood', 'roomPin': room.pin})
+        if i < args.flood_rooms:
+            attacker.emit('create_room', {'nickname': f'flood{i}', 'challengeType': 'desafio1'})
+    await asyncio.sleep(2.0)
+    attacker.drop()   # Sai da sala: as perguntas seguintes avançam quando os legítimos respondem
+    await quiz
+    quiz_time, quiz_cpu = time.perf_counter() - start, stats.cpu_seconds() - cpu_before
+    values = scrape(port)
+    for c in room.clients:
+        c.drop()
+    feedback = percentiles(load.latencies['answer_feedback'])
+    return {
+        "rejected": metric_sum(values, 'quiz_admission_rejected_total'),
+        # Menos os eventos legítimos: o create_room do host, os join_room_pin de cada um e as respostas
+        "handled": sum(values.get(f'quiz_event_duration_seconds_count{{event="{event}"}}', 0)
+                       for event in ('submit_answer', 'join_room_pin', 'create_room'))
+                   - 1 - len(room.clients) - load.sent['submit_answer'],
+        "joined_broadcasts": (load.received['player_joined_room'] - joined_before) / len(room.clients),
+        "cpu_s": quiz_cpu, "quiz_s": quiz_time, "p99": feedback.get('p99'), "max": feedback.get('max'),
+        "finished": sum(c.done.is_set() for c in room.clients), "clients": len(room.clients),
+        "rate_limited": attack.received['rate_limited'],
+    }
+
+
+# --- 2. Clientes lentos ---
+
+class PollingClient:
+    """Cliente Socket.IO por long-polling do Engine.IO, que pode parar de buscar pacotes."""
+
+    def __init__(self, port):
+        self.port = port
+        self.sid = None
+
+    def _request(self, method, body=None):
+        path = '/socket.io/?EIO=4&transport=polling' + (f'&sid={self.sid}' if self.sid else '')
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        try:
+            conn.request(method, path, body=body, headers={'Content-Type': 'text/plain;charset=UTF-8'})
+            response = conn.getresponse()
+            return response.read().decode('utf-8')
+        finally:
+            conn.close()
+
+    def poll(self):
+        """Pacotes Engine.IO esperando na fila do servidor (um GET)."""
+        return self._request('GET').split('\x1e')
+
+    def emit(self, event, data):
+        self._request('POST', '42' + json.dumps([event, data], separators=(',', ':')))
+
+    def join(self, nickname, room_pin):
+        opening = self.poll()[0]
+        self.sid = json.loads(opening[1:])['sid']
+        self._request('POST', '40')
+        self.poll()   # CONNECT do Socket.IO
+        self.emit('join_room_pin', {'nickname': nickname, 'roomPin': room_pin})
+        while not any(p.startswith('42["room_joined"') for p in self.poll()):
+            pass
+
+
+def last_event(packets, event):
+    prefix = f'42["{event}",'
+    matches = [p for p in packets if p.startswith(prefix)]
+    return json.loads(matches[-1][2:])[1] if matches else None
+
+
+def count_events(packets):
+    counts = {}
+    for p in packets:
+        match = re.match(r'42\["([^"]+)"', p)
+        if match:
+            counts[match.group(1)] = counts.get(match.group(1), 0) + 1
+    return counts
+
+
+async def stalled_run(port, args):
+    load = LoadRun(load_params(args.players, parse_distribution('uniform:0.1:0.6')), [('127.0.0.1', port)])
+    room = await setup_room(load, args.questions)
+    stalled = [PollingClient(port) for _ in range(args.stalled)]
+    for i, client in enumerate(stalled):
+        await asyncio.to_thread(client.join, f"lento{i:02d}", room.pin)
+    watcher, last_scores = room.clients[0], []
+    on_event = watcher.on_event
+
+    def remember_scores(event, data):
+        if event == 'scores_update':
+            last_scores.append(data)
+        on_event(event, data)
+
+    watcher.on_event = remember_scores
+    await play_until_done(room, 120)
+    await asyncio.sleep(1.5)   # Resultados individuais, entregues depois do quiz_ended
+    values = scrape(port)
+    queues = [await asyncio.to_thread(client.poll) for client in stalled]
+    await asyncio.sleep(0.5)   # O placar guardado entra depois que a fila esvaziou
+    queues = [q + await asyncio.to_thread(client.poll) for client, q in zip(stalled, queues)]
+    for c in room.clients:
+        c.drop()
+    received = [count_events(packets) for packets in queues]
+    final_scores = last_scores[-1] if last_scores else None
+    legit = len(room.clients)
+    expected = {event: load.received[event] / legit for event in ('new_question', 'time_up', 'quiz_ended', 'scores_update')}
+    expected['quiz_result'] = 1
+    return {
+        "queued": sum(len(q) for q in queues) / len(queues),
+        "essential_ok": sum(all(r.get(event, 0) >= expected[event] for event in ESSENTIAL) for r in received),
+        "scores_ok": sum(last_event(packets, 'scores_update') == final_scores for packets in queues),
+        "received": {event: sum(r.get(event, 0) for r in received) / len(received) for event in expected},
+        "expected": expected,
+        "dropped": metric_sum(values, 'quiz_outbound_dropped_total'),
+        "queue_max": values.get('quiz_outbound_queue_max', 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=30, help='jogadores legítimos da sala, além do host')
+    parser.add_argument('--questions', type=int, default=8)
+    parser.add_argument('--flood-answers', type=int, default=3000)
+    parser.add_argument('--flood-joins', type=int, default=300)
+    parser.add_argument('--flood-rooms', type=int, default=100)
+    parser.add_argument('--stalled', type=int, default=10)
+    parser.add_argument('--queue-max', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"1. Enxurrada: sala com {args.players + 1} clientes, {args.questions} perguntas; um cliente manda "
+          f"{args.flood_answers} submit_answer, {args.flood_joins} join_room_pin e {args.flood_rooms} create_room")
+    print(f"{'limites':<10} {'recusados':>10} {'processados':>12} {'player_joined/jogador':>22} "
+          f"{'CPU (s)':>8} {'p99 resp. (ms)':>15} {'máx. (ms)':>10} {'terminaram':>11}")
+    for label, env in (("ligados", {}), ("desligados", {'QUIZ_RATE_LIMITS': '0'})):
+        proc, port = start_server(dict(env, QUIZ_TIME_PER_QUESTION='3'))
+        try:
+            r = asyncio.run(flood_run(port, args, ProcessStats([proc.pid])))
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{label:<10} {r['rejected']:>10.0f} {r['handled']:>12.0f} {r['joined_broadcasts']:>22.0f} "
+              f"{r['cpu_s']:>8.2f} {r['p99']:>15.1f} {r['max']:>10.1f} {r['finished']:>6}/{r['clients']}")
+
+    print(f"\n2. Clientes lentos: {args.stalled} clientes por long-polling parados numa sala com {args.players + 1} "
+          f"jogando {args.questions} perguntas de 1 s")
+    print(f"{'fila':<12} {'na fila':>8} {'descartados':>12} {'maior fila':>11} {'essenciais ok':>14} {'placar final':>13} "
+          + ' '.join(f"{event:>14}" for event in ESSENTIAL + ('scores_update',)))
+    for label, queue_max in ((f"{args.queue_max} pacotes", args.queue_max), ("sem limite", 0)):
+        proc, port = start_server({'QUIZ_TIME_PER_QUESTION': '1', 'QUIZ_CLIENT_QUEUE_MAX': str(queue_max)})
+        try:
+            r = asyncio.run(stalled_run(port, args))
+        finally:
+            proc.terminate()
+            proc.wait()
+        cells = ' '.join(f"{r['received'][e]:>8.0f}/{r['expected'][e]:<5.0f}" for e in ESSENTIAL + ('scores_update',))
+        essential = f"{r['essential_ok']}/{args.stalled}"
+        scores = f"{r['scores_ok']}/{args.stalled}"
+        print(f"{label:<12} {r['queued']:>8.0f} {r['dropped']:>12.0f} {r['queue_max']:>11.0f} {essential:>14} {scores:>13} {cells}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Os três modos do servidor lado a lado: eventlet, threading e asyncio (uvicorn).
+
+Para cada modo (QUIZ_ASYNC_MODE), sobe o servidor real numa porta livre e mede:
+  subida        do início do processo até o primeiro GET / respondido
+  memória       RSS com todos os clientes conectados e nas salas, menos o RSS
+                antes das conexões, por conexão (e as threads do processo)
+  ocioso        CPU do servidor com todos conectados e parados por --idle s
+                (só os pings do Engine.IO)
+  quiz          todas as salas jogam o quiz ao mesmo tempo, com os clientes do
+                loadgen.py: CPU do servidor, eventos/s e p99 do answer_feedback
+  conexões/núcleo  clientes / fração de um núcleo usada durante o quiz: quantas
+                conexões jogando nesse ritmo um núcleo atenderia (só se todos os
+                clientes chegaram ao fim do quiz)
+O eventlet sobe com max_size acima do número de clientes, e o threading com o
+servidor do Werkzeug (allow_unsafe_werkzeug), que é o que o modo usa. Um modo
+que não dá conta (clientes sem quiz_ended, conexões derrubadas) aparece como
+resultado, com as falhas listadas embaixo da tabela.
+
+Uso:
+    python benchmarks/bench_async_modes.py [--rooms 25] [--players 39] [--modes eventlet,threading,asyncio]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import (APP_DIR, SERVER_CODE, LoadRun, ProcessStats, describe, free_port,  # noqa: E402
+                     parse_distribution, percentiles, raise_fd_limit)
+
+MODES = ('eventlet', 'threading', 'asyncio')
+
+
+def start_server(mode, clients, time_per_question):
+    port = free_port()
+    options = {'eventlet': {'max_size': clients + 100}, 'threading': {'allow_unsafe_werkzeug': True}}.get(mode, {})
+    log = tempfile.NamedTemporaryFile(prefix=f'quiz-modos-{mode}-', suffix='.log', delete=False, mode='w')
+    env = dict(os.environ, QUIZ_ASYNC_MODE=mode, QUIZ_TIME_PER_QUESTION=str(time_per_question),
+               QUIZ_EVENTS_DIR='off', QUIZ_CHECKPOINT='off', QUIZ_LOG_LEVEL='WARNING', PYTHONUNBUFFERED='1')
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, str(port), json.dumps(options)], cwd=APP_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 30
+    while True:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc, port, time.perf_counter() - start, log.name
+        except OSError:
+            pass
+        if time.time() > deadline or proc.poll() is not None:
+            raise RuntimeError(f"servidor {mode} não subiu (veja {log.name})")
+        time.sleep(0.02)
+
+
+def threads(pid):
+    with open(f'/proc/{pid}/status') as f:
+        return int(next(line.split()[1] for line in f if line.startswith('Threads:')))
+
+
+async def play(load, stats, pid, idle):
+    params = load.params
+    semaphore = asyncio.Semaphore(params.connect_concurrency)
+    rss_before, _ = stats.memory_mb()
+    results = await asyncio.gather(*(load.setup_room(i, semaphore) for i in range(params.rooms)),
+                                   return_exceptions=True)
+    rooms = [r for r in results if not isinstance(r, BaseException)]
+    for r in results:
+        if isinstance(r, BaseException):
+            load.errors[f"setup: {describe(r)}"] += 1
+    clients = [c for room in rooms for c in room.clients]
+    await asyncio.sleep(1.0)   # Conexões assentadas antes de medir
+    rss_connected, _ = stats.memory_mb()
+    connected_threads = threads(pid)
+
+    cpu_before = stats.cpu_seconds()
+    await asyncio.sleep(idle)
+    idle_cpu = stats.cpu_seconds() - cpu_before
+
+    received_before = sum(load.received.values()) + sum(load.sent.values())
+    cpu_before, start = stats.cpu_seconds(), time.perf_counter()
+    for room in rooms:
+        room.start_sent_at = time.perf_counter()
+        room.clients[0].emit('start_quiz_for_room', {'roomPin': room.pin})
+    pending = [asyncio.ensure_future(c.done.wait()) for c in clients]
+    _, pending = await asyncio.wait(pending, timeout=params.quiz_timeout)
+    quiz_time, quiz_cpu = time.perf_counter() - start, stats.cpu_seconds() - cpu_before
+    events = sum(load.received.values()) + sum(load.sent.values()) - received_before
+    for task in pending:
+        task.cancel()
+    if pending:
+        load.errors["quiz_ended não chegou"] += len(pending)
+    for c in clients:
+        c.drop()
+    return {
+        "clients": len(clients), "rss_before": rss_before, "rss_connected": rss_connected,
+        "kib_per_connection": (rss_connected - rss_before) * 1024 / max(1, len(clients)),
+        "threads": connected_threads, "idle_cpu_pct": idle_cpu / idle * 100,
+        "quiz_s": quiz_time, "quiz_cpu_pct": quiz_cpu / quiz_time * 100, "events_per_s": events / quiz_time,
+        "connections_per_core": len(clients) / (quiz_cpu / quiz_time) if quiz_cpu else float('inf'),
+        "answer_feedback_p99": percentiles(load.latencies['answer_feedback'])["p99"] if load.latencies['answer_feedback'] else None,
+    }
+
+
+def run_mode(mode, args):
+    clients = args.rooms * (args.players + 1)
+    proc, port, startup, log = start_server(mode, clients, args.time_per_question)
+    params = argparse.Namespace(rooms=args.rooms, players=args.players, challenge='desafio1',
+                                answer_time=args.answer_time, skip_rate=0.0, disconnect_rate=0.0, rejoin_delay=1.0,
+                                stagger=0.0, connect_concurrency=100, timeout=60.0, quiz_timeout=300.0)
+    try:
+        load = LoadRun(params, [('127.0.0.1', port)])
+        result = asyncio.run(play(load, ProcessStats([proc.pid]), proc.pid, args.idle))
+    finally:
+        proc.terminate()
+        proc.wait()
+    result.update(mode=mode, startup_s=startup, errors=dict(load.errors), log=log)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=25)
+    parser.add_argument('--players', type=int, default=39, help='jogadores por sala, além do host')
+    parser.add_argument('--answer-time', type=parse_distribution, default=parse_distribution('uniform:0.5:3'))
+    parser.add_argument('--time-per-question', type=int, default=5)
+    parser.add_argument('--idle', type=float, default=5.0, help='segundos parados, todos conectados')
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    clients = args.rooms * (args.players + 1)
+    print(f"{args.rooms} salas x {args.players + 1} clientes = {clients} conexões WebSocket, "
+          f"respostas em {args.answer_time.spec} s, {os.cpu_count()} CPUs")
+    print(f"{'modo':<10} {'subida (s)':>10} {'KiB/conexão':>12} {'threads':>8} {'ocioso CPU':>11} "
+          f"{'quiz CPU':>9} {'eventos/s':>10} {'p99 resp. (ms)':>15} {'terminaram':>11} {'conexões/núcleo':>16}")
+    failures = []
+    for mode in args.modes.split(','):
+        r = run_mode(mode, args)
+        finished = r['clients'] - r['errors'].get("quiz_ended não chegou", 0)
+        ok = finished == clients and not r['errors']
+        p99 = f"{r['answer_feedback_p99']:.1f}" if r['answer_feedback_p99'] is not None else '-'
+        per_core = f"{r['connections_per_core']:.0f}" if ok else '-'
+        print(f"{mode:<10} {r['startup_s']:>10.2f} {r['kib_per_connection']:>12.1f} {r['threads']:>8} "
+              f"{r['idle_cpu_pct']:>10.1f}% {r['quiz_cpu_pct']:>8.1f}% {r['events_per_s']:>10.0f} {p99:>15} "
+              f"{f'{finished}/{clients}':>11} {per_core:>16}")
+        if not ok:
+            failures.append(f"{mode}: {r['errors']} (log do servidor em {r['log']})")
+    for failure in failures:
+        print(f"  falhas no {failure}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Pacotes e bytes por pergunta com e sem os lotes de broadcast ('room_batch').
+
+Joga um quiz inteiro numa sala pelo cliente de teste, duas vezes: com clientes
+que não anunciam batchFrames (eventos separados, como antes) e com clientes que
+anunciam. Nas perguntas ímpares todos respondem (placar final + próxima
+pergunta); nas pares um aluno não responde e o tempo esgota (time_up + próxima
+pergunta). Cada pacote entregue é contado por destinatário (ver
+bench_wire_bytes.WireCounter).
+
+Antes de comparar, confere que a sequência de eventos que um aluno enxerga é a
+mesma nos dois casos, desembrulhando os 'room_batch' como o static/script.js.
+Os bytes "com cabeçalhos" somam app.PACKET_OVERHEAD_BYTES por pacote
+(frame WebSocket + TCP/IP), que é o que um pacote a menos economiza no Wi-Fi.
+
+Uso:
+    python benchmarks/bench_batch_frames.py [--players 40] [--time-limit 0.3]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ.setdefault('QUIZ_RATE_LIMITS', '0')   # Os clientes de teste respondem as perguntas em sequência, sem pausa
+os.environ['QUIZ_EVENTS_DIR'] = 'off'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+from bench_wire_bytes import WireCounter  # noqa: E402
+
+ROOM_EVENTS = ('quiz_started', 'new_question', 'time_up', 'scores_update', 'quiz_ended')
+
+
+def _unwrap(messages):
+    """Nomes dos eventos de sala recebidos, com os 'room_batch' desembrulhados."""
+    names = []
+    for m in messages:
+        if m['name'] == 'room_batch':
+            names.extend(event for event, _ in m['args'][1:])
+        else:
+            names.append(m['name'])
+    return [n for n in names if n in ROOM_EVENTS]
+
+
+def _questions(messages):
+    found = []
+    for m in messages:
+        if m['name'] == 'room_batch':
+            found.extend(data for event, data in m['args'][1:] if event == 'new_question')
+        elif m['name'] == 'new_question':
+            found.append(m['args'][0])
+    return found
+
+
+def play(players, batch_frames, time_limit):
+    original_reset = quiz_app._reset_room_quiz_state
+
+    def short_reset(room_pin):
+        original_reset(room_pin)
+        quiz_app.rooms_data[room_pin].game_state.time_per_question = time_limit
+
+    quiz_app._reset_room_quiz_state = short_reset
+    try:
+        host = quiz_app.socketio.test_client(quiz_app.app)
+        host.emit('create_room', {'nickname': 'Professor', 'challengeType': 'desafio1', 'batchFrames': batch_frames})
+        pin = [m for m in host.get_received() if m['name'] == 'room_created'][0]['args'][0]['roomPin']
+        students = []
+        for i in range(players):
+            c = quiz_app.socketio.test_client(quiz_app.app)
+            c.emit('join_room_pin', {'nickname': f'Aluno{i:02d}', 'roomPin': pin, 'batchFrames': batch_frames})
+            students.append(c)
+        for c in [host] + students:
+            c.get_received()
+
+        # Cada cliente de teste novo reinstala o envio do servidor: o contador entra depois deles
+        counter = WireCounter(quiz_app.socketio.server)
+        host.emit('start_quiz_for_room', {'roomPin': pin})
+        seen = []                  # Eventos de sala vistos pelo primeiro aluno
+        received = students[0].get_received()
+        questions = 0
+        while True:
+            seen.extend(_unwrap(received))
+            pending = _questions(received)
+            if 'quiz_ended' in seen[-1:] or not pending:
+                break
+            question = pending[-1]
+            questions += 1
+            # Perguntas pares: o último aluno não responde e o prazo esgota
+            answering = students if questions % 2 else students[:-1]
+            for c in [host] + answering:
+                c.emit('submit_answer', {'roomPin': pin, 'questionId': question['question']['id'], 'selectedOptionId': 'a'})
+            deadline = time.time() + time_limit + 5
+            received = students[0].get_received()
+            while not _questions(received) and 'quiz_ended' not in _unwrap(received) and time.time() < deadline:
+                quiz_app.socketio.sleep(0.02)
+                received += students[0].get_received()
+        counter.enabled = False
+        for c in [host] + students:
+            c.disconnect()
+        return questions, seen, counter
+    finally:
+        quiz_app._reset_room_quiz_state = original_reset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--time-limit', type=float, default=0.3)
+    args = parser.parse_args()
+
+    recipients = args.players + 1
+    rows, sequences = [], []
+    for batch_frames in (False, True):
+        questions, seen, counter = play(args.players, batch_frames, args.time_limit)
+        # Só os eventos de sala: respostas individuais (answer_feedback) e resultados não mudam
+        room = {n: (counter.packets[n], counter.bytes[n]) for n in counter.packets if n in ROOM_EVENTS + ('room_batch',)}
+        packets = sum(p for p, _ in room.values())
+        payload = sum(b for _, b in room.values())
+        rows.append(("lotes (room_batch)" if batch_frames else "eventos separados", questions, packets, payload))
+        sequences.append(seen)
+    assert sequences[0] == sequences[1], "sequência de eventos diferente com lotes"
+
+    overhead = quiz_app.PACKET_OVERHEAD_BYTES
+    print(f"Sala com {recipients} clientes, {rows[0][1]} perguntas; mesma sequência de eventos nos dois casos")
+    print(f"{'broadcasts de sala':<20} {'pacotes/cliente/pergunta':>25} {'bytes':>8} {'com cabeçalhos':>15}")
+    per_question = []
+    for label, questions, packets, payload in rows:
+        p = packets / recipients / questions
+        b = payload / recipients / questions
+        per_question.append((p, b, b + p * overhead))
+        print(f"{label:<20} {p:>25.2f} {b:>8.0f} {b + p * overhead:>15.0f}")
+    (p0, b0, w0), (p1, b1, w1) = per_question
+    print(f"Economia por cliente por pergunta: {p0 - p1:.2f} pacotes, {w0 - w1:.0f} bytes com cabeçalhos "
+          f"({b0 - b1:+.0f} bytes de payload); na sala: {(p0 - p1) * recipients:.0f} pacotes por pergunta")
+    for line in quiz_app.metrics.REGISTRY.render().splitlines():
+        if line.startswith('quiz_batch_'):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Custo dos checkpoints das salas e tempo de restaurá-las, com 1.000 salas.
+
+Monta N salas com o quiz na 1ª pergunta (metade dos jogadores já respondeu,
+pontuações diferentes de zero) e mede, com o escritor de checkpoint.py:
+  completo     primeiro checkpoint, com todas as salas alteradas: tempo no loop
+               do servidor (fotos, com o lock de cada sala), maior tempo com um
+               lock em mãos, tempo de gravação (na thread do escritor) e bytes
+  incremental  checkpoint seguinte, com 10% das salas alteradas
+  ocioso       checkpoint sem nenhuma sala alterada
+Depois restaura o arquivo num processo novo (como o servidor ao subir) e
+confere salas, pontuações, respostas e prazos reagendados.
+
+Uso:
+    python benchmarks/bench_checkpoint.py [--rooms 1000] [--players 30]
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ['QUIZ_EVENTS_DIR'] = 'off'
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+logging.disable(logging.CRITICAL)
+
+
+def build_rooms(quiz_app, rooms, players):
+    from leaderboard import Leaderboard
+    from room_state import GameState, PlayerState, RoomState
+    pins = []
+    for r in range(rooms):
+        members = {f"sid-{r}-{i}": PlayerState(f"Aluno{i:02d}", batch_frames=True, session=quiz_app._new_session())
+                   for i in range(players + 1)}
+        host_sid = next(iter(members))
+        pin = quiz_app._register_room(RoomState(host_sid, "Professor", "desafio1", members, Leaderboard(),
+                                                GameState(quiz_app.TIME_PER_QUESTION)))
+        with quiz_app._locked_room(pin) as room:
+            quiz_app._start_quiz_logic(pin)
+            answer(quiz_app, room, list(room.players.items())[1::2])
+        pins.append(pin)
+    return pins
+
+
+def answer(quiz_app, room, players):
+    # O que o submit_answer faz com uma resposta certa, sem o cliente de teste
+    gs = room.game_state
+    for sid, player in players:
+        if player.has_answered(gs.question_gen): continue
+        player.answer(gs.current_question_index, 0, True, 100 + len(player.nickname), gs.question_gen)
+        gs.answered += 1
+        room.leaderboard.update(sid, player.score)
+
+
+def expected_state(quiz_app, pins):
+    scores = answered = 0
+    for pin in pins:
+        with quiz_app._locked_room(pin, touch=False) as room:
+            gs = room.game_state
+            scores += sum(p.score for p in room.players.values())
+            answered += sum(p.has_answered(gs.question_gen) for p in room.players.values())
+    return scores, answered
+
+
+def checkpoint(quiz_app, room_checkpoint):
+    written, size = room_checkpoint.rooms_written, room_checkpoint.bytes_written
+    room_checkpoint.start()
+    start = time.perf_counter()
+    rooms = quiz_app._checkpoint_rooms()
+    in_loop = time.perf_counter() - start
+    room_checkpoint.close()   # Espera o escritor gravar
+    return (rooms, in_loop, room_checkpoint.last_write_seconds if rooms else 0.0,
+            room_checkpoint.rooms_written - written, room_checkpoint.bytes_written - size)
+
+
+def restore_child(path):
+    """Executado no subprocesso: restaura o checkpoint e imprime o resultado em JSON."""
+    start = time.perf_counter()
+    import app as quiz_app
+    from checkpoint import RoomCheckpoint
+    imported = time.perf_counter() - start
+    quiz_app.room_checkpoint = RoomCheckpoint(path)
+    start = time.perf_counter()
+    restored = quiz_app._restore_rooms()
+    elapsed = time.perf_counter() - start
+    scores = answered = timers = 0
+    remaining = []
+    now = time.time()
+    for pin in list(quiz_app.rooms_data):
+        with quiz_app._locked_room(pin, touch=False) as room:
+            gs = room.game_state
+            records = list(room.players.values()) + [p for _, p in room.detached.values()]
+            scores += sum(p.score for p in records)
+            answered += sum(p.has_answered(gs.question_gen) for p in records)
+            remaining.append(gs.timer["deadline_at"] - now)
+    timers = quiz_app.deadline_scheduler.pending_count()
+    print(json.dumps({"restored": restored, "elapsed": elapsed, "import": imported, "scores": scores,
+                      "answered": answered, "timers": timers, "remaining": [min(remaining), max(remaining)],
+                      "problems": quiz_app.check_sid_index_consistency()[:3]}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--players', type=int, default=30)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        restore_child(args.child)
+        return
+
+    import app as quiz_app
+    from checkpoint import RoomCheckpoint
+    path = os.path.join(tempfile.mkdtemp(prefix='quiz-checkpoint-'), 'salas.db')
+    room_checkpoint = quiz_app.room_checkpoint = RoomCheckpoint(path)
+    start = time.perf_counter()
+    pins = build_rooms(quiz_app, args.rooms, args.players)
+    print(f"{args.rooms} salas x {args.players + 1} jogadores montadas em {time.perf_counter() - start:.1f} s, "
+          f"quiz na 1ª pergunta, metade dos jogadores já respondeu")
+
+    holds = []
+    for pin in pins:
+        room = quiz_app.rooms_data[pin]
+        start = time.perf_counter()
+        pickle.dumps(room, pickle.HIGHEST_PROTOCOL)
+        holds.append(time.perf_counter() - start)
+    holds.sort()
+
+    print(f"{'checkpoint':<12} {'salas':>6} {'no loop (ms)':>13} {'gravação (ms)':>14} {'KiB':>8}")
+    rows = [("completo", checkpoint(quiz_app, room_checkpoint))]
+    for pin in pins[::10]:
+        with quiz_app._locked_room(pin) as room:
+            answer(quiz_app, room, list(room.players.items())[2::2][:1])
+    rows.append(("incremental", checkpoint(quiz_app, room_checkpoint)))
+    rows.append(("ocioso", checkpoint(quiz_app, room_checkpoint)))
+    for label, (rooms, in_loop, write, _, size) in rows:
+        print(f"{label:<12} {rooms:>6} {in_loop * 1e3:>13.1f} {write * 1e3:>14.1f} {size / 1024:>8.0f}")
+    print(f"Lock de cada sala durante a foto: mediana {holds[len(holds) // 2] * 1e6:.0f} µs, "
+          f"máximo {holds[-1] * 1e6:.0f} µs; arquivo com {os.path.getsize(path) / 1024:.0f} KiB")
+
+    scores, answered = expected_state(quiz_app, pins)
+    env = dict(os.environ, QUIZ_ASYNC_MODE='threading', QUIZ_EVENTS_DIR='off')
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', path],
+                          env=env, capture_output=True, text=True, cwd=APP_DIR)
+    if proc.returncode:
+        sys.exit(proc.stderr[-2000:])
+    r = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"\nRestauração num processo novo: {r['restored']} salas em {r['elapsed'] * 1e3:.0f} ms "
+          f"(import do app: {r['import'] * 1e3:.0f} ms), {r['timers']} prazos reagendados, "
+          f"restando de {r['remaining'][0]:.1f} a {r['remaining'][1]:.1f} s")
+    ok = (r['restored'] == args.rooms and r['scores'] == scores and r['answered'] == answered
+          and r['timers'] == args.rooms and not r['problems'])
+    if not ok:
+        print(f"ERRO: pontos {r['scores']} (esperado {scores}), respostas {r['answered']} (esperado {answered}), "
+              f"índice: {r['problems']}")
+        sys.exit(1)
+    print("Salas, pontuações, respostas da pergunta atual e prazos conferem com o estado antes do checkpoint.")
+
+
+if __name__ == '__main__':
+    main()
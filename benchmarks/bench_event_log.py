@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Vazão do log de eventos e conferência de que um disco lento não trava os handlers.
+
+Vazão: um produtor chama record() N vezes e mede-se o tempo até o escritor
+gravar tudo (close()), com e sem fsync, contra a gravação síncrona de antes de
+haver group commit (um write + fsync por evento, dentro do handler).
+
+Contrapressão: salas jogam o quiz pelo cliente de teste com o log trocado por
+um cujo "disco" leva --stall s por lote e cuja fila aceita só --max-pending
+eventos. A latência do submit_answer tem de continuar na ordem da medida sem
+log (nenhum handler pode esperar pelo disco) e os eventos excedentes têm de ser
+descartados e contados. Sai com código 1 se isso não acontecer.
+
+Uso:
+    python benchmarks/bench_event_log.py [--events 200000] [--rooms 5] [--players 20] [--stall 0.5]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ.setdefault('QUIZ_RATE_LIMITS', '0')   # Os clientes de teste respondem as perguntas em sequência, sem pausa
+os.environ['QUIZ_EVENTS_DIR'] = 'off'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+from event_log import EventLog, NullEventLog, read_events  # noqa: E402
+
+
+class SlowDiskEventLog(EventLog):
+    """Cada lote demora `stall` s para "chegar ao disco"."""
+
+    def __init__(self, directory, stall, **kwargs):
+        super().__init__(directory, **kwargs)
+        self.stall = stall
+
+    def _commit(self, batch):
+        time.sleep(self.stall)
+        super()._commit(batch)
+
+
+def _answer(i):
+    return {"room": "ABCDE", "player": f"J{i % 500}", "sid": f"sid{i % 500:020d}", "question": f"q{i % 18}",
+            "option": f"q{i % 18}_opt2", "correct": i % 3 == 0, "points": 120, "score": i,
+            "skill": "BICT - Lógica de Programação", "difficulty": "Médio"}
+
+
+def throughput(events, fsync):
+    directory = tempfile.mkdtemp(prefix='quiz-eventos-')
+    try:
+        # Fila do tamanho da medida: aqui interessa a vazão do escritor, não o descarte
+        log = EventLog(directory, fsync=fsync, max_pending=events).start()
+        fields = [_answer(i) for i in range(events)]
+        start = time.perf_counter()
+        for f in fields:
+            log.record("answer", **f)
+        enqueued = time.perf_counter() - start
+        log.close()
+        elapsed = time.perf_counter() - start
+        assert log.written == events and log.dropped == 0, (log.written, log.dropped)
+        assert len(read_events(directory)[0]) == events
+        return events / elapsed, enqueued / events, log.written / log.batches
+    finally:
+        shutil.rmtree(directory)
+
+
+def synchronous(events, fsync):
+    """Gravação de antes do group commit: um write (e fsync) por evento, no próprio handler."""
+    directory = tempfile.mkdtemp(prefix='quiz-eventos-')
+    try:
+        fields = [dict(_answer(i), t=time.time(), ev="answer") for i in range(events)]
+        start = time.perf_counter()
+        with open(os.path.join(directory, 'eventos.jsonl'), 'ab') as f:
+            for event in fields:
+                f.write((json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+        elapsed = time.perf_counter() - start
+        return events / elapsed, elapsed / events
+    finally:
+        shutil.rmtree(directory)
+
+
+def _last(messages, name):
+    found = [m for m in messages if m['name'] == name]
+    return found[-1]['args'][0] if found else None
+
+
+def play(rooms, players):
+    """Joga o quiz inteiro em `rooms` salas; devolve as latências de cada submit_answer."""
+    latencies = []
+    for _ in range(rooms):
+        host = quiz_app.socketio.test_client(quiz_app.app)
+        host.emit('create_room', {'nickname': 'Host', 'challengeType': 'desafio1'})
+        pin = _last(host.get_received(), 'room_created')['roomPin']
+        clients = [host]
+        for i in range(players - 1):
+            c = quiz_app.socketio.test_client(quiz_app.app)
+            c.emit('join_room_pin', {'nickname': f'J{i}', 'roomPin': pin})
+            clients.append(c)
+        for c in clients:
+            c.get_received()
+        host.emit('start_quiz_for_room', {'roomPin': pin})
+        question = _last(host.get_received(), 'new_question')
+        while question:
+            for c in clients[1:]:
+                c.get_received()
+            for c in clients:
+                t0 = time.perf_counter()
+                c.emit('submit_answer', {'roomPin': pin, 'questionId': question['question']['id'],
+                                         'selectedOptionId': 'a'})
+                latencies.append(time.perf_counter() - t0)
+            question = _last(host.get_received(), 'new_question')
+        for c in clients:
+            c.disconnect()
+    return latencies
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--sync-events', type=int, default=5000, help='eventos na medida síncrona com fsync')
+    parser.add_argument('--rooms', type=int, default=5)
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--stall', type=float, default=0.5, help='segundos por lote no disco lento')
+    parser.add_argument('--max-pending', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'gravação':<34} {'eventos/s':>11} {'µs no handler':>14} {'eventos/lote':>13}")
+    for fsync in (True, False):
+        rate, per_event, per_batch = throughput(args.events, fsync)
+        print(f"{'group commit, fsync ' + ('sim' if fsync else 'não'):<34} {rate:>11,.0f} {per_event * 1e6:>14.2f} {per_batch:>13.0f}")
+    for fsync, events in ((True, args.sync_events), (False, args.events)):
+        rate, per_event = synchronous(events, fsync)
+        print(f"{'síncrono por evento, fsync ' + ('sim' if fsync else 'não'):<34} {rate:>11,.0f} {per_event * 1e6:>14.2f} {1:>13}")
+
+    print(f"\nContrapressão: {args.rooms} salas x {args.players} jogadores, disco lento ({args.stall:.1f} s/lote), "
+          f"fila de {args.max_pending} eventos")
+    quiz_app.answer_log = NullEventLog()
+    baseline = play(args.rooms, args.players)
+    directory = tempfile.mkdtemp(prefix='quiz-eventos-')
+    try:
+        slow = SlowDiskEventLog(directory, args.stall, max_pending=args.max_pending).start()
+        quiz_app.answer_log = slow
+        slowed = play(args.rooms, args.players)
+        recorded, dropped = slow.recorded, slow.dropped
+        start = time.perf_counter()
+        slow.close()
+        drain = time.perf_counter() - start
+    finally:
+        quiz_app.answer_log = NullEventLog()
+        shutil.rmtree(directory)
+
+    print(f"{'log':<18} {'respostas':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9}")
+    for label, lat in (("sem log", baseline), ("disco lento", slowed)):
+        ms = [x * 1000 for x in lat]
+        print(f"{label:<18} {len(ms):>10} {_pct(ms, 50):>9.3f} {_pct(ms, 99):>9.3f} {max(ms):>9.3f}")
+    print(f"Eventos aceitos: {recorded}, descartados: {dropped}; escritor terminou de esvaziar a fila em {drain:.1f} s")
+
+    failures = []
+    if max(slowed) >= args.stall / 2:
+        failures.append(f"um submit_answer levou {max(slowed) * 1000:.0f} ms: o handler esperou pelo disco")
+    if _pct(slowed, 99) > 3 * _pct(baseline, 99) + 0.002:
+        failures.append("p99 do submit_answer com disco lento muito acima do p99 sem log")
+    if dropped == 0:
+        failures.append("a fila do log não encheu (aumente --rooms ou diminua --max-pending)")
+    for failure in failures:
+        print("FALHA:", failure)
+    if failures:
+        sys.exit(1)
+    print("OK: nenhum handler esperou pelo disco; o excedente foi descartado e contado")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Ranking com 500 alunos respondendo a mesma pergunta em ~1 segundo.
+
+Duas medições:
+1. Micro-benchmark do ranking: a cada resposta correta, o caminho antigo
+   (lista de todos os jogadores + sorted() + top 10) contra o Leaderboard
+   incremental (update + top(10)).
+2. Sala real com o cliente de teste do Flask-SocketIO: as respostas chegam
+   espalhadas em ~1 s e são contados os pacotes/bytes de 'scores_update'
+   entregues até o fim da pergunta. Antes era um broadcast por resposta
+   (500 x 501 pacotes); agora as atualizações são agrupadas na janela de
+   SCORES_UPDATE_WINDOW e só saem quando o top 10 muda.
+
+Uso:
+    python benchmarks/bench_leaderboard.py [--players 500] [--spread 1.0]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+from bench_wire_bytes import WireCounter  # noqa: E402
+from leaderboard import Leaderboard  # noqa: E402
+from question_bank import OPTION_SHORT_IDS  # noqa: E402
+
+
+def ranking_microbench(players, rounds):
+    rng = random.Random(42)
+    sids = [f"sid{i}" for i in range(players)]
+    answers = [(sid, rng.random() < 0.7) for _ in range(rounds) for sid in rng.sample(sids, len(sids))]
+
+    # Antes: dict de jogadores e sorted() da sala inteira a cada resposta correta
+    room_players = {sid: {"nickname": sid, "score": 0} for sid in sids}
+    start = time.perf_counter()
+    for sid, correct in answers:
+        if correct:
+            room_players[sid]["score"] += 10
+            ranked = sorted(room_players.values(), key=lambda p: p["score"], reverse=True)
+            [{"nickname": p["nickname"], "score": p["score"]} for p in ranked[:10]]
+    before = time.perf_counter() - start
+    expected = sorted(room_players.values(), key=lambda p: p["score"], reverse=True)[:10]
+
+    board = Leaderboard()
+    scores = {}
+    for sid in sids:
+        board.add(sid)
+        scores[sid] = 0
+    start = time.perf_counter()
+    for sid, correct in answers:
+        if correct:
+            scores[sid] += 10
+            board.update(sid, scores[sid])
+            board.top(10)
+    after = time.perf_counter() - start
+    assert [(p["nickname"], p["score"]) for p in expected] == board.top(10)
+
+    n = sum(1 for _, c in answers if c)
+    print(f"Ranking: {players} jogadores, {n} respostas corretas")
+    print(f"  antes  (sorted + top 10)     {before / n * 1e6:9.1f} µs por resposta")
+    print(f"  depois (Leaderboard.top(10)) {after / n * 1e6:9.1f} µs por resposta")
+    print(f"  Aceleração: {before / after:.1f}x")
+
+
+def room_run(players, spread):
+    original_reset = quiz_app._reset_room_quiz_state
+
+    def long_question(room_pin):
+        original_reset(room_pin)
+        quiz_app.rooms_data[room_pin].game_state.time_per_question = spread + 30
+
+    quiz_app._reset_room_quiz_state = long_question
+
+    host = quiz_app.socketio.test_client(quiz_app.app)
+    host.emit('create_room', {'nickname': 'Professor', 'challengeType': 'desafio1'})
+    pin = [m for m in host.get_received() if m['name'] == 'room_created'][0]['args'][0]['roomPin']
+    students = []
+    for i in range(players):
+        c = quiz_app.socketio.test_client(quiz_app.app)
+        c.emit('join_room_pin', {'nickname': f'Aluno{i:03d}', 'roomPin': pin})
+        students.append(c)
+    host.emit('start_quiz_for_room', {'roomPin': pin})
+    question = [m for m in students[0].get_received() if m['name'] == 'new_question'][-1]['args'][0]['question']
+    for c in [host] + students:
+        c.get_received()
+
+    current = quiz_app.question_banks.current('desafio1')[0]
+    correct = current.correct_short_id
+    wrong = next(o for o in OPTION_SHORT_IDS[:len(current.options)] if o != correct)
+
+    counter = WireCounter(quiz_app.socketio.server)
+    counter.stop_after = 'new_question'
+    rng = random.Random(7)
+    order = rng.sample(students, len(students))
+    start = time.perf_counter()
+    for i, c in enumerate(order):
+        # Respostas espalhadas uniformemente ao longo de `spread` segundos
+        wait = start + spread * i / len(order) - time.perf_counter()
+        if wait > 0:
+            quiz_app.socketio.sleep(wait)
+        option = correct if rng.random() < 0.7 else wrong
+        c.emit('submit_answer', {'roomPin': pin, 'questionId': question['id'], 'selectedOptionId': option})
+    elapsed = time.perf_counter() - start
+    deadline = time.time() + 5
+    while counter.enabled and time.time() < deadline:
+        quiz_app.socketio.sleep(0.05)
+    counter.enabled = False
+
+    recipients = players + 1
+    print(f"Sala: {players} alunos respondendo em {elapsed:.2f} s (janela de {quiz_app.SCORES_UPDATE_WINDOW} s)")
+    print(f"  scores_update: {counter.packets['scores_update']} pacotes, {counter.bytes['scores_update']} bytes "
+          f"({counter.packets['scores_update'] // recipients} broadcasts)")
+    print(f"  antes seriam {players * recipients} pacotes (um broadcast por resposta)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--spread', type=float, default=1.0, help='segundos em que as respostas chegam')
+    parser.add_argument('--rounds', type=int, default=3, help='perguntas no micro-benchmark')
+    args = parser.parse_args()
+
+    ranking_microbench(args.players, args.rounds)
+    room_run(args.players, args.spread)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Vazão do servidor com diferentes configurações de log.
+
+Cada configuração roda num subprocesso (os logs são configurados na importação
+do app), com o stderr indo para um arquivo de verdade, como num servidor. A
+carga usa o cliente de teste do Flask-SocketIO: N clientes conectam, entram
+em salas, respondem várias perguntas e desconectam.
+
+Configurações comparadas:
+  verboso   DEBUG, log por pacote do Socket.IO, todos os eventos, escrita síncrona
+            (equivale à configuração fixa de antes)
+  info-sync INFO e amostragem de eventos, mas escrita síncrona no handler
+  padrão    INFO, amostragem de eventos e escrita pela fila (QueueHandler)
+
+Para medir o código de antes de verdade, aponte --before-dir para um checkout antigo.
+
+Uso:
+    python benchmarks/bench_logging.py [--rooms 10] [--players 20] [--rounds 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = [
+    ("verboso", {"QUIZ_LOG_LEVEL": "DEBUG", "QUIZ_SOCKETIO_LOGS": "1", "QUIZ_EVENT_LOG_SAMPLE": "1", "QUIZ_LOG_ASYNC": "0"}),
+    ("info-sync", {"QUIZ_LOG_ASYNC": "0"}),
+    ("padrão", {}),
+]
+
+
+def run_load(rooms, players, rounds):
+    """Executado no subprocesso: roda a carga e imprime o resultado em JSON."""
+    import app as quiz_app
+
+    clients_by_room = []
+    start = time.perf_counter()
+    for _ in range(rooms):
+        host = quiz_app.socketio.test_client(quiz_app.app)
+        host.emit('create_room', {'nickname': 'Professor', 'challengeType': 'desafio1'})
+        pin = [m for m in host.get_received() if m['name'] == 'room_created'][0]['args'][0]['roomPin']
+        clients = [host]
+        for i in range(players):
+            c = quiz_app.socketio.test_client(quiz_app.app)
+            c.emit('join_room_pin', {'nickname': f'Aluno{i:02d}', 'roomPin': pin})
+            clients.append(c)
+        host.emit('start_quiz_for_room', {'roomPin': pin})
+        clients_by_room.append((pin, clients))
+    setup = time.perf_counter() - start
+
+    answers = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for pin, clients in clients_by_room:
+            question = [m for m in clients[0].get_received() if m['name'] == 'new_question'][-1]['args'][0]['question']
+            for c in clients[1:]:
+                c.get_received()
+            for c in clients:
+                c.emit('submit_answer', {'roomPin': pin, 'questionId': question['id'], 'selectedOptionId': 'a'})
+                answers += 1
+    answering = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _, clients in clients_by_room:
+        for c in clients:
+            c.disconnect()
+    teardown = time.perf_counter() - start
+    print(json.dumps({"setup": setup, "answering": answering, "teardown": teardown, "answers": answers,
+                      "clients": sum(len(c) for _, c in clients_by_room)}))
+
+
+def measure(label, app_dir, env_overrides, args):
+    env = dict(os.environ, QUIZ_ASYNC_MODE='threading', QUIZ_RATE_LIMITS='0', **env_overrides)
+    with tempfile.NamedTemporaryFile(prefix='quiz-log-', suffix='.log', delete=False) as log:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--app-dir', app_dir,
+                               '--rooms', str(args.rooms), '--players', str(args.players), '--rounds', str(args.rounds)],
+                              env=env, stdout=subprocess.PIPE, stderr=log, text=True, check=True)
+    size = os.path.getsize(log.name)
+    os.unlink(log.name)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    rate = result["answers"] / result["answering"]
+    print(f"{label:<10} {rate:>12.0f} {result['setup']:>10.2f} {result['answering']:>10.2f} "
+          f"{result['teardown']:>10.2f} {size / 1024:>12.0f}")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--before-dir', help='checkout antigo do app, medido com a sua configuração fixa')
+    parser.add_argument('--app-dir', default=APP_DIR, help=argparse.SUPPRESS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, os.path.abspath(args.app_dir))
+        run_load(args.rooms, args.players, args.rounds)
+        return
+
+    print(f"{args.rooms} salas x {args.players + 1} clientes, {args.rounds} perguntas")
+    print(f"{'config':<10} {'respostas/s':>12} {'setup (s)':>10} {'resp. (s)':>10} {'saída (s)':>10} {'log (KiB)':>12}")
+    configs = list(CONFIGS)
+    if args.before_dir:
+        configs.insert(0, ("antes", {}))
+    rates = {}
+    for label, env in configs:
+        app_dir = args.before_dir if label == "antes" else APP_DIR
+        rates[label] = measure(label, app_dir, env, args)
+    baseline = rates.get("antes", rates["verboso"])
+    print(f"Padrão vs. {'antes' if 'antes' in rates else 'verboso'}: {rates['padrão'] / baseline:.1f}x respostas/s")
+
+
+if __name__ == '__main__':
+    main()
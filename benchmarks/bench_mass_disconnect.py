@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Simula uma queda em massa (ex.: Wi-Fi da escola) com milhares de desconexões.
+
+Cria N salas com M jogadores cada, faz alguns jogadores trocarem de sala e
+alguns hosts reconectarem, desconecta todo mundo em ordem aleatória e mede o
+tempo de cada 'disconnect'. O índice SID -> sala é verificado com
+check_sid_index_consistency() ao longo do processo; o script termina com
+código 1 se encontrar qualquer inconsistência.
+
+Uso:
+    python benchmarks/bench_mass_disconnect.py [--rooms 100] [--players 30]
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+
+
+def _last(messages, name):
+    found = [m for m in messages if m['name'] == name]
+    return found[-1]['args'][0] if found else None
+
+
+def _check(stage):
+    problems = quiz_app.check_sid_index_consistency()
+    status = 'ok' if not problems else f'{len(problems)} inconsistência(s)'
+    print(f"  [{stage}] salas={len(quiz_app.rooms_data)} sids indexados={len(quiz_app.sid_index)} -> {status}")
+    for p in problems[:10]:
+        print(f"    - {p}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--players', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rnd = random.Random(args.seed)
+    ok = True
+
+    print(f"Criando {args.rooms} salas com {args.players} jogadores cada...")
+    clients, pins, hosts = [], [], []
+    for r in range(args.rooms):
+        host = quiz_app.socketio.test_client(quiz_app.app)
+        host.emit('create_room', {'nickname': f'Host{r}', 'challengeType': 'desafio1'})
+        pin = _last(host.get_received(), 'room_created')['roomPin']
+        pins.append(pin)
+        hosts.append((host, pin, f'Host{r}'))
+        clients.append(host)
+        for i in range(args.players - 1):
+            c = quiz_app.socketio.test_client(quiz_app.app)
+            c.emit('join_room_pin', {'nickname': f'J{r}_{i}', 'roomPin': pin})
+            clients.append(c)
+    ok &= _check('após joins')
+
+    # Alguns jogadores trocam de sala com o mesmo SID
+    for c in rnd.sample(clients, len(clients) // 20):
+        c.emit('join_room_pin', {'nickname': 'Trocou', 'roomPin': rnd.choice(pins)})
+    ok &= _check('após trocas de sala')
+
+    # Alguns hosts caem e voltam com um SID novo
+    for host, pin, nick in rnd.sample(hosts, max(1, len(hosts) // 10)):
+        host.disconnect()
+        clients.remove(host)
+        new_host = quiz_app.socketio.test_client(quiz_app.app)
+        new_host.emit('rejoin_room_check', {'roomPin': pin, 'nickname': nick})
+        clients.append(new_host)
+    ok &= _check('após reconexão de hosts')
+
+    rnd.shuffle(clients)
+    timings = []
+    total = len(clients)
+    t_start = time.perf_counter()
+    for n, c in enumerate(clients, 1):
+        t0 = time.perf_counter()
+        c.disconnect()
+        timings.append(time.perf_counter() - t0)
+        if n % max(1, total // 4) == 0 and n < total:
+            ok &= _check(f'{n}/{total} desconectados')
+    elapsed = time.perf_counter() - t_start
+    ok &= _check('todos desconectados')
+
+    ms = sorted(t * 1000 for t in timings)
+    print(f"{total} desconexões em {elapsed:.2f}s | média {statistics.mean(ms):.3f} ms | "
+          f"p95 {ms[int(0.95 * (len(ms) - 1))]:.3f} ms | máx {ms[-1]:.3f} ms")
+    print("Índice consistente." if ok else "FALHA: índice inconsistente.")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
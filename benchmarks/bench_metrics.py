@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Custo da instrumentação do /metrics.
+
+Mede:
+  1. o custo por chamada das primitivas (contador, histograma, wrapper dos handlers);
+  2. o tempo de gerar o /metrics com muitas salas abertas;
+  3. com --before-dir, a vazão de respostas deste checkout vs. um checkout sem
+     métricas (mesma carga do bench_logging.py, num subprocesso cada).
+
+Uso:
+    python benchmarks/bench_metrics.py [--rooms 200] [--players 10] [--before-dir ../checkout-antigo]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import timeit
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metrics  # noqa: E402
+
+
+def bench_primitives(n=200000):
+    counter = metrics.Counter('bench_counter', 'x').labels()
+    histogram = metrics.Histogram('bench_histogram', 'x').labels()
+
+    def handler(data):
+        return data
+
+    instrumented = metrics.instrument_handler('bench')(handler)
+    rows = [
+        ("Counter.inc()", lambda: counter.inc()),
+        ("Histogram.observe()", lambda: histogram.observe(0.0003)),
+        ("handler sem instrumentação", lambda: handler(1)),
+        ("handler instrumentado", lambda: instrumented(1)),
+    ]
+    print(f"{'operação':<28} {'ns/chamada':>12}")
+    for label, func in rows:
+        best = min(timeit.repeat(func, number=n, repeat=5)) / n
+        print(f"{label:<28} {best * 1e9:>12.0f}")
+
+
+def bench_scrape(rooms, players):
+    import app as quiz_app
+    logging.disable(logging.CRITICAL)
+    for _ in range(rooms):
+        host = quiz_app.socketio.test_client(quiz_app.app)
+        host.emit('create_room', {'nickname': 'Professor', 'challengeType': 'desafio1'})
+        pin = [m for m in host.get_received() if m['name'] == 'room_created'][0]['args'][0]['roomPin']
+        for i in range(players):
+            c = quiz_app.socketio.test_client(quiz_app.app)
+            c.emit('join_room_pin', {'nickname': f'Aluno{i:02d}', 'roomPin': pin})
+    client = quiz_app.app.test_client()
+    client.get('/metrics')
+    n = 50
+    start = time.perf_counter()
+    for _ in range(n):
+        body = client.get('/metrics').get_data()
+    elapsed = (time.perf_counter() - start) / n
+    print(f"/metrics com {rooms} salas x {players + 1} jogadores: {elapsed * 1000:.2f} ms por coleta, {len(body) / 1024:.0f} KiB")
+    for (event,), child in sorted(metrics.EVENT_DURATION._children.items()):
+        if child.count() and event != "bench":
+            print(f"  {event}: {child.count()} chamadas, média {child._sum / child.count() * 1e6:.0f} µs por handler")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--players', type=int, default=10)
+    parser.add_argument('--before-dir', help='checkout sem métricas para comparar a vazão de respostas')
+    args = parser.parse_args()
+
+    bench_primitives()
+    print()
+    bench_scrape(args.rooms, args.players)
+    if args.before_dir:
+        import bench_logging
+        load = argparse.Namespace(rooms=10, players=20, rounds=10)
+        print()
+        print(f"{'config':<10} {'respostas/s':>12} {'setup (s)':>10} {'resp. (s)':>10} {'saída (s)':>10} {'log (KiB)':>12}")
+        # Melhor de 5 para cada checkout, alternando a ordem
+        rates = {"antes": [], "depois": []}
+        for _ in range(5):
+            rates["antes"].append(bench_logging.measure("antes", args.before_dir, {}, load))
+            rates["depois"].append(bench_logging.measure("depois", bench_logging.APP_DIR, {}, load))
+        before, after = max(rates["antes"]), max(rates["depois"])
+        print(f"Melhor de 5: antes {before:.0f}/s, depois {after:.0f}/s ({(after / before - 1) * 100:+.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
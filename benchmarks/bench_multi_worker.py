@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""Teste de carga com vários workers numa só máquina (estado compartilhado).
+
+Sobe N processos do app (eventlet) em portas diferentes, com as salas em SQLite
+(QUIZ_ROOM_STORE) e a fila de mensagens do Socket.IO em SQLite
+(QUIZ_MESSAGE_QUEUE). O host e os jogadores de cada sala ficam espalhados pelos
+workers, então create_room, join_room_pin, submit_answer e os timers só
+funcionam se o estado e os emits atravessarem os processos. Verifica que:
+  - todo cliente recebe todas as perguntas, em ordem, o quiz_ended e o seu quiz_result;
+  - na 1ª pergunta um jogador por sala não responde e o time_up chega;
+  - a pontuação final de cada jogador é a soma dos pointsEarned que ele recebeu;
+  - derrubando o worker dono do timer no meio de uma pergunta, outro worker
+    assume o prazo órfão e a sala avança (--skip-takeover pula essa parte).
+
+Uso:
+    python benchmarks/bench_multi_worker.py [--workers 3] [--rooms 4] [--players 24]
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIME_PER_QUESTION = 2
+WORKER_CODE = ("import sys, app; app.socketio.run(app.app, host='127.0.0.1', port=int(sys.argv[1]), "
+               "debug=False, use_reloader=False, log_output=False)")
+
+
+class WebSocket:
+    """Cliente WebSocket mínimo (só frames de texto), sem dependências externas.
+
+    O servidor manda o pacote OPEN do Engine.IO colado na resposta do handshake;
+    aqui o que sobra do handshake é aproveitado como início do primeiro frame.
+    """
+
+    def __init__(self, host, port, path):
+        self.sock = socket.create_connection((host, port))
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n"
+                           f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        self._buf = b''
+        while b'\r\n\r\n' not in self._buf:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("conexão fechada no handshake")
+            self._buf += chunk
+        head, self._buf = self._buf.split(b'\r\n\r\n', 1)
+        if b' 101 ' not in head.split(b'\r\n', 1)[0]:
+            raise ConnectionError(head.decode(errors='replace'))
+        self._send_lock = threading.Lock()
+
+    def _read_exact(self, n):
+        while len(self._buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("conexão fechada")
+            self._buf += chunk
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def receive(self):
+        """Próxima mensagem de texto (ou None se a conexão fechou)."""
+        try:
+            while True:
+                b0, b1 = self._read_exact(2)
+                length = b1 & 0x7f
+                if length == 126:
+                    length = struct.unpack('!H', self._read_exact(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', self._read_exact(8))[0]
+                payload = self._read_exact(length)
+                opcode = b0 & 0x0f
+                if opcode == 0x8:
+                    return None
+                if opcode == 0x9:
+                    self._send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    return payload.decode('utf-8')
+        except (ConnectionError, OSError):
+            return None
+
+    def send(self, text):
+        self._send_frame(0x1, text.encode('utf-8'))
+
+    def _send_frame(self, opcode, payload):
+        mask = os.urandom(4)
+        n = len(payload)
+        header = bytes([0x80 | opcode])
+        if n < 126:
+            header += bytes([0x80 | n])
+        elif n < 65536:
+            header += bytes([0x80 | 126]) + struct.pack('!H', n)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack('!Q', n)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        with self._send_lock:
+            self.sock.sendall(header + mask + masked)
+
+    def close(self):
+        self.sock.close()
+
+
+class QuizClient:
+    """Cliente Socket.IO mínimo (Engine.IO v4 sobre WebSocket) que responde às perguntas."""
+
+    def __init__(self, port, name, skip_questions=()):
+        self.name = name
+        self.port = port
+        self.skip_questions = set(skip_questions)
+        self.events = []            # (instante, evento, dados)
+        self.answer_latencies = []
+        self.points = 0
+        self._answer_sent_at = None
+        self._cond = threading.Condition()
+        self.ws = WebSocket('127.0.0.1', port, '/socket.io/?EIO=4&transport=websocket')
+        self.ws.sock.settimeout(10)
+        assert self.ws.receive().startswith('0')    # open do Engine.IO
+        self.ws.send('40')                          # connect no namespace /
+        assert self.ws.receive().startswith('40')
+        self.ws.sock.settimeout(None)
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def emit(self, event, data):
+        self.ws.send('42' + json.dumps([event, data]))
+
+    def _read(self):
+        while True:
+            msg = self.ws.receive()
+            if msg is None:
+                return
+            if msg == '2':
+                self.ws.send('3')   # pong
+                continue
+            if not msg or not msg.startswith('42'):
+                continue
+            event, *args = json.loads(msg[2:])
+            data = args[0] if args else None
+            now = time.perf_counter()
+            if event == 'new_question':
+                self._on_question(data)
+            elif event == 'answer_feedback':
+                self.points += data["pointsEarned"]
+                if self._answer_sent_at is not None:
+                    self.answer_latencies.append(now - self._answer_sent_at)
+            with self._cond:
+                self.events.append((now, event, data))
+                self._cond.notify_all()
+
+    def _on_question(self, data):
+        if data["questionNumber"] in self.skip_questions:
+            return
+        option = 'abcdefghij'[random.randrange(len(data["question"]["options"]))]
+        payload = {'roomPin': self.pin, 'questionId': data["question"]["id"], 'selectedOptionId': option}
+
+        def answer():
+            self._answer_sent_at = time.perf_counter()
+            try:
+                self.emit('submit_answer', payload)
+            except OSError:
+                pass    # Cliente já fechado no fim do teste
+        threading.Timer(random.uniform(0.0, 0.2), answer).start()
+
+    def wait_for(self, event, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                for _, name, data in self.events:
+                    if name == event:
+                        return data
+                if not self._cond.wait(max(0.0, deadline - time.time())):
+                    raise TimeoutError(f"{self.name}: '{event}' não chegou em {timeout}s")
+
+    def received(self, event):
+        with self._cond:
+            return [(t, data) for t, name, data in self.events if name == event]
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+def start_workers(n, base_port, tmpdir):
+    env = dict(os.environ, QUIZ_ROOM_STORE=f"sqlite:///{tmpdir}/salas.db",
+               QUIZ_MESSAGE_QUEUE=f"sqlite:///{tmpdir}/fila.db",
+               QUIZ_TIME_PER_QUESTION=str(TIME_PER_QUESTION), PYTHONUNBUFFERED='1')
+    env.pop('QUIZ_ASYNC_MODE', None)
+    workers = []
+    for i in range(n):
+        log = open(os.path.join(tmpdir, f"worker{i}.log"), 'w')
+        workers.append(subprocess.Popen([sys.executable, '-c', WORKER_CODE, str(base_port + i)],
+                                        cwd=APP_DIR, env=dict(env, QUIZ_PIN_SHARD=f"{i}/{n}"),
+                                        stdout=log, stderr=subprocess.STDOUT))
+        if i == 0:
+            time.sleep(1.0)  # o primeiro cria as tabelas do SQLite
+    for i in range(n):
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', base_port + i), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline or workers[i].poll() is not None:
+                    raise RuntimeError(f"worker {i} não subiu (veja {tmpdir}/worker{i}.log)")
+                time.sleep(0.1)
+    return workers
+
+
+def create_room(host_port, player_ports, label, skip_first=True):
+    host = QuizClient(host_port, f"{label}-host")
+    host.emit('create_room', {'nickname': f'{label}-host', 'challengeType': 'desafio1'})
+    host.pin = host.wait_for('room_created', 10)['roomPin']
+    players = []
+    for i, port in enumerate(player_ports):
+        # O último jogador não responde a 1ª pergunta: ela termina pelo timer
+        skip = (1,) if skip_first and i == len(player_ports) - 1 else ()
+        c = QuizClient(port, f"{label}-p{i}", skip_questions=skip)
+        c.pin = host.pin
+        c.emit('join_room_pin', {'nickname': f'{label}-p{i}', 'roomPin': host.pin})
+        c.wait_for('room_joined', 10)
+        players.append(c)
+    return host, players
+
+
+def check_room(host, players, total_questions):
+    problems = []
+    clients = [host] + players
+    for c in clients:
+        try:
+            c.wait_for('quiz_result', 10)
+        except TimeoutError as e:
+            problems.append(str(e))
+    results = {data["nickname"]: data["score"] for c in clients for _, data in c.received('quiz_result')[-1:]}
+    total_players = host.received('quiz_ended')[-1][1]["totalPlayers"]
+    if total_players != len(clients):
+        problems.append(f"sala {host.pin}: quiz_ended com {total_players} jogadores para {len(clients)} clientes")
+    for c in clients:
+        numbers = [d["questionNumber"] for _, d in c.received('new_question')]
+        if numbers != list(range(1, total_questions + 1)):
+            problems.append(f"{c.name}: perguntas recebidas {numbers}")
+        if not c.received('quiz_ended'):
+            problems.append(f"{c.name}: sem quiz_ended")
+        if results.get(c.name) != c.points:
+            problems.append(f"{c.name}: placar final {results.get(c.name)} != soma dos pontos {c.points}")
+        if not c.received('time_up'):
+            problems.append(f"{c.name}: sem time_up da 1ª pergunta")
+    if len(results) != len(clients):
+        problems.append(f"sala {host.pin}: {len(results)} resultados para {len(clients)} clientes")
+    return problems
+
+
+def run_takeover(workers, base_port):
+    """Host no worker 0 (dono do timer), jogadores nos outros; derruba o worker 0 durante a 1ª pergunta."""
+    ports = [base_port + 1 + i % (len(workers) - 1) for i in range(4)]
+    host, players = create_room(base_port, ports, 'takeover', skip_first=False)
+    for c in players:
+        c.skip_questions = {1}
+    host.skip_questions = {1}
+    host.emit('start_quiz_for_room', {'roomPin': host.pin})
+    players[0].wait_for('new_question', 10)
+    started = time.perf_counter()
+    workers[0].send_signal(signal.SIGKILL)
+    workers[0].wait()
+    expected = TIME_PER_QUESTION + 0.5
+    players[0].wait_for('time_up', expected + 15)
+    time_up_at = players[0].received('time_up')[0][0]
+    deadline = time.time() + 10
+    while time.time() < deadline and len(players[0].received('new_question')) < 2:
+        time.sleep(0.05)
+    advanced = len(players[0].received('new_question')) >= 2
+    print(f"Worker dono derrubado: time_up após {time_up_at - started:.2f}s "
+          f"(prazo normal {expected:.1f}s), sala {'avançou para a Q2' if advanced else 'NÃO avançou'}")
+    for c in [host] + players:
+        c.close()
+    return [] if advanced else ["takeover: sala não avançou depois do timer órfão"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--rooms', type=int, default=4)
+    parser.add_argument('--players', type=int, default=24, help='jogadores por sala (além do host)')
+    parser.add_argument('--base-port', type=int, default=5101)
+    parser.add_argument('--skip-takeover', action='store_true')
+    args = parser.parse_args()
+
+    sys.path.insert(0, APP_DIR)
+    os.environ['QUIZ_ASYNC_MODE'] = 'threading'
+    import app as quiz_app  # só para saber o número de perguntas
+    total_questions = len(quiz_app.question_banks.current('desafio1'))
+
+    tmpdir = tempfile.mkdtemp(prefix='quiz-workers-')
+    workers = start_workers(args.workers, args.base_port, tmpdir)
+    problems = []
+    try:
+        rooms = []
+        for r in range(args.rooms):
+            host_port = args.base_port + r % args.workers
+            player_ports = [args.base_port + (r + 1 + i) % args.workers for i in range(args.players)]
+            rooms.append(create_room(host_port, player_ports, f"s{r}"))
+        start = time.perf_counter()
+        for host, _ in rooms:
+            host.emit('start_quiz_for_room', {'roomPin': host.pin})
+        for host, players in rooms:
+            for c in [host] + players:
+                c.wait_for('quiz_ended', total_questions * (TIME_PER_QUESTION + 1) + 30)
+        elapsed = time.perf_counter() - start
+        for host, players in rooms:
+            problems += check_room(host, players, total_questions)
+
+        clients = [c for host, players in rooms for c in [host] + players]
+        latencies = sorted(l for c in clients for l in c.answer_latencies)
+        events = sum(len(c.events) for c in clients)
+        print(f"{args.workers} workers, {args.rooms} salas, {len(clients)} clientes, {total_questions} perguntas por sala")
+        print(f"Quizzes completos em {elapsed:.1f}s | {len(latencies)} respostas | {events} eventos recebidos")
+        print(f"submit_answer -> answer_feedback: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms | "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms | máx {latencies[-1] * 1000:.1f} ms")
+        for c in clients:
+            c.close()
+        if not args.skip_takeover and args.workers > 1:
+            problems += run_takeover(workers, args.base_port)
+    finally:
+        for w in workers:
+            if w.poll() is None:
+                w.terminate()
+        for w in workers:
+            w.wait()
+
+    if problems:
+        print(f"{len(problems)} problema(s):")
+        for p in problems[:20]:
+            print("  " + p)
+        print(f"Logs dos workers em {tmpdir}")
+        sys.exit(1)
+    print("Estado e timers consistentes entre os workers.")
+
+
+if __name__ == '__main__':
+    main()
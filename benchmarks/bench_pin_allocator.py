@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Custo de alocar um PIN de sala em função da ocupação do espaço de PINs.
+
+Compara o sorteio de antes (random.choices até achar um PIN fora de rooms_data,
+tudo com o rooms_lock em mãos) com o PinAllocator (pin_allocator.py), com 50%,
+90% e 99% dos PINs em uso. O custo do sorteio só depende da fração ocupada
+(1/(1-ocupação) tentativas em média), então o padrão é um espaço de 4
+caracteres (36^4 PINs) para caber na memória; --length 5 usa o espaço real.
+
+Também mede, a 90% de ocupação, o regime em que os PINs novos já acabaram e
+as salas abrem e fecham (PINs liberados saindo da lista de livres), conferindo
+que nenhum PIN volta antes da quarentena, e confere que as fatias de
+QUIZ_PIN_SHARD não se sobrepõem.
+
+Uso:
+    python benchmarks/bench_pin_allocator.py [--length 4] [--allocs 5000]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pin_allocator import ALPHABET, PinAllocator  # noqa: E402
+
+OCCUPANCY = (0.5, 0.9, 0.99)
+
+
+def generate_room_pin_before(rooms_data, length):
+    # generate_room_pin de antes; devolve também o número de tentativas
+    attempts = 0
+    while True:
+        attempts += 1
+        pin = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+        if pin not in rooms_data:
+            return pin, attempts
+
+
+def before(length, occupancy, allocs, rng):
+    total = len(ALPHABET) ** length
+    encode = PinAllocator(length=length)._encode
+    rooms_data = dict.fromkeys(encode(i) for i in rng.sample(range(total), int(total * occupancy)))
+    rooms_lock = threading.Lock()
+    attempts = worst = 0
+    start = time.perf_counter()
+    for _ in range(allocs):
+        with rooms_lock:
+            pin, tries = generate_room_pin_before(rooms_data, length)
+            rooms_data[pin] = None
+        attempts += tries
+        worst = max(worst, tries)
+    elapsed = time.perf_counter() - start
+    return elapsed / allocs, attempts / allocs, worst
+
+
+def after(length, occupancy, allocs):
+    allocator = PinAllocator(length=length)
+    for _ in range(int(allocator.size * occupancy)):
+        allocator.allocate()
+    start = time.perf_counter()
+    for _ in range(allocs):
+        allocator.allocate()
+    return (time.perf_counter() - start) / allocs
+
+
+def churn(length, occupancy, allocs, quarantine=600.0):
+    """Ocupação constante com os PINs novos esgotados: cada sala nova reusa um PIN liberado."""
+    now = [0.0]
+    allocator = PinAllocator(length=length, quarantine=quarantine, clock=lambda: now[0])
+    live = deque(allocator.allocate() for _ in range(allocator.size))
+    # Fecha salas até a ocupação desejada; o relógio passa da quarentena delas
+    for _ in range(allocator.size - int(allocator.size * occupancy)):
+        allocator.release(live.popleft())
+    now[0] += quarantine
+    events = []   # (momento, PIN liberado, PIN alocado)
+    start = time.perf_counter()
+    for _ in range(allocs):
+        pin = live.popleft()
+        allocator.release(pin)
+        new_pin = allocator.allocate()
+        live.append(new_pin)
+        events.append((now[0], pin, new_pin))
+        now[0] += 0.05
+    elapsed = time.perf_counter() - start
+    released_at = {}
+    for at, pin, new_pin in events:
+        released_at[pin] = at
+        assert at - released_at.get(new_pin, -quarantine) >= quarantine, "PIN reusado dentro da quarentena"
+    return elapsed / allocs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--length', type=int, default=4)
+    parser.add_argument('--allocs', type=int, default=5000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    total = len(ALPHABET) ** args.length
+    print(f"Espaço de {total} PINs ({args.length} caracteres), {args.allocs} alocações por medida")
+    print(f"{'ocupação':>9} {'antes (µs/PIN)':>15} {'tentativas (média/máx)':>23} {'PinAllocator (µs/PIN)':>22}")
+    for occupancy in OCCUPANCY:
+        per_pin, mean_tries, worst = before(args.length, occupancy, args.allocs, rng)
+        new = after(args.length, occupancy, args.allocs)
+        print(f"{occupancy:>9.0%} {per_pin * 1e6:>15.2f} {f'{mean_tries:.1f} / {worst}':>23} {new * 1e6:>22.2f}")
+    print("Antes, todo o sorteio acontecia com o rooms_lock em mãos; agora o PIN sai fora dele.")
+
+    recycled = churn(args.length, 0.9, args.allocs)
+    print(f"\n90% de ocupação sem PINs novos (fecha uma sala e abre outra com um PIN da lista de livres): "
+          f"{recycled * 1e6:.2f} µs, nenhum PIN reusado dentro da quarentena")
+
+    shards = [PinAllocator(length=args.length, shard=k, shards=4) for k in range(4)]
+    pins = [{a.allocate() for _ in range(min(a.size, 20000))} for a in shards]
+    assert len(set().union(*pins)) == sum(len(p) for p in pins), "fatias com PINs em comum"
+    print(f"4 fatias (QUIZ_PIN_SHARD=k/4): {sum(len(p) for p in pins)} PINs alocados, nenhum repetido entre fatias")
+
+
+if __name__ == '__main__':
+    main()
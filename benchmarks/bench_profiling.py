@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Custo dos perfis sob demanda (profiling.py), desligados e ligados.
+
+Mede:
+  1. o custo por chamada do wrapper dos handlers: o de antes (sem o teste do
+     span_recorder), o atual com o perfil desligado e com um perfil 'spans';
+  2. a vazão de respostas no processo (salas com o quiz em andamento, todos os
+     jogadores respondendo a cada rodada) sem perfil, com 'spans' e com o
+     amostrador ('sample', a cada 5 ms), melhor de 3 alternando a ordem, e
+     mostra os caminhos mais caros gravados pelo perfil 'spans'.
+O 'cprofile' só roda com eventlet ou asyncio (QUIZ_ASYNC_MODE=eventlet ou asyncio).
+
+Uso:
+    python benchmarks/bench_profiling.py [--rooms 10] [--players 20] [--rounds 10]
+"""
+import argparse
+import inspect
+import logging
+import os
+import sys
+import tempfile
+import time
+import timeit
+from functools import wraps
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ.setdefault('QUIZ_RATE_LIMITS', '0')   # Os clientes de teste respondem as perguntas em sequência, sem pausa
+os.environ['QUIZ_EVENTS_DIR'] = 'off'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+import metrics  # noqa: E402
+import profiling  # noqa: E402
+
+
+def instrument_handler_before(event):
+    # metrics.instrument_handler de antes dos perfis (sem o teste do span_recorder)
+    errors, duration = metrics.EVENT_ERRORS.labels(event), metrics.EVENT_DURATION.labels(event)
+
+    def decorator(handler):
+        params = inspect.signature(handler).parameters.values()
+        varargs = any(p.kind == p.VAR_POSITIONAL for p in params)
+        nargs = len(params)
+
+        @wraps(handler)
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return handler(*args) if varargs else handler(*args[:nargs])
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def bench_wrapper(n=200000):
+    def handler(data):
+        return data
+
+    before = instrument_handler_before('bench')(handler)
+    instrumented = metrics.instrument_handler('bench')(handler)
+    recorder = profiling.SpanRecorder()
+
+    def with_spans():
+        metrics.span_recorder = recorder
+        try:
+            return min(timeit.repeat(lambda: instrumented(1), number=n, repeat=5)) / n
+        finally:
+            metrics.span_recorder = None
+
+    rows = [
+        ("wrapper de antes", min(timeit.repeat(lambda: before(1), number=n, repeat=5)) / n),
+        ("wrapper, perfil desligado", min(timeit.repeat(lambda: instrumented(1), number=n, repeat=5)) / n),
+        ("wrapper, perfil 'spans'", with_spans()),
+    ]
+    print(f"{'operação':<28} {'ns/chamada':>12}")
+    for label, best in rows:
+        print(f"{label:<28} {best * 1e9:>12.0f}")
+
+
+def answer_rate(rooms, players, rounds):
+    """Respostas/s de `rooms` salas com `players` alunos respondendo `rounds` perguntas."""
+    clients_by_room = []
+    for _ in range(rooms):
+        host = quiz_app.socketio.test_client(quiz_app.app)
+        host.emit('create_room', {'nickname': 'Professor', 'challengeType': 'desafio1'})
+        pin = [m for m in host.get_received() if m['name'] == 'room_created'][0]['args'][0]['roomPin']
+        clients = [host]
+        for i in range(players):
+            c = quiz_app.socketio.test_client(quiz_app.app)
+            c.emit('join_room_pin', {'nickname': f'Aluno{i:02d}', 'roomPin': pin})
+            clients.append(c)
+        host.emit('start_quiz_for_room', {'roomPin': pin})
+        clients_by_room.append((pin, clients))
+
+    answers, elapsed = 0, 0.0
+    for _ in range(rounds):
+        for pin, clients in clients_by_room:
+            with quiz_app._locked_room(pin, touch=False):
+                question = quiz_app._get_current_question_for_room(pin)
+            for c in clients:
+                c.get_received()
+            start = time.perf_counter()
+            for c in clients:
+                c.emit('submit_answer', {'roomPin': pin, 'questionId': question.short_id, 'selectedOptionId': 'a'})
+            elapsed += time.perf_counter() - start
+            answers += len(clients)
+    for _, clients in clients_by_room:
+        for c in clients:
+            c.disconnect()
+    return answers / elapsed
+
+
+def bench_throughput(args):
+    profiler = quiz_app.profiler
+    profiler.out_dir = tempfile.mkdtemp(prefix='quiz-perfis-')
+    configs = [("desligado", None), ("spans", 'spans'), ("sample 5 ms", 'sample')]
+    rates = {label: [] for label, _ in configs}
+    spans_file = None
+    answer_rate(args.rooms, args.players, args.rounds)   # Aquecimento (banco de questões, caches)
+    for attempt in range(3):
+        for label, mode in (configs if attempt % 2 == 0 else configs[::-1]):
+            if mode:
+                profiler.start(mode, profiling.MAX_SECONDS)
+            rates[label].append(answer_rate(args.rooms, args.players, args.rounds))
+            if mode:
+                path = profiler.stop(mode)
+                if mode == 'spans':
+                    spans_file = path
+    quiz_app.socketio.sleep(0.1)   # O amostrador grava o arquivo ao sair
+    base = max(rates["desligado"])
+    print(f"{'perfil':<14} {'respostas/s':>12} {'vs. desligado':>14}")
+    for label, _ in configs:
+        best = max(rates[label])
+        print(f"{label:<14} {best:>12.0f} {(best / base - 1) * 100:>+13.1f}%")
+    with open(spans_file, encoding='utf-8') as f:
+        lines = [line.rsplit(' ', 1) for line in f.read().splitlines()]
+    print(f"\nCaminhos com mais tempo próprio no perfil 'spans' ({spans_file}):")
+    for path, micros in sorted(lines, key=lambda line: -int(line[1]))[:5]:
+        print(f"  {int(micros) / 1e3:>9.1f} ms  {path}")
+    print(f"Arquivos em {profiler.out_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    bench_wrapper()
+    print()
+    print(f"{args.rooms} salas x {args.players + 1} jogadores, {args.rounds} rodadas de respostas, melhor de 3")
+    bench_throughput(args)
+
+
+if __name__ == '__main__':
+    main()
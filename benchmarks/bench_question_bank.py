@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Custo dos bancos de questões em disco em função do tamanho do banco.
+
+Para bancos sintéticos de vários tamanhos (um desafio .jsonl cada), mede:
+  startup   importação do app com QUIZ_QUESTION_BANKS apontando para o banco
+            (subprocesso; o banco só é lido no primeiro uso, então não cresce)
+  1º uso    leitura + índices na primeira chamada de current()
+  memória   memória alocada pela versão carregada (tracemalloc)
+  consulta  select() por área + dificuldade
+  sorteio   draw() de --draw questões entre 3 áreas e 2 dificuldades (estratificado, com semente),
+            contra copiar as questões do filtro numa lista e embaralhá-la (cópia)
+  current() chamada no caminho quente (sem conferir o arquivo)
+  recarga   current() depois de o arquivo mudar (nova versão copy-on-write)
+  pausa     maior intervalo entre dois ticks de 5 ms do loop do eventlet enquanto a recarga
+            roda em background, com o parse no próprio loop e no tpool (subprocesso)
+
+Uso:
+    python benchmarks/bench_question_bank.py [--sizes 100,1000,10000,100000] [--draw 20]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from question_bank import QuestionBankStore  # noqa: E402
+
+SKILLS = [f"Área {i}" for i in range(12)]
+DIFFICULTIES = ["Muito Fácil", "Fácil", "Médio", "Difícil"]
+
+
+def write_bank(path, size, seed=7):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(size):
+            qid = f"q{i}"
+            options = [{"id": f"{qid}_opt{j}", "text": f"Alternativa {j} da questão {i}"} for j in range(1, 5)]
+            f.write(json.dumps({"id": qid, "text": f"Enunciado da questão {i}: " + "texto " * 12,
+                                "options": options, "correctOptionId": f"{qid}_opt{rng.randint(1, 4)}",
+                                "skillArea": rng.choice(SKILLS), "difficulty": rng.choice(DIFFICULTIES)},
+                               ensure_ascii=False) + '\n')
+
+
+def startup_time(directory):
+    code = ("import sys, time; sys.path.insert(0, sys.argv[1]); start = time.perf_counter(); "
+            "import app; print(time.perf_counter() - start)")
+    env = dict(os.environ, QUIZ_ASYNC_MODE='threading', QUIZ_QUESTION_BANKS=directory, QUIZ_LOG_LEVEL='WARNING')
+    out = subprocess.run([sys.executable, '-c', code, APP_DIR], env=env, check=True,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def loop_pause(directory, run_blocking):
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); import eventlet; eventlet.monkey_patch(); "
+            "import bench_question_bank as b; b.loop_pause_child(sys.argv[2], sys.argv[3])")
+    out = subprocess.run([sys.executable, '-c', code, os.path.dirname(os.path.abspath(__file__)), directory, run_blocking],
+                         check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def loop_pause_child(directory, run_blocking):
+    """No subprocesso, já com o monkey_patch: recarga em background com um tick de 5 ms rodando."""
+    import eventlet
+    from eventlet import tpool
+    store = QuestionBankStore(directory, check_interval=0, start_task=eventlet.spawn,
+                              run_blocking=tpool.execute if run_blocking == 'tpool' else None)
+    old = store.current('bench')
+    gaps, done = [], []
+
+    def tick():
+        last = time.perf_counter()
+        while not done:
+            eventlet.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticker = eventlet.spawn(tick)
+    eventlet.sleep(0.05)
+    with open(os.path.join(directory, 'bench.jsonl'), 'a', encoding='utf-8') as f:
+        f.write('# edição no subprocesso\n')
+    store.current('bench')
+    while store.current('bench') is old:
+        eventlet.sleep(0.005)
+    done.append(True)
+    ticker.wait()
+    print(max(gaps))
+
+
+def copy_and_shuffle(bank, count, skill_areas, difficulties, seed):
+    """Sorteio ingênuo: lista com as questões do filtro, embaralhada inteira."""
+    questions = [q for q in bank if q.skill_area in skill_areas and q.difficulty in difficulties]
+    random.Random(seed).shuffle(questions)
+    return questions[:count]
+
+
+def measure(size, draw_count):
+    directory = tempfile.mkdtemp(prefix='quiz-banco-')
+    try:
+        path = os.path.join(directory, 'bench.jsonl')
+        write_bank(path, size)
+        file_kib = os.path.getsize(path) / 1024
+        startup = startup_time(directory)
+
+        store = QuestionBankStore(directory)
+        start = time.perf_counter()
+        bank = store.current('bench')
+        first_use = time.perf_counter() - start
+
+        tracemalloc.start()
+        measured = QuestionBankStore(directory).current('bench')
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del measured
+
+        n = 20000
+        query = min(timeit.repeat(lambda: bank.select(SKILLS[3], "Médio"), number=n, repeat=5)) / n
+        hot = min(timeit.repeat(lambda: store.current('bench'), number=n, repeat=5)) / n
+        skill_areas, difficulties = SKILLS[:3], ["Médio", "Difícil"]
+        drawn = bank.draw(draw_count, skill_areas, difficulties, seed=11)
+        assert drawn == bank.draw(draw_count, skill_areas, difficulties, seed=11)   # Reprodutível
+        assert len(set(drawn)) == len(drawn) == min(draw_count, bank.pool_size(skill_areas, difficulties))
+        assert all(bank[p].skill_area in skill_areas and bank[p].difficulty in difficulties for p in drawn)
+        m = 2000
+        sample = min(timeit.repeat(lambda: bank.draw(draw_count, skill_areas, difficulties, seed=11),
+                                   number=m, repeat=5)) / m
+        m = max(1, 200000 // size)
+        copied = min(timeit.repeat(lambda: copy_and_shuffle(bank, draw_count, skill_areas, difficulties, 11),
+                                   number=m, repeat=3)) / m
+
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('# edição\n')
+        store.check_interval = 0
+        start = time.perf_counter()
+        new_bank = store.current('bench')
+        reload_time = time.perf_counter() - start
+        assert new_bank.version != bank.version and len(new_bank) == len(bank)
+        pauses = [loop_pause(directory, mode) for mode in ('inline', 'tpool')]
+        return file_kib, startup, first_use, memory, query, hot, sample, copied, reload_time, pauses
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000,100000')
+    parser.add_argument('--draw', type=int, default=20, help='questões por sorteio')
+    args = parser.parse_args()
+
+    print(f"{'questões':>9} {'arquivo':>10} {'startup':>9} {'1º uso':>9} {'memória':>10} "
+          f"{'consulta':>10} {'current()':>10} {'sorteio':>10} {'cópia':>10} {'recarga':>9} {'pausa (loop / tpool)':>21}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        file_kib, startup, first_use, memory, query, hot, sample, copied, reload_time, pauses = measure(size, args.draw)
+        print(f"{size:>9} {file_kib / 1024:>7.1f} MB {startup:>7.2f} s {first_use * 1000:>6.0f} ms "
+              f"{memory / 2**20:>7.1f} MB {query * 1e6:>7.2f} µs {hot * 1e9:>7.0f} ns {sample * 1e6:>7.1f} µs "
+              f"{copied * 1000:>7.2f} ms {reload_time * 1000:>6.0f} ms {pauses[0] * 1000:>9.0f} / {pauses[1] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark da montagem do payload de 'new_question'.
+
+Compara o caminho antigo (to_client_dict() + dict do payload + json.dumps a
+cada envio) com o payload pré-serializado do cache (_question_payload), ambos
+passando pela codificação do pacote Socket.IO como acontece num emit.
+
+Uso:
+    python benchmarks/bench_question_payloads.py [--iterations 20000]
+"""
+import argparse
+import logging
+import os
+import sys
+import timeit
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+from socketio import packet  # noqa: E402
+
+
+def _encode(data):
+    # Mesma classe de pacote (e módulo JSON) que o servidor usa nos emits
+    return quiz_app.socketio.server.packet_class(packet.EVENT, data=['new_question', data]).encode()
+
+
+def build_before(bank, idx, time_limit):
+    payload = {"question": bank[idx].to_client_dict(), "questionNumber": idx + 1,
+               "totalQuestions": len(bank), "timeLimit": time_limit}
+    return _encode(payload)
+
+
+def build_after(bank, idx, time_limit):
+    return _encode(quiz_app._question_payload(bank, idx, idx + 1, len(bank), time_limit))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    banks = [quiz_app.question_banks.current(c) for c in quiz_app.question_banks.challenges()]
+    keys = [(bank, i, 20) for bank in banks for i in range(len(bank))]
+    for key in keys:
+        assert quiz_app.wire_json.loads(build_before(*key)[1:]) == quiz_app.wire_json.loads(build_after(*key)[1:])
+
+    def run(fn):
+        n = 0
+        for _ in range(args.iterations // len(keys) + 1):
+            for key in keys:
+                fn(*key)
+                n += 1
+        return n
+
+    results = {}
+    for label, fn in (("antes (dict + json)", build_before), ("depois (cache PreEncoded)", build_after)):
+        n = run(fn)  # aquecimento
+        elapsed = min(timeit.repeat(lambda: run(fn), number=1, repeat=5))
+        results[label] = elapsed / n * 1e6
+        print(f"{label:<28} {results[label]:8.2f} µs por envio ({n} envios)")
+    before, after = results.values()
+    print(f"Aceleração: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
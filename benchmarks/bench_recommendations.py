@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Custo das recomendações do fim do quiz por 1.000 jogadores.
+
+Compara o cálculo de antes (uma chamada por jogador, remontando o dicionário de
+cursos e a contagem com defaultdict a cada vez) com o do _deliver_results:
+recommend_skills sobre o answer_summary dos arrays de respostas de cada
+jogador, com os textos em cache. Antes de medir, confere que os textos são
+idênticos, inclusive nos empates entre áreas.
+
+Uso:
+    python benchmarks/bench_recommendations.py [--players 1000] [--questions 18]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import recommendation  # noqa: E402
+from room_state import PlayerState, answer_summary  # noqa: E402
+
+
+def recommend_before(player_answers):
+    """Cálculo de antes, por jogador (o dicionário de cursos era recriado a cada chamada)."""
+    if not player_answers: return "Nenhuma resposta registrada."
+    correct_skill_counts = defaultdict(int)
+    for q_id, answer_data in player_answers.items():
+        if answer_data.get('is_correct'):
+            skill = answer_data.get('skill')
+            if skill: correct_skill_counts[skill] += 1
+    if not correct_skill_counts: return "Nenhum acerto para sugerir área."
+    best_skill_area = max(correct_skill_counts, key=correct_skill_counts.get)
+    course_suggestions = dict(recommendation.COURSE_SUGGESTIONS)
+    suggestion_text = f"Você se destacou em '{best_skill_area}'. "
+    suggestion_text += f"Cursos como {course_suggestions.get(best_skill_area, 'áreas relacionadas')} podem ser interessantes."
+    sorted_correct_skills = sorted(correct_skill_counts.items(), key=lambda item: item[1], reverse=True)
+    top_skills_info = "; ".join([f"{s[0]}: {s[1]} acerto(s)" for s in sorted_correct_skills[:3]])
+    return f"{suggestion_text} Suas áreas de destaque: {top_skills_info}."
+
+
+def make_room(players, questions, seed=3):
+    """Respostas de cada jogador no formato de antes (player["answers"]) e nos arrays do PlayerState.
+
+    As áreas se repetem entre as perguntas para forçar empates. Retorna
+    (respostas de antes, registros dos jogadores, área de cada pergunta).
+    """
+    rng = random.Random(seed)
+    skill_names = list(recommendation.COURSE_SUGGESTIONS)[:questions // 2] + ["Área sem curso"]
+    skills = tuple(rng.choice(skill_names) for _ in range(questions))
+    before, players_state = [], []
+    for p in range(players):
+        answered = rng.randint(0, questions) if p % 10 == 0 else questions
+        skill_rate = rng.random()
+        player, answers = PlayerState(f"Aluno{p}"), {}
+        player.start_quiz(questions)
+        for pos in range(answered):
+            correct = rng.random() < skill_rate
+            player.answer(pos, 0, correct, 100, pos)
+            answers[f"q{pos}"] = {"answer_id": "x", "is_correct": correct, "skill": skills[pos], "points_earned": 100}
+        before.append(answers)
+        players_state.append(player)
+    return before, players_state, skills
+
+
+def recommend_now(players, skills):
+    """O cálculo do _deliver_results."""
+    return [recommendation.recommend_skills(*answer_summary(p.choices, skills)) for p in players]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=18)
+    args = parser.parse_args()
+
+    room, players, skills = make_room(args.players, args.questions)
+    assert recommend_now(players, skills) == [recommend_before(answers) for answers in room]
+
+    print(f"{args.players} jogadores x {args.questions} perguntas; textos idênticos aos de antes")
+    print(f"{'cálculo':<22} {'ms por 1.000 jogadores':>24}")
+    results = {}
+    for label, run in (("antes (por jogador)", lambda: [recommend_before(a) for a in room]),
+                       ("recommend_skills", lambda: recommend_now(players, skills))):
+        best = min(timeit.repeat(run, number=5, repeat=7)) / 5
+        results[label] = best / args.players * 1000
+        print(f"{label:<22} {results[label] * 1000:>24.2f}")
+    before, after = results.values()
+    print(f"Aceleração: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Salas e memória retidas por uma instância de longa duração, com e sem o ciclo de vida.
+
+A cada rodada são abertas --rooms salas pelo cliente de teste, em partes iguais:
+  encerrada  quiz jogado até o fim (com resultados), host e jogadores conectados
+  órfã       jogadores esperando um host que desconectou e não voltou
+  ociosa     sala criada e nunca iniciada
+e a varredura do ciclo de vida roda (como faria a cada ROOM_SWEEP_INTERVAL s).
+Compara três configurações: sem despejo (comportamento de antes), prazos curtos
+(--ttl s para as três categorias) e só o limite de salas (--max-rooms).
+A memória medida é a alocada (tracemalloc) pelo código das salas (app.py, room_state.py,
+leaderboard.py, recommendation.py) e ainda viva, sem os clientes de teste;
+ao lado, a estimativa publicada em quiz_rooms_memory_bytes.
+
+Também mede o custo da varredura com --sweep-rooms salas abertas.
+
+Uso:
+    python benchmarks/bench_room_lifecycle.py [--rounds 8] [--rooms 30] [--players 5] [--ttl 0.3] [--max-rooms 60]
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ.setdefault('QUIZ_RATE_LIMITS', '0')   # Os clientes de teste respondem as perguntas em sequência, sem pausa
+os.environ['QUIZ_EVENTS_DIR'] = 'off'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+quiz_app.CAPACITY_EVICTION_INTERVAL = 0   # As salas são abertas em sequência, sem pausa
+from leaderboard import Leaderboard  # noqa: E402
+from room_lifecycle import RoomLifecycle, estimate_bytes  # noqa: E402
+from room_state import RoomState, GameState, PlayerState  # noqa: E402
+
+INF = float('inf')
+ROOM_CODE = [tracemalloc.Filter(True, os.path.join('*', name)) for name in ('app.py', 'room_state.py', 'leaderboard.py', 'recommendation.py')]
+
+
+def _last(messages, name):
+    found = [m for m in messages if m['name'] == name]
+    return found[-1]['args'][0] if found else None
+
+
+def _open_room(kind, players):
+    host = quiz_app.socketio.test_client(quiz_app.app)
+    host.emit('create_room', {'nickname': 'Host', 'challengeType': 'desafio1'})
+    pin = _last(host.get_received(), 'room_created')['roomPin']
+    clients = [host]
+    for i in range(players - 1):
+        c = quiz_app.socketio.test_client(quiz_app.app)
+        c.emit('join_room_pin', {'nickname': f'J{i}', 'roomPin': pin})
+        clients.append(c)
+    if kind == 'encerrada':
+        host.emit('start_quiz_for_room', {'roomPin': pin})
+        question = _last(host.get_received(), 'new_question')
+        while question:
+            for c in clients:
+                c.emit('submit_answer', {'roomPin': pin, 'questionId': question['question']['id'], 'selectedOptionId': 'a'})
+            question = _last(host.get_received(), 'new_question')
+        # Resultados entregues numa tarefa em segundo plano
+        deadline = time.time() + 5
+        while quiz_app.rooms_data[pin].results is None and time.time() < deadline:
+            time.sleep(0.005)
+    elif kind == 'órfã':
+        host.disconnect()
+        clients.remove(host)
+    for c in clients:
+        c.get_received()
+    return clients
+
+
+def _reset():
+    for pin in list(quiz_app.rooms_data):
+        quiz_app.room_store.delete(pin)
+        quiz_app._forget_room(pin)
+
+
+def run(label, lifecycle, rounds, rooms, players, ttl):
+    _reset()
+    quiz_app.room_lifecycle = lifecycle
+    gc.collect()
+    tracemalloc.start()
+    clients, rows = [], []
+    kinds = ('encerrada', 'órfã', 'ociosa')
+    for _ in range(rounds):
+        for i in range(rooms):
+            clients.extend(_open_room(kinds[i % len(kinds)], players))
+        time.sleep(ttl)
+        quiz_app._evict_rooms()
+        gc.collect()
+        with quiz_app.rooms_lock:
+            infos = [quiz_app._room_info(pin, room) for pin, room in quiz_app.rooms_data.items()]
+        measured = sum(s.size for s in tracemalloc.take_snapshot().filter_traces(ROOM_CODE).statistics('filename'))
+        rows.append((len(infos), sum(estimate_bytes(i) for i in infos), measured))
+    tracemalloc.stop()
+    for c in clients:
+        c.disconnect()
+    return label, rows
+
+
+def sweep_cost(n, players):
+    """Tempo da varredura com n salas abertas: nenhuma expirada e todas expiradas."""
+    _reset()
+    quiz_app.room_lifecycle = RoomLifecycle(idle_ttl=INF, finished_ttl=INF, orphan_ttl=INF)
+    for r in range(n):
+        quiz_app._register_room(RoomState(
+            f"h{r}", "Host", "desafio1", {f"s{r}-{p}": PlayerState(f"J{p}") for p in range(players)},
+            Leaderboard(), GameState(20, 18)))
+    start = time.perf_counter()
+    assert quiz_app._evict_rooms() == 0
+    keep = time.perf_counter() - start
+    quiz_app.room_lifecycle = RoomLifecycle(idle_ttl=0, finished_ttl=0, orphan_ttl=0)
+    start = time.perf_counter()
+    assert quiz_app._evict_rooms() == n
+    evict = time.perf_counter() - start
+    assert not quiz_app.rooms_data and not quiz_app.sid_index
+    return keep, evict
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=8)
+    parser.add_argument('--rooms', type=int, default=30)
+    parser.add_argument('--players', type=int, default=5)
+    parser.add_argument('--ttl', type=float, default=0.3)
+    parser.add_argument('--max-rooms', type=int, default=60)
+    parser.add_argument('--sweep-rooms', type=int, default=5000)
+    args = parser.parse_args()
+
+    configs = [("sem despejo", RoomLifecycle(idle_ttl=INF, finished_ttl=INF, orphan_ttl=INF)),
+               (f"TTL {args.ttl:g} s", RoomLifecycle(idle_ttl=args.ttl, finished_ttl=args.ttl, orphan_ttl=args.ttl)),
+               (f"limite {args.max_rooms}", RoomLifecycle(idle_ttl=INF, finished_ttl=INF, orphan_ttl=INF,
+                                                          max_rooms=args.max_rooms))]
+    results = [run(label, lifecycle, args.rounds, args.rooms, args.players, args.ttl) for label, lifecycle in configs]
+
+    print(f"{args.rooms} salas por rodada ({args.players} jogadores cada): salas retidas / estimativa do /metrics / memória medida")
+    print(f"{'rodada':>6} " + " ".join(f"{label:>28}" for label, _ in results))
+    for r in range(args.rounds):
+        cells = []
+        for _, rows in results:
+            held, estimate, measured = rows[r]
+            cells.append(f"{held:>6} {estimate / 2**20:>7.2f} MB {measured / 2**20:>7.2f} MB")
+        print(f"{r + 1:>6} " + " ".join(f"{c:>28}" for c in cells))
+
+    keep, evict = sweep_cost(args.sweep_rooms, args.players)
+    print(f"\nVarredura com {args.sweep_rooms} salas: {keep * 1000:.1f} ms sem despejos, "
+          f"{evict * 1000:.1f} ms despejando todas ({evict / args.sweep_rooms * 1e6:.0f} µs por sala)")
+
+
+if __name__ == '__main__':
+    main()
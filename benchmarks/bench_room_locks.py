@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de latência do submit_answer com várias salas simultâneas.
+
+Cada sala tem sua própria thread de jogadores respondendo as perguntas, e uma
+thread extra por sala fica fazendo joins (que geram broadcasts) numa sala de
+espera separada, competindo apenas pelos locks globais. Mede-se o
+tempo de processamento de cada 'submit_answer' (handler + emits) para um
+número crescente de salas.
+
+Uso:
+    python benchmarks/bench_room_locks.py [--rooms 1,10,50,100] [--players 5] [--global-lock]
+
+--global-lock reproduz o comportamento antigo fazendo todas as salas
+compartilharem um único lock.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ.setdefault('QUIZ_RATE_LIMITS', '0')   # Os clientes de teste respondem as perguntas em sequência, sem pausa
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+
+
+def _last(messages, name):
+    found = [m for m in messages if m['name'] == name]
+    return found[-1]['args'][0] if found else None
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def _setup_room(players_per_room):
+    host = quiz_app.socketio.test_client(quiz_app.app)
+    host.emit('create_room', {'nickname': 'Host', 'challengeType': 'desafio1'})
+    pin = _last(host.get_received(), 'room_created')['roomPin']
+    players = [host]
+    for i in range(players_per_room - 1):
+        c = quiz_app.socketio.test_client(quiz_app.app)
+        c.emit('join_room_pin', {'nickname': f'J{i}', 'roomPin': pin})
+        players.append(c)
+    for c in players:
+        c.get_received()
+    host.emit('start_quiz_for_room', {'roomPin': pin})
+    return pin, players
+
+
+def _play_room(pin, players, rounds, latencies, stop_event):
+    question = _last(players[0].get_received(), 'new_question')
+    for c in players[1:]:
+        c.get_received()
+    for _ in range(rounds):
+        if not question or stop_event.is_set():
+            break
+        q = question['question']
+        for c in players:
+            t0 = time.perf_counter()
+            c.emit('submit_answer', {'roomPin': pin, 'questionId': q['id'],
+                                     'selectedOptionId': 'a'})  # ID curto da 1ª opção
+            latencies.append(time.perf_counter() - t0)
+        question = _last(players[0].get_received(), 'new_question')
+        for c in players[1:]:
+            c.get_received()
+
+
+def _churn_joins(stop_event):
+    host = quiz_app.socketio.test_client(quiz_app.app)
+    host.emit('create_room', {'nickname': 'Espera', 'challengeType': 'desafio1'})
+    pin = _last(host.get_received(), 'room_created')['roomPin']
+    while not stop_event.is_set():
+        c = quiz_app.socketio.test_client(quiz_app.app)
+        c.emit('join_room_pin', {'nickname': 'Visitante', 'roomPin': pin})
+        c.disconnect()
+        host.get_received()
+        time.sleep(0.001)
+
+
+def run(num_rooms, players_per_room, rounds, global_lock):
+    quiz_app.rooms_data.clear()
+    quiz_app.room_locks.clear()
+    rooms = [_setup_room(players_per_room) for _ in range(num_rooms)]
+    if global_lock:
+        shared = threading.Lock()
+        for pin in quiz_app.room_locks:
+            quiz_app.room_locks[pin] = shared
+
+    latencies = []
+    stop_event = threading.Event()
+    churners = [threading.Thread(target=_churn_joins, args=(stop_event,), daemon=True) for _ in rooms]
+    players = [threading.Thread(target=_play_room, args=(pin, clients, rounds, latencies, stop_event))
+               for pin, clients in rooms]
+    for t in churners + players:
+        t.start()
+    for t in players:
+        t.join()
+    stop_event.set()
+    for t in churners:
+        t.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', default='1,10,50,100')
+    parser.add_argument('--players', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--global-lock', action='store_true')
+    args = parser.parse_args()
+
+    mode = 'lock global' if args.global_lock else 'lock por sala'
+    print(f"Modo: {mode} | async_mode={quiz_app.socketio.async_mode} | jogadores/sala={args.players}")
+    print(f"{'salas':>6} {'respostas':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'média (ms)':>11}")
+    for num_rooms in [int(x) for x in args.rooms.split(',')]:
+        lat = run(num_rooms, args.players, args.rounds, args.global_lock)
+        ms = [x * 1000 for x in lat]
+        print(f"{num_rooms:>6} {len(ms):>10} {_percentile(ms, 50):>9.3f} {_percentile(ms, 95):>9.3f} "
+              f"{_percentile(ms, 99):>9.3f} {statistics.mean(ms) if ms else 0:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
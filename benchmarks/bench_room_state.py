@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Memória por jogador e custo de avançar a pergunta com 10.000 jogadores numa sala.
+
+Compara o estado de antes (cada jogador um dict, cada resposta mais um dict em
+player["answers"] e a chave "answered_current_question" apagada de todos os
+jogadores a cada pergunta) com os registros de room_state.py (PlayerState com
+as respostas em arrays e o contador de geração em GameState).
+
+Mede, com todas as perguntas respondidas:
+  memória por jogador (tracemalloc) e bytes por jogador no pickle do store compartilhado
+  avançar a pergunta (limpar quem já respondeu)
+  conferir se todos responderam (feito a cada submit_answer; pior caso, o da última resposta)
+Antes de medir, confere que as recomendações calculadas dos dois formatos são idênticas.
+
+Uso:
+    python benchmarks/bench_room_state.py [--players 10000] [--questions 18]
+"""
+import argparse
+import gc
+import os
+import pickle
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import recommendation  # noqa: E402
+from room_state import GameState, PlayerState, answer_summary  # noqa: E402
+
+
+def make_quiz(questions, seed=5):
+    rng = random.Random(seed)
+    skills = list(recommendation.COURSE_SUGGESTIONS)
+    return [(f"desafio1_q{i}", rng.choice(skills)) for i in range(questions)]
+
+
+def _plays(players, quiz, seed=7):
+    """(posição da opção, acertou, pontos) de cada jogador em cada pergunta."""
+    rng = random.Random(seed)
+    return [[(o, o == 1, 100 + rng.randint(0, 50) if o == 1 else 0) for o in (rng.randrange(4) for _ in quiz)]
+            for _ in range(players)]
+
+
+def build_before(plays, quiz):
+    players = {}
+    for p, answers in enumerate(plays):
+        player = {"nickname": f"Jogador{p}", "score": 0, "answers": {}}
+        for (qid, skill), (option, correct, points) in zip(quiz, answers):
+            player["answers"][qid] = {"answer_id": f"{qid}_opt{option}", "is_correct": correct,
+                                      "skill": skill, "points_earned": points}
+            player["score"] += points
+        player["answered_current_question"] = True
+        players[f"sid{p:016d}"] = player
+    return players
+
+
+def build_after(plays, quiz, gs):
+    players = {}
+    for p, answers in enumerate(plays):
+        player = PlayerState(f"Jogador{p}")
+        player.start_quiz(len(quiz))
+        for position, (option, correct, points) in enumerate(answers):
+            player.answer(position, option, correct, points, gs.question_gen)
+        players[f"sid{p:016d}"] = player
+    gs.answered = len(players)
+    return players
+
+
+def _memory(build):
+    gc.collect()
+    tracemalloc.start()
+    players = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return players, size
+
+
+def advance_before(players):
+    # Laço de _advance_question_for_room antes dos registros
+    for player_sid_key in list(players.keys()):
+        player_data = players.get(player_sid_key)
+        if player_data and "answered_current_question" in player_data:
+            del player_data["answered_current_question"]
+
+
+def mark_before(players):
+    # Volta ao estado "todos responderam"; seu tempo é descontado da medida do avanço
+    for player_data in players.values():
+        player_data["answered_current_question"] = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--questions', type=int, default=18)
+    args = parser.parse_args()
+
+    quiz = make_quiz(args.questions)
+    skills = tuple(skill for _, skill in quiz)
+    plays = _plays(args.players, quiz)
+    gs = GameState(20, args.questions)
+    before, before_bytes = _memory(lambda: build_before(plays, quiz))
+    after, after_bytes = _memory(lambda: build_after(plays, quiz, gs))
+
+    assert ([recommendation.recommend(p["answers"]) for p in before.values()]
+            == [recommendation.recommend_skills(*answer_summary(p.choices, skills)) for p in after.values()])
+    assert [p["score"] for p in before.values()] == [p.score for p in after.values()]
+
+    print(f"{args.players} jogadores x {args.questions} perguntas respondidas; recomendações e scores idênticos")
+    print(f"{'estado':<26} {'bytes/jogador':>14} {'pickle/jogador':>15}")
+    for label, players, size in (("antes (dicts)", before, before_bytes), ("PlayerState (arrays)", after, after_bytes)):
+        pickled = len(pickle.dumps(players, pickle.HIGHEST_PROTOCOL))
+        print(f"{label:<26} {size / args.players:>14.0f} {pickled / args.players:>15.0f}")
+    print(f"Memória: {before_bytes / after_bytes:.1f}x menor")
+
+    number = 20
+    mark = min(timeit.repeat(lambda: mark_before(before), number=number, repeat=5)) / number
+    advance = min(timeit.repeat(lambda: (mark_before(before), advance_before(before)), number=number, repeat=5)) / number - mark
+    next_question = min(timeit.repeat(gs.next_question, number=10000, repeat=5)) / 10000
+    mark_before(before)
+    gs.answered = len(after)
+    check_before = min(timeit.repeat(lambda: all(p.get("answered_current_question") for p in before.values() if p),
+                                     number=number, repeat=5)) / number
+    check_after = min(timeit.repeat(lambda: gs.answered >= len(after), number=10000, repeat=5)) / 10000
+
+    print(f"\n{'operação':<36} {'antes (µs)':>12} {'agora (µs)':>12}")
+    print(f"{'avançar a pergunta':<36} {advance * 1e6:>12.1f} {next_question * 1e6:>12.3f}")
+    print(f"{'todos responderam? (última resposta)':<36} {check_before * 1e6:>12.1f} {check_after * 1e6:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Tempestade de reconexões: 500 alunos voltando ao mesmo tempo no meio de uma pergunta.
+
+Uma sala com o quiz em andamento, metade dos alunos já com a pergunta atual
+respondida. Todos trocam de conexão (SID novo) e mandam 'rejoin_room_check' ao
+mesmo tempo, cada um na sua thread, em dois cenários:
+  queda percebida      o servidor processa as desconexões antes das reconexões
+  queda não percebida  as reconexões chegam antes (o ping do Socket.IO ainda não
+                       expirou) e as desconexões antigas só depois
+e de dois jeitos:
+  antes   sem resumeToken: registro novo (pontuação zerada), room_joined + new_question
+  token   com o resumeToken: o mesmo registro volta ao SID novo, um 'room_snapshot'
+
+Mede a latência de cada rejoin_room_check (da chamada até a resposta, com a
+espera pelo lock da sala), os pacotes de resposta por aluno, os broadcasts
+de lista de jogadores que a tempestade gera na sala (com o token, as voltas
+de uma janela de app.PLAYERS_UPDATE_WINDOW saem num só), e confere
+pontuações, o contador de quem já respondeu e o índice SID -> sala depois dela.
+Esses broadcasts são contados mas não chegam aos clientes de teste, que
+decodificam cada pacote por destinatário e guardariam todos na memória
+(500 listas de 500 apelidos para cada um): a latência medida é a do servidor,
+sem a entrega nos sockets.
+
+Uso:
+    python benchmarks/bench_session_resume.py [--players 500]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ['QUIZ_EVENTS_DIR'] = 'off'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+import wire_json  # noqa: E402
+from socketio import packet  # noqa: E402
+
+REPLIES = ('room_snapshot', 'room_joined', 'new_question', 'quiz_result')
+BROADCASTS = ('player_left', 'player_joined_room')
+MUTED_PREFIXES = tuple(f'{packet.EVENT}["{event}"' for event in BROADCASTS)
+
+
+def _test_client():
+    # Cada cliente de teste novo reinstala o envio do servidor: o filtro volta depois dele
+    client = quiz_app.socketio.test_client(quiz_app.app)
+    server = quiz_app.socketio.server
+    send_packet, send_eio_packet = server._send_packet, server._send_eio_packet
+
+    def send(eio_sid, pkt):
+        if pkt.packet_type == packet.EVENT and pkt.data[0] in BROADCASTS: return
+        return send_packet(eio_sid, pkt)
+
+    def send_eio(eio_sid, eio_pkt):
+        if isinstance(eio_pkt.data, str) and eio_pkt.data.startswith(MUTED_PREFIXES): return
+        return send_eio_packet(eio_sid, eio_pkt)
+
+    server._send_packet, server._send_eio_packet = send, send_eio
+    return client
+
+
+def _last(messages, name):
+    found = [m for m in messages if m['name'] == name]
+    return found[-1]['args'][0] if found else None
+
+
+def _room_with_quiz(players):
+    original_reset = quiz_app._reset_room_quiz_state
+
+    def long_question(room_pin):
+        original_reset(room_pin)
+        quiz_app.rooms_data[room_pin].game_state.time_per_question = 600   # O prazo não vence durante a medida
+
+    quiz_app._reset_room_quiz_state = long_question
+    try:
+        host = _test_client()
+        host.emit('create_room', {'nickname': 'Professor', 'challengeType': 'desafio1', 'batchFrames': True})
+        pin = _last(host.get_received(), 'room_created')['roomPin']
+        students = []
+        for i in range(players):
+            c = _test_client()
+            c.emit('join_room_pin', {'nickname': f'Aluno{i:03d}', 'roomPin': pin, 'batchFrames': True})
+            token = _last(c.get_received(), 'room_joined')['resumeToken']
+            students.append((c, f'Aluno{i:03d}', token))
+        host.emit('start_quiz_for_room', {'roomPin': pin})
+        with quiz_app._locked_room(pin, touch=False):
+            question = quiz_app._get_current_question_for_room(pin)
+        for c, _, _ in students[::2]:   # Respostas certas: pontuação diferente de zero
+            c.emit('submit_answer', {'roomPin': pin, 'questionId': question.short_id,
+                                     'selectedOptionId': question.correct_short_id})
+        for c, _, _ in students:
+            c.get_received()
+        return host, pin, students
+    finally:
+        quiz_app._reset_room_quiz_state = original_reset
+
+
+class BroadcastCounter:
+    """Conta os broadcasts de lista de jogadores por destinatário, envolvendo app._broadcast."""
+
+    def __init__(self):
+        self.packets = self.bytes = 0
+        self._original = quiz_app._broadcast
+
+        def counting(room_pin, room, event, payload, include_self=True):
+            if event in BROADCASTS:
+                recipients = len(room.players) - (0 if include_self else 1)
+                self.packets += recipients
+                self.bytes += recipients * (len(wire_json.dumps([event, payload], separators=(',', ':')).encode('utf-8')) + 1)
+            return self._original(room_pin, room, event, payload, include_self)
+
+        quiz_app._broadcast = counting
+
+    def close(self):
+        quiz_app._broadcast = self._original
+
+
+def _scores(pin):
+    with quiz_app._locked_room(pin, touch=False) as room:
+        gs = room.game_state
+        scores = {p.nickname: p.score for p in room.players.values()}
+        answered = sum(p.has_answered(gs.question_gen) for p in room.players.values())
+        return scores, len(room.players), gs.answered, answered
+
+
+def storm(players, with_token, noticed):
+    host, pin, students = _room_with_quiz(players)
+    before, _, _, _ = _scores(pin)
+    answered_before = _scores(pin)[2]
+    if noticed:
+        for c, _, _ in students:
+            c.disconnect()
+    fresh = [_test_client() for _ in students]
+    counter = BroadcastCounter()
+
+    latencies = [0.0] * players
+    replies = [0] * players
+    barrier = threading.Barrier(players)
+
+    def reconnect(i):
+        c = fresh[i]
+        _, nickname, token = students[i]
+        data = {'roomPin': pin, 'nickname': nickname, 'batchFrames': True}
+        if with_token:
+            data['resumeToken'] = token
+        barrier.wait()
+        start = time.perf_counter()
+        c.emit('rejoin_room_check', data)
+        latencies[i] = time.perf_counter() - start
+        replies[i] = sum(m['name'] in REPLIES for m in c.get_received())
+
+    threads = [threading.Thread(target=reconnect, args=(i,)) for i in range(players)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    quiz_app.socketio.sleep(quiz_app.PLAYERS_UPDATE_WINDOW + 0.5)   # Lista de jogadores agrupada das voltas
+    during = _scores(pin)[1]
+    if not noticed:
+        for c, _, _ in students:
+            c.disconnect()   # As desconexões antigas chegam depois das reconexões
+    counter.close()
+    after, remaining, answered_counter, answered = _scores(pin)
+    problems = quiz_app.check_sid_index_consistency()
+    kept = sum(after.get(nickname) == before[nickname] for _, nickname, _ in students)
+    for c in [host] + fresh:
+        c.disconnect()
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies), "p99": latencies[int(0.99 * (players - 1))], "max": latencies[-1],
+        "elapsed": elapsed, "replies": sum(replies) / players,
+        "broadcasts": counter.packets, "broadcast_bytes": counter.bytes,
+        "kept": kept, "during": during, "remaining": remaining,
+        "answered": (answered_before, answered_counter, answered), "problems": problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=500)
+    args = parser.parse_args()
+    n = args.players
+
+    print(f"Sala com {n} alunos e o host, quiz na 1ª pergunta, {n // 2 + n % 2} alunos já responderam")
+    print(f"{'cenário':<20} {'modo':<6} {'p50 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9} {'total (s)':>10} "
+          f"{'resp./aluno':>12} {'broadcasts':>11} {'MB':>7} {'pontos mantidos':>16} {'jogadores':>10}")
+    ok = True
+    for noticed in (True, False):
+        for with_token in (False, True):
+            r = storm(n, with_token, noticed)
+            label = "queda percebida" if noticed else "queda não percebida"
+            players = f"{r['during']}/{r['remaining']}"
+            print(f"{label:<20} {'token' if with_token else 'antes':<6} {r['p50'] * 1e3:>9.2f} {r['p99'] * 1e3:>9.2f} "
+                  f"{r['max'] * 1e3:>9.2f} {r['elapsed']:>10.2f} {r['replies']:>12.1f} {r['broadcasts']:>11} "
+                  f"{r['broadcast_bytes'] / 1e6:>7.1f} {r['kept']:>10}/{n:<5} {players:>10}")
+            if with_token:
+                counted_before, counter, actual = r['answered']
+                if r['kept'] != n or r['remaining'] != n + 1 or counter != actual or counter != counted_before or r['problems']:
+                    ok = False
+                    print(f"  ERRO: pontos mantidos {r['kept']}/{n}, jogadores {r['remaining']}, respondidas "
+                          f"{counted_before} -> contador {counter} / registros {actual}, índice: {r['problems'][:3]}")
+    print("Jogadores: na sala logo depois das reconexões / depois das desconexões antigas (esperado: "
+          f"{n + 1}). Broadcasts: player_left e player_joined_room entregues, somados por destinatário.")
+    if not ok:
+        sys.exit(1)
+    print("Com o token: mesmas pontuações, contador de respostas e índice SID -> sala consistentes.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Bytes no fio por pergunta numa sala (ex.: 40 alunos no 4G).
+
+Roda uma sala real com o cliente de teste do Flask-SocketIO: todos menos um
+aluno respondem a primeira pergunta e o tempo esgota (gerando 'time_up').
+Cada pacote entregue é contado por destinatário, com o tamanho em UTF-8 do
+pacote Engine.IO, e o total é separado por evento.
+
+Para comparar com outra versão do app (ex.: a anterior a uma mudança),
+aponte --app-dir para outro checkout:
+    git worktree add /tmp/quiz-antes <commit>
+    python benchmarks/bench_wire_bytes.py --app-dir /tmp/quiz-antes
+    python benchmarks/bench_wire_bytes.py
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ.setdefault('QUIZ_RATE_LIMITS', '0')   # Os clientes de teste respondem as perguntas em sequência, sem pausa
+
+_EVENT_NAME = re.compile(r'^\d+(?:/[^,]*,)?\d*\["([^"]+)"')
+
+
+class WireCounter:
+    """Envolve o envio de pacotes do servidor para contar pacotes e bytes por evento."""
+
+    def __init__(self, server):
+        self.packets = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.enabled = True
+        self.stop_after = None
+        self._stop_seen = False
+        send_packet, send_eio_packet = server._send_packet, server._send_eio_packet
+
+        def counting_send_packet(eio_sid, pkt):
+            self._count(pkt.encode())
+            return send_packet(eio_sid, pkt)
+
+        def counting_send_eio_packet(eio_sid, eio_pkt):
+            self._count(eio_pkt.data)
+            return send_eio_packet(eio_sid, eio_pkt)
+
+        server._send_packet = counting_send_packet
+        server._send_eio_packet = counting_send_eio_packet
+
+    def _count(self, encoded):
+        if not self.enabled:
+            return
+        for part in (encoded if isinstance(encoded, list) else [encoded]):
+            data = part.encode('utf-8') if isinstance(part, str) else part
+            match = _EVENT_NAME.match(part) if isinstance(part, str) else None
+            name = match.group(1) if match else '(binário)'
+            if self._stop_seen and name != self.stop_after:
+                # Primeiro pacote depois do broadcast de stop_after: encerra a contagem
+                self.enabled = False
+                return
+            self._stop_seen = self._stop_seen or name == self.stop_after
+            self.packets[name] += 1
+            self.bytes[name] += len(data) + 1  # +1: tipo do pacote Engine.IO ("4")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--players', type=int, default=40)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.app_dir))
+    logging.disable(logging.CRITICAL)
+    import app as quiz_app
+
+    original_reset = quiz_app._reset_room_quiz_state
+
+    def short_reset(room_pin):
+        original_reset(room_pin)
+        quiz_app.rooms_data[room_pin].game_state.time_per_question = 0.5
+
+    quiz_app._reset_room_quiz_state = short_reset
+
+    host = quiz_app.socketio.test_client(quiz_app.app)
+    host.emit('create_room', {'nickname': 'Professor', 'challengeType': 'desafio1'})
+    pin = [m for m in host.get_received() if m['name'] == 'room_created'][0]['args'][0]['roomPin']
+    students = []
+    for i in range(args.players):
+        c = quiz_app.socketio.test_client(quiz_app.app)
+        c.emit('join_room_pin', {'nickname': f'Aluno{i:02d}', 'roomPin': pin})
+        students.append(c)
+    for c in [host] + students:
+        c.get_received()
+
+    counter = WireCounter(quiz_app.socketio.server)
+    host.emit('start_quiz_for_room', {'roomPin': pin})
+    question = [m for m in students[0].get_received() if m['name'] == 'new_question'][-1]['args'][0]['question']
+    first_option = question['options'][0]
+    option_id = first_option['id'] if isinstance(first_option, dict) else 'a'
+    # O host e um aluno não respondem, então a pergunta termina por tempo
+    for c in students[1:]:
+        c.emit('submit_answer', {'roomPin': pin, 'questionId': question['id'], 'selectedOptionId': option_id})
+    # Após o time_up da primeira pergunta a contagem para (o resto é a pergunta seguinte)
+    counter.stop_after = 'time_up'
+    deadline = time.time() + 10
+    while counter.enabled and time.time() < deadline:
+        quiz_app.socketio.sleep(0.05)
+    counter.enabled = False
+
+    recipients = args.players + 1
+    print(f"App: {os.path.abspath(args.app_dir)}")
+    print(f"Sala com {recipients} clientes ({args.players} alunos + host), 1 pergunta, {args.players - 1} respostas + time_up")
+    print(f"{'evento':<16} {'pacotes':>8} {'bytes':>10} {'bytes/pacote':>13}")
+    for name in sorted(counter.bytes, key=counter.bytes.get, reverse=True):
+        if name in ('quiz_started',):
+            continue
+        print(f"{name:<16} {counter.packets[name]:>8} {counter.bytes[name]:>10} {counter.bytes[name] / counter.packets[name]:>13.1f}")
+    total = sum(b for n, b in counter.bytes.items() if n != 'quiz_started')
+    print(f"{'TOTAL':<16} {sum(p for n, p in counter.packets.items() if n != 'quiz_started'):>8} {total:>10}")
+    print(f"Por aluno por pergunta: {total / recipients / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
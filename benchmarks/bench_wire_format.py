@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Bytes no fio e CPU de codificar/decodificar pacotes em JSON vs. MessagePack.
+
+Para 'new_question' (todas as perguntas do desafio), 'scores_update' (top 10)
+e 'quiz_ended' (top 10 e total de jogadores), monta os payloads como o app.py
+e mede o pacote Socket.IO completo nos dois formatos:
+  JSON         o que o servidor já envia (wire_json, com o cache PreEncoded de new_question)
+  MessagePack  a versão que wire_msgpack gera para os clientes com o parser MessagePack;
+               o tempo de codificar inclui o JSON, que o servidor gera de qualquer forma
+Bytes no fio contam o tipo do pacote Engine.IO ("4") nos frames de texto;
+frames binários não têm prefixo. A decodificação é a do servidor
+(WirePacket), uma aproximação do que o navegador faz com cada pacote.
+
+Uso:
+    python benchmarks/bench_wire_format.py [--players 40] [--iterations 20000]
+"""
+import argparse
+import logging
+import os
+import sys
+import timeit
+
+os.environ.setdefault('QUIZ_ASYNC_MODE', 'threading')
+os.environ['QUIZ_EVENTS_DIR'] = 'off'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as quiz_app  # noqa: E402
+import wire_msgpack  # noqa: E402
+from socketio import packet  # noqa: E402
+
+
+def payloads(players):
+    bank = quiz_app.question_banks.current(quiz_app._bank_name('desafio1'))
+    pin = 'K7Q2M'
+    nicknames = [f"Aluno{i:02d} Ciência" for i in range(players)]
+    top = [{"nickname": nickname, "score": 2400 - 37 * i} for i, nickname in enumerate(nicknames[:10])]
+    ranking = [{"rank": rank, **entry} for rank, entry in enumerate(top, 1)]
+    return {
+        'new_question': [quiz_app._question_payload(bank, pos, pos + 1, len(bank), 20) for pos in range(len(bank))],
+        'scores_update': [{"scores": top, "roomPin": pin}],
+        'quiz_ended': [{"ranking": ranking, "totalPlayers": players, "roomPin": pin}],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    if not wire_msgpack.available:
+        sys.exit("O pacote msgpack não está instalado (pip install msgpack).")
+    packet_class = quiz_app.socketio.server.packet_class
+
+    def encode_json(pkt):
+        return pkt.encode()
+
+    def encode_msgpack(pkt):
+        # Caminho de um broadcast com destinatários MessagePack: JSON + versão MessagePack
+        return pkt.encode().msgpack_packet().data
+
+    print(f"{'evento':<14} {'formato':<12} {'bytes':>7} {'codificar (µs)':>15} {'decodificar (µs)':>17}")
+    for event, samples in payloads(args.players).items():
+        rows = []
+        for label, encode in (("JSON", encode_json), ("MessagePack", encode_msgpack)):
+            # Com algum cliente em MessagePack, o encode passa a devolver WireText
+            if encode is encode_msgpack:
+                wire_msgpack.clients.add('bench')
+            size = enc_time = dec_time = 0
+            number = max(1, args.iterations // len(samples))
+            for data in samples:
+                # Um pacote novo a cada envio, como no emit
+                make = lambda data=data: packet_class(packet.EVENT, namespace='/', data=[event, data])
+                wire = encode(make())
+                assert packet_class(encoded_packet=wire).data[0] == event
+                size += len(wire.encode('utf-8')) + 1 if isinstance(wire, str) else len(wire)
+                enc_time += min(timeit.repeat(lambda: encode(make()), number=number, repeat=3)) / number
+                dec_time += min(timeit.repeat(lambda: packet_class(encoded_packet=wire), number=number, repeat=3)) / number
+            wire_msgpack.clients.discard('bench')
+            n = len(samples)
+            rows.append((label, size / n, enc_time / n, dec_time / n))
+        for label, size, enc, dec in rows:
+            print(f"{event:<14} {label:<12} {size:>7.0f} {enc * 1e6:>15.2f} {dec * 1e6:>17.2f}")
+        (_, s0, e0, d0), (_, s1, e1, d1) = rows
+        print(f"{'':<14} {'diferença':<12} {(s1 - s0) / s0:>+7.0%} {e1 / e0:>14.1f}x {d1 / d0:>16.1f}x")
+
+
+if __name__ == '__main__':
+    main()
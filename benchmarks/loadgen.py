@@ -0,0 +1,618 @@
+# -*- coding: utf-8 -*-
+"""Gerador de carga: milhares de clientes Socket.IO simulados contra o servidor real.
+
+Cada cliente fala o protocolo de verdade (Engine.IO v4 sobre WebSocket), todos
+num único loop asyncio. O fluxo completo roda em cada sala: o host faz
+create_room, os jogadores join_room_pin, o host start_quiz_for_room e todos
+respondem (submit_answer) com um tempo de resposta sorteado de uma distribuição.
+Jogadores podem cair no meio de uma pergunta e voltar com rejoin_room_check.
+
+Sem --url, sobe um servidor local (eventlet, estado em memória) numa porta
+livre; com --url host:porta[,host:porta...] usa servidores já rodando,
+espalhando os clientes entre eles. O servidor WSGI do eventlet atende no máximo
+1024 conexões simultâneas por worker (max_size); os clientes além disso ficam
+na fila do accept e aparecem como erros de conexão. --server-max-size muda
+esse limite no servidor local.
+
+Latências medidas (relógio único, já que todos os clientes estão no mesmo processo):
+  answer_feedback     envio do submit_answer -> answer_feedback
+  new_question        último submit_answer da pergunta anterior (ou o
+                      start_quiz_for_room) -> new_question, quando todos responderam
+  new_question_timer  prazo da pergunta anterior -> new_question, quando ela
+                      terminou pelo timer (primeira chegada + timeLimit + 0,5 s)
+  join / rejoin       join_room_pin / rejoin_room_check -> room_joined
+
+O resultado (parâmetros, commit, latências, vazão, CPU e memória) pode ser salvo
+em JSON com --output e comparado com outra execução via --compare ou --diff.
+
+Uso:
+    python benchmarks/loadgen.py --rooms 50 --players 20 --answer-time uniform:0.2:2 \\
+        --disconnect-rate 0.02 --output resultados/$(git rev-parse --short HEAD).json
+    python benchmarks/loadgen.py --diff antes.json depois.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_CODE = ("import json, sys, app; app.socketio.run(app.app, host='127.0.0.1', port=int(sys.argv[1]), "
+               "debug=False, use_reloader=False, log_output=False, **json.loads(sys.argv[2]))")
+# Atraso extra do servidor sobre o tempo da pergunta antes do time_up (ver _start_question_timer_for_room)
+TIMER_SLACK = 0.5
+
+
+def parse_distribution(spec):
+    """'uniform:A:B', 'exp:MÉDIA', 'normal:MU:SIGMA', 'lognormal:MU:SIGMA' ou 'fixed:S' -> função sem argumentos."""
+    kind, *params = spec.split(':')
+    try:
+        p = [float(x) for x in params]
+        samplers = {
+            'uniform': lambda: random.uniform(p[0], p[1]),
+            'exp': lambda: random.expovariate(1.0 / p[0]),
+            'normal': lambda: max(0.0, random.gauss(p[0], p[1])),
+            'lognormal': lambda: random.lognormvariate(p[0], p[1]),
+            'fixed': lambda: p[0],
+        }
+        sampler = samplers[kind]
+        sampler()
+    except (KeyError, IndexError, ValueError):
+        raise argparse.ArgumentTypeError(f"distribuição inválida: {spec!r}")
+    sampler.spec = spec
+    return sampler
+
+
+def describe(error):
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return {"count": len(values), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "max": values[-1] * 1000, "mean": sum(values) / len(values) * 1000}
+
+
+class ProcessStats:
+    """CPU e memória de processos do servidor, lidos do /proc (só Linux)."""
+
+    def __init__(self, pids):
+        self.pids = pids
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def cpu_seconds(self):
+        total = 0.0
+        for pid in self.pids:
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                total += (int(fields[11]) + int(fields[12])) / self._ticks   # utime + stime
+            except (OSError, IndexError, ValueError):
+                return None
+        return total
+
+    def memory_mb(self):
+        rss = peak = 0
+        for pid in self.pids:
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    status = dict(line.split(':', 1) for line in f if ':' in line)
+                rss += int(status['VmRSS'].split()[0])
+                peak += int(status['VmHWM'].split()[0])
+            except (OSError, KeyError, ValueError):
+                return None, None
+        return rss / 1024, peak / 1024
+
+
+class Client:
+    """Um cliente Socket.IO (namespace /) sobre um WebSocket cru do asyncio."""
+
+    def __init__(self, run, room, name, address, is_host=False):
+        self.run = run
+        self.room = room
+        self.name = name
+        self.address = address
+        self.is_host = is_host
+        self.writer = None
+        self.connected = False
+        self.done = asyncio.Event()
+        self._waiters = defaultdict(list)
+        self._answer_handle = None
+        self._answer_sent_at = None
+        self._joined_sent_at = None
+        self._rejoining = False
+        self.current_question = None
+
+    async def connect(self):
+        await asyncio.wait_for(self._connect(), self.run.params.timeout)
+
+    async def _connect(self):
+        host, port = self.address
+        reader, self.writer = await asyncio.open_connection(host, port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.writer.write((f"GET /socket.io/?EIO=4&transport=websocket HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                           f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                           f"Sec-WebSocket-Version: 13\r\n\r\n").encode())
+        head = await reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in head.split(b'\r\n', 1)[0]:
+            raise ConnectionError(head.decode(errors='replace').splitlines()[0])
+        opening = await self._receive(reader)
+        if not opening or not opening.startswith('0'):
+            raise ConnectionError(f"abertura Engine.IO inesperada: {opening!r}")
+        self._send('40')
+        while True:
+            message = await self._receive(reader)
+            if message is None:
+                raise ConnectionError("conexão fechada antes do CONNECT do Socket.IO")
+            if message.startswith('40'):
+                break
+            if message.startswith('44'):
+                raise ConnectionError(f"CONNECT recusado: {message}")
+        self.connected = True
+        asyncio.get_running_loop().create_task(self._read_loop(reader))
+
+    def drop(self):
+        """Derruba a conexão sem despedida, como um celular que perdeu o sinal."""
+        self.connected = False
+        if self._answer_handle:
+            self._answer_handle.cancel()
+        if self.writer:
+            self.writer.transport.abort()
+
+    def emit(self, event, data):
+        if not self.connected:
+            return
+        self.run.sent[event] += 1
+        self._send('42' + json.dumps([event, data], separators=(',', ':')))
+
+    def _send(self, text, opcode=0x1):
+        payload = text.encode('utf-8') if isinstance(text, str) else text
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.writer.write(header + mask + masked)
+
+    async def _receive(self, reader):
+        """Próxima mensagem de texto, juntando fragmentos (None se a conexão fechou)."""
+        parts = []
+        try:
+            while True:
+                b0, b1 = await reader.readexactly(2)
+                length = b1 & 0x7f
+                if length == 126:
+                    length = struct.unpack('!H', await reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', await reader.readexactly(8))[0]
+                mask = await reader.readexactly(4) if b1 & 0x80 else None
+                data = await reader.readexactly(length)
+                if mask:
+                    data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+                opcode = b0 & 0x0f
+                if opcode == 0x8:
+                    return None
+                if opcode == 0x9:
+                    self._send(data, opcode=0xa)   # O pong repete os dados do ping
+                    continue
+                if opcode in (0x0, 0x1):
+                    parts.append(data)
+                    if b0 & 0x80:
+                        return b''.join(parts).decode('utf-8')
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            return None
+
+    async def _read_loop(self, reader):
+        writer = self.writer
+        while True:
+            message = await self._receive(reader)
+            if message is None:
+                break
+            if message == '2':                  # PING do Engine.IO
+                self._send('3')
+            elif message.startswith('42'):
+                event, *args = json.loads(message[2:])
+                self.run.received[event] += 1
+                self.on_event(event, args[0] if args else None)
+        if writer is self.writer and self.connected:
+            self.connected = False
+            if not self.done.is_set():
+                self.run.errors["conexão encerrada pelo servidor"] += 1
+                self.done.set()
+
+    async def wait_for(self, event, timeout):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[event].append(future)
+        return await asyncio.wait_for(future, timeout)
+
+    def on_event(self, event, data):
+        now = time.perf_counter()
+        for future in self._waiters.pop(event, []):
+            if not future.done():
+                future.set_result(data)
+        if event == 'new_question':
+            self._on_new_question(now, data)
+        elif event == 'answer_feedback' and self._answer_sent_at is not None:
+            self.run.latencies['answer_feedback'].append(now - self._answer_sent_at)
+            self._answer_sent_at = None
+        elif event == 'room_joined' and self._joined_sent_at is not None:
+            self.run.latencies[self._joined_sent_at[0]].append(now - self._joined_sent_at[1])
+            self._joined_sent_at = None
+        elif event == 'quiz_ended':
+            self.done.set()
+        elif event in ('room_join_error', 'room_error', 'room_not_found_on_rejoin'):
+            self.run.errors[f"{event}: {data.get('message')}"] += 1
+        elif event == 'answer_ack' and not data.get('success', True):
+            self.run.errors[f"answer_ack: {data.get('error')}"] += 1
+
+    def _on_new_question(self, now, data):
+        number, time_limit = data['questionNumber'], data['timeLimit']
+        self.current_question = number
+        if self._rejoining:
+            # Pergunta atual reenviada só para quem voltou: não é um avanço da sala
+            self._rejoining = False
+        else:
+            self.room.question_arrived(number, time_limit, now)
+        if self._answer_handle:
+            self._answer_handle.cancel()
+        params = self.run.params
+        if random.random() >= params.skip_rate:
+            delay = min(params.answer_time(), time_limit)
+            option = 'abcdefghij'[random.randrange(len(data['question']['options']))]
+            self._answer_handle = asyncio.get_running_loop().call_later(
+                delay, self._answer, number, data['question']['id'], option)
+        if not self.is_host and random.random() < params.disconnect_rate:
+            asyncio.get_running_loop().create_task(self._drop_and_rejoin(random.uniform(0, time_limit)))
+
+    def _answer(self, number, question_id, option):
+        self._answer_handle = None
+        if not self.connected or self.current_question != number:
+            return
+        self._answer_sent_at = time.perf_counter()
+        self.room.answer_sent(number, self._answer_sent_at)
+        self.emit('submit_answer', {'roomPin': self.room.pin, 'questionId': question_id, 'selectedOptionId': option})
+
+    async def join(self, event, payload):
+        self._joined_sent_at = ('join' if event == 'join_room_pin' else 'rejoin', time.perf_counter())
+        self.emit(event, payload)
+        return await self.wait_for('room_joined', self.run.params.timeout)
+
+    async def _drop_and_rejoin(self, after):
+        await asyncio.sleep(after)
+        if not self.connected or self.done.is_set():
+            return
+        self.drop()
+        self.run.disconnects += 1
+        await asyncio.sleep(self.run.params.rejoin_delay)
+        try:
+            await self.connect()
+            self._rejoining = True
+            joined = await self.join('rejoin_room_check', {'roomPin': self.room.pin, 'nickname': self.name})
+            self.run.rejoins += 1
+            if not joined['quizActive']:
+                # O quiz acabou enquanto o jogador estava fora: o quiz_ended não vem mais
+                self.run.missed_end += 1
+                self.done.set()
+        except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+            self.run.errors[f"rejoin: {describe(e)}"] += 1
+            self.done.set()
+
+
+class Room:
+    """Tempos por pergunta de uma sala, para as latências de new_question."""
+
+    def __init__(self, run, index):
+        self.run = run
+        self.index = index
+        self.pin = None
+        self.clients = []
+        self.start_sent_at = None
+        self.first_arrival = {}
+        self.time_limit = {}
+        self.last_answer = {}
+
+    def question_arrived(self, number, time_limit, now):
+        if number not in self.first_arrival:
+            self.first_arrival[number] = now
+            self.time_limit[number] = time_limit
+        previous = number - 1
+        if previous == 0:
+            if self.start_sent_at is not None:
+                self.run.latencies['new_question'].append(now - self.start_sent_at)
+        elif previous in self.first_arrival:
+            prev_arrival = self.first_arrival[previous]
+            deadline = prev_arrival + self.time_limit[previous] + TIMER_SLACK
+            if now < prev_arrival + self.time_limit[previous] and previous in self.last_answer:
+                self.run.latencies['new_question'].append(now - self.last_answer[previous])
+            elif self.first_arrival[number] >= prev_arrival + self.time_limit[previous]:
+                self.run.latencies['new_question_timer'].append(max(0.0, now - deadline))
+
+    def answer_sent(self, number, now):
+        self.last_answer[number] = now
+
+
+class LoadRun:
+    def __init__(self, params, addresses):
+        self.params = params
+        self.addresses = addresses
+        self.sent = Counter()
+        self.received = Counter()
+        self.errors = Counter()
+        self.latencies = defaultdict(list)
+        self.disconnects = 0
+        self.rejoins = 0
+        self.missed_end = 0
+        self._next_address = 0
+
+    def address(self):
+        address = self.addresses[self._next_address % len(self.addresses)]
+        self._next_address += 1
+        return address
+
+    async def setup_room(self, index, semaphore):
+        room = Room(self, index)
+        async with semaphore:
+            host = Client(self, room, f"s{index}-host", self.address(), is_host=True)
+            await host.connect()
+            host.emit('create_room', {'nickname': host.name, 'challengeType': self.params.challenge})
+            room.pin = (await host.wait_for('room_created', self.params.timeout))['roomPin']
+            room.clients.append(host)
+        for i in range(self.params.players):
+            async with semaphore:
+                client = Client(self, room, f"s{index}-p{i:03d}", self.address())
+                try:
+                    await client.connect()
+                    await client.join('join_room_pin', {'nickname': client.name, 'roomPin': room.pin})
+                except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                    # A sala segue com os jogadores que conseguiram entrar
+                    self.errors[f"join: {describe(e)}"] += 1
+                    client.drop()
+                    continue
+                room.clients.append(client)
+        return room
+
+    async def execute(self):
+        params = self.params
+        semaphore = asyncio.Semaphore(params.connect_concurrency)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.setup_room(i, semaphore) for i in range(params.rooms)),
+                                       return_exceptions=True)
+        rooms = [r for r in results if isinstance(r, Room)]
+        for r in results:
+            if not isinstance(r, Room):
+                self.errors[f"setup: {describe(r)}"] += 1
+        setup_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for room in rooms:
+            room.start_sent_at = time.perf_counter()
+            room.clients[0].emit('start_quiz_for_room', {'roomPin': room.pin})
+            if params.stagger:
+                await asyncio.sleep(params.stagger)
+        clients = [c for room in rooms for c in room.clients]
+        pending = [asyncio.ensure_future(c.done.wait()) for c in clients]
+        deadline = start + params.quiz_timeout
+        while pending and time.perf_counter() < deadline:
+            _, pending = await asyncio.wait(pending, timeout=min(10.0, deadline - time.perf_counter()))
+            print(f"  {len(clients) - len(pending)}/{len(clients)} clientes terminaram "
+                  f"({time.perf_counter() - start:.0f}s)", file=sys.stderr)
+        quiz_time = time.perf_counter() - start
+        unfinished = [c for c in clients if not c.done.is_set()]
+        if unfinished:
+            self.errors["quiz_ended não chegou"] += len(unfinished)
+        for task in pending:
+            task.cancel()
+        for c in clients:
+            c.drop()
+        return {"rooms": len(rooms), "clients": len(clients), "setup_s": setup_time, "quiz_s": quiz_time,
+                "completed_clients": len(clients) - len(unfinished)}
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=APP_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(time_per_question, max_size=None):
+    port = free_port()
+    options = {'max_size': max_size} if max_size else {}
+    log = tempfile.NamedTemporaryFile(prefix='quiz-loadgen-server-', suffix='.log', delete=False, mode='w')
+    env = dict(os.environ, QUIZ_TIME_PER_QUESTION=str(time_per_question), PYTHONUNBUFFERED='1')
+    env.pop('QUIZ_ASYNC_MODE', None)
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, str(port), json.dumps(options)], cwd=APP_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 30
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc, port, log.name
+        except OSError:
+            if time.time() > deadline or proc.poll() is not None:
+                raise RuntimeError(f"servidor não subiu (veja {log.name})")
+            time.sleep(0.1)
+
+
+def raise_fd_limit():
+    # Milhares de sockets abertos: sobe o limite flexível até o rígido (herdado pelo servidor local)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+
+def run(params):
+    raise_fd_limit()
+    server = None
+    if params.url:
+        addresses = [(u.rsplit(':', 1)[0], int(u.rsplit(':', 1)[1])) for u in params.url.split(',')]
+        pids = [int(p) for p in params.server_pid.split(',')] if params.server_pid else []
+    else:
+        server, port, server_log = start_server(params.time_per_question, params.server_max_size)
+        addresses, pids = [('127.0.0.1', port)], [server.pid]
+    stats = ProcessStats(pids)
+    try:
+        load = LoadRun(params, addresses)
+        cpu_before, client_before, wall_before = stats.cpu_seconds(), os.times(), time.perf_counter()
+        summary = asyncio.run(load.execute())
+        wall = time.perf_counter() - wall_before
+        cpu_after, client_after = stats.cpu_seconds(), os.times()
+        rss, peak = stats.memory_mb()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    server_cpu = (cpu_after - cpu_before) if pids and cpu_before is not None and cpu_after is not None else None
+    client_cpu = (client_after.user + client_after.system) - (client_before.user + client_before.system)
+    events_received, events_sent = sum(load.received.values()), sum(load.sent.values())
+    return {
+        "meta": {**git_revision(), "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                 "python": platform.python_version(), "cpus": os.cpu_count(),
+                 "server": f"local (log em {server_log})" if server else params.url},
+        "params": {"rooms": params.rooms, "players": params.players, "challenge": params.challenge,
+                   "answer_time": params.answer_time.spec, "skip_rate": params.skip_rate,
+                   "disconnect_rate": params.disconnect_rate, "rejoin_delay": params.rejoin_delay,
+                   "time_per_question": params.time_per_question if server else None,
+                   "server_max_size": params.server_max_size if server else None},
+        "results": {
+            **summary,
+            "wall_s": wall,
+            "events_sent": events_sent, "events_received": events_received,
+            "events_per_s": (events_sent + events_received) / wall,
+            "answers": load.sent['submit_answer'], "answers_per_s": load.sent['submit_answer'] / summary["quiz_s"],
+            "disconnects": load.disconnects, "rejoins": load.rejoins, "missed_end": load.missed_end,
+            "latency_ms": {name: percentiles(values) for name, values in sorted(load.latencies.items())},
+            "received_by_event": dict(load.received), "sent_by_event": dict(load.sent),
+            "errors": dict(load.errors),
+            "server_cpu_s": server_cpu, "server_cpu_pct": server_cpu / wall * 100 if server_cpu is not None else None,
+            "server_rss_mb": rss, "server_peak_rss_mb": peak,
+            "loadgen_cpu_pct": client_cpu / wall * 100,
+        },
+    }
+
+
+def print_report(report):
+    r, p = report["results"], report["params"]
+    commit = (report["meta"]["commit"] or "?")[:10] + (" (modificado)" if report["meta"]["dirty"] else "")
+    print(f"commit {commit} | {r['rooms']} salas x {p['players'] + 1} clientes = {r['clients']} | "
+          f"resposta {p['answer_time']} | quedas {p['disconnect_rate']:.0%} por pergunta")
+    print(f"setup {r['setup_s']:.1f}s | quizzes {r['quiz_s']:.1f}s | {r['completed_clients']}/{r['clients']} chegaram ao fim | "
+          f"{r['disconnects']} quedas, {r['rejoins']} reentradas ({r['missed_end']} depois do fim do quiz)")
+    print(f"{r['events_per_s']:.0f} eventos/s ({r['events_sent']} enviados, {r['events_received']} recebidos) | "
+          f"{r['answers_per_s']:.0f} respostas/s")
+    print(f"{'latência (ms)':<20} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}")
+    for name, s in r["latency_ms"].items():
+        if s["count"]:
+            print(f"{name:<20} {s['count']:>7} {s['p50']:>8.1f} {s['p95']:>8.1f} {s['p99']:>8.1f} {s['max']:>8.1f}")
+    if r["server_cpu_s"] is not None:
+        print(f"servidor: CPU {r['server_cpu_pct']:.0f}% ({r['server_cpu_s']:.1f}s) | "
+              f"RSS {r['server_rss_mb']:.0f} MB (pico {r['server_peak_rss_mb']:.0f} MB)")
+    print(f"gerador de carga: CPU {r['loadgen_cpu_pct']:.0f}%" +
+          (" -- perto de 100%: as latências incluem atraso do próprio gerador" if r['loadgen_cpu_pct'] > 90 else ""))
+    for error, count in sorted(r["errors"].items(), key=lambda e: -e[1])[:10]:
+        print(f"  erro x{count}: {error}")
+
+
+def print_diff(before, after):
+    def commit(report):
+        return (report["meta"]["commit"] or "?")[:10]
+    changed = {k: (before["params"].get(k), after["params"].get(k)) for k in after["params"]
+               if before["params"].get(k) != after["params"].get(k)}
+    if changed:
+        print("Atenção, parâmetros diferentes: " + ", ".join(f"{k} {a} -> {b}" for k, (a, b) in changed.items()))
+    print(f"{'métrica':<32} {commit(before):>12} {commit(after):>12} {'variação':>10}")
+    rows = [("eventos/s", ("events_per_s",)), ("respostas/s", ("answers_per_s",)),
+            ("CPU do servidor (%)", ("server_cpu_pct",)), ("pico de RSS (MB)", ("server_peak_rss_mb",))]
+    for name in sorted(set(before["results"]["latency_ms"]) | set(after["results"]["latency_ms"])):
+        for q in ("p50", "p95", "p99"):
+            rows.append((f"{name} {q} (ms)", ("latency_ms", name, q)))
+    for label, path in rows:
+        values = []
+        for report in (before, after):
+            value = report["results"]
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            values.append(value)
+        a, b = values
+        change = f"{(b / a - 1) * 100:+.1f}%" if a and b is not None else ""
+        fmt = lambda v: f"{v:.1f}" if isinstance(v, (int, float)) else "-"
+        print(f"{label:<32} {fmt(a):>12} {fmt(b):>12} {change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--players', type=int, default=20, help='jogadores por sala, além do host')
+    parser.add_argument('--challenge', default='desafio1')
+    parser.add_argument('--answer-time', type=parse_distribution, default=parse_distribution('uniform:0.2:2'),
+                        help="uniform:A:B, exp:MÉDIA, normal:MU:SIGMA, lognormal:MU:SIGMA ou fixed:S (padrão uniform:0.2:2)")
+    parser.add_argument('--skip-rate', type=float, default=0.0, help='fração das perguntas que cada jogador não responde')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='probabilidade de um jogador cair durante cada pergunta (volta com rejoin_room_check)')
+    parser.add_argument('--rejoin-delay', type=float, default=1.0, help='segundos fora antes de reconectar')
+    parser.add_argument('--time-per-question', type=int, default=5, help='QUIZ_TIME_PER_QUESTION do servidor local')
+    parser.add_argument('--server-max-size', type=int,
+                        help='conexões simultâneas aceitas pelo servidor local (max_size do eventlet, padrão 1024)')
+    parser.add_argument('--stagger', type=float, default=0.0, help='intervalo entre os start_quiz_for_room das salas')
+    parser.add_argument('--connect-concurrency', type=int, default=100, help='conexões abertas em paralelo no setup')
+    parser.add_argument('--timeout', type=float, default=30.0, help='espera máxima por room_created/room_joined')
+    parser.add_argument('--quiz-timeout', type=float, default=600.0, help='espera máxima para todos os quizzes terminarem')
+    parser.add_argument('--url', help='host:porta[,host:porta...] de servidores já rodando (padrão: sobe um local)')
+    parser.add_argument('--server-pid', help='PID(s) dos servidores em --url, para medir CPU e memória')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help='salva o resultado em JSON')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparar com esta')
+    parser.add_argument('--diff', nargs=2, metavar=('ANTES', 'DEPOIS'), help='só compara dois JSONs salvos')
+    params = parser.parse_args()
+
+    if params.diff:
+        with open(params.diff[0]) as a, open(params.diff[1]) as b:
+            print_diff(json.load(a), json.load(b))
+        return
+    if params.seed is not None:
+        random.seed(params.seed)
+    report = run(params)
+    print_report(report)
+    if params.output:
+        os.makedirs(os.path.dirname(os.path.abspath(params.output)), exist_ok=True)
+        with open(params.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultado salvo em {params.output}")
+    if params.compare:
+        with open(params.compare) as f:
+            print()
+            print_diff(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Checkpoints do estado das salas em disco, para um reinício não apagar as partidas.
+
+Com o store em memória (um worker só), as salas viviam só no rooms_data: um
+deploy ou uma queda do processo levava junto todas as partidas em andamento.
+O app.py grava, a cada QUIZ_CHECKPOINT_INTERVAL s, só as salas que mudaram
+desde o checkpoint anterior (marcadas ao soltar o lock da sala) e as que foram
+removidas, e uma última vez ao encerrar; ao subir, restaura as salas do arquivo.
+
+A foto de cada sala é o pickle do RoomState (o formato do store compartilhado),
+tirado pelo app com o lock da sala em mãos. Comprimir (zlib) e gravar fica com
+uma thread real do sistema (criada pelo _thread, como a do log de eventos),
+fora do loop do servidor. O arquivo é um SQLite com uma linha por sala, e cada
+checkpoint é uma transação: um checkpoint interrompido no meio (queda durante
+a escrita) não estraga o anterior. Se o disco atrasar, os checkpoints que se
+acumularem na fila saem numa transação só, com a foto mais recente de cada sala.
+
+O arquivo guarda pickles: deve ficar num diretório acessível só ao servidor.
+"""
+import _queue
+import _thread
+import logging
+import os
+import sqlite3
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Guardados na importação, antes de um eventual monkey_patch do eventlet trocá-los
+_SimpleQueue = _queue.SimpleQueue
+_Empty = _queue.Empty
+_start_new_thread = _thread.start_new_thread
+_allocate_lock = _thread.allocate_lock
+
+_STOP = object()
+
+
+class RoomCheckpoint:
+    """Escritor dos checkpoints: `submit()` enfileira as fotos, `load()` lê o último checkpoint gravado."""
+
+    def __init__(self, path, compress_level=1):
+        self.path = path
+        self.compress_level = compress_level
+        self._queue = _SimpleQueue()
+        self._finished = None
+        # Estatísticas lidas pelo /metrics; só o escritor altera
+        self.checkpoints = 0
+        self.rooms_written = 0
+        self.rooms_deleted = 0
+        self.bytes_written = 0
+        self.errors = 0
+        self.last_write_seconds = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS rooms (pin TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        return db
+
+    def load(self):
+        """(hora do último checkpoint, [(PIN, pickle da sala)]); (None, []) se ainda não houver arquivo."""
+        if not os.path.exists(self.path):
+            return None, []
+        db = self._connect()
+        try:
+            row = db.execute("SELECT value FROM meta WHERE key = 'saved_at'").fetchone()
+            rooms = [(pin, zlib.decompress(data)) for pin, data in db.execute("SELECT pin, data FROM rooms")]
+        finally:
+            db.close()
+        return (row[0] if row else None), rooms
+
+    def start(self):
+        self._finished = _allocate_lock()
+        self._finished.acquire()
+        _start_new_thread(self._run, ())
+        return self
+
+    def submit(self, changes, saved_at):
+        """Enfileira um checkpoint. `changes`: PIN -> pickle da sala, ou None para sala removida."""
+        self._queue.put((changes, saved_at))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self):
+        """Grava o que ainda está na fila e encerra o escritor."""
+        if self._finished is None:
+            return
+        self._queue.put(_STOP)
+        self._finished.acquire()
+        self._finished = None
+
+    def _run(self):
+        changes, saved_at, stop = {}, None, False
+        try:
+            db = self._connect()
+        except sqlite3.Error:
+            logger.exception("Checkpoint: não foi possível abrir %s; checkpoints desligados.", self.path)
+            self._finished.release()
+            return
+        try:
+            while not stop:
+                items = [self._queue.get()]
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except _Empty:
+                        break
+                for item in items:
+                    if item is _STOP:
+                        stop = True
+                    else:
+                        changes.update(item[0])   # A foto mais nova de cada sala vence
+                        saved_at = item[1]
+                # Se a transação falhar, as fotos ficam para a próxima
+                if changes and self._commit(db, changes, saved_at):
+                    changes = {}
+            if changes:
+                logger.error("Checkpoint: %d salas não gravadas ao encerrar.", len(changes))
+        finally:
+            db.close()
+            self._finished.release()
+
+    def _commit(self, db, changes, saved_at):
+        start = time.perf_counter()
+        rows = [(pin, zlib.compress(data, self.compress_level)) for pin, data in changes.items() if data is not None]
+        removed = [(pin,) for pin, data in changes.items() if data is None]
+        try:
+            db.execute("BEGIN")
+            db.executemany("INSERT OR REPLACE INTO rooms (pin, data) VALUES (?, ?)", rows)
+            db.executemany("DELETE FROM rooms WHERE pin = ?", removed)
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('saved_at', ?)", (saved_at,))
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception("Checkpoint: falha ao gravar %d salas em %s.", len(changes), self.path)
+            try:
+                db.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            return False
+        self.checkpoints += 1
+        self.rooms_written += len(rows)
+        self.rooms_deleted += len(removed)
+        self.bytes_written += sum(len(data) for _, data in rows)
+        self.last_write_seconds = time.perf_counter() - start
+        return True
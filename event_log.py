@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""Log durável de eventos do quiz (respostas, time_up, entradas e saídas).
+
+Os eventos vão para arquivos JSON Lines só de acréscimo, em segmentos
+(eventos-<início>-<pid>-<n>.jsonl), para a análise vocacional depois que as
+salas já não existem. Cada processo escreve os seus próprios segmentos, então
+vários workers podem usar a mesma pasta.
+
+`record()` só coloca o evento numa fila, sem tocar no disco: quem escreve é uma
+thread real do sistema (criada pelo _thread, como a dos logs), que junta tudo o
+que chegou enquanto a escrita anterior estava em andamento e grava o lote com
+uma escrita e um fsync só (group commit). Se o disco não der conta e a fila
+passar de `max_pending` eventos, os novos são descartados e contados: o
+handler de evento nunca espera pelo log.
+
+Para reconstruir as estatísticas por sala e por jogador:
+    python event_log.py [pasta] [--room PIN] [--json]
+"""
+import _queue
+import _thread
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+
+from recommendation import recommend
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_BYTES = 64 * 1024 * 1024
+MAX_PENDING = 100000
+MAX_BATCH = 5000
+
+# Guardados na importação, antes de um eventual monkey_patch do eventlet trocá-los:
+# a fila e a thread precisam ser as reais para funcionar entre o loop de eventos e o escritor
+_SimpleQueue = _queue.SimpleQueue
+_Empty = _queue.Empty
+_start_new_thread = _thread.start_new_thread
+_allocate_lock = _thread.allocate_lock
+
+_STOP = object()
+
+
+class EventLog:
+    """Escritor assíncrono com group commit. Use `record(tipo, **campos)` nos handlers."""
+
+    def __init__(self, directory, fsync=True, segment_bytes=SEGMENT_BYTES, max_pending=MAX_PENDING,
+                 max_batch=MAX_BATCH, clock=time.time):
+        self.directory = directory
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self._clock = clock
+        self._queue = _SimpleQueue()
+        self._prefix = f"eventos-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._segment = 0
+        self._file = None
+        # Contadores lidos pelo /metrics; só o escritor altera written/batches/errors
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._finished = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        self._finished = _allocate_lock()
+        self._finished.acquire()
+        _start_new_thread(self._run, ())
+        return self
+
+    def record(self, kind, **fields):
+        """Enfileira um evento; nunca bloqueia (descarta se a fila estiver cheia)."""
+        if self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            if self.dropped % 10000 == 1:
+                logger.warning("Log de eventos atrasado: %d eventos descartados até agora.", self.dropped)
+            return False
+        fields["t"] = self._clock()
+        fields["ev"] = kind
+        self._queue.put(fields)
+        self.recorded += 1
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self):
+        """Grava o que ainda está na fila e encerra o escritor."""
+        if self._finished is None:
+            return
+        self._queue.put(_STOP)
+        self._finished.acquire()
+        self._finished = None
+
+    def _run(self):
+        try:
+            stop = False
+            while not stop:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except _Empty:
+                        break
+                if batch[-1] is _STOP:
+                    batch.pop()
+                    stop = True
+                if batch:
+                    self._commit(batch)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._finished.release()
+
+    def _commit(self, batch):
+        data = ''.join(json.dumps(event, ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+                       for event in batch).encode('utf-8')
+        try:
+            if self._file is None or self._file.tell() + len(data) > self.segment_bytes:
+                self._open_segment()
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except (OSError, ValueError) as e:
+            # Sem disco não há como gravar: o lote se perde, mas o servidor segue
+            self.errors += 1
+            logger.error("Falha ao gravar %d eventos no log: %s", len(batch), e)
+            self._file = None
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._segment += 1
+        path = os.path.join(self.directory, f"{self._prefix}-{self._segment:04d}.jsonl")
+        self._file = open(path, 'ab')
+
+
+class NullEventLog:
+    """Usado quando o log de eventos está desligado (QUIZ_EVENTS_DIR=off)."""
+    recorded = dropped = written = batches = errors = 0
+
+    def record(self, kind, **fields):
+        return False
+
+    def pending(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def read_events(directory):
+    """Eventos de todos os segmentos da pasta, em ordem de horário, e o número de linhas puladas.
+
+    Linhas inválidas (ex.: a última linha de um segmento cortada por uma queda)
+    são puladas em vez de interromper a leitura.
+    """
+    events, skipped = [], 0
+    for path in sorted(glob.glob(os.path.join(directory, 'eventos-*.jsonl'))):
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    skipped += 1
+    events.sort(key=lambda e: e.get('t', 0))
+    return events, skipped
+
+
+def _player_key(event):
+    # A sessão identifica o jogador: apelidos podem se repetir na sala e mudar no meio do quiz.
+    # Logs gravados antes de a sessão ir para os eventos caem no apelido.
+    return event.get("session") or f"apelido:{event.get('player')}"
+
+
+def replay(events):
+    """Reconstrói estatísticas por sala e por jogador (chave: sala, sessão) a partir dos eventos.
+
+    O apelido vai nas estatísticas do jogador só para exibição (o último com que ele apareceu).
+    """
+    rooms = defaultdict(lambda: {"quizzes": 0, "answers": 0, "correct": 0, "time_ups": 0,
+                                 "joins": 0, "leaves": 0, "players": set(), "challenge": None})
+    players = defaultdict(lambda: {"nickname": None, "answers": 0, "correct": 0, "points": 0, "score": 0,
+                                   "skills": defaultdict(lambda: [0, 0]), "_answers": {}})
+    for e in events:
+        kind, pin = e.get("ev"), e.get("room")
+        room = rooms[pin]
+        if kind == "quiz_start":
+            room["quizzes"] += 1
+            room["challenge"] = e.get("challenge")
+            for (p_pin, _), player in players.items():
+                if p_pin == pin:
+                    player["_answers"] = {}   # Nova partida: a recomendação vale para a última
+        elif kind == "answer":
+            key = _player_key(e)
+            player = players[(pin, key)]
+            player["nickname"] = e.get("player")
+            room["answers"] += 1
+            player["answers"] += 1
+            room["players"].add(key)
+            correct = bool(e.get("correct"))
+            room["correct"] += correct
+            player["correct"] += correct
+            player["points"] += e.get("points", 0)
+            player["score"] = e.get("score", player["score"])
+            skill = player["skills"][e.get("skill")]
+            skill[0] += 1
+            skill[1] += correct
+            player["_answers"][e.get("question")] = {"is_correct": correct, "skill": e.get("skill")}
+        elif kind == "time_up":
+            room["time_ups"] += 1
+        elif kind == "join":
+            room["joins"] += 1
+            room["players"].add(_player_key(e))
+        elif kind == "leave":
+            room["leaves"] += 1
+
+    room_stats = {}
+    for pin, room in rooms.items():
+        room_stats[pin] = dict(room, players=len(room["players"]),
+                               accuracy=room["correct"] / room["answers"] if room["answers"] else None)
+    player_stats = {}
+    for key, player in players.items():
+        answers = player.pop("_answers")
+        player_stats[key] = dict(player, skills={s: {"answers": a, "correct": c} for s, (a, c) in player["skills"].items()},
+                                 recommendation=recommend(answers))
+    return room_stats, player_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estatísticas por sala e por jogador a partir do log de eventos.")
+    parser.add_argument('directory', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eventos'))
+    parser.add_argument('--room', help='só esta sala')
+    parser.add_argument('--json', action='store_true', help='saída em JSON')
+    args = parser.parse_args()
+
+    events, skipped = read_events(args.directory)
+    if args.room:
+        events = [e for e in events if e.get("room") == args.room.upper()]
+    rooms, players = replay(events)
+    if args.json:
+        print(json.dumps({"rooms": rooms, "players": [dict(stats, room=pin, session=key) for (pin, key), stats in players.items()]},
+                         ensure_ascii=False, indent=2))
+        return
+    print(f"{len(events)} eventos ({skipped} linhas inválidas), {len(rooms)} salas, {len(players)} jogadores")
+    for pin, room in sorted(rooms.items()):
+        accuracy = f"{room['accuracy'] * 100:.0f}%" if room["accuracy"] is not None else "-"
+        print(f"\nSala {pin} ({room['challenge'] or '?'}): {room['quizzes']} quiz(zes), {room['players']} jogadores, "
+              f"{room['answers']} respostas, {accuracy} de acerto, {room['time_ups']} time_up, "
+              f"{room['joins']} entradas, {room['leaves']} saídas")
+        ranked = sorted((s for (p_pin, _), s in players.items() if p_pin == pin), key=lambda s: -s["score"])
+        for stats in ranked:
+            print(f"  {stats['nickname'] or '?':<25} {stats['score']:>6} pts  {stats['correct']}/{stats['answers']} acertos  {stats['recommendation']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Ranking incremental por sala.
+
+Os jogadores ficam agrupados em baldes por pontuação, e as pontuações
+distintas numa lista ordenada. Atualizar a pontuação de um jogador custa
+O(log S + B) (S pontuações distintas, B jogadores no balde) em vez de
+reordenar a sala inteira, e top(n) só percorre os primeiros baldes.
+
+Empates seguem a ordem de entrada na sala, como o sorted() estável que
+era usado antes.
+"""
+import bisect
+
+
+class Leaderboard:
+    def __init__(self):
+        self._scores = {}        # sid -> pontuação
+        self._seq = {}           # sid -> ordem de entrada (desempate)
+        self._buckets = {}       # pontuação -> lista ordenada de (seq, sid)
+        self._distinct = []      # pontuações distintas em ordem crescente
+        self._next_seq = 0       # inteiro simples: a sala é serializada com pickle
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, sid):
+        return sid in self._scores
+
+    def score(self, sid):
+        return self._scores.get(sid)
+
+    def add(self, sid, score=0):
+        if sid in self._scores:
+            self.update(sid, score)
+            return
+        self._seq[sid] = self._next_seq
+        self._next_seq += 1
+        self._scores[sid] = score
+        self._insert(sid, score)
+
+    def remove(self, sid):
+        score = self._scores.pop(sid, None)
+        if score is None:
+            return
+        self._discard(sid, score)
+        del self._seq[sid]
+
+    def update(self, sid, score):
+        old = self._scores.get(sid)
+        if old is None:
+            self.add(sid, score)
+            return
+        if old == score:
+            return
+        self._discard(sid, old)
+        self._scores[sid] = score
+        self._insert(sid, score)
+
+    def rename(self, old_sid, new_sid):
+        """Troca o SID de um jogador (reconexão) mantendo a pontuação e a posição nos empates."""
+        score = self._scores.get(old_sid)
+        if score is None:
+            return
+        self._discard(old_sid, score)
+        del self._scores[old_sid]
+        self._seq[new_sid] = self._seq.pop(old_sid)
+        self._scores[new_sid] = score
+        self._insert(new_sid, score)
+
+    def reset(self, score=0):
+        """Zera todas as pontuações mantendo a ordem de entrada."""
+        self._buckets = {score: sorted((seq, sid) for sid, seq in self._seq.items())} if self._seq else {}
+        self._distinct = [score] if self._seq else []
+        for sid in self._scores:
+            self._scores[sid] = score
+
+    def top(self, n):
+        """Os n primeiros colocados como lista de (sid, pontuação)."""
+        result = []
+        for score in reversed(self._distinct):
+            for _, sid in self._buckets[score]:
+                result.append((sid, score))
+                if len(result) >= n:
+                    return result
+        return result
+
+    def ranked(self):
+        """Todos os jogadores, do primeiro ao último colocado."""
+        for score in reversed(self._distinct):
+            for _, sid in self._buckets[score]:
+                yield sid, score
+
+    def _insert(self, sid, score):
+        bucket = self._buckets.get(score)
+        if bucket is None:
+            bucket = self._buckets[score] = []
+            bisect.insort(self._distinct, score)
+        bisect.insort(bucket, (self._seq[sid], sid))
+
+    def _discard(self, sid, score):
+        bucket = self._buckets[score]
+        item = (self._seq[sid], sid)
+        del bucket[bisect.bisect_left(bucket, item)]
+        if not bucket:
+            del self._buckets[score]
+            del self._distinct[bisect.bisect_left(self._distinct, score)]
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""Métricas do servidor no formato texto do Prometheus (servidas em GET /metrics).
+
+Implementação mínima e sem dependências, feita para ficar ligada em produção:
+contadores e histogramas (buckets fixos) são atualizados sem lock, e os valores
+que dependem do estado das salas (gauges) só são calculados quando o /metrics é
+lido. Com eventlet as atualizações são exatas (greenlets não são interrompidos
+no meio delas); no modo threading uma atualização pode, raramente, se perder
+numa troca de thread, o que basta para métricas e evita um lock por observação.
+"""
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Buckets em segundos, de 50 µs a 10 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FANOUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+# SpanRecorder do profiling.py enquanto um perfil 'spans' estiver ligado (None = desligado)
+span_recorder = None
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{v}"' for n, v in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Série com os valores de label dados (guarde o retorno para usar no caminho quente)."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        lines = self.header()
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f'{name}_total{_format_labels(labelnames, values)} {_format_value(self.value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ('_buckets', '_counts', '_sum')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)   # Último: acima do maior bucket
+        self._sum = 0.0
+
+    def observe(self, value):
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+
+    def count(self):
+        return sum(self._counts)
+
+    def render(self, name, labelnames, values):
+        counts, total = list(self._counts), self._sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self._buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, (('le', _format_value(float(bound))),))
+            lines.append(f'{name}_bucket{labels} {cumulative}')
+        labels = _format_labels(labelnames, values)
+        lines.append(f'{name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(float(b) for b in buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class Collected(_Metric):
+    """Gauge (ou contador) calculado na hora da coleta.
+
+    `collect` retorna pares (valores dos labels, valor); é chamado a cada leitura
+    do /metrics e deve ser barato e seguro fora dos locks de sala.
+    """
+
+    def __init__(self, name, documentation, collect, labelnames=(), kind='gauge'):
+        self.kind = kind
+        self._collect = collect
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        lines = self.header()
+        suffix = '_total' if self.kind == 'counter' else ''
+        for values, value in self._collect():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, values)} {_format_value(value)}')
+        return lines
+
+
+class CollectedHistogram(_Metric):
+    """Histograma calculado na hora da coleta: `collect` retorna os valores observados agora.
+
+    Para distribuições sobre as salas abertas (jogadores por sala) sem um label
+    por PIN, que criaria uma série nova para cada sala que já existiu.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, collect, buckets):
+        self._collect = collect
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(float(b) for b in buckets)
+
+    def render(self):
+        child = _HistogramChild(self.buckets)
+        for value in self._collect():
+            child.observe(value)
+        return self.header() + child.render(self.name, (), ())
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = Registry()
+
+EVENT_DURATION = Histogram(
+    'quiz_event_duration_seconds', 'Tempo de execução dos handlers Socket.IO.', ['event'])
+# Contagem tirada do próprio histograma na coleta: uma atualização a menos por evento
+EVENTS = REGISTRY.register(Collected(
+    'quiz_events', 'Eventos Socket.IO recebidos, por handler.',
+    lambda: [(values, child.count()) for values, child in sorted(EVENT_DURATION._children.items())],
+    labelnames=['event'], kind='counter'))
+EVENT_ERRORS = REGISTRY.register(Counter(
+    'quiz_event_errors', 'Handlers Socket.IO que terminaram com exceção.', ['event']))
+REGISTRY.register(EVENT_DURATION)
+TRANSITION_DURATION = REGISTRY.register(Histogram(
+    'quiz_transition_duration_seconds', 'Tempo das transições de sala (avançar pergunta, encerrar quiz).',
+    ['transition']))
+ROOM_LOCK_WAIT = REGISTRY.register(Histogram(
+    'quiz_room_lock_wait_seconds', 'Espera para adquirir o lock (e o lease) de uma sala.'))
+ROOM_LOCK_HOLD = REGISTRY.register(Histogram(
+    'quiz_room_lock_hold_seconds', 'Tempo com o lock de uma sala em mãos.'))
+EMIT_FANOUT = REGISTRY.register(Histogram(
+    'quiz_emit_fanout', 'Jogadores da sala alcançados por cada broadcast, por evento.', ['event'],
+    buckets=FANOUT_BUCKETS))
+TIMER_LATENESS = REGISTRY.register(Histogram(
+    'quiz_timer_lateness_seconds', 'Atraso dos prazos do DeadlineScheduler em relação ao horário agendado.'))
+ROOMS_EVICTED = REGISTRY.register(Counter(
+    'quiz_rooms_evicted', 'Salas removidas pelo ciclo de vida, por motivo (idle, finished, orphaned, cap).', ['reason']))
+SESSION_RESUMES = REGISTRY.register(Counter(
+    'quiz_session_resumes', 'rejoin_room_check com resumeToken, por resultado (swapped, restored, missing).', ['outcome']))
+BATCH_FRAMES = REGISTRY.register(Counter(
+    'quiz_batch_frames', "Pacotes 'room_batch' enviados (uma transição de sala com mais de um broadcast)."))
+BATCH_EVENTS = REGISTRY.register(Counter(
+    'quiz_batch_events', "Broadcasts entregues dentro de pacotes 'room_batch'."))
+BATCH_PACKETS_SAVED = REGISTRY.register(Counter(
+    'quiz_batch_packets_saved', "Pacotes que deixaram de ser enviados aos clientes graças aos lotes."))
+BATCH_BYTES_SAVED = REGISTRY.register(Counter(
+    'quiz_batch_bytes_saved', "Bytes economizados pelos lotes, contando os cabeçalhos WebSocket/TCP/IP estimados por pacote."))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    'quiz_admission_rejected', 'Eventos recusados pelo controle de admissão, por evento e motivo (sid, room, rooms_per_connection).',
+    ['event', 'reason']))
+OUTBOUND_DROPPED = REGISTRY.register(Counter(
+    'quiz_outbound_dropped', 'Pacotes descartados com a fila de saída do cliente cheia, por evento.', ['event']))
+CHECKPOINT_DURATION = REGISTRY.register(Histogram(
+    'quiz_checkpoint_duration_seconds', 'Tempo de cada checkpoint no servidor (fotos das salas alteradas), sem a escrita.'))
+
+
+def instrument_handler(event):
+    """Decorator para handlers Socket.IO: conta chamadas, exceções e mede a duração.
+
+    Aplicado abaixo do @socketio.on. O wrapper repassa só os argumentos que o
+    handler aceita: o Flask-SocketIO passa `auth` ao connect e só repete a chamada
+    sem ele se o handler levantar TypeError. Com um perfil 'spans' ligado
+    (profiling.py), o handler e as transições chamadas dentro dele viram spans.
+    """
+    errors, duration = EVENT_ERRORS.labels(event), EVENT_DURATION.labels(event)
+
+    def decorator(handler):
+        params = inspect.signature(handler).parameters.values()
+        varargs = any(p.kind == p.VAR_POSITIONAL for p in params)
+        nargs = len(params)
+
+        @wraps(handler)
+        def wrapper(*args):
+            spans = span_recorder
+            if spans is not None:
+                spans.enter(event)
+            start = time.perf_counter()
+            try:
+                return handler(*args) if varargs else handler(*args[:nargs])
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                duration.observe(elapsed)
+                if spans is not None:
+                    spans.exit(elapsed)
+        return wrapper
+    return decorator
+
+
+def timed(transition):
+    """Decorator que mede a duração de uma transição de sala."""
+    duration = TRANSITION_DURATION.labels(transition)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            spans = span_recorder
+            if spans is not None:
+                spans.enter(transition)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                duration.observe(elapsed)
+                if spans is not None:
+                    spans.exit(elapsed)
+        return wrapper
+    return decorator
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Alocação dos PINs das salas: O(1) por PIN, com quarentena e fatias por worker.
+
+Antes, cada PIN era sorteado com random.choices e conferido contra rooms_data
+(com o rooms_lock em mãos) até achar um livre: com o espaço de PINs cheio, as
+tentativas crescem (10 em média a 90% de ocupação) e um PIN liberado podia
+voltar na sala seguinte, enquanto clientes antigos ainda tentavam o
+rejoin_room_check nele.
+
+O espaço de PINs (36^5 com o alfabeto padrão) é numerado de 0 a N-1 e
+dividido em `shards` fatias contíguas; cada worker usa a sua, e workers com
+fatias diferentes nunca geram o mesmo PIN. Dentro da fatia:
+  novos      uma permutação pseudoaleatória da fatia (rede de Feistel com chave
+             aleatória, sem tabela), percorrida por um contador: cada PIN sai
+             uma vez só, em ordem imprevisível
+  quarentena PINs liberados, em ordem de liberação, por `quarantine` segundos
+  livres     PINs que já cumpriram a quarentena, usados só depois que os novos
+             acabarem
+Alocar e liberar custam O(1) (amortizado para a quarentena).
+
+A quarentena vive na memória do worker: ao reiniciar, os PINs começam de uma
+permutação nova, e o store compartilhado recusa os que ainda estão em uso
+(ver _register_room).
+"""
+import random
+import string
+import threading
+import time
+from collections import deque
+
+ALPHABET = string.ascii_uppercase + string.digits
+
+
+class PinsExhausted(Exception):
+    """Nenhum PIN disponível na fatia: todos em uso ou em quarentena."""
+
+
+class _Permutation:
+    """Permutação de range(size) por uma rede de Feistel desbalanceada de 4 rodadas com cycle-walking.
+
+    As metades têm bits//2 e bits - bits//2 bits e trocam de largura a cada
+    rodada, então o domínio da rede é 2^bits, menos que o dobro da fatia:
+    menos de 2 passos em média até o resultado cair nela.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size, rng):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self.left_bits = bits // 2
+        self.right_bits = bits - self.left_bits
+        self.keys = [rng.getrandbits(32) for _ in range(self.ROUNDS)]
+
+    def __call__(self, index):
+        value = index
+        while True:
+            left_bits, right_bits = self.left_bits, self.right_bits
+            left, right = value >> right_bits, value & ((1 << right_bits) - 1)
+            for key in self.keys:
+                mixed = ((right ^ key) * 0x9E3779B1) & 0xFFFFFFFF
+                left, right = right, (left ^ mixed ^ (mixed >> 15)) & ((1 << left_bits) - 1)
+                left_bits, right_bits = right_bits, left_bits
+            value = (left << right_bits) | right
+            if value < self.size:
+                return value
+
+
+class PinAllocator:
+    def __init__(self, length=5, alphabet=ALPHABET, shard=0, shards=1, quarantine=3600.0,
+                 clock=time.monotonic, seed=None):
+        if not 0 <= shard < shards:
+            raise ValueError(f"Fatia {shard} inválida para {shards} fatias.")
+        self.length = length
+        self.alphabet = alphabet
+        self.quarantine = quarantine
+        self._clock = clock
+        self._base = len(alphabet)
+        self._digits = {c: i for i, c in enumerate(alphabet)}
+        self._pairs = [a + b for a in alphabet for b in alphabet]   # Dois caracteres por divmod
+        total = self._base ** length
+        self.start = total * shard // shards
+        self.size = total * (shard + 1) // shards - self.start
+        self._permute = _Permutation(self.size, random.Random(seed))
+        self._next = 0                 # Próximo índice da permutação ainda não usado
+        self._quarantined = deque()    # (liberado em, índice na fatia), em ordem de liberação
+        self._free = deque()
+        self._lock = threading.Lock()
+
+    def _encode(self, index):
+        parts = []
+        pairs, base2 = self._pairs, self._base * self._base
+        for _ in range(self.length // 2):
+            index, pair = divmod(index, base2)
+            parts.append(pairs[pair])
+        if self.length % 2:
+            parts.append(self.alphabet[index])
+        return ''.join(reversed(parts))
+
+    def _decode(self, pin):
+        index = 0
+        for c in pin:
+            index = index * self._base + self._digits[c]
+        return index
+
+    def _release_expired(self, now):
+        quarantined = self._quarantined
+        while quarantined and now - quarantined[0][0] >= self.quarantine:
+            self._free.append(quarantined.popleft()[1])
+
+    def allocate(self):
+        with self._lock:
+            if self._next < self.size:
+                local = self._permute(self._next)
+                self._next += 1
+            else:
+                self._release_expired(self._clock())
+                if not self._free:
+                    raise PinsExhausted(f"{self.size} PINs na fatia, {len(self._quarantined)} em quarentena.")
+                local = self._free.popleft()
+        return self._encode(self.start + local)
+
+    def release(self, pin):
+        """Devolve um PIN desta fatia; ele só volta a ser alocado depois da quarentena."""
+        if len(pin) != self.length or any(c not in self._digits for c in pin):
+            return
+        local = self._decode(pin) - self.start
+        if not 0 <= local < self.size:
+            return   # PIN de outra fatia (sala criada por outro worker)
+        with self._lock:
+            self._quarantined.append((self._clock(), local))
+
+    def counts(self):
+        """(novos, em quarentena, livres) restantes, para as métricas."""
+        with self._lock:
+            self._release_expired(self._clock())
+            return self.size - self._next, len(self._quarantined), len(self._free)
+
+
+def parse_shard(spec):
+    """'k/K' (fatia k de K, a partir de 0) -> (k, K); vazio ou None -> (0, 1)."""
+    if not spec:
+        return 0, 1
+    shard, _, shards = spec.partition('/')
+    return int(shard), int(shards)
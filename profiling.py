@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""Perfis sob demanda do servidor em execução (ligados pelo /admin/profile do app.py).
+
+Três modos, cada um por até `seconds` segundos, gravados em disco ao terminar:
+  sample    amostrador: uma thread real do sistema lê a pilha de todas as threads
+            (sys._current_frames) a cada `interval` s e conta as pilhas. Com
+            eventlet, a pilha da thread principal é a do greenlet que está rodando.
+            Saída: pilhas colapsadas (.folded), uma por linha com o número de amostras,
+            prontas para o flamegraph.pl ou o speedscope.
+  cprofile  cProfile determinístico da thread do loop (.prof, para o pstats/snakeviz).
+            Só com eventlet ou asyncio: no modo threading cada evento roda na sua
+            thread, que o cProfile não vê.
+  spans     tempo de cada handler Socket.IO e de cada transição de sala (os wrappers
+            de metrics.py), com o aninhamento (submit_answer;advance_question;end_quiz).
+            Saída: pilhas colapsadas com o tempo próprio de cada caminho em µs.
+
+Desligado, nada disso roda: os wrappers de metrics.py só testam se há um
+span_recorder, e o amostrador e o cProfile não existem fora de uma sessão.
+"""
+import _thread
+import contextvars
+import cProfile
+import itertools
+import os
+import sys
+import time
+from collections import defaultdict
+
+import metrics
+
+MODES = ('sample', 'cprofile', 'spans')
+MAX_SECONDS = 600
+DEFAULT_INTERVAL = 0.005
+MIN_INTERVAL, MAX_INTERVAL = 0.001, 1.0
+
+# Guardados na importação, antes de um eventual monkey_patch do eventlet trocá-los:
+# o amostrador roda numa thread real e a trava é compartilhada com ela
+_start_new_thread = _thread.start_new_thread
+_allocate_lock = _thread.allocate_lock
+_get_ident = _thread.get_ident
+_sleep = time.sleep
+
+# (SpanRecorder, pilha de spans abertos) do contexto atual
+_open_spans = contextvars.ContextVar('quiz_open_spans', default=(None, None))
+
+
+class SpanRecorder:
+    """Tempo próprio por caminho de spans aninhados, alimentado por metrics.instrument_handler/timed.
+
+    A pilha de spans abertos fica numa ContextVar, local a cada thread e a cada
+    greenlet (os do eventlet e os do modo asyncio, que não têm monkey_patch).
+    As somas não usam lock, como as métricas: no modo threading uma soma pode,
+    raramente, se perder.
+    """
+
+    def __init__(self):
+        self.self_time = defaultdict(float)   # "a;b" -> segundos fora dos spans filhos
+        self.calls = defaultdict(int)
+
+    def enter(self, name):
+        owner, stack = _open_spans.get()
+        if owner is not self:
+            stack = []
+            _open_spans.set((self, stack))
+        stack.append([f"{stack[-1][0]};{name}" if stack else name, 0.0])
+
+    def exit(self, elapsed):
+        stack = _open_spans.get()[1]
+        path, children = stack.pop()
+        self.self_time[path] += elapsed - children
+        self.calls[path] += 1
+        if stack:
+            stack[-1][1] += elapsed
+
+    def folded(self):
+        return [f"{path} {round(seconds * 1e6)}" for path, seconds in sorted(self.self_time.items())]
+
+
+class _Sampler:
+    """Amostrador de pilhas numa thread real do sistema."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self.stopped = False
+        self._labels = {}   # code -> rótulo, para não formatar o mesmo código a cada amostra
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def run(self, deadline, done):
+        own = _get_ident()
+        try:
+            while not self.stopped and time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+                _sleep(self.interval)
+        finally:
+            done(self)
+
+    def folded(self):
+        return [f"{stack} {count}" for stack, count in sorted(self.stacks.items())]
+
+
+class _Session:
+    __slots__ = ('mode', 'started_at', 'until', 'path', 'worker')
+
+    def __init__(self, mode, seconds, path, worker):
+        self.mode = mode
+        self.started_at = time.time()
+        self.until = self.started_at + seconds
+        self.path = path
+        self.worker = worker   # _Sampler, cProfile.Profile ou SpanRecorder
+
+    def info(self):
+        return {"mode": self.mode, "startedAt": self.started_at, "until": self.until, "file": self.path}
+
+
+class Profiler:
+    """Sessões de perfil do processo, no máximo uma por modo ao mesmo tempo.
+
+    `spawn` e `sleep` são os do Socket.IO: o fim automático do cProfile e dos
+    spans roda como tarefa do servidor (com eventlet ou asyncio, na mesma thread
+    do loop, onde o cProfile foi ligado). `green` diz se todos os eventos rodam
+    na thread do loop (eventlet ou asyncio).
+    """
+
+    def __init__(self, out_dir, spawn, sleep, green):
+        self.out_dir = out_dir
+        self._spawn = spawn
+        self._sleep = sleep
+        self.green = green
+        self._sessions = {}
+        self._finished = []   # Arquivos gravados, do mais antigo ao mais recente
+        self._numbers = itertools.count(1)   # Nomes distintos para sessões no mesmo segundo
+        self._lock = _allocate_lock()
+
+    def start(self, mode, seconds, interval=DEFAULT_INTERVAL):
+        """Liga um perfil por `seconds` s e retorna a sessão. ValueError se o pedido for inválido."""
+        if mode not in MODES:
+            raise ValueError(f"Modo '{mode}' desconhecido (use {', '.join(MODES)}).")
+        if not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f"Duração deve estar entre 0 e {MAX_SECONDS} s.")
+        if mode == 'cprofile' and not self.green:
+            raise ValueError("O cprofile só vê a thread do loop: use QUIZ_ASYNC_MODE=eventlet ou asyncio, ou o modo sample.")
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, "perfil-{}-{}-{}-{}.{}".format(
+            time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(self._numbers), mode,
+            'prof' if mode == 'cprofile' else 'folded'))
+        with self._lock:
+            if mode in self._sessions:
+                raise ValueError(f"Já há um perfil '{mode}' em andamento.")
+            if mode == 'sample':
+                worker = _Sampler(min(MAX_INTERVAL, max(MIN_INTERVAL, interval)))
+            elif mode == 'cprofile':
+                worker = cProfile.Profile()
+            else:
+                worker = SpanRecorder()
+            session = self._sessions[mode] = _Session(mode, seconds, path, worker)
+        if mode == 'sample':
+            _start_new_thread(worker.run, (time.monotonic() + seconds, lambda _: self._sampler_done(session)))
+        else:
+            if mode == 'cprofile':
+                worker.enable()
+            else:
+                metrics.span_recorder = worker
+            self._spawn(self._stop_later, session, seconds)
+        return session.info()
+
+    def _stop_later(self, session, seconds):
+        self._sleep(seconds)
+        self._stop(session)
+
+    def stop(self, mode):
+        """Encerra o perfil do modo antes do prazo. Retorna o arquivo (None se não havia sessão).
+
+        O arquivo do amostrador é gravado pela thread dele, logo depois (até um `interval`).
+        """
+        with self._lock:
+            session = self._sessions.get(mode)
+        if session is None:
+            return None
+        self._stop(session)
+        return session.path
+
+    def _claim(self, session):
+        # Tira a sessão da lista de ativas; False se ela já tinha sido encerrada
+        # (o prazo de uma sessão antiga não desliga a seguinte do mesmo modo)
+        with self._lock:
+            if self._sessions.get(session.mode) is not session:
+                return False
+            del self._sessions[session.mode]
+            return True
+
+    def _stop(self, session):
+        if not self._claim(session):
+            return
+        worker = session.worker
+        if session.mode == 'sample':
+            worker.stopped = True   # A thread do amostrador grava o arquivo ao sair
+            return
+        if session.mode == 'cprofile':
+            worker.disable()
+        elif metrics.span_recorder is worker:
+            metrics.span_recorder = None
+        self._write(session)
+
+    def _sampler_done(self, session):
+        self._claim(session)   # Fim pelo prazo; parada pedida já a tirou das ativas
+        self._write(session)
+
+    def _write(self, session):
+        worker = session.worker
+        if session.mode == 'cprofile':
+            worker.dump_stats(session.path)
+        else:
+            with open(session.path, 'w', encoding='utf-8') as f:
+                f.writelines(line + '\n' for line in worker.folded())
+        with self._lock:
+            self._finished = (self._finished + [session.path])[-20:]
+
+    def status(self):
+        with self._lock:
+            return {"active": [s.info() for s in self._sessions.values()], "files": list(self._finished)}
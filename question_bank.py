@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""Bancos de questões em disco, carregados sob demanda e recarregáveis a quente.
+
+Cada desafio é um arquivo <desafio>.jsonl na pasta dos bancos, com uma questão
+por linha (mesmas chaves de sempre: id, text, options, correctOptionId,
+skillArea, difficulty). Linhas vazias e linhas começando com # são ignoradas.
+
+O banco de um desafio só é lido no primeiro uso. Cada leitura gera uma versão
+imutável (QuestionBank), identificada pelo hash do conteúdo do arquivo, com os
+índices por área e por dificuldade. Editar o arquivo troca a versão atual por
+uma nova (copy-on-write) sem tocar nas anteriores: salas em andamento guardam a
+versão com que começaram e continuam nela até o fim do quiz.
+
+Uma sala pode jogar só N questões sorteadas do banco, filtradas por área e
+dificuldade (QuestionFilter). O sorteio (QuestionBank.draw) é estratificado por
+área, usa os índices montados na carga e custa O(N), qualquer que seja o
+tamanho do banco; a sala guarda só o array com as posições sorteadas. Com a
+mesma versão do banco, o mesmo filtro e a mesma semente, o sorteio se repete,
+o que permite auditar depois as questões que cada sala recebeu.
+
+Uma cópia de cada versão carregada fica em <pasta>/.versoes, então qualquer
+worker consegue abrir a versão fixada numa sala mesmo depois de o arquivo mudar
+(ou de a versão sair do cache em memória).
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import string
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from collections.abc import Sequence
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = '.versoes'
+# Nomes de desafio aceitos como nome de arquivo (o challengeType vem do cliente)
+_CHALLENGE_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Desafios inexistentes lembrados por exists(): acima disso a lista recomeça
+MISSING_CACHE_SIZE = 1024
+
+
+# Questões de uma sala: `count` sorteadas entre as áreas e dificuldades dadas (None = todas).
+# seed None: uma semente nova a cada partida (guardada no estado da sala e no log de eventos)
+QuestionFilter = namedtuple('QuestionFilter', 'count skill_areas difficulties seed')
+
+
+# --- Definição das Questões ---
+class QuizOption:
+    def __init__(self, id: str, text: str): self.id = id; self.text = text
+    def to_dict(self): return {"id": self.id, "text": self.text}
+
+# IDs curtos enviados aos clientes: a pergunta é identificada pela sua posição no desafio
+# (base 36) e as opções pela posição na lista (a, b, c, ...).
+OPTION_SHORT_IDS = string.ascii_lowercase
+
+def to_base36(n: int) -> str:
+    digits = string.digits + string.ascii_lowercase
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+        if n == 0: return out
+
+class QuizQuestion:
+    def __init__(self, id: str, text: str, options: list[QuizOption], correct_option_id: str, skill_area: str, difficulty: str, short_id: str = None):
+        self.id, self.text, self.options, self.correct_option_id, self.skill_area, self.difficulty = id, text, options, correct_option_id, skill_area, difficulty
+        self.short_id = short_id or id
+        self._option_positions = {}
+        for pos, opt in enumerate(options):
+            self._option_positions[opt.id] = pos
+            self._option_positions[OPTION_SHORT_IDS[pos]] = pos
+        self.correct_short_id = self.short_option_id(correct_option_id)
+    @classmethod
+    def from_dict(cls, q, position):
+        return cls(q["id"], q["text"], [QuizOption(opt["id"], opt["text"]) for opt in q["options"]],
+                   q["correctOptionId"], q["skillArea"], q["difficulty"], to_base36(position))
+    def to_dict(self):
+        return {"id": self.id, "text": self.text, "options": [opt.to_dict() for opt in self.options],
+                "correctOptionId": self.correct_option_id, "skillArea": self.skill_area, "difficulty": self.difficulty}
+    def to_client_dict(self):
+        # Visão enviada aos jogadores: sem resposta correta, área ou dificuldade
+        return {"id": self.short_id, "text": self.text, "options": [opt.text for opt in self.options]}
+    def matches_id(self, question_id):
+        return question_id is not None and question_id in (self.short_id, self.id)
+    def option_position(self, option_id):
+        # Aceita tanto o ID curto (a, b, ...) quanto o ID completo da opção
+        return self._option_positions.get(option_id)
+    def resolve_option_id(self, option_id):
+        pos = self._option_positions.get(option_id)
+        return None if pos is None else self.options[pos].id
+    def short_option_id(self, option_id):
+        for pos, opt in enumerate(self.options):
+            if opt.id == option_id: return OPTION_SHORT_IDS[pos]
+        return None
+
+
+class _Pool(Sequence):
+    """Posições de vários estratos vistas como uma sequência só, sem concatená-las.
+
+    random.sample sorteia índices da sequência, então o custo do sorteio não
+    depende do tamanho dos estratos.
+    """
+    __slots__ = ('_parts', '_ends')
+
+    def __init__(self, parts):
+        self._parts = [p for p in parts if p]
+        self._ends, total = [], 0
+        for part in self._parts:
+            total += len(part)
+            self._ends.append(total)
+
+    def __len__(self):
+        return self._ends[-1] if self._ends else 0
+
+    def __getitem__(self, i):
+        k = bisect_right(self._ends, i)
+        return self._parts[k][i - (self._ends[k - 1] if k else 0)]
+
+
+class QuestionBank:
+    """Uma versão imutável do banco de um desafio, com índices por área e dificuldade.
+
+    Os índices guardam posições na lista de questões (a posição é também o ID
+    curto enviado aos clientes). `payload_cache` guarda os payloads já
+    serializados desta versão; como a versão não muda, nunca precisa ser invalidado.
+    """
+
+    def __init__(self, challenge, version, questions):
+        self.challenge = challenge
+        self.version = version
+        self.questions = tuple(questions)
+        self.by_id = {}
+        self.skills = tuple(q.skill_area for q in self.questions)   # Área de cada posição
+        by_skill, by_difficulty, by_both = {}, {}, {}
+        for pos, q in enumerate(self.questions):
+            self.by_id[q.id] = pos
+            by_skill.setdefault(q.skill_area, []).append(pos)
+            by_difficulty.setdefault(q.difficulty, []).append(pos)
+            by_both.setdefault((q.skill_area, q.difficulty), []).append(pos)
+        self.by_skill = {k: tuple(v) for k, v in by_skill.items()}
+        self.by_difficulty = {k: tuple(v) for k, v in by_difficulty.items()}
+        self._by_both = {k: tuple(v) for k, v in by_both.items()}
+        self.payload_cache = {}
+
+    @classmethod
+    def parse(cls, challenge, data):
+        """Monta a versão a partir do conteúdo (bytes) de um arquivo .jsonl."""
+        version = hashlib.sha1(data).hexdigest()[:12]
+        questions = []
+        for lineno, line in enumerate(data.decode('utf-8').splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                questions.append(QuizQuestion.from_dict(json.loads(line), len(questions)))
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                raise ValueError(f"{challenge}.jsonl, linha {lineno}: questão inválida ({e!r})") from e
+        if not questions:
+            raise ValueError(f"{challenge}.jsonl não tem nenhuma questão")
+        if len(set(q.id for q in questions)) != len(questions):
+            raise ValueError(f"{challenge}.jsonl tem IDs de questão repetidos")
+        return cls(challenge, version, questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __getitem__(self, idx):
+        return self.questions[idx]
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    def select(self, skill_area=None, difficulty=None):
+        """Posições das questões com a área e/ou dificuldade dadas, na ordem do banco."""
+        if skill_area is None and difficulty is None:
+            return tuple(range(len(self.questions)))
+        if difficulty is None:
+            return self.by_skill.get(skill_area, ())
+        if skill_area is None:
+            return self.by_difficulty.get(difficulty, ())
+        return self._by_both.get((skill_area, difficulty), ())
+
+    def _strata(self, skill_areas, difficulties):
+        # Um estrato por área (em ordem alfabética, para o sorteio ser reprodutível),
+        # com as posições das dificuldades pedidas
+        skills = sorted(set(skill_areas)) if skill_areas else sorted(self.by_skill)
+        strata = []
+        for skill in skills:
+            if difficulties:
+                pool = _Pool([self._by_both.get((skill, d), ()) for d in sorted(set(difficulties))])
+            else:
+                pool = _Pool([self.by_skill.get(skill, ())])
+            if len(pool):
+                strata.append((skill, pool))
+        return strata
+
+    def pool_size(self, skill_areas=None, difficulties=None):
+        """Quantas questões atendem ao filtro de áreas e dificuldades."""
+        return sum(len(pool) for _, pool in self._strata(skill_areas, difficulties))
+
+    def draw(self, count, skill_areas=None, difficulties=None, seed=None):
+        """Sorteia até `count` posições distintas (array('I'), já embaralhado) entre as do filtro.
+
+        As questões são divididas igualmente entre as áreas; uma área com menos
+        questões que a sua parte cede o restante às outras. count None sorteia a
+        ordem de todas as questões do filtro.
+        """
+        rng = random.Random(seed)
+        strata = sorted(self._strata(skill_areas, difficulties), key=lambda s: (len(s[1]), s[0]))
+        total = sum(len(pool) for _, pool in strata)
+        remaining = total if count is None else min(count, total)
+        positions = []
+        for i, (_, pool) in enumerate(strata):
+            take = min(len(pool), remaining // (len(strata) - i))
+            positions.extend(rng.sample(pool, take))
+            remaining -= take
+        rng.shuffle(positions)
+        return array('I', positions)
+
+
+class QuestionBankStore:
+    """Bancos de todos os desafios de uma pasta, com carga preguiçosa e recarga a quente.
+
+    `current(desafio)` devolve a versão atual e, no máximo a cada
+    `check_interval` segundos, pede uma conferência da data de modificação do
+    arquivo. A conferência (e a recarga, se o arquivo mudou) roda numa tarefa
+    de `start_task` (socketio.start_background_task), fora de quem chamou
+    current(), que pode estar com o lock de uma sala. Sem start_task, roda na
+    hora. Só a primeira carga de um desafio é feita por quem pediu o banco.
+
+    Ler, conferir o hash e montar uma versão é trabalho de CPU que não cede a
+    vez: roda em `run_blocking(fn, *args)`, que no eventlet e no asyncio manda
+    fn para uma thread do sistema e só devolve o controle a quem chamou quando
+    ela termina, sem parar o loop. Nada disso segura o lock do store, que só é
+    usado para trocar a versão nova pela atual. Sem run_blocking, roda na
+    própria thread de quem chamou (modo threading, scripts). `exists()` lembra
+    por `check_interval` segundos os desafios que não existem, para um
+    challengeType inventado não custar uma consulta ao disco a cada evento.
+    `get(desafio, versão)` devolve uma versão específica (a fixada
+    numa sala). Versões antigas ficam num cache LRU de `keep_versions` entradas;
+    as que saírem dele são relidas da cópia em .versoes quando pedidas.
+
+    Um arquivo inválido nunca derruba a versão atual: o erro vai para o log e a
+    versão anterior continua valendo até o arquivo ser corrigido.
+    """
+
+    def __init__(self, directory, check_interval=2.0, keep_versions=8, clock=time.monotonic, start_task=None,
+                 run_blocking=None):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.keep_versions = keep_versions
+        self._clock = clock
+        self._start_task = start_task
+        self._run_blocking = run_blocking or (lambda fn, *args: fn(*args))
+        self._lock = threading.Lock()
+        self._current = {}          # desafio -> QuestionBank
+        self._file_stamp = {}       # desafio -> (mtime_ns, tamanho) da última leitura
+        self._checked_at = {}       # desafio -> instante da última conferência
+        self._refreshing = set()    # Desafios com uma conferência pedida e ainda não feita
+        self._missing = {}          # desafio -> instante em que o arquivo não existia
+        self._versions = OrderedDict()   # (desafio, versão) -> QuestionBank, em ordem de uso
+
+    def _path(self, challenge):
+        return os.path.join(self.directory, f"{challenge}.jsonl")
+
+    def _snapshot_path(self, challenge, version):
+        return os.path.join(self.directory, SNAPSHOT_DIR, f"{challenge}-{version}.jsonl")
+
+    def exists(self, challenge):
+        if not isinstance(challenge, str) or not _CHALLENGE_NAME.match(challenge):
+            return False
+        if challenge in self._current:
+            return True
+        now = self._clock()
+        missing_at = self._missing.get(challenge)
+        if missing_at is not None and now - missing_at < self.check_interval:
+            return False
+        if os.path.isfile(self._path(challenge)):
+            self._missing.pop(challenge, None)
+            return True
+        if len(self._missing) >= MISSING_CACHE_SIZE:
+            self._missing.clear()
+        self._missing[challenge] = now
+        return False
+
+    def challenges(self):
+        """Desafios disponíveis na pasta (sem carregá-los)."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-len('.jsonl')] for n in names
+                      if n.endswith('.jsonl') and _CHALLENGE_NAME.match(n[:-len('.jsonl')]))
+
+    def current(self, challenge):
+        """Versão atual do banco, carregando-o no primeiro uso. KeyError se o desafio não existe."""
+        bank = self._current.get(challenge)
+        if bank is not None:
+            if self._clock() - self._checked_at.get(challenge, 0) >= self.check_interval:
+                self._request_refresh(challenge)
+                return self._current[challenge]   # Sem start_task, já é a versão recarregada
+            return bank
+        if not self.exists(challenge):
+            raise KeyError(challenge)
+        self._checked_at[challenge] = self._clock()
+        try:
+            stat = os.stat(self._path(challenge))
+        except OSError:
+            raise KeyError(challenge) from None
+        return self._reload(challenge, None, (stat.st_mtime_ns, stat.st_size))
+
+    def _request_refresh(self, challenge):
+        with self._lock:
+            if challenge in self._refreshing:
+                return
+            self._refreshing.add(challenge)
+        if self._start_task is None:
+            self._refresh(challenge)
+        else:
+            self._start_task(self._refresh, challenge)
+
+    def _refresh(self, challenge):
+        # Confere o arquivo e recarrega se ele mudou; quem chama current() segue com a versão atual
+        try:
+            bank = self._current[challenge]
+            self._checked_at[challenge] = self._clock()
+            try:
+                stat = os.stat(self._path(challenge))
+            except OSError:
+                logger.error("Banco '%s' sumiu de %s; mantendo a versão %s.", challenge, self.directory, bank.version)
+                return
+            if self._file_stamp.get(challenge) != (stat.st_mtime_ns, stat.st_size):
+                self._reload(challenge, bank, (stat.st_mtime_ns, stat.st_size))
+        finally:
+            self._refreshing.discard(challenge)
+
+    def reload(self, challenge):
+        """Relê o arquivo do desafio agora, sem esperar o intervalo de conferência."""
+        self._checked_at[challenge] = self._clock()
+        stat = os.stat(self._path(challenge))
+        return self._reload(challenge, self._current.get(challenge), (stat.st_mtime_ns, stat.st_size))
+
+    def _read_file(self, challenge, known_version):
+        # Roda em run_blocking, sem o lock: leitura, hash, parse e cópia em .versoes.
+        # None se o arquivo ainda tem o conteúdo de `known_version`.
+        with open(self._path(challenge), 'rb') as f:
+            data = f.read()
+        if hashlib.sha1(data).hexdigest()[:12] == known_version:
+            return None
+        bank = QuestionBank.parse(challenge, data)
+        self._write_snapshot(challenge, bank.version, data)
+        return bank
+
+    def _read_snapshot(self, challenge, version):
+        # Roda em run_blocking, sem o lock
+        with open(self._snapshot_path(challenge, version), 'rb') as f:
+            return QuestionBank.parse(challenge, f.read())
+
+    def _reload(self, challenge, old, stamp):
+        start = time.perf_counter()
+        try:
+            bank = self._run_blocking(self._read_file, challenge, old and old.version)
+        except (OSError, ValueError) as e:
+            if old is None:
+                raise
+            self._file_stamp[challenge] = stamp   # Só tenta de novo quando o arquivo mudar outra vez
+            logger.error("Falha ao recarregar o banco '%s' (mantendo a versão %s): %s", challenge, old.version, e)
+            return old
+        with self._lock:
+            current = self._current.get(challenge)
+            if current is not old:
+                return current   # Outra carga trocou a versão enquanto esta lia o arquivo
+            self._file_stamp[challenge] = stamp
+            if bank is None:
+                return old
+            self._current[challenge] = bank
+            self._remember(bank)
+        logger.info("Banco '%s' %s: versão %s, %d questões (%.1f ms).", challenge,
+                    "carregado" if old is None else "recarregado", bank.version, len(bank),
+                    (time.perf_counter() - start) * 1000)
+        return bank
+
+    def get(self, challenge, version=None):
+        """Versão específica do banco (ou a atual, se `version` for None). KeyError se não existir."""
+        if version is None:
+            return self.current(challenge)
+        bank = self._current.get(challenge)
+        if bank is not None and bank.version == version:
+            return bank
+        key = (challenge, version)
+        with self._lock:
+            bank = self._versions.get(key)
+            if bank is not None:
+                self._versions.move_to_end(key)
+                return bank
+        if not _CHALLENGE_NAME.match(challenge) or not re.match(r'^[0-9a-f]{12}$', version):
+            raise KeyError(key)
+        try:
+            bank = self._run_blocking(self._read_snapshot, challenge, version)
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        with self._lock:
+            self._remember(bank)
+        return bank
+
+    def _remember(self, bank):
+        self._versions[(bank.challenge, bank.version)] = bank
+        self._versions.move_to_end((bank.challenge, bank.version))
+        # As versões atuais continuam em _current mesmo se saírem daqui
+        while len(self._versions) > self.keep_versions:
+            self._versions.popitem(last=False)
+
+    def _write_snapshot(self, challenge, version, data):
+        path = self._snapshot_path(challenge, version)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            # Sem a cópia, esta versão só fica disponível enquanto estiver em memória
+            logger.warning("Não foi possível guardar a versão %s do banco '%s': %s", version, challenge, e)
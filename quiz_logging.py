@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Configuração de logs do servidor.
+
+Os níveis vêm de variáveis de ambiente:
+    QUIZ_LOG_LEVEL        nível do app (padrão INFO)
+    QUIZ_SOCKETIO_LOGS=1  liga os logs por pacote do Socket.IO/Engine.IO (padrão desligado)
+    QUIZ_EVENT_LOG_SAMPLE registra 1 de cada N eventos frequentes, ex.: respostas (padrão 100)
+    QUIZ_LOG_ASYNC=0      escreve os logs direto no handler, sem a fila (padrão 1)
+
+Com QUIZ_LOG_ASYNC ligado, o logger raiz só enfileira os registros
+(QueueHandler) e uma thread separada (QueueListener) faz a escrita, então os
+handlers de evento nunca esperam por I/O de log.
+"""
+import _thread
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from collections import defaultdict
+
+LOG_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+# Guardados na importação, antes de um eventual monkey_patch do eventlet trocá-los
+_start_new_thread = _thread.start_new_thread
+_allocate_lock = _thread.allocate_lock
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() not in ('0', 'false', 'no', 'off', '')
+
+
+def configure_logging():
+    """Configura o logger raiz e retorna o QueueListener (ou None no modo síncrono)."""
+    level = os.environ.get('QUIZ_LOG_LEVEL', 'INFO').upper()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    root.setLevel(level)
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    listener = None
+    if _env_flag('QUIZ_LOG_ASYNC', '1'):
+        log_queue = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        listener = _OSThreadListener(log_queue, handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+    else:
+        root.addHandler(handler)
+    logging.getLogger('werkzeug').setLevel(max(logging.INFO, root.level))
+    return listener
+
+
+class _OSThreadListener(logging.handlers.QueueListener):
+    """QueueListener cuja escrita roda numa thread real do sistema.
+
+    A thread é criada direto pelo _thread (fora do registro do módulo threading),
+    então continua real e termina sem erro mesmo depois do monkey_patch.
+    """
+
+    def start(self):
+        self._finished = _allocate_lock()
+        self._finished.acquire()
+        _start_new_thread(self._run, ())
+
+    def _run(self):
+        try:
+            self._monitor()
+        finally:
+            self._finished.release()
+
+    def stop(self):
+        self.enqueue_sentinel()
+        self._finished.acquire()
+
+
+def socketio_logs_enabled():
+    return _env_flag('QUIZ_SOCKETIO_LOGS', '0')
+
+
+class LogSampler:
+    """Deixa passar 1 de cada `every` chamadas por chave (every=1: todas).
+
+    A contagem não usa lock: sob concorrência a amostragem fica aproximada,
+    o que basta para logs.
+    """
+
+    def __init__(self, every=None):
+        if every is None:
+            every = int(os.environ.get('QUIZ_EVENT_LOG_SAMPLE', 100))
+        self.every = max(1, every)
+        self._counts = defaultdict(int)
+
+    def __call__(self, key):
+        n = self._counts[key]
+        self._counts[key] = n + 1
+        return n % self.every == 0
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Recomendações de curso do fim do quiz ("parte inteligente" do sistema).
+
+A área de destaque de cada jogador é a com mais acertos (no empate, a acertada
+primeiro) e o texto traz até 3 áreas. O mapeamento de cursos é montado uma vez,
+na importação, e cada resultado distinto (áreas + acertos) vira texto uma vez
+só: numa sala grande muitos jogadores terminam com o mesmo resultado.
+"""
+from functools import lru_cache
+from operator import itemgetter
+
+NO_ANSWERS = "Nenhuma resposta registrada."
+NO_CORRECT = "Nenhum acerto para sugerir área."
+TOP_SKILLS = 3
+
+# Mapeamento de áreas de habilidade para sugestões de curso, essa é a parte inteligente do sistema, mas não é tão robusta
+# quanto um modelo de IA real.
+COURSE_SUGGESTIONS = {
+    "BICT - Lógica de Programação": "Engenharia de Computação, Ciência da Computação",
+    "BICT - Redes de Computadores": "Engenharia de Computação", 
+    "BICT - Matemática Discreta": "Engenharia de Computação",
+    "Eng. Computação - Arquitetura de Computadores": "Engenharia de Computação",
+    "Eng. Civil - Materiais de Construção": "Engenharia Civil",
+    "Eng. Mecânica - Termodinâmica": "Engenharia Mecânica, Eng. Aeroespacial",
+    "Eng. Aeroespacial - Aerodinâmica": "Engenharia Aeroespacial",
+    "Eng. Ambiental - Gestão de Resíduos": "Engenharia Ambiental",
+    "Eng. Transportes - Engenharia de Tráfego": "Engenharia de Transportes",
+    "Cálculo Básico - Geometria": "Todas as Engenharias",
+    "Física Aplicada - Termologia": "Eng. Mecânica, Eng. Materiais",
+    "BICT - Estatística Básica": "Todas as Engenharias", 
+    "Conhecimentos Gerais": "Qualquer área!",
+    # Novas áreas de habilidade para o Desafio 2
+    "Eng. Computação - Fundamentos de Programação": "Engenharia de Computação, Ciência da Computação",
+    "Eng. Computação - Hardware Básico": "Engenharia de Computação",
+    "Eng. Computação - Desenvolvimento Web": "Engenharia de Computação, Sistemas de Informação",
+    "Eng. Civil - Estruturas Básicas": "Engenharia Civil",
+    "Eng. Civil - Urbanismo e Infraestrutura": "Engenharia Civil",
+    "Eng. Mecânica - Fundamentos de Máquinas": "Engenharia Mecânica, Eng. de Produção",
+    "Eng. Mecânica - Elementos de Máquinas": "Engenharia Mecânica",
+    "Eng. Aeroespacial - Aerodinâmica Básica": "Engenharia Aeroespacial",
+    "Eng. Aeroespacial - Propulsão": "Engenharia Aeroespacial",
+    "Eng. Aeroespacial - Aplicações Espaciais": "Engenharia Aeroespacial",
+    "Eng. Ambiental - Clima e Poluição": "Engenharia Ambiental",
+    "Eng. Ambiental - Energias Renováveis": "Engenharia Ambiental, Eng. de Energia",
+    "Eng. Transportes - Mobilidade Urbana": "Engenharia de Transportes, Eng. Civil",
+    "Eng. Transportes - Infraestrutura": "Engenharia de Transportes, Eng. Civil",
+    "Eng. Transportes - Planejamento Urbano": "Engenharia de Transportes, Eng. Civil",
+    # Novas áreas de habilidade para o Desafio 1 (perguntas avançadas)
+    "Eng. Computação - Estruturas de Dados": "Engenharia de Computação, Ciência da Computação",
+    "Eng. Civil - Concreto Armado": "Engenharia Civil",
+    "Eng. Aeroespacial - Mecânica Orbital": "Engenharia Aeroespacial",
+    "Eng. Ambiental - Saneamento Básico": "Engenharia Ambiental",
+}
+
+
+@lru_cache(maxsize=4096)
+def _format(top):
+    """Texto da recomendação a partir das áreas de destaque: ((área, acertos), ...) em ordem."""
+    best_skill_area = top[0][0]
+    suggestion_text = f"Você se destacou em '{best_skill_area}'. "
+    suggestion_text += f"Cursos como {COURSE_SUGGESTIONS.get(best_skill_area, 'áreas relacionadas')} podem ser interessantes."
+    top_skills_info = "; ".join([f"{skill}: {count} acerto(s)" for skill, count in top])
+    return f"{suggestion_text} Suas áreas de destaque: {top_skills_info}."
+
+
+def recommend_skills(answered, correct_skills):
+    """Recomendação a partir do número de respostas e das áreas acertadas, em ordem de acerto."""
+    if not answered: return NO_ANSWERS
+    counts = {}
+    for skill in correct_skills:
+        if skill: counts[skill] = counts.get(skill, 0) + 1
+    if not counts: return NO_CORRECT
+    # sorted é estável: no empate vence a área acertada primeiro, como no max() de antes
+    return _format(tuple(sorted(counts.items(), key=itemgetter(1), reverse=True)[:TOP_SKILLS]))
+
+
+def recommend(player_answers):
+    """Recomendação de um jogador a partir de respostas no formato {id: {"is_correct", "skill"}}."""
+    return recommend_skills(len(player_answers),
+                            [a.get('skill') for a in player_answers.values() if a.get('is_correct')])
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Ciclo de vida das salas: expiração por inatividade e limite de salas e jogadores.
+
+Uma sala só era apagada quando ficava sem jogadores e sem host; salas cujo host
+nunca voltou, salas já encerradas e salas que nunca começaram ficavam na
+memória para sempre. RoomLifecycle decide quais salas despejar a partir de uma
+foto de cada uma (RoomInfo), sem tocar no estado: quem remove é o app, sob o
+lock da sala.
+
+Prazos, contados a partir da última atividade na sala:
+  idle      sala que nunca começou o quiz (ou foi reiniciada)
+  finished  sala com o quiz encerrado (resultados já entregues)
+  orphaned  host desconectado que não voltou, sem quiz em andamento
+Sala com quiz em andamento não expira: os prazos das perguntas a mantêm ativa.
+Só se ficar `idle_ttl` sem nenhuma atividade (timer perdido) ela é despejada.
+
+Além dos prazos, `max_rooms` e `max_players` limitam o total do worker: acima
+deles, as salas sem quiz em andamento são despejadas da menos para a mais
+recentemente usada.
+"""
+import math
+from collections import namedtuple
+from operator import attrgetter
+
+# Foto de uma sala para a decisão de despejo (orphaned: o host saiu e não voltou)
+RoomInfo = namedtuple('RoomInfo', 'pin last_activity quiz_active finished orphaned players answers results')
+
+IDLE, FINISHED, ORPHANED, CAP = 'idle', 'finished', 'orphaned', 'cap'
+
+# Memória aproximada por registro, medida com tracemalloc (CPython 3.11) em salas de 1 a 31
+# jogadores; benchmarks/bench_room_lifecycle.py compara a estimativa com a medida.
+# Uma resposta é um byte em PlayerState.choices e dois em PlayerState.points (room_state.py)
+ROOM_BYTES = 1250
+PLAYER_BYTES = 470
+ANSWER_BYTES = 3
+RESULT_BYTES = 180
+
+
+def estimate_bytes(info):
+    """Memória aproximada que a sala ocupa (sem contar os bancos de questões, compartilhados)."""
+    return ROOM_BYTES + info.players * PLAYER_BYTES + info.answers * ANSWER_BYTES + info.results * RESULT_BYTES
+
+
+class RoomLifecycle:
+    """Política de despejo. TTLs em segundos; limites None (ou 0) desligam o limite."""
+
+    def __init__(self, idle_ttl=1800.0, finished_ttl=900.0, orphan_ttl=600.0, max_rooms=None, max_players=None):
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.orphan_ttl = orphan_ttl
+        self.max_rooms = max_rooms or None
+        self.max_players = max_players or None
+
+    def expired(self, info, now):
+        """Motivo pelo qual a sala expirou (IDLE, FINISHED, ORPHANED) ou None."""
+        idle = now - info.last_activity
+        if info.quiz_active:
+            return IDLE if idle >= self.idle_ttl else None
+        if info.orphaned and idle >= self.orphan_ttl:
+            return ORPHANED
+        if info.finished:
+            return FINISHED if idle >= self.finished_ttl else None
+        return IDLE if idle >= self.idle_ttl else None
+
+    def over_limit(self, rooms, players):
+        return ((self.max_rooms is not None and rooms > self.max_rooms)
+                or (self.max_players is not None and players > self.max_players))
+
+    def headroom(self, fraction):
+        """Folga (salas, jogadores) de `fraction` de cada limite, para os pedidos seguintes caberem sem outro despejo."""
+        return (math.ceil(self.max_rooms * fraction) if self.max_rooms else 0,
+                math.ceil(self.max_players * fraction) if self.max_players else 0)
+
+    def plan(self, infos, now, extra_rooms=0, extra_players=0, protect=()):
+        """Lista de (RoomInfo, motivo) a despejar: as expiradas e, se preciso, as menos usadas.
+
+        extra_rooms/extra_players reservam espaço para uma sala ou jogador que
+        está chegando; salas em `protect` nunca são despejadas por limite.
+        """
+        evict, keep = [], []
+        for info in infos:
+            reason = self.expired(info, now)
+            if reason:
+                evict.append((info, reason))
+            else:
+                keep.append(info)
+        rooms = len(keep) + extra_rooms
+        players = sum(info.players for info in keep) + extra_players
+        if self.over_limit(rooms, players):
+            candidates = sorted((info for info in keep if not info.quiz_active and info.pin not in protect),
+                                key=attrgetter('last_activity'))
+            for info in candidates:
+                if not self.over_limit(rooms, players):
+                    break
+                evict.append((info, CAP))
+                rooms -= 1
+                players -= info.players
+        return evict
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Registros do estado das salas: sala, estado do quiz e jogador, com __slots__.
+
+Cada sala, seu game_state e cada jogador eram dicts, e cada resposta era mais
+um dict dentro de player["answers"]. Avançar a pergunta apagava a chave
+"answered_current_question" de todos os jogadores: O(jogadores) por pergunta.
+
+Aqui as respostas de um jogador ficam em dois arrays de tamanho fixo indexados
+pela posição da pergunta no banco: a opção escolhida (com o bit de acerto) e os
+pontos. "Já respondeu a pergunta atual" compara a geração em que o jogador
+respondeu com a geração da sala, um contador que avança a cada pergunta, e
+GameState.answered conta quantos jogadores já responderam: avançar a pergunta
+e conferir se todos responderam custam O(1).
+
+Os índices de pergunta (current_question_index, posição nos arrays) contam as
+perguntas da partida; com um sorteio, question_order traduz cada uma para a
+posição da questão no banco.
+
+Os registros são serializados com pickle pelo store compartilhado e pelos
+checkpoints (checkpoint.py); o jogador, o registro mais numeroso, vira uma tupla.
+"""
+from array import array
+
+# Código de cada resposta em PlayerState.choices (0 = pergunta não respondida)
+INVALID_OPTION = 0x7F     # Respondeu com uma opção que não existe
+CORRECT = 0x80            # Bit de acerto, somado à posição da opção + 1
+
+
+class PlayerState:
+    __slots__ = ('nickname', 'score', 'answered_gen', 'choices', 'points', 'batch_frames', 'session')
+
+    def __init__(self, nickname, score=0, batch_frames=False, session=None):
+        self.nickname = nickname
+        self.score = score
+        self.batch_frames = batch_frames    # O cliente entende 'room_batch'
+        self.session = session              # Id da sessão retomável (ver o resumeToken no app.py)
+        self.answered_gen = -1
+        self.choices = bytearray()
+        self.points = array('H')
+
+    def __getstate__(self):
+        # Tupla no lugar do dict de slots padrão: ~35% menos tempo no pickle de uma sala cheia
+        return (self.nickname, self.score, self.answered_gen, bytes(self.choices), self.points.tobytes(),
+                self.batch_frames, self.session)
+
+    def __setstate__(self, state):
+        self.nickname, self.score, self.answered_gen, choices, points, self.batch_frames, self.session = state
+        self.choices = bytearray(choices)
+        self.points = array('H')
+        self.points.frombytes(points)
+
+    def start_quiz(self, total_questions):
+        # Arrays novos (e não zerados no lugar): um resultado ainda em cálculo
+        # fora do lock continua lendo as respostas da partida anterior
+        self.score = 0
+        self.answered_gen = -1
+        self.choices = bytearray(total_questions)
+        self.points = array('H', bytes(2 * total_questions))
+
+    def has_answered(self, generation):
+        return self.answered_gen == generation
+
+    def answer(self, position, option_position, correct, points, generation):
+        code = INVALID_OPTION if option_position is None else option_position + 1
+        self.choices[position] = code | CORRECT if correct else code
+        self.points[position] = points
+        self.score += points
+        self.answered_gen = generation
+
+    def answer_count(self):
+        return len(self.choices) - self.choices.count(0)
+
+
+def answer_summary(choices, skills):
+    """(respostas dadas, áreas das perguntas acertadas em ordem) a partir de PlayerState.choices.
+
+    `skills` é a área de cada posição do banco da partida (QuestionBank.skills).
+    """
+    return (len(choices) - choices.count(0),
+            [skills[pos] for pos, code in enumerate(choices) if code & CORRECT])
+
+
+class GameState:
+    __slots__ = ('current_question_index', 'quiz_active', 'question_start_time', 'time_per_question',
+                 'total_questions_in_challenge', 'bank_version', 'question_order', 'seed', 'results_id',
+                 'timer', 'question_gen', 'answered')
+
+    def __init__(self, time_per_question, total_questions=0):
+        self.current_question_index = -1
+        self.quiz_active = False
+        self.question_start_time = None
+        self.time_per_question = time_per_question
+        self.total_questions_in_challenge = total_questions
+        self.bank_version = None      # Fixada em _start_quiz_logic
+        self.question_order = None    # array('I') com as posições sorteadas no banco (None = o banco inteiro, em ordem)
+        self.seed = None              # Semente do sorteio da partida
+        self.results_id = None
+        self.timer = None             # Dono, token e prazo do timer da pergunta atual
+        self.question_gen = 0         # Avança a cada pergunta
+        self.answered = 0             # Jogadores que já responderam a pergunta desta geração
+
+    def next_question(self):
+        self.current_question_index += 1
+        self.question_gen += 1
+        self.answered = 0
+
+
+class RoomState:
+    __slots__ = ('host_sid', 'host_nickname_on_creation', 'challenge_type', 'question_filter', 'players',
+                 'leaderboard', 'game_state', 'host_sid_disconnected_temp', 'last_activity', 'last_scores_sent',
+                 'results', 'batch_clients', 'sessions', 'detached')
+
+    def __init__(self, host_sid, host_nickname, challenge_type, players, leaderboard, game_state, question_filter=None):
+        self.host_sid = host_sid
+        self.host_nickname_on_creation = host_nickname
+        self.challenge_type = challenge_type
+        self.question_filter = question_filter  # QuestionFilter (question_bank.py) ou None para o banco inteiro
+        self.players = players                  # sid -> PlayerState
+        self.leaderboard = leaderboard
+        self.game_state = game_state
+        self.host_sid_disconnected_temp = None  # SID antigo do host desconectado, aguardando reconexão
+        self.last_activity = 0.0
+        self.last_scores_sent = None
+        self.results = None                     # Resultados completos, para a consulta paginada do host
+        self.batch_clients = 0                  # Jogadores com batch_frames (mantido por _add_player/_drop_player)
+        self.sessions = {}                      # Id da sessão -> SID atual do jogador (mantido por _add_player/_drop_player)
+        self.detached = {}                      # Id da sessão -> (desconectado em, PlayerState), em ordem de desconexão
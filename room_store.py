@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Backends de estado das salas.
+
+MemoryRoomStore (padrão) mantém as salas só neste processo, como sempre foi.
+SQLiteRoomStore guarda cada sala serializada (pickle) num arquivo SQLite
+compartilhado, para vários workers do servidor atenderem a mesma sala: o
+worker carrega a sala ao adquirir o lock dela e grava de volta ao soltar.
+
+O lock entre processos é um lease por sala (linha em room_leases com dono e
+validade), então um worker que morre segurando o lock não trava a sala para
+sempre. A espera pelo lease usa o sleep do servidor, sem bloquear o eventlet.
+Um trecho longo com a sala em mãos renova o lease com renew(); save() só grava
+se o lease ainda for deste worker (e o renova na mesma transação), senão
+levanta LeaseExpired: outro worker pode ter assumido a sala no meio.
+Cada evento grava o RoomState inteiro: o custo cresce com o número de
+jogadores da sala, não com o que o evento mudou.
+O banco guarda pickles: deve ficar num diretório acessível só ao servidor.
+"""
+import contextlib
+import itertools
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseExpired(Exception):
+    """O lease da sala venceu (e pode ter passado a outro worker) antes de o estado ser gravado."""
+
+
+def sqlite_path(url):
+    """Caminho do arquivo a partir de uma URL sqlite:///caminho (ou do próprio caminho)."""
+    return url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+
+
+class SQLitePool:
+    """Conexões SQLite reaproveitadas entre threads/greenlets (modo WAL, autocommit)."""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self._timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self._timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._idle.append(conn)
+
+
+class MemoryRoomStore:
+    """Salas só no processo atual: o dict carregado é o próprio registro da sala."""
+    shared = False
+
+    def __init__(self):
+        self._rooms = {}
+
+    def insert(self, pin, room):
+        if pin in self._rooms: return False
+        self._rooms[pin] = room
+        return True
+
+    def lease(self, pin):
+        # O lock da sala no processo já basta
+        return contextlib.nullcontext()
+
+    def renew(self, pin):
+        pass
+
+    def load(self, pin):
+        return self._rooms.get(pin)
+
+    def save(self, pin, room, deadline_at=None):
+        self._rooms[pin] = room
+
+    def delete(self, pin):
+        self._rooms.pop(pin, None)
+
+    def exists(self, pin):
+        return pin in self._rooms
+
+    def overdue(self, before):
+        return []
+
+
+class SQLiteRoomStore:
+    """Salas num arquivo SQLite compartilhado entre processos da mesma máquina.
+
+    deadline_at (hora de parede do prazo da pergunta atual) fica numa coluna
+    própria para overdue() achar timers órfãos sem desserializar as salas.
+    """
+    shared = True
+
+    def __init__(self, path, sleep=time.sleep, lease_ttl=10.0, lock_timeout=15.0, retry_interval=0.002):
+        self._pool = SQLitePool(path)
+        self._sleep = sleep
+        self.lease_ttl = lease_ttl
+        self.lock_timeout = lock_timeout
+        self.retry_interval = retry_interval
+        self._owner = uuid.uuid4().hex[:12]
+        self._lease_seq = itertools.count()
+        self._held = {}   # PIN -> dono do lease em mãos (o lock da sala no processo garante um por PIN)
+        with self._pool.connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS rooms (pin TEXT PRIMARY KEY, data BLOB NOT NULL, deadline_at REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS rooms_deadline ON rooms (deadline_at)")
+            db.execute("CREATE TABLE IF NOT EXISTS room_leases (pin TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def insert(self, pin, room):
+        with self._pool.connection() as db:
+            cur = db.execute("INSERT OR IGNORE INTO rooms (pin, data) VALUES (?, ?)",
+                             (pin, pickle.dumps(room, pickle.HIGHEST_PROTOCOL)))
+            return cur.rowcount == 1
+
+    @contextlib.contextmanager
+    def lease(self, pin):
+        holder = f"{self._owner}:{next(self._lease_seq)}"
+        give_up = time.monotonic() + self.lock_timeout
+        delay = self.retry_interval
+        while True:
+            now = time.time()
+            with self._pool.connection() as db:
+                # Só toma o lease se não houver dono ou se o dono anterior deixou expirar
+                cur = db.execute(
+                    "INSERT INTO room_leases (pin, holder, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (pin) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                    "WHERE room_leases.expires_at < ?", (pin, holder, now + self.lease_ttl, now))
+            if cur.rowcount == 1:
+                break
+            if time.monotonic() > give_up:
+                raise TimeoutError(f"Lease da sala {pin} não obtido em {self.lock_timeout}s")
+            self._sleep(delay)
+            delay = min(delay * 2, 0.05)
+        self._held[pin] = holder
+        try:
+            yield
+        finally:
+            del self._held[pin]
+            with self._pool.connection() as db:
+                db.execute("DELETE FROM room_leases WHERE pin = ? AND holder = ?", (pin, holder))
+
+    def _extend_lease(self, db, pin):
+        cur = db.execute("UPDATE room_leases SET expires_at = ? WHERE pin = ? AND holder = ?",
+                         (time.time() + self.lease_ttl, pin, self._held[pin]))
+        if cur.rowcount != 1:
+            raise LeaseExpired(f"Lease da sala {pin} vencido (mais de {self.lease_ttl}s com a sala em mãos)")
+
+    def renew(self, pin):
+        """Renova o lease em mãos por mais lease_ttl segundos. LeaseExpired se ele já venceu e foi tomado."""
+        if pin not in self._held:
+            return
+        with self._pool.connection() as db:
+            self._extend_lease(db, pin)
+
+    def load(self, pin):
+        with self._pool.connection() as db:
+            row = db.execute("SELECT data FROM rooms WHERE pin = ?", (pin,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def save(self, pin, room, deadline_at=None):
+        data = pickle.dumps(room, pickle.HIGHEST_PROTOCOL)
+        with self._pool.connection() as db:
+            if pin not in self._held:
+                db.execute("UPDATE rooms SET data = ?, deadline_at = ? WHERE pin = ?", (data, deadline_at, pin))
+                return
+            # Confere (e renova) o lease e grava na mesma transação: sem lease, nada é gravado
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._extend_lease(db, pin)
+                db.execute("UPDATE rooms SET data = ?, deadline_at = ? WHERE pin = ?", (data, deadline_at, pin))
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def delete(self, pin):
+        with self._pool.connection() as db:
+            db.execute("DELETE FROM rooms WHERE pin = ?", (pin,))
+
+    def exists(self, pin):
+        with self._pool.connection() as db:
+            return db.execute("SELECT 1 FROM rooms WHERE pin = ?", (pin,)).fetchone() is not None
+
+    def overdue(self, before):
+        """PINs das salas cujo prazo de pergunta venceu antes de `before`."""
+        with self._pool.connection() as db:
+            return [pin for (pin,) in db.execute("SELECT pin FROM rooms WHERE deadline_at < ?", (before,))]
+
+
+def create_room_store(url, sleep=time.sleep):
+    """'memory' (padrão) ou 'sqlite:///caminho/do/arquivo.db'."""
+    if not url or url == 'memory':
+        return MemoryRoomStore()
+    if url.startswith('sqlite:'):
+        logger.info("Estado das salas compartilhado em SQLite: %s", sqlite_path(url))
+        return SQLiteRoomStore(sqlite_path(url), sleep=sleep)
+    raise ValueError(f"Backend de salas desconhecido: {url!r}")
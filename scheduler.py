@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Scheduler central de prazos (deadlines) baseado em heap.
+
+Uma única tarefa em background atende os prazos de todas as salas, no lugar
+de uma thread/greenlet por pergunta. Cada prazo tem uma chave (ex.:
+("question", PIN)); agendar de novo a mesma chave substitui o prazo anterior,
+e cancel() descarta o prazo pendente quando a sala avança antes do tempo.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("deadline", "seq", "key", "callback", "args", "cancelled")
+
+    def __init__(self, deadline, seq, key, callback, args):
+        self.deadline, self.seq, self.key, self.callback, self.args = deadline, seq, key, callback, args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class DeadlineScheduler:
+    """Executa callbacks quando seus prazos vencem, a partir de um único loop.
+
+    start_task vem do servidor (socketio.start_background_task), e `wakeup` é o
+    Event em que o loop espera o próximo prazo: threading.Event com eventlet (já
+    trocado pelo monkey_patch) e com threading, asgi_server.Event no modo asyncio.
+    Sem prazos, o loop fica parado até o próximo schedule(); um prazo novo que
+    vence antes dos demais acorda o loop. Os callbacks rodam no próprio loop,
+    fora do lock interno do scheduler. on_lateness, se dado, recebe o atraso
+    (em segundos) de cada prazo disparado.
+    """
+
+    def __init__(self, start_task, wakeup=None, clock=time.monotonic, on_lateness=None):
+        self._start_task = start_task
+        self._wakeup = wakeup if wakeup is not None else threading.Event()
+        self._clock = clock
+        self._on_lateness = on_lateness
+        self._lock = threading.Lock()
+        self._heap = []
+        self._entries = {}
+        self._seq = itertools.count()
+        self._started = False
+        self._stale = 0
+        # Estatísticas
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.lateness_total = 0.0
+        self.lateness_max = 0.0
+        self._recent_lateness = deque(maxlen=1000)
+
+    def schedule(self, key, delay, callback, *args):
+        """Agenda callback(*args) para daqui a `delay` segundos, substituindo o prazo anterior da chave."""
+        with self._lock:
+            self._cancel_locked(key, count=False)
+            must_start, earliest = self._schedule_locked(key, delay, callback, args)
+        self._wake(must_start, earliest)
+
+    def schedule_once(self, key, delay, callback, *args):
+        """Como schedule(), mas não faz nada se a chave já tiver um prazo pendente.
+
+        Retorna True se agendou. Útil para agrupar vários eventos num único disparo.
+        """
+        with self._lock:
+            if key in self._entries:
+                return False
+            must_start, earliest = self._schedule_locked(key, delay, callback, args)
+        self._wake(must_start, earliest)
+        return True
+
+    def _schedule_locked(self, key, delay, callback, args):
+        entry = _Entry(self._clock() + delay, next(self._seq), key, callback, args)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        self.scheduled += 1
+        must_start = not self._started
+        self._started = True
+        return must_start, self._heap[0] is entry
+
+    def _wake(self, must_start, earliest):
+        if must_start:
+            self._start_task(self._run)
+        elif earliest:
+            self._wakeup.set()   # O loop dorme até um prazo posterior (ou sem prazo nenhum)
+
+    def cancel(self, key):
+        """Cancela o prazo pendente da chave. Retorna True se havia um."""
+        with self._lock:
+            return self._cancel_locked(key)
+
+    def _cancel_locked(self, key, count=True):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        self._stale += 1
+        if count:
+            self.cancelled += 1
+        # Compacta o heap quando a maioria das entradas já foi cancelada
+        if self._stale > 64 and self._stale > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if not e.cancelled]
+            heapq.heapify(self._heap)
+            self._stale = 0
+        return True
+
+    def pending(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            recent = sorted(self._recent_lateness)
+            fired = self.fired
+            return {
+                "pending": len(self._entries),
+                "scheduled": self.scheduled,
+                "fired": fired,
+                "cancelled": self.cancelled,
+                "lateness_avg_ms": (self.lateness_total / fired * 1000) if fired else 0.0,
+                "lateness_max_ms": self.lateness_max * 1000,
+                "lateness_p99_ms": (recent[int(0.99 * (len(recent) - 1))] * 1000) if recent else 0.0,
+            }
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0].deadline <= now:
+                entry = heapq.heappop(self._heap)
+                if entry.cancelled:
+                    self._stale -= 1
+                    continue
+                del self._entries[entry.key]
+                lateness = now - entry.deadline
+                self.fired += 1
+                self.lateness_total += lateness
+                self.lateness_max = max(self.lateness_max, lateness)
+                self._recent_lateness.append(lateness)
+                due.append(entry)
+            next_deadline = self._heap[0].deadline if self._heap else None
+        if self._on_lateness:
+            for entry in due:
+                self._on_lateness(now - entry.deadline)
+        return due, next_deadline
+
+    def run_due(self):
+        """Executa os callbacks vencidos e retorna quanto tempo dormir até o próximo (None: sem prazos)."""
+        now = self._clock()
+        due, next_deadline = self._pop_due(now)
+        for entry in due:
+            try:
+                entry.callback(*entry.args)
+            except Exception:
+                logger.exception("DeadlineScheduler: erro no callback do prazo %r", entry.key)
+        if next_deadline is None:
+            return None
+        return max(0.0, next_deadline - self._clock())
+
+    def _run(self):
+        logger.info("DeadlineScheduler: loop de prazos iniciado.")
+        while True:
+            # Um schedule() entre o run_due() e o wait() deixa o Event ligado: o wait() volta na hora
+            self._wakeup.wait(self.run_due())
+            self._wakeup.clear()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Fila de mensagens do Socket.IO em SQLite, para vários workers numa só máquina.
+
+Faz o papel de um Redis local: cada worker publica os emits numa tabela e um
+greenlet/thread de cada worker lê as mensagens novas (por id crescente) e
+entrega aos clientes conectados nele. Serve para rodar vários processos sem
+serviço externo; em produção com várias máquinas use QUIZ_MESSAGE_QUEUE=redis://...
+"""
+import logging
+import pickle
+import time
+
+import socketio
+
+from room_store import SQLitePool, sqlite_path
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteManager(socketio.PubSubManager):
+    name = 'sqlite'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None,
+                 poll_interval=0.005, retention=60.0):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._pool = SQLitePool(sqlite_path(url))
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._published = 0
+        with self._pool.connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                       "channel TEXT NOT NULL, data BLOB NOT NULL, created_at REAL NOT NULL)")
+
+    def _publish(self, data):
+        now = time.time()
+        with self._pool.connection() as db:
+            db.execute("INSERT INTO messages (channel, data, created_at) VALUES (?, ?, ?)",
+                       (self.channel, pickle.dumps(data, pickle.HIGHEST_PROTOCOL), now))
+            self._published += 1
+            if self._published % 1000 == 0:
+                # Todos os workers já leram mensagens tão antigas
+                db.execute("DELETE FROM messages WHERE created_at < ?", (now - self.retention,))
+
+    def _listen(self):
+        with self._pool.connection() as db:
+            last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        while True:
+            with self._pool.connection() as db:
+                rows = db.execute("SELECT id, data FROM messages WHERE id > ? AND channel = ? ORDER BY id",
+                                  (last_id, self.channel)).fetchall()
+            if not rows:
+                self.server.sleep(self.poll_interval)
+                continue
+            for last_id, data in rows:
+                yield data
@@ -16,12 +16,15 @@ let currentRoomData = {
 };
 let questionTimerInterval = null;
 let selectedOptionId = null;
+// O servidor envia as opções como lista de textos; o ID de cada opção é a sua posição (a, b, c, ...)
+const OPTION_SHORT_IDS = 'abcdefghijklmnopqrstuvwxyz';
 
 // --- Seletores de Elementos ---
 function getIndexPageElements() {
     return {
         nicknameInput: document.getElementById('nickname'),
         challengeTypeSelect: document.getElementById('challengeType'), 
+        questionCountSelect: document.getElementById('questionCount'), // Opcional: perguntas sorteadas do desafio
         createRoomBtn: document.getElementById('createRoomBtn'),
         roomPinInput: document.getElementById('roomPinInput'),
         joinRoomBtn: document.getElementById('joinRoomBtn'),
@@ -66,6 +69,7 @@ function getResultsPageElements() {
         finalScoreDisplay: document.getElementById('finalScore'),
         recommendationText: document.getElementById('recommendationText'),
         rankingList: document.getElementById('rankingList'),
+        loadMoreResultsBtn: document.getElementById('loadMoreResultsBtn'),
         playAgainBtn: document.getElementById('playAgainBtn'),
     };
 }
@@ -74,6 +78,8 @@ function getResultsPageElements() {
 function connectSocket() {
     if (!socket || !socket.connected) {
         console.log('Tentando conectar ao servidor Socket.IO...');
+        // Com QUIZ_WIRE_FORMAT=msgpack a página carrega socket.io.msgpack.min.js, que já usa o
+        // parser MessagePack; o servidor reconhece o formato pelo primeiro pacote
         socket = io({
             reconnectionAttempts: 5, // Tenta reconectar 5 vezes
             reconnectionDelay: 2000  // Espera 2s entre tentativas
@@ -101,6 +107,8 @@ function setupSocketListeners() {
             socket.emit('rejoin_room_check', { 
                 roomPin: storedRoomPin, 
                 nickname: storedNickname,
+                batchFrames: true, // Entende 'room_batch'
+                resumeToken: sessionStorage.getItem('resumeToken'), // Retoma o mesmo registro (pontuação e respostas)
             });
         } else {
             const indexUI = getIndexPageElements();
@@ -130,6 +138,16 @@ function setupSocketListeners() {
         // Adicionar feedback visual para o usuário
     });
 
+    // Eventos de uma mesma transição da sala (ex.: time_up + new_question) chegam num pacote só:
+    // cada um é repassado, em ordem, aos handlers registrados para ele. O roomPin vem uma vez
+    // só, no primeiro argumento, e é devolvido a cada evento.
+    socket.on('room_batch', (roomPin, ...events) => {
+        events.forEach(([eventName, data]) => {
+            const payload = (data && typeof data === 'object' && !Array.isArray(data)) ? { roomPin, ...data } : data;
+            socket.listeners(eventName).forEach(listener => listener(payload));
+        });
+    });
+
     socket.on('room_created', (data) => {
         console.log('Socket.IO: Evento "room_created":', data);
         if (data.roomPin) {
@@ -141,6 +159,7 @@ function setupSocketListeners() {
             sessionStorage.setItem('currentRoomPin', data.roomPin);
             sessionStorage.setItem('isHost', data.isHost.toString()); 
             sessionStorage.setItem('challengeType', data.challengeType); // Novo: armazena o tipo de desafio
+            if (data.resumeToken) sessionStorage.setItem('resumeToken', data.resumeToken);
             localStorage.setItem('quizNickname', data.nickname); 
             console.log(`Redirecionando para /lobby para a sala ${data.roomPin}`);
             window.location.href = '/lobby';
@@ -150,8 +169,7 @@ function setupSocketListeners() {
         }
     });
 
-    socket.on('room_joined', (data) => {
-        console.log('Socket.IO: Evento "room_joined" (confirmação para mim):', data);
+    const handleRoomJoined = (data) => {
         currentRoomData.roomPin = data.roomPin;
         currentRoomData.myNickname = data.nickname; 
         currentRoomData.isHost = data.isHost;
@@ -160,6 +178,7 @@ function setupSocketListeners() {
         sessionStorage.setItem('currentRoomPin', data.roomPin);
         sessionStorage.setItem('isHost', data.isHost.toString());
         sessionStorage.setItem('challengeType', data.challengeType); // Novo: armazena o tipo de desafio
+        if (data.resumeToken) sessionStorage.setItem('resumeToken', data.resumeToken);
         localStorage.setItem('quizNickname', data.nickname); 
 
         const path = window.location.pathname;
@@ -177,6 +196,33 @@ function setupSocketListeners() {
             console.log("Recebido 'room_joined' na página do quiz. Atualizando dados.");
             updatePlayerListQuiz(getQuizPageElements());
             // Se o quiz estiver ativo, o backend enviará 'new_question' ou 'quiz_state_on_connect'
+        } else if (path.includes('/results') && data.isHost) {
+            // O host vê o ranking completo, página por página
+            socket.emit('get_results', { roomPin: data.roomPin, page: 1 });
+        }
+    };
+
+    socket.on('room_joined', (data) => {
+        console.log('Socket.IO: Evento "room_joined" (confirmação para mim):', data);
+        handleRoomJoined(data);
+    });
+
+    // Reconexão com a sessão retomada: o estado da sala num evento só (dados do room_joined,
+    // pontuação e, com o quiz em andamento, a pergunta atual com o tempo que resta)
+    socket.on('room_snapshot', (data) => {
+        console.log('Socket.IO: Evento "room_snapshot":', data);
+        handleRoomJoined(data);
+        currentRoomData.quizActive = data.quizActive;
+        currentRoomData.currentScore = data.score;
+        const ui = getQuizPageElements();
+        if (!ui.quizArea) return;
+        if (ui.scoreDisplay) ui.scoreDisplay.textContent = data.score;
+        if (!data.currentQuestion) return;
+        showQuestion(data.currentQuestion, Math.ceil(data.remaining), ui);
+        if (data.answered) {
+            if (questionTimerInterval) clearInterval(questionTimerInterval);
+            ui.optionsContainer.querySelectorAll('button.quiz-option-button').forEach(button => { button.disabled = true; });
+            if (ui.feedbackText) ui.feedbackText.textContent = 'Resposta já enviada. Aguardando a próxima pergunta...';
         }
     });
     
@@ -220,7 +266,7 @@ function setupSocketListeners() {
         }
     });
 
-    socket.on('room_error', (data) => {
+    const showRoomError = (data) => {
         console.error('Socket.IO: Erro de Sala:', data.message);
         const path = window.location.pathname;
         const lobbyUI = getLobbyPageElements();
@@ -233,7 +279,10 @@ function setupSocketListeners() {
             if(indexUI.joinRoomBtn) indexUI.joinRoomBtn.disabled = false; // Reabilita botão de entrar
             if(indexUI.createRoomBtn) indexUI.createRoomBtn.disabled = false; // Reabilita botão de criar
         }
-    });
+    };
+    socket.on('room_error', showRoomError);
+    socket.on('room_join_error', showRoomError);
+    socket.on('rate_limited', showRoomError); // Eventos repetidos rápido demais (limites de taxa do servidor)
 
     socket.on('room_not_found_on_rejoin', (data) => {
         console.warn(`Socket.IO: Evento 'room_not_found_on_rejoin' para sala ${data.roomPin}. Mensagem: ${data.message}`);
@@ -241,6 +290,7 @@ function setupSocketListeners() {
         sessionStorage.removeItem('currentRoomPin');
         sessionStorage.removeItem('isHost');
         sessionStorage.removeItem('challengeType'); // Remove o tipo de desafio
+        sessionStorage.removeItem('resumeToken');
         sessionStorage.removeItem('lastRoomPinForResults'); 
         
         const path = window.location.pathname;
@@ -250,6 +300,22 @@ function setupSocketListeners() {
     });
 
 
+    socket.on('room_closed', (data) => {
+        console.warn(`Socket.IO: Evento 'room_closed' para sala ${data.roomPin} (${data.reason}).`);
+        if (currentRoomData.roomPin !== data.roomPin) return;
+        sessionStorage.removeItem('currentRoomPin');
+        sessionStorage.removeItem('isHost');
+        sessionStorage.removeItem('challengeType');
+        sessionStorage.removeItem('resumeToken');
+        // Na página de resultados o ranking já está guardado no navegador: ela só deixa de reconectar à sala
+        const path = window.location.pathname;
+        if (path.includes('/lobby') || path.includes('/quiz')) {
+            alert(`${data.message} Você será redirecionado para a página inicial.`);
+            window.location.href = '/';
+        }
+    });
+
+
     socket.on('quiz_started', (data) => {
         console.log('Socket.IO: Evento "quiz_started":', data);
         if (currentRoomData.roomPin === data.roomPin) {
@@ -273,6 +339,10 @@ function setupSocketListeners() {
             console.warn("new_question recebido, mas não na página do quiz. Ignorando.");
             return;
         }
+        showQuestion(data, data.timeLimit, ui);
+    });
+
+    const showQuestion = (data, timeLeft, ui) => {
         hideWaitingScreen(ui);
         selectedOptionId = null;
         currentRoomData.currentQuestion = data.question;
@@ -280,8 +350,8 @@ function setupSocketListeners() {
         currentRoomData.totalQuestions = data.totalQuestions;
         currentRoomData.timeLimit = data.timeLimit;
         updateQuizUI(ui);
-        startClientTimer(data.timeLimit, ui);
-    });
+        startClientTimer(timeLeft, ui);
+    };
 
     socket.on('answer_feedback', (data) => {
         // ... (mesma lógica de antes)
@@ -318,7 +388,7 @@ function setupSocketListeners() {
             buttons.forEach(button => {
                 button.disabled = true;
                 button.classList.remove('selected');
-                if (currentRoomData.currentQuestion && button.dataset.optionId === currentRoomData.currentQuestion.correctOptionId) {
+                if (button.dataset.optionId === data.correctOptionId) { // A resposta só é revelada no time_up/answer_feedback
                     button.classList.add('correct');
                 }
             });
@@ -330,7 +400,8 @@ function setupSocketListeners() {
         // ... (mesma lógica de antes)
         console.log('Socket.IO: Evento "quiz_ended":', data);
         if (currentRoomData.roomPin === data.roomPin) {
-            sessionStorage.setItem('quizResults_room_' + data.roomPin, JSON.stringify(data.results));
+            // Só o resumo (top 10) vem para a sala; o resultado de cada um chega em 'quiz_result'
+            sessionStorage.setItem('quizRanking_room_' + data.roomPin, JSON.stringify({ ranking: data.ranking, totalPlayers: data.totalPlayers }));
             sessionStorage.setItem('myNickname', currentRoomData.myNickname);
             sessionStorage.setItem('mySid', currentRoomData.mySid);
             sessionStorage.setItem('lastRoomPinForResults', data.roomPin); 
@@ -342,10 +413,35 @@ function setupSocketListeners() {
                     window.location.href = '/results';
                 }, 1500);
             } else if (window.location.pathname.includes('/results')) {
-                populateResultsPage(); 
+                populateResultsPage(getResultsPageElements()); 
             }
         }
     });
+
+    socket.on('quiz_result', (data) => {
+        console.log('Socket.IO: Evento "quiz_result" (meu resultado):', data);
+        sessionStorage.setItem('quizMyResult_room_' + data.roomPin, JSON.stringify(data));
+        if (window.location.pathname.includes('/results')) {
+            populateResultsPage(getResultsPageElements());
+        }
+    });
+
+    socket.on('results_page', (data) => {
+        console.log('Socket.IO: Evento "results_page":', data);
+        const ui = getResultsPageElements();
+        if (!ui.rankingList) return;
+        if (!data.ready) { // Resultados ainda sendo calculados: tenta de novo em 1 s
+            setTimeout(() => socket.emit('get_results', { roomPin: data.roomPin, page: data.page }), 1000);
+            return;
+        }
+        if (data.page === 1) ui.rankingList.innerHTML = '';
+        const myResult = JSON.parse(sessionStorage.getItem('quizMyResult_room_' + data.roomPin) || 'null');
+        data.results.forEach(player => ui.rankingList.appendChild(rankingItem(player, myResult && player.rank === myResult.rank)));
+        if (ui.loadMoreResultsBtn) {
+            ui.loadMoreResultsBtn.classList.toggle('hidden', data.page >= data.totalPages);
+            ui.loadMoreResultsBtn.onclick = () => socket.emit('get_results', { roomPin: data.roomPin, page: data.page + 1 });
+        }
+    });
 }
 
 // --- Lógica da Página Inicial (index.html) ---
@@ -371,7 +467,9 @@ function setupIndexPage() {
             localStorage.setItem('quizNickname', nick); 
             currentRoomData.myNickname = nick; 
             console.log(`IndexPage: Emitindo 'create_room' com nickname: ${nick}, challengeType: ${challenge}`);
-            socket.emit('create_room', { nickname: nick, challengeType: challenge }); // Envia o tipo de desafio
+            const createData = { nickname: nick, challengeType: challenge, batchFrames: true }; // Envia o tipo de desafio
+            if (ui.questionCountSelect && ui.questionCountSelect.value) createData.questionCount = parseInt(ui.questionCountSelect.value, 10);
+            socket.emit('create_room', createData);
             ui.statusMessage.textContent = 'Criando sala...';
         } else {
             ui.statusMessage.textContent = 'Não conectado. Tentando conectar...';
@@ -390,7 +488,7 @@ function setupIndexPage() {
             localStorage.setItem('quizNickname', nick);
             currentRoomData.myNickname = nick; 
             console.log(`IndexPage: Emitindo 'join_room_pin' com nickname: ${nick}, PIN: ${pin}`);
-            socket.emit('join_room_pin', { nickname: nick, roomPin: pin });
+            socket.emit('join_room_pin', { nickname: nick, roomPin: pin, batchFrames: true });
             ui.statusMessage.textContent = `Entrando na sala ${pin}...`;
         } else {
             ui.statusMessage.textContent = 'Não conectado. Tentando conectar...';
@@ -543,11 +641,11 @@ function updateQuizUI(ui) {
     if(ui.feedbackText) ui.feedbackText.className = 'font-medium';
 
     if(ui.optionsContainer) ui.optionsContainer.innerHTML = '';
-    currentRoomData.currentQuestion.options.forEach(option => {
+    currentRoomData.currentQuestion.options.forEach((optionText, index) => {
         const button = document.createElement('button');
-        button.textContent = option.text;
+        button.textContent = optionText;
         button.className = 'quiz-option-button w-full p-3 md:p-4 text-left rounded-lg bg-slate-700 hover:bg-sky-600 border-2 border-slate-600 hover:border-sky-500 text-slate-200 font-medium transition-all duration-200 ease-in-out shadow-md';
-        button.dataset.optionId = option.id;
+        button.dataset.optionId = OPTION_SHORT_IDS[index];
         button.addEventListener('click', handleOptionClick);
         if(ui.optionsContainer) ui.optionsContainer.appendChild(button);
     });
@@ -643,55 +741,66 @@ function setupResultsPage() {
 
     if(ui.playAgainBtn) {
         ui.playAgainBtn.addEventListener('click', () => {
-            sessionStorage.removeItem('quizResults_room_' + sessionStorage.getItem('lastRoomPinForResults'));
+            sessionStorage.removeItem('quizRanking_room_' + sessionStorage.getItem('lastRoomPinForResults'));
+            sessionStorage.removeItem('quizMyResult_room_' + sessionStorage.getItem('lastRoomPinForResults'));
             sessionStorage.removeItem('mySid');
             sessionStorage.removeItem('currentRoomPin');
             sessionStorage.removeItem('isHost');
             sessionStorage.removeItem('challengeType'); // Remove o tipo de desafio
+            sessionStorage.removeItem('resumeToken');
             sessionStorage.removeItem('lastRoomPinForResults');
             window.location.href = '/';
         });
     }
 }
 
+function rankingItem(player, isMe) {
+    const li = document.createElement('li');
+    li.className = `flex justify-between items-center p-3 rounded-md ${isMe ? 'bg-sky-600/70' : 'bg-slate-600/50'}`;
+    li.innerHTML = `
+        <span class="font-semibold">${player.rank}. ${player.nickname}</span>
+        <span class="text-amber-400 font-bold">${player.score} pts</span>
+    `;
+    return li;
+}
+
 function populateResultsPage(ui) { 
     const lastRoomPin = sessionStorage.getItem('lastRoomPinForResults');
-    const resultsDataString = sessionStorage.getItem('quizResults_room_' + lastRoomPin);
+    const rankingDataString = sessionStorage.getItem('quizRanking_room_' + lastRoomPin);
+    const myResult = JSON.parse(sessionStorage.getItem('quizMyResult_room_' + lastRoomPin) || 'null');
     const userNick = localStorage.getItem('quizNickname') || 'Jogador'; 
-    const mySidSession = sessionStorage.getItem('mySid');
 
     if(ui.userNicknameResult) ui.userNicknameResult.textContent = userNick;
 
-    if (resultsDataString) {
-        const allResults = JSON.parse(resultsDataString);
-        const myResult = allResults.find(r => r.sid === mySidSession); 
-
-        if (myResult) {
-            if(ui.finalScoreDisplay) ui.finalScoreDisplay.textContent = myResult.score;
-            if(ui.recommendationText) ui.recommendationText.textContent = myResult.recommendation;
-        } else {
-            if(ui.finalScoreDisplay) ui.finalScoreDisplay.textContent = '-';
-            if(ui.recommendationText) ui.recommendationText.textContent = 'Seus resultados não foram encontrados.';
-        }
+    if (myResult) {
+        if(ui.finalScoreDisplay) ui.finalScoreDisplay.textContent = myResult.score;
+        if(ui.recommendationText) ui.recommendationText.textContent = myResult.recommendation;
+    } else if (rankingDataString) {
+        // O resultado individual chega logo depois do resumo ('quiz_result')
+        if(ui.finalScoreDisplay) ui.finalScoreDisplay.textContent = '-';
+        if(ui.recommendationText) ui.recommendationText.textContent = 'Calculando sua recomendação...';
+    } else {
+        if(ui.recommendationText) ui.recommendationText.textContent = 'Não foi possível carregar os resultados.';
+    }
 
-        if(ui.rankingList) {
-            ui.rankingList.innerHTML = '';
-            if (allResults.length > 0) {
-                allResults.forEach((player, index) => {
-                    const li = document.createElement('li');
-                    li.className = `flex justify-between items-center p-3 rounded-md ${player.sid === mySidSession ? 'bg-sky-600/70' : 'bg-slate-600/50'}`;
-                    li.innerHTML = `
-                        <span class="font-semibold">${index + 1}. ${player.nickname}</span>
-                        <span class="text-amber-400 font-bold">${player.score} pts</span>
-                    `;
-                    ui.rankingList.appendChild(li);
-                });
-            } else {
-                ui.rankingList.innerHTML = '<p class="text-slate-400">Nenhum resultado no ranking.</p>';
+    // O host substitui este resumo pelo ranking completo ('results_page')
+    if (ui.rankingList && rankingDataString && sessionStorage.getItem('isHost') !== 'true') {
+        const { ranking, totalPlayers } = JSON.parse(rankingDataString);
+        ui.rankingList.innerHTML = '';
+        if (ranking.length > 0) {
+            ranking.forEach(player => ui.rankingList.appendChild(rankingItem(player, myResult && player.rank === myResult.rank)));
+            if (myResult && myResult.rank > ranking.length) {
+                ui.rankingList.appendChild(rankingItem(myResult, true));
+            }
+            if (totalPlayers > ranking.length) {
+                const more = document.createElement('p');
+                more.className = 'text-slate-400 text-sm';
+                more.textContent = `${totalPlayers} jogadores no total.`;
+                ui.rankingList.appendChild(more);
             }
+        } else {
+            ui.rankingList.innerHTML = '<p class="text-slate-400">Nenhum resultado no ranking.</p>';
         }
-    } else {
-        if(ui.recommendationText) ui.recommendationText.textContent = 'Não foi possível carregar os resultados.';
     }
 }
 
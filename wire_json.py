@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Módulo JSON usado pelo Socket.IO (SocketIO(json=wire_json)).
+
+Funciona como o json da biblioteca padrão, mas aceita argumentos de evento já
+serializados (PreEncoded): o texto JSON guardado é emendado direto no pacote,
+sem percorrer e codificar o dict de novo a cada envio. Os acentos vão como
+UTF-8 (ensure_ascii=False) em vez de escapes \\uXXXX, que custam 6 bytes cada.
+"""
+import json
+
+_SEPARATORS = (',', ':')
+
+
+class PreEncoded:
+    """Payload de evento com o JSON já pronto. `data` mantém o objeto original.
+
+    `encoded` pode vir pronto (montado a partir de partes já serializadas); deve
+    ser o JSON de `data`.
+    """
+    __slots__ = ("data", "encoded")
+
+    def __init__(self, data, encoded=None):
+        self.data = data
+        self.encoded = json.dumps(data, separators=_SEPARATORS, ensure_ascii=False) if encoded is None else encoded
+
+    def __len__(self):
+        return len(self.encoded)
+
+
+def encode_batch(events, room_pin):
+    """Argumentos de um 'room_batch': (room_pin, [evento, payload], ...), cada evento já serializado.
+
+    O roomPin que aparece nos payloads (dicts) sai deles e vai uma vez só, no
+    primeiro argumento; o cliente o devolve a cada evento. Payloads PreEncoded
+    são emendados como estão.
+    """
+    args = [room_pin]
+    for event, payload in events:
+        if isinstance(payload, PreEncoded):
+            payload, encoded = payload.data, payload.encoded
+        else:
+            if isinstance(payload, dict) and payload.get("roomPin") == room_pin:
+                payload = {k: v for k, v in payload.items() if k != "roomPin"}
+            encoded = json.dumps(payload, separators=_SEPARATORS, ensure_ascii=False)
+        args.append(PreEncoded([event, payload], '[' + json.dumps(event, ensure_ascii=False) + ',' + encoded + ']'))
+    return tuple(args)
+
+
+def dumps(obj, **kwargs):
+    kwargs.setdefault('ensure_ascii', False)
+    # Pacotes de evento chegam como [nome_do_evento, *args]
+    if isinstance(obj, list) and any(isinstance(item, PreEncoded) for item in obj):
+        separators = kwargs.get('separators') or (', ', ': ')
+        return '[' + separators[0].join(
+            item.encoded if isinstance(item, PreEncoded) else json.dumps(item, **kwargs)
+            for item in obj) + ']'
+    return json.dumps(obj, **kwargs)
+
+
+def loads(s, **kwargs):
+    return json.loads(s, **kwargs)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Transporte MessagePack opcional, escolhido por cliente, ao lado do JSON.
+
+O serializer do python-socketio vale para o servidor inteiro; aqui cada
+conexão usa o formato que o seu cliente fala. O parser MessagePack do
+Socket.IO (socket.io-msgpack-parser, embutido em socket.io.msgpack.min.js)
+manda todo pacote como frame binário, e o parser padrão manda texto: o
+primeiro pacote de cada conexão já diz o formato, sem parâmetro novo no
+handshake. Clientes antigos (e anexos binários do parser padrão, que chegam
+depois de um pacote de texto) continuam no JSON.
+
+Um broadcast é codificado uma vez em JSON, como antes (WirePacket.encode); a
+versão MessagePack só é montada, uma vez por broadcast, se algum destinatário
+a pedir, e reaproveitada para os demais.
+
+Sem o pacote `msgpack` instalado, `available` é False e tudo segue em JSON.
+"""
+from engineio import packet as eio_packet
+from socketio import packet
+
+from wire_json import PreEncoded
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+available = msgpack is not None
+# eio_sids que falam MessagePack (preenchido por install)
+clients = set()
+
+
+def _default(obj):
+    # Payload pré-serializado em JSON: o MessagePack codifica o objeto original
+    if isinstance(obj, PreEncoded):
+        return obj.data
+    raise TypeError(f"Tipo não serializável em MessagePack: {type(obj).__name__}")
+
+
+def dumps(obj):
+    return msgpack.packb(obj, default=_default)
+
+
+class WireText(str):
+    """Pacote Socket.IO em JSON que sabe gerar (e guardar) a sua versão MessagePack."""
+
+    def __new__(cls, encoded, pkt):
+        text = super().__new__(cls, encoded)
+        text.packet = pkt
+        text.msgpack = None
+        return text
+
+    def msgpack_packet(self):
+        if self.msgpack is None:
+            self.msgpack = eio_packet.Packet(eio_packet.MESSAGE, dumps(self.packet._to_dict()))
+        return self.msgpack
+
+
+class WirePacket(packet.Packet):
+    """Packet do Socket.IO que decodifica os dois formatos e marca o JSON para transcodificação."""
+
+    def encode(self):
+        encoded = super().encode()
+        if not clients or isinstance(encoded, list):
+            return encoded   # Ninguém em MessagePack, ou evento com anexos binários: só JSON
+        return WireText(encoded, self)
+
+    def decode(self, encoded_packet):
+        if isinstance(encoded_packet, bytes) and msgpack is not None:
+            # Mesmo formato do socketio.msgpack_packet.MsgPackPacket
+            decoded = msgpack.unpackb(encoded_packet)
+            self.packet_type = decoded['type']
+            self.data = decoded.get('data')
+            self.id = decoded.get('id')
+            self.namespace = decoded['nsp']
+            return 0
+        return super().decode(encoded_packet)
+
+
+def install(server):
+    """Liga a escolha do formato por cliente num socketio.Server criado com serializer=WirePacket.
+
+    Devolve o conjunto (vivo) de eio_sids que falam MessagePack. O primeiro pacote
+    de um cliente é marcado antes de ser tratado, então tudo que for codificado
+    para ele depois disso já sai com a versão MessagePack. Serve também para o
+    socketio.AsyncServer do modo asyncio (asgi_server.py).
+    """
+    if not available:
+        return clients
+    eio = server.eio
+    handle_message, handle_disconnect, send_packet = server._handle_eio_message, server._handle_eio_disconnect, eio.send_packet
+
+    def mark(eio_sid, data):
+        if isinstance(data, bytes) and eio_sid not in server._binary_packet:
+            clients.add(eio_sid)
+
+    def wire(eio_sid, pkt):
+        # Todo envio (broadcast ou para um cliente) passa aqui antes de ir para o socket
+        if eio_sid in clients and isinstance(pkt.data, WireText):
+            return pkt.data.msgpack_packet()
+        return pkt
+
+    if eio.is_asyncio_based():
+        async def on_message(eio_sid, data):
+            mark(eio_sid, data)
+            return await handle_message(eio_sid, data)
+
+        async def on_disconnect(eio_sid, *args):
+            clients.discard(eio_sid)
+            return await handle_disconnect(eio_sid, *args)
+
+        async def send(eio_sid, pkt):
+            return await send_packet(eio_sid, wire(eio_sid, pkt))
+    else:
+        def on_message(eio_sid, data):
+            mark(eio_sid, data)
+            return handle_message(eio_sid, data)
+
+        def on_disconnect(eio_sid, *args):
+            clients.discard(eio_sid)
+            return handle_disconnect(eio_sid, *args)
+
+        def send(eio_sid, pkt):
+            return send_packet(eio_sid, wire(eio_sid, pkt))
+
+    eio.on('message', on_message)
+    eio.on('disconnect', on_disconnect)
+    eio.send_packet = send
+    return clients